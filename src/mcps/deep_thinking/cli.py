@@ -43,5 +43,43 @@ def init():
     console.print("✅ Initialization complete!")
 
 
+@main.command("bundle-templates")
+@click.option("--templates-dir", "-t", default="templates", help="Templates directory")
+@click.option("--output", "-o", help="Bundle file path")
+def bundle_templates(templates_dir: str, output: str = None):
+    """Precompile templates into a bundle for faster server startup."""
+    from .templates.template_bundle import build_template_bundle
+
+    summary = build_template_bundle(templates_dir, output)
+    console.print(
+        f"✅ Bundled {summary['templates']} templates into {summary['path']} "
+        f"({summary['bytes']} bytes)"
+    )
+
+
+@main.command("rotate-key")
+@click.option("--data-dir", "-d", help="Data directory (default: ~/.deep_thinking)")
+@click.option("--database", default="sessions.db", help="Database file name")
+@click.option(
+    "--batch-size", default=200, type=int, help="Rows re-encrypted per transaction"
+)
+def rotate_key(
+    data_dir: str = None, database: str = "sessions.db", batch_size: int = 200
+):
+    """Re-encrypt the session database under a new encryption key.
+
+    The command refuses to run while another process has the database open,
+    since that process would keep using the old key. To rotate while the
+    server keeps serving, call its rotate_encryption_key tool instead.
+    """
+    from .data.privacy_manager import PrivacyManager
+
+    results = PrivacyManager(data_dir).rotate_encryption_key(database, batch_size)
+    if not results["rotation_successful"]:
+        console.print(f"❌ Key rotation failed: {results.get('error')}")
+        raise SystemExit(1)
+    console.print(f"✅ {results['message']}")
+
+
 if __name__ == "__main__":
     main()
@@ -15,6 +15,7 @@ from .exceptions import (
     AgentValidationError,
     ConfigurationError,
     DeepThinkingError,
+    ExpressionError,
     FlowConfigurationError,
 )
 
@@ -23,6 +24,7 @@ __all__ = [
     "DeepThinkingError",
     "ConfigurationError",
     "FlowConfigurationError",
+    "ExpressionError",
     "AgentExecutionError",
     "AgentTimeoutError",
     "AgentValidationError",
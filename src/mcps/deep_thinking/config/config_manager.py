@@ -5,57 +5,23 @@ Configuration management system with hot reload support
 import asyncio
 import json
 import logging
+import threading
 from pathlib import Path
 from typing import Any, Callable, Dict, List, Optional, Union
 
 import yaml
-from watchdog.events import FileSystemEventHandler
-from watchdog.observers import Observer
 
 from ..models.agent_models import AgentConfig, AgentType
+from .config_snapshot import ConfigSnapshot, thaw
 from .config_validator import config_validator
 from .exceptions import ConfigurationError
 from .hot_reload_manager import HotReloadManager
+from .reload_bus import ChangeSet
 from .yaml_config_loader import YAMLConfigLoader
 
 logger = logging.getLogger(__name__)
 
 
-class ConfigFileHandler(FileSystemEventHandler):
-    """File system event handler for configuration file changes"""
-
-    def __init__(self, config_manager: "ConfigManager"):
-        self.config_manager = config_manager
-        self.debounce_delay = 1.0  # seconds
-        self.pending_reloads = set()
-
-    def on_modified(self, event):
-        if event.is_directory:
-            return
-
-        file_path = Path(event.src_path)
-        if file_path.suffix in [".yaml", ".yml", ".json"]:
-            # Debounce rapid file changes
-            asyncio.create_task(self._debounced_reload(file_path))
-
-    async def _debounced_reload(self, file_path: Path):
-        """Debounced reload to handle rapid file changes"""
-        file_key = str(file_path)
-
-        if file_key in self.pending_reloads:
-            return
-
-        self.pending_reloads.add(file_key)
-        await asyncio.sleep(self.debounce_delay)
-
-        try:
-            await self.config_manager._reload_config_file(file_path)
-        except Exception as e:
-            logger.error(f"Failed to reload config file {file_path}: {e}")
-        finally:
-            self.pending_reloads.discard(file_key)
-
-
 class ConfigManager:
     """
     Central configuration manager with hot reload support
@@ -69,10 +35,13 @@ class ConfigManager:
             config_dir: Directory containing configuration files
         """
         self.config_dir = Path(config_dir) if config_dir else Path("config")
+        # Working copy for writers; readers go through the published snapshot
         self.config_data: Dict[str, Any] = {}
+        self._snapshot = ConfigSnapshot({})
+        self._publish_lock = threading.Lock()
         self.config_files: Dict[str, Path] = {}
         self.reload_callbacks: List[Callable[[str, Dict[str, Any]], None]] = []
-        self.file_observer: Optional[Observer] = None
+        self._reload_subscription = None
         self.is_watching = False
         self._lock = asyncio.Lock()
 
@@ -124,6 +93,7 @@ class ConfigManager:
 
             # Load configurations from hot reload manager
             self.config_data = self.hot_reload_manager.get_all_configs()
+            self._publish_snapshot()
 
             # Build config files mapping
             self._build_config_files_mapping()
@@ -165,6 +135,7 @@ class ConfigManager:
 
             self.config_data[config_name] = config_data
             self.config_files[config_name] = file_path
+            self._publish_snapshot()
 
             logger.info(f"Loaded configuration: {config_name} from {file_path}")
 
@@ -191,20 +162,31 @@ class ConfigManager:
 
             logger.info(f"Reloaded configuration: {config_name}")
 
+    async def _on_config_files_changed(self, changes: ChangeSet) -> None:
+        """Reload changed files that the hot reload manager does not handle"""
+        for file_path in sorted(changes.modified):
+            if self.hot_reload_manager._get_config_name_from_path(file_path):
+                continue
+            try:
+                await self._reload_config_file(file_path)
+            except Exception as e:
+                logger.error(f"Failed to reload config file {file_path}: {e}")
+
     async def _start_file_watching(self) -> None:
         """Start watching configuration files for changes"""
         if self.is_watching:
             return
 
         try:
-            self.file_observer = Observer()
-            event_handler = ConfigFileHandler(self)
-
-            self.file_observer.schedule(
-                event_handler, str(self.config_dir), recursive=True
+            # Shares the hot reload manager's watch of the same directory
+            reload_bus = self.hot_reload_manager.reload_bus
+            self._reload_subscription = reload_bus.subscribe(
+                self.config_dir,
+                self._on_config_files_changed,
+                suffixes=(".yaml", ".yml", ".json"),
+                recursive=True,
+                debounce=1.0,
             )
-
-            self.file_observer.start()
             self.is_watching = True
 
             logger.info(f"Started watching config directory: {self.config_dir}")
@@ -214,12 +196,24 @@ class ConfigManager:
 
     async def stop_file_watching(self) -> None:
         """Stop watching configuration files"""
-        if self.file_observer and self.is_watching:
-            self.file_observer.stop()
-            self.file_observer.join()
+        if self._reload_subscription and self.is_watching:
+            self.hot_reload_manager.reload_bus.unsubscribe(self._reload_subscription)
+            self._reload_subscription = None
             self.is_watching = False
             logger.info("Stopped watching config files")
 
+    @property
+    def snapshot(self) -> ConfigSnapshot:
+        """Current read-only snapshot of all configurations"""
+        return self._snapshot
+
+    def _publish_snapshot(self) -> None:
+        """Rebuild the snapshot from the working copy and swap it in"""
+        with self._publish_lock:
+            self._snapshot = ConfigSnapshot(
+                self.config_data, self._snapshot.version + 1
+            )
+
     def get_config(self, config_name: str, default: Any = None) -> Any:
         """
         Get configuration by name
@@ -229,9 +223,9 @@ class ConfigManager:
             default: Default value if config not found
 
         Returns:
-            Configuration data
+            Configuration data (read-only; use thaw() for a mutable copy)
         """
-        return self.config_data.get(config_name, default)
+        return self._snapshot.get_config(config_name, default)
 
     def get_nested_config(self, path: str, default: Any = None) -> Any:
         """
@@ -244,16 +238,7 @@ class ConfigManager:
         Returns:
             Configuration value
         """
-        parts = path.split(".")
-        current = self.config_data
-
-        for part in parts:
-            if isinstance(current, dict) and part in current:
-                current = current[part]
-            else:
-                return default
-
-        return current
+        return self._snapshot.get(path, default)
 
     def set_config(self, config_name: str, config_data: Dict[str, Any]) -> None:
         """
@@ -263,7 +248,8 @@ class ConfigManager:
             config_name: Name of the configuration
             config_data: Configuration data to set
         """
-        self.config_data[config_name] = config_data
+        self.config_data[config_name] = thaw(config_data)
+        self._publish_snapshot()
 
     def update_config(self, config_name: str, updates: Dict[str, Any]) -> None:
         """
@@ -276,7 +262,8 @@ class ConfigManager:
         if config_name not in self.config_data:
             self.config_data[config_name] = {}
 
-        self._deep_update(self.config_data[config_name], updates)
+        self._deep_update(self.config_data[config_name], thaw(updates))
+        self._publish_snapshot()
 
     def _deep_update(
         self, base_dict: Dict[str, Any], update_dict: Dict[str, Any]
@@ -377,7 +364,7 @@ class ConfigManager:
 
     def get_all_configs(self) -> Dict[str, Any]:
         """Get all loaded configurations"""
-        return self.config_data.copy()
+        return dict(self._snapshot.configs)
 
     def get_config_files(self) -> Dict[str, Path]:
         """Get mapping of config names to file paths"""
@@ -423,6 +410,7 @@ class ConfigManager:
 
         # Update local config data
         self.config_data[config_name] = config_data
+        self._publish_snapshot()
 
         # Notify registered callbacks
         for callback in self.reload_callbacks:
@@ -543,6 +531,7 @@ class ConfigManager:
         Raises:
             ConfigurationError: If validation fails or save fails
         """
+        config_data = thaw(config_data)
         if validate:
             self.validate_config(config_name, config_data)
 
@@ -558,6 +547,7 @@ class ConfigManager:
             # Update local data
             self.config_data[config_name] = config_data
             self.config_files[config_name] = file_path
+            self._publish_snapshot()
 
             logger.info(f"Successfully saved configuration: {config_name}")
 
@@ -0,0 +1,102 @@
+"""
+Immutable configuration snapshots
+
+Configuration is read far more often than it changes, so readers get a
+published snapshot instead of walking and copying the mutable sources:
+- freeze() turns a configuration tree into read-only dicts and lists that
+  can be shared between readers without copying
+- ConfigSnapshot pre-flattens every dotted path ("system.log_level") into a
+  single dict, so a nested lookup is one dict access
+- Owners build a new snapshot whenever a source changes and publish it by
+  replacing a reference, so readers never take a lock and never see a
+  half-applied change
+"""
+
+from typing import Any, Dict, Mapping, Optional
+
+
+def _read_only(self, *args, **kwargs):
+    raise TypeError(f"{type(self).__name__} is read-only")
+
+
+class FrozenDict(dict):
+    """Read-only dict; copy, deepcopy and pickle give plain dicts"""
+
+    __slots__ = ()
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def copy(self) -> Dict[str, Any]:
+        return dict(self)
+
+    def __reduce__(self):
+        return dict, (dict(self),)
+
+
+class FrozenList(list):
+    """Read-only list; copy, deepcopy and pickle give plain lists"""
+
+    __slots__ = ()
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _read_only
+    append = clear = extend = insert = pop = remove = reverse = sort = _read_only
+
+    def copy(self) -> list:
+        return list(self)
+
+    def __reduce__(self):
+        return list, (list(self),)
+
+
+def freeze(value: Any) -> Any:
+    """Read-only copy of a configuration tree; frozen subtrees are shared"""
+    if isinstance(value, (FrozenDict, FrozenList)):
+        return value
+    if isinstance(value, dict):
+        return FrozenDict((key, freeze(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return FrozenList(freeze(item) for item in value)
+    return value
+
+
+def thaw(value: Any) -> Any:
+    """Plain mutable copy of a configuration tree"""
+    if isinstance(value, dict):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [thaw(item) for item in value]
+    return value
+
+
+EMPTY_CONFIG = FrozenDict()
+
+
+class ConfigSnapshot:
+    """Frozen configurations with every dotted path resolved up front"""
+
+    __slots__ = ("configs", "version", "_paths")
+
+    def __init__(self, configs: Mapping[str, Any], version: int = 0):
+        self.configs: FrozenDict = freeze(dict(configs))
+        self.version = version
+        self._paths: Dict[str, Any] = {}
+        self._flatten(self.configs, "")
+
+    def _flatten(self, node: Mapping[str, Any], prefix: str) -> None:
+        for key, value in node.items():
+            # A dotted path can only reach string keys without dots
+            if not isinstance(key, str) or "." in key:
+                continue
+            path = prefix + key
+            self._paths[path] = value
+            if isinstance(value, dict):
+                self._flatten(value, path + ".")
+
+    def get(self, path: str, default: Any = None) -> Any:
+        """Get a value by dot-separated path (e.g., 'system.log_level')"""
+        return self._paths.get(path, default)
+
+    def get_config(self, config_name: str, default: Optional[Any] = None) -> Any:
+        """Get a whole configuration by name"""
+        return self.configs.get(config_name, default)
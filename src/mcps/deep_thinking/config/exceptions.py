@@ -34,6 +34,23 @@ class FlowConfigurationError(ConfigurationError):
     pass
 
 
+class ExpressionError(FlowConfigurationError):
+    """Raised when a flow condition or reference expression is invalid"""
+
+    def __init__(
+        self, message: str, expression: str = None, position: int = None, **kwargs
+    ):
+        if expression is not None and position is not None:
+            message = f"{message} at position {position} in '{expression}'"
+        super().__init__(message, **kwargs)
+        self.expression = expression
+        self.position = position
+        if expression is not None:
+            self.details["expression"] = expression
+        if position is not None:
+            self.details["position"] = position
+
+
 class AgentExecutionError(DeepThinkingError):
     """Raised when agent execution fails"""
 
@@ -10,6 +10,7 @@ from typing import Any, Dict, List, Optional, Set, Union
 
 from ..models.thinking_models import FlowStep, ThinkingFlow
 from .config_manager import ConfigManager
+from .config_snapshot import thaw
 from .exceptions import FlowConfigurationError
 from .yaml_flow_parser import YAMLFlowParser
 
@@ -301,8 +302,8 @@ class FlowConfigManager:
             raise FlowConfigurationError(f"Flow '{flow_name}' not found")
 
         try:
-            # Get current flows config
-            flows_config = self.config_manager.get_config("flows", {})
+            # Get current flows config as a mutable copy
+            flows_config = thaw(self.config_manager.get_config("flows", {}))
 
             # Update with this flow
             flows_config[flow_name] = flow.model_dump(exclude={"name"})
@@ -0,0 +1,586 @@
+"""
+Flow Condition and Reference Expressions
+
+A small, safe expression language for step conditions, repeat_until gates
+and references to earlier step results:
+- Comparisons (==, !=, <, <=, >, >=, chained as in Python), in / not in,
+  and / or / not, + - * / % on numbers, parentheses and list literals
+- Paths such as critic.scores.depth, decomposer.sub_questions.0 or
+  decomposer.sub_questions[0] read nested dicts and lists of the context
+- A few pure functions: len, min, max, abs, sum, round
+- Nothing else: no attribute access, no calls into the context, no eval
+
+Expressions are parsed once into nested closures and cached by source
+text, so a flow validates its expressions when it is loaded and evaluating
+a gate on every step costs a few function calls. Syntax errors raise
+ExpressionError with the position of the offending token.
+
+A path that does not exist evaluates to a missing value: comparisons and
+membership tests against it are false and it is falsy, matching the
+previous single-comparison evaluator.
+
+As in that evaluator, a bare word standing alone on the right of ==, !=,
+<, <=, > or >= is a string literal: "critic.status == completed" compares
+with 'completed'. Dotted paths, calls and arithmetic there still read the
+context, and so does a bare word after in / not in.
+"""
+
+import ast
+import logging
+import operator
+import re
+from functools import lru_cache
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+from .exceptions import ExpressionError
+
+logger = logging.getLogger(__name__)
+
+Evaluator = Callable[[Any], Any]
+
+
+class _Missing:
+    """Value of a path that is not in the context"""
+
+    __slots__ = ()
+
+    def __bool__(self) -> bool:
+        return False
+
+    def __repr__(self) -> str:
+        return "<missing>"
+
+
+MISSING = _Missing()
+
+_TOKEN_PATTERN = re.compile(
+    r"""
+    (?P<space>\s+)
+    | (?P<number>\d+(?:\.\d+)?)
+    | (?P<string>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+    | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+    | (?P<op>==|!=|<=|>=|<|>|\+|-|\*|/|%|\(|\)|\[|\]|,|\.)
+    """,
+    re.VERBOSE,
+)
+
+_COMPARISONS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "in": lambda left, right: left in right,
+    "not in": lambda left, right: left not in right,
+}
+
+_ARITHMETIC = {
+    "+": operator.add,
+    "-": operator.sub,
+    "*": operator.mul,
+    "/": operator.truediv,
+    "%": operator.mod,
+}
+
+_FUNCTIONS = {
+    "len": len,
+    "min": min,
+    "max": max,
+    "abs": abs,
+    "sum": sum,
+    "round": round,
+}
+
+# Case-insensitive, like the literals of the previous evaluator
+_CONSTANTS = {"true": True, "false": False, "none": None, "null": None}
+
+_KEYWORDS = frozenset({"and", "or", "not", "in"})
+
+# Operators whose right operand may be a bare word literal, as before
+_LITERAL_WORD_COMPARISONS = frozenset({"==", "!=", "<", "<=", ">", ">="})
+# Tokens after a name that make it part of a larger operand
+_OPERAND_CONTINUATIONS = frozenset({"(", "[", ".", "+", "-", "*", "/", "%"})
+
+# Step references embedded in text, e.g. "Summarize critic.overall_score"
+_EMBEDDED_REFERENCE = re.compile(r"(\w+)\.([a-zA-Z0-9_.]+)")
+_DIRECT_REFERENCE = re.compile(r"[a-zA-Z0-9_]+\.[a-zA-Z0-9_.]+")
+
+# Errors an expression can raise at evaluation time, e.g. comparing a
+# string with a number
+EVALUATION_ERRORS = (TypeError, ValueError, ZeroDivisionError, OverflowError)
+
+
+def compile_path(segments: Tuple[str, ...]) -> Evaluator:
+    """
+    Accessor for a dotted path through nested dicts and lists
+
+    Digit segments also index lists; the int conversion is done here,
+    once, rather than on every lookup.
+    """
+    steps = tuple(
+        (segment, int(segment) if segment.isdigit() else None) for segment in segments
+    )
+
+    def access(context: Any) -> Any:
+        current = context
+        for key, index in steps:
+            if isinstance(current, dict):
+                current = current.get(key, MISSING)
+                if current is MISSING:
+                    return MISSING
+            elif index is not None and isinstance(current, (list, tuple)):
+                if index >= len(current):
+                    return MISSING
+                current = current[index]
+            else:
+                return MISSING
+        return current
+
+    return access
+
+
+def _index(container: Any, key: Any) -> Any:
+    if isinstance(container, dict):
+        return container.get(key, MISSING)
+    if isinstance(container, (list, tuple, str)) and isinstance(key, int):
+        if -len(container) <= key < len(container):
+            return container[key]
+    return MISSING
+
+
+class Expression:
+    """A compiled expression"""
+
+    __slots__ = ("source", "references", "_evaluate")
+
+    def __init__(self, source: str, evaluate: Evaluator, references: FrozenSet[str]):
+        self.source = source
+        self.references = references  # Root names of the paths it reads
+        self._evaluate = evaluate
+
+    def evaluate(self, context: Dict[str, Any]) -> Any:
+        """
+        Evaluate against a context
+
+        Returns:
+            The value, or None for a missing path
+
+        Raises:
+            TypeError, ValueError, ZeroDivisionError: On invalid operands
+        """
+        value = self._evaluate(context)
+        return None if value is MISSING else value
+
+    def test(self, context: Dict[str, Any]) -> bool:
+        """Evaluate as a condition; invalid operands make it false"""
+        try:
+            return bool(self._evaluate(context))
+        except EVALUATION_ERRORS as e:
+            logger.warning(f"Condition '{self.source}' could not be evaluated: {e}")
+            return False
+
+    def __repr__(self) -> str:
+        return f"Expression({self.source!r})"
+
+
+class _Parser:
+    """Recursive descent parser producing closures"""
+
+    def __init__(self, source: str):
+        self.source = source
+        self.tokens = self._tokenize(source)
+        self.position = 0
+        self.references = set()
+
+    def _tokenize(self, source: str) -> List[Tuple[str, str, int]]:
+        tokens = []
+        position = 0
+        while position < len(source):
+            match = _TOKEN_PATTERN.match(source, position)
+            if not match:
+                raise ExpressionError(
+                    f"Unexpected character {source[position]!r}", source, position
+                )
+            kind = match.lastgroup
+            if kind != "space":
+                tokens.append((kind, match.group(), position))
+            position = match.end()
+        tokens.append(("end", "", len(source)))
+        return tokens
+
+    # Token helpers
+
+    def _peek(self, offset: int = 0) -> Tuple[str, str, int]:
+        return self.tokens[min(self.position + offset, len(self.tokens) - 1)]
+
+    def _at(self, value: str, offset: int = 0) -> bool:
+        kind, text, _ = self._peek(offset)
+        return kind in ("op", "name") and text == value
+
+    def _next(self) -> Tuple[str, str, int]:
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+
+    def _error(self, message: str, token: Optional[Tuple[str, str, int]] = None):
+        kind, text, position = token or self._peek()
+        found = "end of expression" if kind == "end" else repr(text)
+        return ExpressionError(f"{message}, found {found}", self.source, position)
+
+    def _expect(self, value: str) -> None:
+        if not self._at(value):
+            raise self._error(f"Expected '{value}'")
+        self._next()
+
+    # Grammar
+
+    def parse(self) -> Expression:
+        if self._peek()[0] == "end":
+            raise ExpressionError("Empty expression", self.source, 0)
+        evaluate = self._or()
+        if self._peek()[0] != "end":
+            raise self._error("Unexpected token")
+        return Expression(self.source, evaluate, frozenset(self.references))
+
+    def _or(self) -> Evaluator:
+        operands = [self._and()]
+        while self._at("or"):
+            self._next()
+            operands.append(self._and())
+        if len(operands) == 1:
+            return operands[0]
+
+        def evaluate_or(context):
+            value = False
+            for operand in operands:
+                value = operand(context)
+                if value:
+                    return value
+            return value
+
+        return evaluate_or
+
+    def _and(self) -> Evaluator:
+        operands = [self._not()]
+        while self._at("and"):
+            self._next()
+            operands.append(self._not())
+        if len(operands) == 1:
+            return operands[0]
+
+        def evaluate_and(context):
+            value = True
+            for operand in operands:
+                value = operand(context)
+                if not value:
+                    return value
+            return value
+
+        return evaluate_and
+
+    def _not(self) -> Evaluator:
+        if self._at("not"):
+            self._next()
+            operand = self._not()
+            return lambda context: not operand(context)
+        return self._comparison()
+
+    def _comparison_operator(self) -> Optional[str]:
+        kind, text, _ = self._peek()
+        if kind == "op" and text in _COMPARISONS:
+            self._next()
+            return text
+        if self._at("in"):
+            self._next()
+            return "in"
+        if self._at("not") and self._at("in", 1):
+            self._next()
+            self._next()
+            return "not in"
+        return None
+
+    def _at_bare_word(self) -> bool:
+        """Whether the next operand is a lone name that is not a constant"""
+        kind, text, _ = self._peek()
+        if kind != "name" or text in _KEYWORDS or text.lower() in _CONSTANTS:
+            return False
+        next_kind, next_text, _ = self._peek(1)
+        return not (next_kind == "op" and next_text in _OPERAND_CONTINUATIONS)
+
+    def _word(self) -> Evaluator:
+        value = self._next()[1]
+        return lambda context: value
+
+    def _comparison(self) -> Evaluator:
+        first = self._sum()
+        links = []
+        while True:
+            name = self._comparison_operator()
+            if name is None:
+                break
+            if name in _LITERAL_WORD_COMPARISONS and self._at_bare_word():
+                links.append((_COMPARISONS[name], self._word()))
+            else:
+                links.append((_COMPARISONS[name], self._sum()))
+        if not links:
+            return first
+
+        if len(links) == 1:
+            compare, second = links[0]
+
+            def evaluate_comparison(context):
+                left = first(context)
+                right = second(context)
+                if left is MISSING or right is MISSING:
+                    return False
+                return compare(left, right)
+
+            return evaluate_comparison
+
+        def evaluate_chain(context):
+            left = first(context)
+            for compare, operand in links:
+                right = operand(context)
+                if left is MISSING or right is MISSING or not compare(left, right):
+                    return False
+                left = right
+            return True
+
+        return evaluate_chain
+
+    def _sum(self) -> Evaluator:
+        return self._binary(self._product, ("+", "-"))
+
+    def _product(self) -> Evaluator:
+        return self._binary(self._unary, ("*", "/", "%"))
+
+    def _binary(self, operand_parser, operators) -> Evaluator:
+        left = operand_parser()
+        while self._peek()[0] == "op" and self._peek()[1] in operators:
+            apply = _ARITHMETIC[self._next()[1]]
+            right = operand_parser()
+            left = self._apply(apply, left, right)
+        return left
+
+    @staticmethod
+    def _apply(apply, left: Evaluator, right: Evaluator) -> Evaluator:
+        def evaluate_binary(context):
+            left_value = left(context)
+            right_value = right(context)
+            if left_value is MISSING or right_value is MISSING:
+                return MISSING
+            return apply(left_value, right_value)
+
+        return evaluate_binary
+
+    def _unary(self) -> Evaluator:
+        if self._at("-"):
+            self._next()
+            operand = self._unary()
+
+            def evaluate_negative(context):
+                value = operand(context)
+                return MISSING if value is MISSING else -value
+
+            return evaluate_negative
+        return self._postfix()
+
+    def _postfix(self) -> Evaluator:
+        value = self._primary()
+        while True:
+            if self._at("["):
+                self._next()
+                key = self._or()
+                self._expect("]")
+                value = self._subscript(value, key)
+            elif self._at(".") and self._peek(1)[0] in ("name", "number"):
+                self._next()
+                segments = tuple(self._next()[1].split("."))
+                value = self._member(value, compile_path(segments))
+            else:
+                return value
+
+    @staticmethod
+    def _subscript(container: Evaluator, key: Evaluator) -> Evaluator:
+        return lambda context: _index(container(context), key(context))
+
+    @staticmethod
+    def _member(container: Evaluator, access: Evaluator) -> Evaluator:
+        def evaluate_member(context):
+            value = container(context)
+            return MISSING if value is MISSING else access(value)
+
+        return evaluate_member
+
+    def _primary(self) -> Evaluator:
+        token = self._peek()
+        kind, text, _ = token
+
+        if kind == "number":
+            self._next()
+            value = float(text) if "." in text else int(text)
+            return lambda context: value
+
+        if kind == "string":
+            self._next()
+            value = ast.literal_eval(text)
+            return lambda context: value
+
+        if self._at("("):
+            self._next()
+            value = self._or()
+            self._expect(")")
+            return value
+
+        if self._at("["):
+            return self._list()
+
+        if kind == "name" and text not in _KEYWORDS:
+            if text.lower() in _CONSTANTS:
+                self._next()
+                value = _CONSTANTS[text.lower()]
+                return lambda context: value
+            if self._at("(", 1):
+                return self._call()
+            return self._path()
+
+        raise self._error("Expected a value")
+
+    def _list(self) -> Evaluator:
+        self._expect("[")
+        items = []
+        while not self._at("]"):
+            items.append(self._or())
+            if not self._at(","):
+                break
+            self._next()
+        self._expect("]")
+        return lambda context: [item(context) for item in items]
+
+    def _call(self) -> Evaluator:
+        token = self._next()
+        function = _FUNCTIONS.get(token[1])
+        if function is None:
+            raise ExpressionError(
+                f"Unknown function '{token[1]}'", self.source, token[2]
+            )
+        self._expect("(")
+        arguments = []
+        while not self._at(")"):
+            arguments.append(self._or())
+            if not self._at(","):
+                break
+            self._next()
+        self._expect(")")
+
+        def evaluate_call(context):
+            values = [argument(context) for argument in arguments]
+            if any(value is MISSING for value in values):
+                return MISSING
+            return function(*values)
+
+        return evaluate_call
+
+    def _path(self) -> Evaluator:
+        segments = [self._next()[1]]
+        while self._at(".") and self._peek(1)[0] in ("name", "number"):
+            self._next()
+            # "items.0.1" tokenizes its indexes as the number 0.1
+            segments.extend(self._next()[1].split("."))
+        self.references.add(segments[0])
+        return compile_path(tuple(segments))
+
+
+@lru_cache(maxsize=1024)
+def compile_expression(source: str) -> Expression:
+    """
+    Compile an expression, reusing earlier compilations of the same text
+
+    Args:
+        source: Expression text, e.g. "critic.overall_score >= 0.8 and not done"
+
+    Returns:
+        Expression: Compiled expression
+
+    Raises:
+        ExpressionError: If the expression is not valid
+    """
+    if not isinstance(source, str):
+        raise ExpressionError(f"Expression must be a string, got {type(source)}")
+    return _Parser(source).parse()
+
+
+def compile_conditions(conditions: Dict[str, Any]) -> Optional[Expression]:
+    """
+    Compile a step's conditions mapping into one expression
+
+    Each key is a reference and each value either a comparison suffix
+    ({"critic.overall_score": ">= 0.8"}) or a value the reference must
+    equal. All conditions must hold.
+
+    Returns:
+        Expression: Combined condition, or None if there are no conditions
+
+    Raises:
+        ExpressionError: If a condition is not valid
+    """
+    if not conditions:
+        return None
+
+    clauses = []
+    for reference, requirement in conditions.items():
+        if isinstance(requirement, str) and re.match(
+            r"\s*(==|!=|<=|>=|<|>|in\b|not\s+in\b)", requirement
+        ):
+            clauses.append(f"({reference} {requirement.strip()})")
+        else:
+            clauses.append(f"({reference} == {requirement!r})")
+    return compile_expression(" and ".join(clauses))
+
+
+@lru_cache(maxsize=1024)
+def compile_reference(text: str) -> Evaluator:
+    """
+    Compile a reference or a text with embedded references
+
+    A text that is a single reference ("critic.scores.depth") resolves to
+    the referenced value, or None if it does not exist. Otherwise every
+    embedded reference whose value exists is replaced by that value as
+    text, and the others are left as written.
+
+    Returns:
+        Callable taking the context and returning the resolved value
+    """
+    if _DIRECT_REFERENCE.fullmatch(text):
+        access = compile_path(tuple(text.split(".")))
+
+        def resolve_direct(context):
+            value = access(context)
+            return None if value is MISSING else value
+
+        return resolve_direct
+
+    # Alternating literal text and (accessor, original text) pairs
+    parts: List[Any] = []
+    position = 0
+    for match in _EMBEDDED_REFERENCE.finditer(text):
+        parts.append(text[position : match.start()])
+        parts.append((compile_path(tuple(match.group(0).split("."))), match.group(0)))
+        position = match.end()
+    parts.append(text[position:])
+    if len(parts) == 1:
+        return lambda context: text
+
+    def resolve_embedded(context):
+        pieces = []
+        for part in parts:
+            if isinstance(part, str):
+                pieces.append(part)
+                continue
+            access, original = part
+            value = access(context)
+            pieces.append(original if value is MISSING else str(value))
+        return "".join(pieces)
+
+    return resolve_embedded
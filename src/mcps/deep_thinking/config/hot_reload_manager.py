@@ -4,98 +4,18 @@ Hot reload manager for configuration files with file system monitoring
 
 import asyncio
 import logging
-import time
 from pathlib import Path
 from typing import Any, Callable, Dict, List, Optional, Set, Union
 
-from watchdog.events import FileSystemEvent, FileSystemEventHandler
-from watchdog.observers import Observer
-
 from .config_validator import config_validator
 from .exceptions import ConfigurationError
+from .reload_bus import ChangeSet, ReloadBus
+from .reload_bus import reload_bus as shared_reload_bus
 from .yaml_config_loader import YAMLConfigLoader
 
 logger = logging.getLogger(__name__)
 
 
-class ConfigFileEventHandler(FileSystemEventHandler):
-    """
-    File system event handler for configuration file changes
-    """
-
-    def __init__(self, hot_reload_manager: "HotReloadManager"):
-        self.hot_reload_manager = hot_reload_manager
-        self.debounce_delay = 1.0  # seconds
-        self.pending_reloads: Dict[str, float] = {}
-
-    def on_modified(self, event: FileSystemEvent) -> None:
-        """Handle file modification events"""
-        if event.is_directory:
-            return
-
-        file_path = Path(event.src_path)
-
-        # Only process YAML files
-        if file_path.suffix not in [".yaml", ".yml"]:
-            return
-
-        # Debounce rapid file changes
-        current_time = time.time()
-        file_key = str(file_path)
-
-        if file_key in self.pending_reloads:
-            # Update the timestamp for debouncing
-            self.pending_reloads[file_key] = current_time
-        else:
-            # Schedule reload with debouncing
-            self.pending_reloads[file_key] = current_time
-            asyncio.create_task(self._debounced_reload(file_path))
-
-    def on_created(self, event: FileSystemEvent) -> None:
-        """Handle file creation events"""
-        self.on_modified(event)  # Treat creation same as modification
-
-    def on_deleted(self, event: FileSystemEvent) -> None:
-        """Handle file deletion events"""
-        if event.is_directory:
-            return
-
-        file_path = Path(event.src_path)
-
-        if file_path.suffix not in [".yaml", ".yml"]:
-            return
-
-        logger.warning(f"Configuration file deleted: {file_path}")
-        asyncio.create_task(self.hot_reload_manager._handle_file_deletion(file_path))
-
-    async def _debounced_reload(self, file_path: Path) -> None:
-        """
-        Debounced reload to handle rapid file changes
-
-        Args:
-            file_path: Path to the file that changed
-        """
-        file_key = str(file_path)
-
-        # Wait for debounce delay
-        await asyncio.sleep(self.debounce_delay)
-
-        # Check if there were more recent changes
-        if file_key in self.pending_reloads:
-            last_change_time = self.pending_reloads[file_key]
-            if time.time() - last_change_time < self.debounce_delay:
-                # More recent changes, skip this reload
-                return
-
-            # Remove from pending reloads
-            del self.pending_reloads[file_key]
-
-        try:
-            await self.hot_reload_manager._reload_config_file(file_path)
-        except Exception as e:
-            logger.error(f"Failed to reload config file {file_path}: {e}")
-
-
 class HotReloadManager:
     """
     Manager for hot reloading configuration files
@@ -105,6 +25,7 @@ class HotReloadManager:
         self,
         config_dir: Optional[Union[str, Path]] = None,
         yaml_loader: Optional[YAMLConfigLoader] = None,
+        reload_bus: Optional[ReloadBus] = None,
     ):
         """
         Initialize hot reload manager
@@ -112,11 +33,14 @@ class HotReloadManager:
         Args:
             config_dir: Directory to monitor for configuration files
             yaml_loader: YAML configuration loader instance
+            reload_bus: File watcher to subscribe to; defaults to the shared one
         """
         self.config_dir = Path(config_dir) if config_dir else Path("config")
         self.yaml_loader = yaml_loader or YAMLConfigLoader(self.config_dir)
 
-        self.observer: Optional[Observer] = None
+        self.reload_bus = reload_bus or shared_reload_bus
+        self.reload_debounce = 1.0  # seconds
+        self._subscription = None
         self.is_monitoring = False
         self.reload_callbacks: List[Callable[[str, Dict[str, Any]], None]] = []
         self.error_callbacks: List[Callable[[str, Exception], None]] = []
@@ -172,13 +96,14 @@ class HotReloadManager:
             return
 
         try:
-            self.observer = Observer()
-            event_handler = ConfigFileEventHandler(self)
-
-            # Monitor main config directory
-            self.observer.schedule(event_handler, str(self.config_dir), recursive=True)
-
-            self.observer.start()
+            # Monitor main config directory; changes arrive on this event loop
+            self._subscription = self.reload_bus.subscribe(
+                self.config_dir,
+                self._on_config_files_changed,
+                suffixes=(".yaml", ".yml"),
+                recursive=True,
+                debounce=self.reload_debounce,
+            )
             self.is_monitoring = True
 
             logger.info(
@@ -191,9 +116,9 @@ class HotReloadManager:
 
     async def stop_monitoring(self) -> None:
         """Stop file system monitoring"""
-        if self.observer and self.is_monitoring:
-            self.observer.stop()
-            self.observer.join()
+        if self._subscription and self.is_monitoring:
+            self.reload_bus.unsubscribe(self._subscription)
+            self._subscription = None
             self.is_monitoring = False
             logger.info("Stopped configuration file monitoring")
 
@@ -205,24 +130,78 @@ class HotReloadManager:
             file_path: Path to the file to reload
         """
         async with self._lock:
-            try:
-                # Determine config name from file path
-                config_name = self._get_config_name_from_path(file_path)
-                if not config_name:
-                    logger.warning(f"Unknown configuration file: {file_path}")
-                    return
-
-                # Load and validate the configuration
-                if config_name == "flows" and file_path.parent.name == "flows":
-                    # Handle individual flow files
-                    await self._reload_flow_file(file_path)
+            await self._apply_file_change(file_path)
+
+    async def _on_config_files_changed(self, changes: ChangeSet) -> None:
+        """
+        Apply a batch of file changes from the reload bus
+
+        Flow files are reloaded together and the "flows" callbacks notified
+        once for the whole batch.
+        """
+        async with self._lock:
+            flows_deleted = False
+            for file_path in sorted(changes.deleted):
+                flows_deleted |= self._forget_file(file_path)
+            if flows_deleted:
+                # Rereads every remaining flow file, modified ones included
+                try:
+                    await self._reload_all_flow_files()
+                except Exception as e:
+                    logger.error(f"Failed to reload flows after file deletion: {e}")
+
+            flows_changed = False
+            for file_path in sorted(changes.modified):
+                if self._is_flow_file(file_path):
+                    if not flows_deleted:
+                        flows_changed |= await self._apply_file_change(
+                            file_path, notify=False
+                        )
                 else:
-                    # Handle main config files
-                    await self._reload_main_config_file(file_path, config_name)
+                    await self._apply_file_change(file_path)
 
-            except Exception as e:
-                logger.error(f"Failed to reload config file {file_path}: {e}")
-                await self._notify_error_callbacks(str(file_path), e)
+            if flows_changed:
+                await self._notify_reload_callbacks(
+                    "flows", self.current_configs["flows"]
+                )
+
+    def _is_flow_file(self, file_path: Path) -> bool:
+        return (
+            file_path.parent.name == "flows"
+            and self._get_config_name_from_path(file_path) == "flows"
+        )
+
+    async def _apply_file_change(self, file_path: Path, notify: bool = True) -> bool:
+        """
+        Reload a changed configuration file; the caller holds the lock
+
+        Args:
+            file_path: Path to the file that changed
+            notify: Notify reload callbacks; False leaves it to the caller
+
+        Returns:
+            bool: True if the file was reloaded
+        """
+        try:
+            # Determine config name from file path
+            config_name = self._get_config_name_from_path(file_path)
+            if not config_name:
+                logger.warning(f"Unknown configuration file: {file_path}")
+                return False
+
+            # Load and validate the configuration
+            if config_name == "flows" and file_path.parent.name == "flows":
+                # Handle individual flow files
+                return await self._reload_flow_file(file_path, notify)
+            else:
+                # Handle main config files
+                await self._reload_main_config_file(file_path, config_name)
+                return True
+
+        except Exception as e:
+            logger.error(f"Failed to reload config file {file_path}: {e}")
+            await self._notify_error_callbacks(str(file_path), e)
+            return False
 
     def _get_config_name_from_path(self, file_path: Path) -> Optional[str]:
         """
@@ -301,12 +280,16 @@ class HotReloadManager:
             logger.error(f"Failed to reload {config_name} config from {file_path}: {e}")
             raise
 
-    async def _reload_flow_file(self, file_path: Path) -> None:
+    async def _reload_flow_file(self, file_path: Path, notify: bool = True) -> bool:
         """
         Reload an individual flow configuration file
 
         Args:
             file_path: Path to the flow configuration file
+            notify: Notify reload callbacks of the updated flows
+
+        Returns:
+            bool: True if the flows were updated
         """
         try:
             # Load the flow configuration
@@ -321,7 +304,7 @@ class HotReloadManager:
                 await self._notify_error_callbacks(
                     str(file_path), ConfigurationError(error_msg)
                 )
-                return
+                return False
 
             # Update flows configuration
             if "flows" not in self.current_configs:
@@ -334,9 +317,13 @@ class HotReloadManager:
             self.config_file_mapping[file_path] = "flows"
 
             # Notify callbacks
-            await self._notify_reload_callbacks("flows", self.current_configs["flows"])
+            if notify:
+                await self._notify_reload_callbacks(
+                    "flows", self.current_configs["flows"]
+                )
 
             logger.info(f"Successfully reloaded flow configuration from: {file_path}")
+            return True
 
         except Exception as e:
             logger.error(f"Failed to reload flow config from {file_path}: {e}")
@@ -350,17 +337,7 @@ class HotReloadManager:
             file_path: Path to the deleted file
         """
         async with self._lock:
-            config_name = self._get_config_name_from_path(file_path)
-
-            if not config_name:
-                return
-
-            # Remove from file mapping
-            if file_path in self.config_file_mapping:
-                del self.config_file_mapping[file_path]
-
-            # Handle flow file deletion
-            if config_name == "flows" and file_path.parent.name == "flows":
+            if self._forget_file(file_path):
                 # Remove specific flows from the deleted file
                 try:
                     # We can't know which flows were in the deleted file,
@@ -369,7 +346,26 @@ class HotReloadManager:
                 except Exception as e:
                     logger.error(f"Failed to reload flows after file deletion: {e}")
 
-            logger.warning(f"Configuration file deleted: {file_path}")
+    def _forget_file(self, file_path: Path) -> bool:
+        """
+        Drop a deleted file from the mapping
+
+        Returns:
+            bool: True if it was a flow file, so the flows need reloading
+        """
+        config_name = self._get_config_name_from_path(file_path)
+
+        if not config_name:
+            return False
+
+        # Remove from file mapping
+        if file_path in self.config_file_mapping:
+            del self.config_file_mapping[file_path]
+
+        logger.warning(f"Configuration file deleted: {file_path}")
+
+        # Handle flow file deletion
+        return config_name == "flows" and file_path.parent.name == "flows"
 
     async def _reload_all_flow_files(self) -> None:
         """Reload all flow configuration files"""
@@ -532,7 +528,7 @@ class HotReloadManager:
                 ]
 
                 for file_path in config_files:
-                    await self._reload_config_file(file_path)
+                    await self._apply_file_change(file_path)
             else:
                 # Reload all configurations
                 await self._load_initial_configs()
@@ -0,0 +1,370 @@
+"""
+Shared file watching for hot reload
+
+One watchdog observer serves every hot-reload consumer (templates, config
+files and flow definitions):
+- Subscribers register a directory, the file suffixes they care about and a
+  callback; a directory watched by several subscribers is scheduled once
+- Events are coalesced per file and delivered once the directory has been
+  quiet for the subscriber's debounce delay (trailing edge), so a checkout
+  touching 50 templates produces one ChangeSet instead of 50 reloads
+- A change set waits at most max_delay after its first event, so files that
+  keep changing are still reloaded
+- Callbacks run on the bus's dispatch thread; coroutine callbacks are
+  scheduled with run_coroutine_threadsafe on the event loop that subscribed,
+  because watchdog threads have no event loop of their own
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from watchdog.events import FileSystemEvent, FileSystemEventHandler
+from watchdog.observers import Observer
+
+logger = logging.getLogger(__name__)
+
+# Watchdog event types that leave a file with new content
+_CHANGE_EVENTS = frozenset({"created", "modified", "closed"})
+
+
+@dataclass(frozen=True)
+class ChangeSet:
+    """Files that changed during one debounce window"""
+
+    modified: FrozenSet[Path]  # Created or modified, including move targets
+    deleted: FrozenSet[Path]  # Deleted, including move sources
+
+    @property
+    def paths(self) -> FrozenSet[Path]:
+        return self.modified | self.deleted
+
+
+class ReloadSubscription:
+    """A subscriber's directory, filter, callback and pending changes"""
+
+    def __init__(
+        self,
+        directory: Path,
+        callback: Callable[[ChangeSet], Any],
+        suffixes: Tuple[str, ...],
+        recursive: bool,
+        debounce: float,
+        max_delay: float,
+        loop: Optional[asyncio.AbstractEventLoop],
+    ):
+        self.directory = directory
+        self.watched_directory = directory.resolve()
+        self.callback = callback
+        self.suffixes = suffixes
+        self.recursive = recursive
+        self.debounce = debounce
+        self.max_delay = max(max_delay, debounce)
+        self.loop = loop
+        self.is_coroutine = asyncio.iscoroutinefunction(callback)
+
+        # path -> True if its last event was a deletion
+        self.pending: Dict[Path, bool] = {}
+        self.first_event = 0.0
+        self.last_event = 0.0
+
+    @property
+    def watch_key(self) -> Tuple[Path, bool]:
+        return self.watched_directory, self.recursive
+
+    def matches(self, path: Path) -> bool:
+        """Whether an event path concerns this subscriber"""
+        if self.suffixes and path.suffix not in self.suffixes:
+            return False
+        if self.recursive:
+            return self.watched_directory in path.parents
+        return path.parent == self.watched_directory
+
+    def deadline(self) -> float:
+        """When the pending changes are due for delivery"""
+        return min(self.last_event + self.debounce, self.first_event + self.max_delay)
+
+    def take(self) -> ChangeSet:
+        """Pending changes as a ChangeSet in the subscriber's own path spelling"""
+        modified, deleted = [], []
+        for path, is_deleted in self.pending.items():
+            path = self.directory / path.relative_to(self.watched_directory)
+            (deleted if is_deleted else modified).append(path)
+        self.pending = {}
+        return ChangeSet(frozenset(modified), frozenset(deleted))
+
+
+class _BusEventHandler(FileSystemEventHandler):
+    """Forwards watchdog events of every watch to the bus"""
+
+    def __init__(self, bus: "ReloadBus"):
+        self.bus = bus
+
+    def on_any_event(self, event: FileSystemEvent) -> None:
+        if event.is_directory:
+            return
+
+        if event.event_type in _CHANGE_EVENTS:
+            self.bus._record([(event.src_path, False)])
+        elif event.event_type == "deleted":
+            self.bus._record([(event.src_path, True)])
+        elif event.event_type == "moved":
+            self.bus._record([(event.src_path, True), (event.dest_path, False)])
+
+
+class ReloadBus:
+    """Single file observer that delivers debounced, batched change sets"""
+
+    def __init__(self):
+        self._subscriptions: List[ReloadSubscription] = []
+        self._watches: Dict[Tuple[Path, bool], Any] = {}
+        self._observer: Optional[Observer] = None
+        self._dispatcher: Optional[threading.Thread] = None
+        self._handler = _BusEventHandler(self)
+        self._condition = threading.Condition()
+        self._stop_event: Optional[threading.Event] = None
+        self.stats = {"events": 0, "coalesced_events": 0, "change_sets": 0}
+
+    def subscribe(
+        self,
+        directory: Union[str, Path],
+        callback: Callable[[ChangeSet], Any],
+        suffixes: Iterable[str] = (),
+        recursive: bool = False,
+        debounce: float = 0.5,
+        max_delay: float = 5.0,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+    ) -> ReloadSubscription:
+        """
+        Watch a directory for changes
+
+        Args:
+            directory: Directory to watch
+            callback: Called with a ChangeSet; may be a coroutine function
+            suffixes: File suffixes to report, e.g. (".yaml", ".yml"); all if empty
+            recursive: Also watch subdirectories
+            debounce: Quiet period in seconds before changes are delivered
+            max_delay: Longest time in seconds changes are held back
+            loop: Event loop to run the callback on; coroutine callbacks
+                default to the running loop, others run on the dispatch thread
+
+        Returns:
+            Subscription to pass to unsubscribe
+        """
+        if asyncio.iscoroutinefunction(callback) and loop is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                raise ValueError(
+                    "Coroutine callbacks need an event loop: subscribe from "
+                    "the loop or pass loop="
+                ) from None
+
+        subscription = ReloadSubscription(
+            Path(directory),
+            callback,
+            tuple(suffixes),
+            recursive,
+            debounce,
+            max_delay,
+            loop,
+        )
+        try:
+            with self._condition:
+                self._start()
+                if subscription.watch_key not in self._watches:
+                    self._watches[subscription.watch_key] = self._observer.schedule(
+                        self._handler,
+                        str(subscription.watched_directory),
+                        recursive=recursive,
+                    )
+                self._subscriptions.append(subscription)
+        except Exception:
+            # Don't leave threads running for a bus nobody subscribes to
+            with self._condition:
+                threads = [] if self._subscriptions else self._stop()
+            self._join(threads)
+            raise
+
+        logger.debug(f"Watching {subscription.directory} for hot reload")
+        return subscription
+
+    def unsubscribe(self, subscription: ReloadSubscription) -> None:
+        """Stop delivering changes to a subscriber, discarding pending ones"""
+        with self._condition:
+            if subscription not in self._subscriptions:
+                return
+            self._subscriptions.remove(subscription)
+            subscription.pending = {}
+
+            key = subscription.watch_key
+            if not any(s.watch_key == key for s in self._subscriptions):
+                self._observer.unschedule(self._watches.pop(key))
+            if self._subscriptions:
+                return
+            threads = self._stop()
+
+        self._join(threads)
+
+    def _start(self) -> None:
+        """Start the observer and dispatch thread; called with the lock held"""
+        if self._observer is not None:
+            return
+
+        self._stop_event = threading.Event()
+        self._observer = Observer()
+        self._observer.daemon = True
+        self._observer.start()
+        self._dispatcher = threading.Thread(
+            target=self._dispatch_loop,
+            args=(self._stop_event,),
+            name="reload-bus",
+            daemon=True,
+        )
+        self._dispatcher.start()
+
+    def _stop(self) -> List[threading.Thread]:
+        """Signal both threads to stop; called with the lock held"""
+        observer, dispatcher = self._observer, self._dispatcher
+        self._observer = self._dispatcher = None
+        self._watches.clear()
+        if self._stop_event is not None:
+            self._stop_event.set()
+        self._condition.notify_all()
+        if observer is not None:
+            observer.stop()
+        return [t for t in (observer, dispatcher) if t is not None]
+
+    @staticmethod
+    def _join(threads: List[threading.Thread]) -> None:
+        for thread in threads:
+            # A callback may unsubscribe the last subscriber from the dispatcher
+            if thread is not threading.current_thread():
+                thread.join(timeout=5.0)
+
+    def shutdown(self) -> None:
+        """Drop all subscribers and stop watching"""
+        with self._condition:
+            self._subscriptions.clear()
+            threads = self._stop()
+        self._join(threads)
+
+    def _record(self, events: List[Tuple[Any, bool]]) -> None:
+        """Add events to the pending changes of matching subscribers"""
+        now = time.monotonic()
+        with self._condition:
+            matched = False
+            for raw_path, deleted in events:
+                path = Path(os.fsdecode(raw_path))
+                self.stats["events"] += 1
+                for subscription in self._subscriptions:
+                    if not subscription.matches(path):
+                        continue
+                    if not subscription.pending:
+                        subscription.first_event = now
+                    elif path in subscription.pending:
+                        self.stats["coalesced_events"] += 1
+                    subscription.pending[path] = deleted
+                    subscription.last_event = now
+                    matched = True
+            if matched:
+                self._condition.notify()
+
+    def _dispatch_loop(self, stop_event: threading.Event) -> None:
+        while True:
+            with self._condition:
+                while True:
+                    if stop_event.is_set():
+                        return
+                    waiting = [s for s in self._subscriptions if s.pending]
+                    now = time.monotonic()
+                    due = [s for s in waiting if s.deadline() <= now]
+                    if due:
+                        batches = [(s, s.take()) for s in due]
+                        break
+                    timeout = (
+                        min(s.deadline() for s in waiting) - now if waiting else None
+                    )
+                    self._condition.wait(timeout)
+
+            for subscription, changes in batches:
+                self._deliver(subscription, changes)
+
+    def flush(self) -> None:
+        """Deliver every pending change now, on the calling thread"""
+        with self._condition:
+            batches = [(s, s.take()) for s in self._subscriptions if s.pending]
+        for subscription, changes in batches:
+            self._deliver(subscription, changes)
+
+    def _deliver(self, subscription: ReloadSubscription, changes: ChangeSet) -> None:
+        with self._condition:
+            self.stats["change_sets"] += 1
+
+        if subscription.loop is None:
+            self._invoke(subscription, changes)
+            return
+
+        coroutine = (
+            subscription.callback(changes) if subscription.is_coroutine else None
+        )
+        try:
+            if coroutine is None:
+                subscription.loop.call_soon_threadsafe(
+                    self._invoke, subscription, changes
+                )
+                return
+            future = asyncio.run_coroutine_threadsafe(coroutine, subscription.loop)
+        except RuntimeError as e:
+            if coroutine is not None:
+                coroutine.close()
+            logger.warning(
+                f"Dropped changes in {subscription.directory}, "
+                f"its event loop is closed: {e}"
+            )
+            return
+        future.add_done_callback(lambda done: self._log_failure(subscription, done))
+
+    @staticmethod
+    def _invoke(subscription: ReloadSubscription, changes: ChangeSet) -> None:
+        try:
+            subscription.callback(changes)
+        except Exception as e:
+            logger.error(f"Hot reload of {subscription.directory} failed: {e}")
+
+    @staticmethod
+    def _log_failure(subscription: ReloadSubscription, future: Future) -> None:
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(
+                f"Hot reload of {subscription.directory} failed: {future.exception()}"
+            )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get event, coalescing and delivery counts"""
+        with self._condition:
+            return {
+                **self.stats,
+                "subscriptions": len(self._subscriptions),
+                "watches": len(self._watches),
+                "pending_changes": sum(len(s.pending) for s in self._subscriptions),
+            }
+
+
+# Global reload bus instance
+reload_bus = ReloadBus()
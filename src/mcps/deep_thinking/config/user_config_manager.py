@@ -9,6 +9,7 @@ from typing import Any, Dict, List, Optional, Union
 
 import yaml
 
+from .config_snapshot import EMPTY_CONFIG, ConfigSnapshot
 from .config_validator import config_validator
 from .exceptions import ConfigurationError
 from .yaml_config_loader import YAMLConfigLoader
@@ -88,6 +89,10 @@ class UserConfigManager:
             },
         }
 
+        # Merged configuration per profile, rebuilt after a source changes
+        self._snapshots: Dict[str, ConfigSnapshot] = {}
+        self._snapshot_version = 0
+
     async def initialize(self) -> None:
         """Initialize user configuration manager"""
         # Create user config directory if it doesn't exist
@@ -105,6 +110,7 @@ class UserConfigManager:
         # Load user profiles
         await self._load_user_profiles()
 
+        self.invalidate_snapshots()
         logger.info("User configuration manager initialized")
 
     async def _load_system_defaults(self) -> None:
@@ -274,6 +280,63 @@ class UserConfigManager:
 
         logger.info(f"Created default user profiles at {profiles_file}")
 
+    def invalidate_snapshots(self) -> None:
+        """
+        Discard merged configurations after a source changed
+
+        Called by every method that changes a layer or profile; code that
+        edits config_layers, user_profiles or inheritance_rules directly
+        must call it too.
+        """
+        self._snapshot_version += 1
+        # Replaced rather than cleared, so a snapshot built from the old
+        # sources by a concurrent reader lands in the discarded dict
+        self._snapshots = {}
+
+    def get_snapshot(self, profile: Optional[str] = None) -> ConfigSnapshot:
+        """
+        Get the merged configuration of a profile
+
+        Args:
+            profile: Profile to use (defaults to active profile)
+
+        Returns:
+            ConfigSnapshot: Read-only configurations without session or
+            runtime overrides
+        """
+        profile = profile or self.active_profile
+        snapshots = self._snapshots
+        snapshot = snapshots.get(profile)
+        if snapshot is None:
+            snapshot = self._build_snapshot(profile)
+            snapshots[profile] = snapshot
+        return snapshot
+
+    def _build_snapshot(self, profile: str) -> ConfigSnapshot:
+        """Merge every configuration of a profile into a snapshot"""
+        config_names = set()
+        for priority in (
+            ConfigPriority.SYSTEM_DEFAULT,
+            ConfigPriority.GLOBAL_CONFIG,
+            ConfigPriority.USER_DEFAULT,
+            ConfigPriority.USER_CUSTOM,
+        ):
+            config_names.update(self.config_layers[priority])
+        if profile in self.user_profiles:
+            config_names.update(self.user_profiles[profile].get("config", {}))
+
+        configs = {}
+        for config_name in config_names:
+            try:
+                configs[config_name] = self._merge_layers(config_name, profile)
+            except Exception as e:
+                logger.error(
+                    f"Failed to merge config '{config_name}' "
+                    f"for profile '{profile}': {e}"
+                )
+
+        return ConfigSnapshot(configs, self._snapshot_version)
+
     def get_effective_config(
         self,
         config_name: str,
@@ -291,10 +354,51 @@ class UserConfigManager:
             runtime_overrides: Runtime parameter overrides
 
         Returns:
-            Dict[str, Any]: Effective configuration
+            Dict[str, Any]: Effective configuration; read-only unless
+            overrides are given
         """
-        profile = profile or self.active_profile
+        effective_config = self.get_snapshot(profile).get_config(
+            config_name, EMPTY_CONFIG
+        )
+        if not session_overrides and not runtime_overrides:
+            return effective_config
+
+        effective_config = self._deep_copy(effective_config)
+
+        # Apply session overrides
+        if session_overrides:
+            session_config = session_overrides.get(config_name, {})
+            effective_config = self._merge_configs(
+                effective_config, session_config, config_name
+            )
+
+        # Apply runtime overrides
+        if runtime_overrides:
+            runtime_config = runtime_overrides.get(config_name, {})
+            effective_config = self._merge_configs(
+                effective_config, runtime_config, config_name
+            )
+
+        return effective_config
+
+    def get_effective_value(
+        self, key: str, default: Any = None, profile: Optional[str] = None
+    ) -> Any:
+        """
+        Get one effective value by dotted path (e.g., 'agents.quality_threshold')
 
+        Args:
+            key: Dot-separated path starting with the configuration name
+            default: Default value if not found
+            profile: Profile to use (defaults to active profile)
+
+        Returns:
+            Any: Effective value or default
+        """
+        return self.get_snapshot(profile).get(key, default)
+
+    def _merge_layers(self, config_name: str, profile: str) -> Dict[str, Any]:
+        """Merge the stored layers of a configuration for a profile"""
         # Start with system defaults
         effective_config = self._deep_copy(
             self.config_layers[ConfigPriority.SYSTEM_DEFAULT].get(config_name, {})
@@ -329,25 +433,7 @@ class UserConfigManager:
         custom_config = self.config_layers[ConfigPriority.USER_CUSTOM].get(
             config_name, {}
         )
-        effective_config = self._merge_configs(
-            effective_config, custom_config, config_name
-        )
-
-        # Apply session overrides
-        if session_overrides:
-            session_config = session_overrides.get(config_name, {})
-            effective_config = self._merge_configs(
-                effective_config, session_config, config_name
-            )
-
-        # Apply runtime overrides
-        if runtime_overrides:
-            runtime_config = runtime_overrides.get(config_name, {})
-            effective_config = self._merge_configs(
-                effective_config, runtime_config, config_name
-            )
-
-        return effective_config
+        return self._merge_configs(effective_config, custom_config, config_name)
 
     def _merge_configs(
         self,
@@ -457,6 +543,7 @@ class UserConfigManager:
             current = current[key_part]
 
         current[keys[-1]] = value
+        self.invalidate_snapshots()
 
         logger.info(f"Set user preference '{key}' = '{value}' for profile '{profile}'")
 
@@ -541,6 +628,7 @@ class UserConfigManager:
 
         if base_profile:
             self.user_profiles[profile_name]["inherits_from"] = base_profile
+        self.invalidate_snapshots()
 
         logger.info(f"Created user profile '{profile_name}' ({display_name})")
 
@@ -561,6 +649,7 @@ class UserConfigManager:
             self.active_profile = "default"
 
         del self.user_profiles[profile_name]
+        self.invalidate_snapshots()
         logger.info(f"Deleted user profile '{profile_name}'")
 
     def set_active_profile(self, profile_name: str) -> None:
@@ -741,6 +830,9 @@ class UserConfigManager:
 
         except Exception as e:
             raise ConfigurationError(f"Failed to import configuration: {e}")
+        finally:
+            # A failed import may still have replaced some layers
+            self.invalidate_snapshots()
 
     def validate_user_config(
         self, config_name: str, profile: Optional[str] = None
@@ -13,7 +13,8 @@ from typing import Any, Dict, List, Optional, Set, Tuple, Union
 import yaml
 
 from ..models.thinking_models import FlowStep, ThinkingFlow
-from .exceptions import FlowConfigurationError
+from .exceptions import ExpressionError, FlowConfigurationError
+from .flow_expressions import compile_conditions, compile_expression, compile_reference
 
 logger = logging.getLogger(__name__)
 
@@ -27,7 +28,6 @@ class YAMLFlowParser:
     """
 
     def __init__(self):
-        self.condition_pattern = re.compile(r"([a-zA-Z0-9_.]+)\s*([<>=!]+)\s*(.+)")
         self.reference_pattern = re.compile(r"([a-zA-Z0-9_]+)\.([a-zA-Z0-9_.]+)")
 
     def parse_file(self, file_path: Union[str, Path]) -> Dict[str, ThinkingFlow]:
@@ -198,6 +198,18 @@ class YAMLFlowParser:
                 if ref_match:
                     dependencies.append(ref_match.group(1))
 
+        # Compile gates now so invalid expressions fail when the flow loads
+        repeat_until = step_data.get("repeat_until")
+        try:
+            if isinstance(conditions, dict):
+                compile_conditions(conditions)
+            if repeat_until:
+                compile_expression(repeat_until)
+        except ExpressionError as e:
+            raise FlowConfigurationError(
+                f"Step '{step_id}' has an invalid condition: {e}"
+            ) from e
+
         # Create step
         return FlowStep(
             step_id=step_id,
@@ -208,7 +220,7 @@ class YAMLFlowParser:
             conditions=conditions,
             parallel=step_data.get("parallel", False),
             for_each=for_each,
-            repeat_until=step_data.get("repeat_until"),
+            repeat_until=repeat_until,
             timeout_seconds=step_data.get("timeout_seconds"),
             retry_config=step_data.get("retry_config"),
         )
@@ -288,69 +300,20 @@ class YAMLFlowParser:
         Evaluate a condition expression
 
         Args:
-            condition: Condition expression (e.g., "score >= 0.8")
+            condition: Condition expression (e.g., "score >= 0.8 and not done")
             context: Evaluation context with variables
 
         Returns:
             bool: Result of condition evaluation
         """
-        match = self.condition_pattern.match(condition)
-        if not match:
-            logger.warning(f"Invalid condition format: {condition}")
-            return False
-
-        var_name, operator, value_str = match.groups()
-
-        # Get variable value from context
-        if "." in var_name:
-            parts = var_name.split(".")
-            current = context
-            for part in parts:
-                if isinstance(current, dict) and part in current:
-                    current = current[part]
-                else:
-                    logger.warning(f"Variable not found in context: {var_name}")
-                    return False
-            var_value = current
-        else:
-            var_value = context.get(var_name)
-            if var_value is None:
-                logger.warning(f"Variable not found in context: {var_name}")
-                return False
-
-        # Convert value string to appropriate type
         try:
-            if value_str.lower() == "true":
-                value = True
-            elif value_str.lower() == "false":
-                value = False
-            elif value_str.replace(".", "", 1).isdigit():
-                value = float(value_str)
-                if value.is_integer():
-                    value = int(value)
-            else:
-                # Remove quotes if present
-                value = value_str.strip("\"'")
-        except Exception:
-            value = value_str
-
-        # Evaluate condition
-        if operator == "==":
-            return var_value == value
-        elif operator == "!=":
-            return var_value != value
-        elif operator == ">":
-            return var_value > value
-        elif operator == ">=":
-            return var_value >= value
-        elif operator == "<":
-            return var_value < value
-        elif operator == "<=":
-            return var_value <= value
-        else:
-            logger.warning(f"Unsupported operator: {operator}")
+            expression = compile_expression(condition)
+        except ExpressionError as e:
+            logger.warning(f"Invalid condition format: {e}")
             return False
 
+        return expression.test(context)
+
     def resolve_references(self, expression: str, context: Dict[str, Any]) -> Any:
         """
         Resolve variable references in an expression
@@ -365,69 +328,10 @@ class YAMLFlowParser:
         if not isinstance(expression, str):
             return expression
 
-        # Check if it's a direct reference
-        ref_match = self.reference_pattern.match(expression)
-        if ref_match:
-            step_id, field_path = ref_match.groups()
-
-            if step_id not in context:
-                logger.warning(f"Referenced step not found in context: {step_id}")
-                return None
-
-            step_context = context[step_id]
-
-            # Navigate nested fields
-            parts = field_path.split(".")
-            current = step_context
-
-            for part in parts:
-                if isinstance(current, dict) and part in current:
-                    current = current[part]
-                elif isinstance(current, list) and part.isdigit():
-                    index = int(part)
-                    if 0 <= index < len(current):
-                        current = current[index]
-                    else:
-                        logger.warning(f"Index out of range: {part} in {field_path}")
-                        return None
-                else:
-                    logger.warning(f"Field not found: {part} in {field_path}")
-                    return None
-
-            return current
-
-        # If not a direct reference, look for embedded references
-        def replace_ref(match):
-            full_ref = match.group(0)
-            step_id = match.group(1)
-            field_path = match.group(2)
-
-            if step_id not in context:
-                logger.warning(f"Referenced step not found in context: {step_id}")
-                return full_ref
-
-            # Navigate nested fields
-            current = context[step_id]
-            parts = field_path.split(".")
-
-            for part in parts:
-                if isinstance(current, dict) and part in current:
-                    current = current[part]
-                elif isinstance(current, list) and part.isdigit():
-                    index = int(part)
-                    if 0 <= index < len(current):
-                        current = current[index]
-                    else:
-                        logger.warning(f"Index out of range: {part} in {field_path}")
-                        return full_ref
-                else:
-                    logger.warning(f"Field not found: {part} in {field_path}")
-                    return full_ref
-
-            return str(current)
-
-        # Replace all references in the expression
-        return re.sub(r"(\w+)\.([a-zA-Z0-9_.]+)", replace_ref, expression)
+        value = compile_reference(expression)(context)
+        if value is None and self.reference_pattern.fullmatch(expression):
+            logger.warning(f"Reference not found in context: {expression}")
+        return value
 
     def get_step_dependencies(self, step: FlowStep) -> Set[str]:
         """
@@ -474,33 +378,60 @@ class YAMLFlowParser:
         for step in flow.steps:
             graph[step.step_id] = self.get_step_dependencies(step)
 
-        # Perform topological sort
-        result = []
-        visited = set()
-        temp_visited = set()
+        return topological_order(
+            flow.name, [step.step_id for step in flow.steps], graph
+        )
 
-        def visit(node: str) -> None:
-            if node in temp_visited:
-                raise FlowConfigurationError(
-                    f"Cycle detected in flow '{flow.name}' dependencies"
-                )
-            if node in visited:
-                return
 
-            temp_visited.add(node)
+def topological_order(
+    flow_name: str, step_ids: List[str], graph: Dict[str, Set[str]]
+) -> List[str]:
+    """
+    Order steps so that every step follows its dependencies
 
-            for neighbor in graph.get(node, set()):
-                visit(neighbor)
+    Steps without ordering constraints keep their declared order.
 
-            temp_visited.remove(node)
-            visited.add(node)
-            result.append(node)
+    Args:
+        flow_name: Flow name for error messages
+        step_ids: Step IDs in declared order
+        graph: Step ID to the step IDs it depends on
 
-        for step in flow.steps:
-            if step.step_id not in visited:
-                visit(step.step_id)
+    Returns:
+        List[str]: List of step IDs in execution order
+
+    Raises:
+        FlowConfigurationError: If cycle is detected
+    """
+    result = []
+    visited = set()
+    temp_visited = set()
+
+    def visit(node: str) -> None:
+        if node in temp_visited:
+            raise FlowConfigurationError(
+                f"Cycle detected in flow '{flow_name}' dependencies"
+            )
+        if node in visited:
+            return
+
+        temp_visited.add(node)
+
+        # Dependencies are visited in declared order so the result is stable
+        for neighbor in sorted(
+            graph.get(node, set()), key=lambda dep: order.get(dep, len(order))
+        ):
+            visit(neighbor)
+
+        temp_visited.remove(node)
+        visited.add(node)
+        result.append(node)
+
+    order = {step_id: i for i, step_id in enumerate(step_ids)}
+    for step_id in step_ids:
+        if step_id not in visited:
+            visit(step_id)
 
-        return result
+    return result
 
 
 # Global instance
@@ -3,29 +3,91 @@ SQLite database implementation for local session storage
 Zero-cost local storage with encryption support and performance optimization
 """
 
+import base64
+import hashlib
+import hmac
 import json
 import logging
+import os
 import sqlite3
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
-from datetime import datetime
+from datetime import datetime, timedelta
+from functools import partial
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+from cryptography.hazmat.primitives import padding
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 
-from cryptography.fernet import Fernet
 from .database_performance import DatabasePerformanceOptimizer
+from .lazy_row import DecryptionCache, LazyRow
+from .search_index import SearchIndex, make_snippet
+from .session_archive import export_archive, import_archive
+from .write_batch import DURABILITY_LEVELS, WriteBatch, WriteBatchStats
+
+try:
+    import fcntl
+except ImportError:  # Windows: file databases are opened without the process lock
+    fcntl = None
 
 logger = logging.getLogger(__name__)
 
 
+class DatabaseInUseError(Exception):
+    """Raised when a database is locked by another process"""
+
+
+_encryption_executor: Optional[ThreadPoolExecutor] = None
+_encryption_executor_lock = threading.Lock()
+
+
+def _get_encryption_executor() -> ThreadPoolExecutor:
+    """Thread pool shared by every DatabaseEncryption for batch operations"""
+    global _encryption_executor
+    with _encryption_executor_lock:
+        if _encryption_executor is None:
+            _encryption_executor = ThreadPoolExecutor(
+                max_workers=DatabaseEncryption.MAX_WORKERS,
+                thread_name_prefix="encryption",
+            )
+        return _encryption_executor
+
+
 class DatabaseEncryption:
     """Handle local data encryption for privacy protection"""
 
-    def __init__(self, key: Optional[bytes] = None):
+    # Worker threads for encrypt_many/decrypt_many/rotate_many; the AES and
+    # HMAC work runs in OpenSSL, so batches spread over the cores
+    MAX_WORKERS = min(4, os.cpu_count() or 1)
+    # Batches smaller than this run inline, where the pool costs more than
+    # it saves
+    PARALLEL_MIN_BYTES = 256 * 1024
+
+    def __init__(
+        self, key: Optional[bytes] = None, previous_keys: Sequence[bytes] = ()
+    ):
         if key is None:
             # Generate a new key for this session
             key = Fernet.generate_key()
-        self.cipher = Fernet(key)
+        # With previous keys, data encrypted under any of them stays
+        # readable; new data is always encrypted with key
+        self.cipher = (
+            MultiFernet([Fernet(k) for k in (key, *previous_keys)])
+            if previous_keys
+            else Fernet(key)
+        )
         self._key = key
+        self.previous_keys = tuple(previous_keys)
+        # (signing key, encryption key) of each Fernet key, for binary tokens
+        self._binary_keys = [
+            (raw[:16], raw[16:])
+            for raw in (base64.urlsafe_b64decode(k) for k in (key, *previous_keys))
+        ]
 
     @property
     def key(self) -> bytes:
@@ -54,6 +116,99 @@ class DatabaseEncryption:
         json_str = self.decrypt(encrypted_data)
         return json.loads(json_str) if json_str else {}
 
+    def rotate(self, encrypted_data: str) -> str:
+        """Re-encrypt data written under a previous key with the current key"""
+        if not encrypted_data or not isinstance(self.cipher, MultiFernet):
+            return encrypted_data
+        return self.cipher.rotate(encrypted_data.encode()).decode()
+
+    def encrypt_bytes(self, data: bytes) -> bytes:
+        """
+        Encrypt binary data for a BLOB column
+
+        Builds the Fernet token in binary form (what its base64 text decodes
+        to) directly, so there is no text encoding to undo and the token is
+        a quarter smaller than those of encrypt()
+        """
+        if not data:
+            return data
+        signing_key, encryption_key = self._binary_keys[0]
+        iv = os.urandom(16)
+        padder = padding.PKCS7(algorithms.AES.block_size).padder()
+        padded = padder.update(data) + padder.finalize()
+        encryptor = Cipher(algorithms.AES(encryption_key), modes.CBC(iv)).encryptor()
+        token = (
+            b"\x80"
+            + struct.pack(">Q", int(time.time()))
+            + iv
+            + encryptor.update(padded)
+            + encryptor.finalize()
+        )
+        return token + hmac.new(signing_key, token, hashlib.sha256).digest()
+
+    def decrypt_bytes(self, encrypted_data: bytes) -> bytes:
+        """Decrypt a binary token from encrypt_bytes, under any of the keys"""
+        if not encrypted_data:
+            return encrypted_data
+        token, signature = encrypted_data[:-32], encrypted_data[-32:]
+        if len(token) < 41 or token[0] != 0x80 or (len(token) - 25) % 16:
+            raise InvalidToken
+        for signing_key, encryption_key in self._binary_keys:
+            expected = hmac.new(signing_key, token, hashlib.sha256).digest()
+            if not hmac.compare_digest(signature, expected):
+                continue
+            decryptor = Cipher(
+                algorithms.AES(encryption_key), modes.CBC(token[9:25])
+            ).decryptor()
+            padded = decryptor.update(token[25:]) + decryptor.finalize()
+            unpadder = padding.PKCS7(algorithms.AES.block_size).unpadder()
+            try:
+                return unpadder.update(padded) + unpadder.finalize()
+            except ValueError:
+                raise InvalidToken from None
+        raise InvalidToken
+
+    def encrypt_many(self, values: Sequence[str]) -> List[str]:
+        """Encrypt a batch of strings, in parallel for large batches"""
+        return self._map(self.encrypt, values)
+
+    def decrypt_many(self, values: Sequence[str]) -> List[str]:
+        """Decrypt a batch of strings, in parallel for large batches"""
+        return self._map(self.decrypt, values)
+
+    def rotate_many(self, values: Sequence[str]) -> List[str]:
+        """Rotate a batch of tokens to the current key (see rotate)"""
+        return self._map(self.rotate, values)
+
+    def encrypt_bytes_many(self, values: Sequence[bytes]) -> List[bytes]:
+        """Encrypt a batch of binary values (see encrypt_bytes)"""
+        return self._map(self.encrypt_bytes, values)
+
+    def decrypt_bytes_many(self, values: Sequence[bytes]) -> List[bytes]:
+        """Decrypt a batch of binary tokens (see decrypt_bytes)"""
+        return self._map(self.decrypt_bytes, values)
+
+    def _map(self, operation: Callable[[Any], Any], values: Sequence[Any]) -> List[Any]:
+        """Apply operation to values in order, splitting large batches over the pool"""
+        values = list(values)
+        workers = self.MAX_WORKERS
+        if (
+            workers < 2
+            or len(values) < 2
+            or sum(len(value or "") for value in values) < self.PARALLEL_MIN_BYTES
+        ):
+            return [operation(value) for value in values]
+
+        # A few slices per worker keeps them busy when payload sizes vary
+        size = -(-len(values) // (workers * 4))
+        slices = [values[i : i + size] for i in range(0, len(values), size)]
+        results: List[Any] = []
+        for part in _get_encryption_executor().map(
+            lambda part: [operation(value) for value in part], slices
+        ):
+            results.extend(part)
+        return results
+
 
 class ThinkingDatabase:
     """
@@ -61,6 +216,45 @@ class ThinkingDatabase:
     Implements zero-cost local persistence with encryption and performance optimization
     """
 
+    # Session JSON columns that can also be persisted as incremental entries
+    CONTEXT_NAMESPACES = ("context", "quality_metrics")
+    # Sessions with at least this many entries are compacted by cleanup
+    COMPACTION_MIN_ENTRIES = 64
+    # Rows fetched per query by the streaming iterators
+    STREAM_PAGE_SIZE = 100
+    # Sessions updated or deleted per transaction by retention
+    RETENTION_BATCH_SIZE = 200
+    # Tables whose rows are deleted along with their session
+    SESSION_CHILD_TABLES = (
+        "session_steps",
+        "step_results",
+        "evidence_sources",
+        "session_context_entries",
+    )
+    # Columns stored encrypted when encryption is enabled, with the key
+    # columns their rows are paged by during key rotation
+    ENCRYPTED_COLUMNS = {
+        "thinking_sessions": (
+            ("id",),
+            ("topic_encrypted", "configuration", "context", "quality_metrics"),
+        ),
+        "session_steps": (("id",), ("input_data", "output_data")),
+        "step_results": (("id",), ("content",)),
+        "evidence_sources": (("id",), ("summary", "key_claims")),
+        "session_context_entries": (
+            ("session_id", "namespace", "entry_key", "seq"),
+            ("value",),
+        ),
+        "flow_state_history": (("flow_id", "seq"), ("metadata",)),
+    }
+    # Rows re-encrypted per transaction by key rotation
+    KEY_ROTATION_BATCH_SIZE = 200
+    # step_results columns read when content is not needed
+    RESULT_HEADER_COLUMNS = (
+        "id, session_id, step_id, result_type, metadata, quality_indicators, "
+        "citations, created_at"
+    )
+
     def __init__(
         self,
         db_path: str = "thinking_sessions.db",
@@ -68,10 +262,60 @@ class ThinkingDatabase:
         enable_performance_optimization: bool = True,
         min_connections: int = 2,
         max_connections: int = 10,
+        write_behind: bool = False,
+        write_batch_size: int = 100,
+        write_batch_interval: float = 1.0,
+        durability: str = "normal",
+        enable_search_index: bool = True,
+        encrypted_search: bool = False,
+        decryption_cache_entries: int = 1024,
+        exclusive: bool = False,
+        previous_encryption_keys: Sequence[bytes] = (),
     ):
+        if durability not in DURABILITY_LEVELS:
+            raise ValueError(
+                f"Invalid durability: {durability}, "
+                f"expected one of {tuple(DURABILITY_LEVELS)}"
+            )
+
         self.db_path = Path(db_path) if db_path != ":memory:" else db_path
-        self.encryption = DatabaseEncryption(encryption_key) if encryption_key else None
+        # Each process with a file database open holds a shared lock on
+        # <db>.lock; exclusive opens (offline key rotation) need it alone
+        self._process_lock = self._lock_process(exclusive)
+        # Previous keys keep rows not yet rotated to encryption_key readable
+        self.encryption = (
+            DatabaseEncryption(encryption_key, previous_encryption_keys)
+            if encryption_key
+            else None
+        )
+        # Recently decrypted column values, memory only (see lazy_row.py)
+        self.decryption_cache = (
+            DecryptionCache(decryption_cache_entries)
+            if self.encryption and decryption_cache_entries > 0
+            else None
+        )
         self._memory_conn = None  # For persistent in-memory connections
+        # The in-memory connection is shared, so threads take turns using it
+        self._memory_lock = threading.RLock()
+
+        # Write-behind batching: commits inside write_batch() are grouped
+        # into one transaction per batch (see write_batch.py)
+        self.write_behind = write_behind
+        self.write_batch_size = write_batch_size
+        self.write_batch_interval = write_batch_interval
+        self.durability = durability
+        self.write_batch_stats = WriteBatchStats()
+        self._batch_lock = threading.RLock()
+        self._local = threading.local()
+
+        # Full-text search index (see search_index.py). Encrypted databases
+        # only get one on request, and then it stores blinded tokens keyed
+        # by a key derived from the encryption key
+        self.search_index = None
+        if enable_search_index and self.encryption is None:
+            self.search_index = SearchIndex()
+        elif enable_search_index and encrypted_search:
+            self.search_index = SearchIndex(self._search_blind_key())
 
         # Initialize performance optimizer
         self.performance_optimizer = None
@@ -85,6 +329,32 @@ class ThinkingDatabase:
 
         self._init_database()
 
+    def _lock_process(self, exclusive: bool):
+        """Take the inter-process lock of a file database, without waiting"""
+        if self.db_path == ":memory:" or fcntl is None:
+            return None
+        lock_file = open(f"{self.db_path}.lock", "ab")
+        mode = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+        try:
+            fcntl.flock(lock_file, mode | fcntl.LOCK_NB)
+        except BlockingIOError as e:
+            lock_file.close()
+            if exclusive:
+                raise DatabaseInUseError(
+                    f"Database {self.db_path} is open in another process"
+                ) from e
+            raise DatabaseInUseError(
+                f"Database {self.db_path} is locked by another process"
+                " (offline key rotation in progress?)"
+            ) from e
+        return lock_file
+
+    def _search_blind_key(self) -> bytes:
+        """Key for blinded search tokens, derived from the encryption key"""
+        return hmac.new(
+            self.encryption.key, b"deep-thinking-search-index", hashlib.sha256
+        ).digest()
+
     def _init_database(self):
         """Initialize database with required tables"""
         try:
@@ -94,8 +364,11 @@ class ThinkingDatabase:
 
                 # Enable WAL mode for better concurrent performance (skip for memory db)
                 if self.db_path != ":memory:":
+                    # Lets retention return freed pages in small steps; only
+                    # takes effect on a new database, before journal_mode
+                    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
                     conn.execute("PRAGMA journal_mode=WAL")
-                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.execute(f"PRAGMA synchronous={DURABILITY_LEVELS[self.durability]}")
                 conn.execute("PRAGMA cache_size=10000")
                 conn.execute("PRAGMA temp_store=memory")
 
@@ -131,12 +404,16 @@ class ThinkingDatabase:
                     configuration TEXT,  -- JSON
                     context TEXT,        -- JSON (encrypted if encryption enabled)
                     quality_metrics TEXT, -- JSON
+                    context_version INTEGER DEFAULT 0, -- bumped by full context rewrites
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     completed_at TIMESTAMP NULL
                 )
             """
             )
+            self._ensure_column(
+                conn, "thinking_sessions", "context_version", "INTEGER DEFAULT 0"
+            )
             logger.info("Created thinking_sessions table")
 
             # Session steps tracking
@@ -202,6 +479,46 @@ class ThinkingDatabase:
             """
             )
 
+            # Incremental context storage: per-key rows for context and
+            # quality_metrics, folded back into thinking_sessions by compaction.
+            # seq 0 holds a key's full value (NULL marks a removed key); seq >= 1
+            # holds items appended to a list-valued key.
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS session_context_entries (
+                    session_id TEXT NOT NULL,
+                    namespace TEXT NOT NULL,    -- 'context' or 'quality_metrics'
+                    entry_key TEXT NOT NULL,
+                    seq INTEGER NOT NULL DEFAULT 0,
+                    value TEXT,                 -- JSON (encrypted)
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (session_id, namespace, entry_key, seq),
+                    FOREIGN KEY (session_id) REFERENCES thinking_sessions (id) ON DELETE CASCADE
+                ) WITHOUT ROWID
+            """
+            )
+
+            # Flow state transitions, appended in batches by the flow state
+            # machine (see flows/flow_history.py). Flows need not belong to
+            # a stored session, so rows are deleted with their session
+            # explicitly rather than by cascade
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS flow_state_history (
+                    flow_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    session_id TEXT,
+                    timestamp TEXT NOT NULL,
+                    from_state TEXT NOT NULL,
+                    to_state TEXT NOT NULL,
+                    event TEXT NOT NULL,
+                    duration_seconds REAL,
+                    metadata TEXT,              -- JSON (encrypted)
+                    PRIMARY KEY (flow_id, seq)
+                ) WITHOUT ROWID
+            """
+            )
+
             # Create indexes for performance
             conn.execute(
                 "CREATE INDEX IF NOT EXISTS idx_sessions_status ON thinking_sessions (status)"
@@ -209,18 +526,36 @@ class ThinkingDatabase:
             conn.execute(
                 "CREATE INDEX IF NOT EXISTS idx_sessions_created ON thinking_sessions (created_at)"
             )
+            # Retention scans: inactive active sessions, expired completed ones
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_sessions_status_updated ON thinking_sessions (status, updated_at)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_sessions_status_completed ON thinking_sessions (status, completed_at)"
+            )
             conn.execute(
                 "CREATE INDEX IF NOT EXISTS idx_steps_session ON session_steps (session_id)"
             )
             conn.execute(
                 "CREATE INDEX IF NOT EXISTS idx_steps_number ON session_steps (session_id, step_number)"
             )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_steps_name ON session_steps (session_id, step_name, step_number)"
+            )
             conn.execute(
                 "CREATE INDEX IF NOT EXISTS idx_results_session ON step_results (session_id)"
             )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_results_step ON step_results (session_id, step_id, id)"
+            )
             conn.execute(
                 "CREATE INDEX IF NOT EXISTS idx_evidence_session ON evidence_sources (session_id)"
             )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_flow_history_session ON flow_state_history (session_id)"
+            )
+
+            self._create_search_index(conn)
 
             conn.commit()
             logger.info("All database tables created successfully")
@@ -229,9 +564,164 @@ class ThinkingDatabase:
             logger.error(f"Error creating database tables: {e}")
             raise
 
+    def _create_search_index(self, conn: sqlite3.Connection):
+        """Create the full-text index, backfilling it for existing data"""
+        if self.search_index is None:
+            # Rebuilt from scratch if a later open enables it again
+            SearchIndex.drop(conn)
+            return
+        try:
+            if self.search_index.create(conn):
+                self._populate_search_index(conn)
+                logger.info("Created search index")
+        except sqlite3.OperationalError as e:
+            # SQLite built without FTS5: searches fall back to LIKE
+            logger.warning(f"Full-text search unavailable: {e}")
+            self.search_index = None
+
+    def _populate_search_index(self, conn: sqlite3.Connection):
+        """Index every topic, step result and evidence summary"""
+        index = self.search_index
+        index.clear(conn)
+        rows = conn.execute(
+            "SELECT id, topic, topic_encrypted FROM thinking_sessions"
+        ).fetchall()
+        if self.encryption:
+            topics = self.encryption.decrypt_many([row[2] for row in rows])
+        else:
+            topics = [row[1] for row in rows]
+        for row, topic in zip(rows, topics):
+            index.add(conn, row[0], "topic", topic)
+        for table, source, column in (
+            ("step_results", "step_result", "content"),
+            ("evidence_sources", "evidence", "summary"),
+        ):
+            rows = conn.execute(
+                f"SELECT id, session_id, {column} FROM {table}"
+            ).fetchall()
+            texts = self._decrypt_many([row[2] for row in rows])
+            for row, text in zip(rows, texts):
+                index.add(conn, row[1], source, text, row[0])
+
+    def rebuild_search_index(self) -> bool:
+        """
+        Rebuild the search index from the stored data
+
+        Returns:
+            True if successful
+        """
+        if self.search_index is None:
+            return False
+        try:
+            with self.get_connection() as conn:
+                self._populate_search_index(conn)
+                conn.commit()
+                logger.info("Rebuilt search index")
+                return True
+        except Exception as e:
+            logger.error(f"Error rebuilding search index: {e}")
+            return False
+
+    def _ensure_column(
+        self, conn: sqlite3.Connection, table: str, column: str, definition: str
+    ):
+        """Add a column to an existing table created by an older schema"""
+        cursor = conn.execute(f"PRAGMA table_info({table})")
+        if column not in [row[1] for row in cursor.fetchall()]:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+            logger.info(f"Added column {column} to {table}")
+
     @contextmanager
     def get_connection(self):
         """Get database connection with proper cleanup and performance optimization"""
+        batch = getattr(self._local, "batch", None)
+        if batch is not None:
+            # Inside write_batch(): share the pinned connection in a savepoint
+            conn = batch.enter()
+            failed = False
+            try:
+                yield conn
+            except BaseException:
+                failed = True
+                raise
+            finally:
+                batch.leave(conn, failed)
+            return
+
+        with self._open_connection() as conn:
+            yield conn
+
+    @contextmanager
+    def get_read_connection(self):
+        """
+        Get a connection for work that only reads
+
+        Pooled databases serve these from query_only reader connections, so
+        reads do not queue behind writers. Inside write_batch() the pinned
+        connection is used, so batched writes stay visible.
+        """
+        if self.performance_optimizer and getattr(self._local, "batch", None) is None:
+            with self.performance_optimizer.get_connection(readonly=True) as conn:
+                yield conn
+            return
+
+        with self.get_connection() as conn:
+            yield conn
+
+    @contextmanager
+    def write_batch(self):
+        """
+        Group the commits made inside the block into a single transaction
+
+        Used around one tool call so its several writes (steps, results,
+        session updates) cost one commit instead of one each. Commits happen
+        earlier if write_batch_size commits are pending or the batch has been
+        open for write_batch_interval seconds. Work committed by a block is
+        kept even if a later block in the batch raises. A no-op unless
+        write_behind is enabled; nested calls join the outer batch.
+        """
+        if not self.write_behind or getattr(self._local, "batch", None) is not None:
+            yield
+            return
+
+        with self._open_connection() as conn:
+            conn.execute(f"PRAGMA synchronous={DURABILITY_LEVELS[self.durability]}")
+            batch = WriteBatch(
+                conn,
+                self.write_batch_size,
+                self.write_batch_interval,
+                self.write_batch_stats,
+                self._batch_lock,
+            )
+            self._local.batch = batch
+            with self._batch_lock:
+                self.write_batch_stats.batches += 1
+            try:
+                yield
+            finally:
+                self._local.batch = None
+                batch.finish()
+
+    def get_write_batch_stats(self) -> Dict[str, Any]:
+        """Get write batching statistics"""
+        with self._batch_lock:
+            stats = self.write_batch_stats
+            return {
+                "write_behind": self.write_behind,
+                "durability": self.durability,
+                "batches": stats.batches,
+                "commits_requested": stats.commits_requested,
+                "commits_performed": stats.commits_performed,
+                "commits_saved": max(
+                    stats.commits_requested - stats.commits_performed, 0
+                ),
+                "threshold_flushes": stats.threshold_flushes,
+                "rollbacks": stats.rollbacks,
+            }
+
+    @contextmanager
+    def _open_connection(self):
+        """Open a pooled, shared in-memory or one-off connection"""
         if self.performance_optimizer:
             # Use performance-optimized connection pool
             with self.performance_optimizer.get_connection() as conn:
@@ -240,12 +730,15 @@ class ThinkingDatabase:
             # Fallback to original connection management
             if self.db_path == ":memory:":
                 # For in-memory databases, maintain a persistent connection
-                if self._memory_conn is None:
-                    self._memory_conn = sqlite3.connect(":memory:")
-                    self._memory_conn.row_factory = sqlite3.Row
-                    # Enable foreign keys for in-memory connection
-                    self._memory_conn.execute("PRAGMA foreign_keys=ON")
-                yield self._memory_conn
+                with self._memory_lock:
+                    if self._memory_conn is None:
+                        self._memory_conn = sqlite3.connect(
+                            ":memory:", check_same_thread=False
+                        )
+                        self._memory_conn.row_factory = sqlite3.Row
+                        # Enable foreign keys for in-memory connection
+                        self._memory_conn.execute("PRAGMA foreign_keys=ON")
+                    yield self._memory_conn
             else:
                 # For file databases, create new connections
                 db_path = (
@@ -272,6 +765,27 @@ class ThinkingDatabase:
             return self.encryption.decrypt(data)
         return data
 
+    def _decrypt_many(self, values: Sequence[str]) -> List[str]:
+        """Decrypt a batch of stored values if encryption is enabled"""
+        if self.encryption:
+            return self.encryption.decrypt_many(values)
+        return list(values)
+
+    def _decrypt_column(self, row_key: str, data: str) -> str:
+        """Decrypt a stored column value through the decryption cache"""
+        if not (self.encryption and data):
+            return data
+        if self.decryption_cache is None:
+            return self.encryption.decrypt(data)
+        return self.decryption_cache.decrypt(row_key, data, self.encryption.decrypt)
+
+    def _decode_json_column(self, row_key: str, data: str) -> Any:
+        """Decrypt (if enabled) and parse a stored JSON column"""
+        if not data:
+            return {}
+        text = self._decrypt_column(row_key, data)
+        return json.loads(text) if text else {}
+
     def _encrypt_json_if_enabled(self, data: Dict[str, Any]) -> str:
         """Encrypt JSON data if encryption is enabled"""
         if self.encryption:
@@ -322,6 +836,8 @@ class ThinkingDatabase:
                         datetime.now().isoformat(),
                     ),
                 )
+                if self.search_index:
+                    self.search_index.add(conn, session_id, "topic", topic)
                 conn.commit()
                 logger.info(f"Created session {session_id} for topic: {topic[:50]}...")
                 return True
@@ -335,7 +851,7 @@ class ThinkingDatabase:
     def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
         """Retrieve session information"""
         try:
-            with self.get_connection() as conn:
+            with self.get_read_connection() as conn:
                 cursor = conn.execute(
                     """
                     SELECT * FROM thinking_sessions WHERE id = ?
@@ -347,30 +863,44 @@ class ThinkingDatabase:
                 if not row:
                     return None
 
-                session_data = dict(row)
-
-                # Decrypt sensitive data
-                if self.encryption and session_data.get("topic_encrypted"):
-                    session_data["topic"] = self._decrypt_if_enabled(
-                        session_data["topic_encrypted"]
-                    )
-
-                if session_data.get("configuration"):
-                    session_data["configuration"] = self._decrypt_json_if_enabled(
-                        session_data["configuration"]
-                    )
-
-                if session_data.get("context"):
-                    session_data["context"] = self._decrypt_json_if_enabled(
-                        session_data["context"]
-                    )
-
-                if session_data.get("quality_metrics"):
-                    session_data["quality_metrics"] = self._decrypt_json_if_enabled(
-                        session_data["quality_metrics"]
+                # Incremental entries written since the last compaction
+                entries = self._read_context_entries(conn, session_id)
+
+            # Sensitive columns are decrypted when first read
+            session_data = LazyRow(row)
+            if self.encryption and session_data.get("topic_encrypted"):
+                session_data.defer(
+                    "topic",
+                    partial(
+                        self._decrypt_column,
+                        f"thinking_sessions.topic:{session_id}",
+                        session_data["topic_encrypted"],
+                    ),
+                )
+            if session_data.get("configuration"):
+                session_data.defer(
+                    "configuration",
+                    partial(
+                        self._decode_json_column,
+                        f"thinking_sessions.configuration:{session_id}",
+                        session_data["configuration"],
+                    ),
+                )
+            for namespace in self.CONTEXT_NAMESPACES:
+                blob = session_data.get(namespace)
+                if blob or namespace in entries:
+                    session_data.defer(
+                        namespace,
+                        partial(
+                            self._decode_context,
+                            session_id,
+                            namespace,
+                            blob,
+                            entries.get(namespace, []),
+                        ),
                     )
 
-                return session_data
+            return session_data
 
         except Exception as e:
             logger.error(f"Error retrieving session {session_id}: {e}")
@@ -403,6 +933,16 @@ class ThinkingDatabase:
                     set_clauses.append(f"{key} = ?")
                     values.append(value)
 
+            # A full context rewrite invalidates writers holding deltas
+            # against the previous version
+            rewritten = [
+                namespace
+                for namespace in self.CONTEXT_NAMESPACES
+                if isinstance(updates.get(namespace), dict)
+            ]
+            if rewritten:
+                set_clauses.append("context_version = context_version + 1")
+
             # Always update timestamp
             set_clauses.append("updated_at = ?")
             values.append(datetime.now().isoformat())
@@ -410,15 +950,338 @@ class ThinkingDatabase:
 
             with self.get_connection() as conn:
                 query = f"UPDATE thinking_sessions SET {', '.join(set_clauses)} WHERE id = ?"
-                conn.execute(query, values)
+                cursor = conn.execute(query, values)
+
+                if self.search_index and "topic" in updates and cursor.rowcount:
+                    self.search_index.remove(conn, session_id, "topic")
+                    self.search_index.add(conn, session_id, "topic", updates["topic"])
+
+                # A full rewrite supersedes any incremental entries
+                for namespace in rewritten:
+                    conn.execute(
+                        "DELETE FROM session_context_entries WHERE session_id = ? AND namespace = ?",
+                        (session_id, namespace),
+                    )
+
                 conn.commit()
 
-                return conn.total_changes > 0
+                return cursor.rowcount > 0
 
         except Exception as e:
             logger.error(f"Error updating session {session_id}: {e}")
             return False
 
+    def serialize_context_value(self, value: Any) -> str:
+        """Serialize a single context entry value (before encryption)"""
+        return json.dumps(value, default=str)
+
+    def get_context_version(self, session_id: str) -> Optional[int]:
+        """Get the context version a delta writer must build on"""
+        try:
+            with self.get_read_connection() as conn:
+                cursor = conn.execute(
+                    "SELECT context_version FROM thinking_sessions WHERE id = ?",
+                    (session_id,),
+                )
+                row = cursor.fetchone()
+                return (row[0] or 0) if row else None
+        except Exception as e:
+            logger.error(f"Error getting context version for {session_id}: {e}")
+            return None
+
+    def update_session_delta(
+        self,
+        session_id: str,
+        expected_version: int,
+        context_changes: Optional[Dict[str, str]] = None,
+        context_removed: Optional[List[str]] = None,
+        context_appends: Optional[Dict[str, List[str]]] = None,
+        quality_changes: Optional[Dict[str, str]] = None,
+        quality_removed: Optional[List[str]] = None,
+        **updates,
+    ) -> bool:
+        """
+        Persist only the changed context/quality entries of a session
+
+        Unlike update_session(context=...), the write cost is proportional to
+        the changed entries rather than the whole context blob.
+
+        Args:
+            session_id: Session identifier
+            expected_version: context_version the changes were made against;
+                the write is refused if the context was rewritten since
+            context_changes: Changed context keys mapped to values already
+                serialized with serialize_context_value
+            context_removed: Context keys removed since the last write
+            context_appends: Serialized items appended to list-valued keys
+            quality_changes: Changed quality_metrics keys (serialized values)
+            quality_removed: Quality_metrics keys removed since the last write
+            **updates: Plain column updates (current_step, step_number, status...)
+
+        Returns:
+            True if written; False if the session is missing, its context
+            version moved on, or the write failed
+        """
+        try:
+            now = datetime.now().isoformat()
+            replaced_keys = []
+            value_rows = []
+            for namespace, changes, removed in (
+                ("context", context_changes, context_removed),
+                ("quality_metrics", quality_changes, quality_removed),
+            ):
+                for key, serialized in (changes or {}).items():
+                    replaced_keys.append((session_id, namespace, key))
+                    value_rows.append(
+                        (
+                            session_id,
+                            namespace,
+                            key,
+                            self._encrypt_if_enabled(serialized),
+                            now,
+                        )
+                    )
+                for key in removed or []:
+                    replaced_keys.append((session_id, namespace, key))
+                    value_rows.append((session_id, namespace, key, None, now))
+
+            append_rows = [
+                (
+                    session_id,
+                    "context",
+                    key,
+                    self._encrypt_if_enabled(serialized),
+                    now,
+                    session_id,
+                    key,
+                )
+                for key, items in (context_appends or {}).items()
+                for serialized in items
+            ]
+
+            set_clauses = [f"{key} = ?" for key in updates]
+            values = list(updates.values())
+            set_clauses.append("updated_at = ?")
+            values.extend([now, session_id, expected_version])
+
+            with self.get_connection() as conn:
+                cursor = conn.execute(
+                    f"UPDATE thinking_sessions SET {', '.join(set_clauses)} "
+                    "WHERE id = ? AND context_version = ?",
+                    values,
+                )
+                if cursor.rowcount == 0:
+                    conn.rollback()
+                    return False
+
+                if replaced_keys:
+                    # A new full value drops items appended to the old one
+                    conn.executemany(
+                        """
+                        DELETE FROM session_context_entries
+                        WHERE session_id = ? AND namespace = ? AND entry_key = ? AND seq > 0
+                    """,
+                        replaced_keys,
+                    )
+                    conn.executemany(
+                        """
+                        INSERT INTO session_context_entries
+                        (session_id, namespace, entry_key, seq, value, updated_at)
+                        VALUES (?, ?, ?, 0, ?, ?)
+                        ON CONFLICT (session_id, namespace, entry_key, seq)
+                        DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at
+                    """,
+                        value_rows,
+                    )
+                if append_rows:
+                    conn.executemany(
+                        """
+                        INSERT INTO session_context_entries
+                        (session_id, namespace, entry_key, seq, value, updated_at)
+                        SELECT ?, ?, ?, COALESCE(MAX(seq), 0) + 1, ?, ?
+                        FROM session_context_entries
+                        WHERE session_id = ? AND namespace = 'context' AND entry_key = ?
+                    """,
+                        append_rows,
+                    )
+                conn.commit()
+                return True
+
+        except Exception as e:
+            logger.error(f"Error updating session delta {session_id}: {e}")
+            return False
+
+    def _read_context_entries(
+        self, conn, session_id: str
+    ) -> Dict[str, List[Tuple[str, int, Optional[str]]]]:
+        """A session's incremental entries as stored, by namespace"""
+        cursor = conn.execute(
+            """
+            SELECT namespace, entry_key, seq, value FROM session_context_entries
+            WHERE session_id = ?
+            ORDER BY namespace, entry_key, seq
+        """,
+            (session_id,),
+        )
+        entries: Dict[str, List[Tuple[str, int, Optional[str]]]] = {}
+        for row in cursor.fetchall():
+            if row[0] in self.CONTEXT_NAMESPACES:
+                entries.setdefault(row[0], []).append((row[1], row[2], row[3]))
+        return entries
+
+    def _merge_context_entries(
+        self,
+        session_id: str,
+        namespace: str,
+        target: Dict[str, Any],
+        entries: List[Tuple[str, int, Optional[str]]],
+    ) -> None:
+        """Merge one namespace's incremental entries into its decoded blob"""
+        for key, seq, value in entries:
+            if seq == 0:
+                if value is None:
+                    target.pop(key, None)
+                else:
+                    target[key] = self._decode_entry(
+                        session_id, namespace, key, 0, value
+                    )
+            else:
+                items = target.get(key)
+                if not isinstance(items, list):
+                    items = []
+                    target[key] = items
+                items.append(self._decode_entry(session_id, namespace, key, seq, value))
+
+    def _decode_entry(
+        self, session_id: str, namespace: str, key: str, seq: int, value: str
+    ) -> Any:
+        row_key = f"session_context_entries:{session_id}:{namespace}:{key}:{seq}"
+        return json.loads(self._decrypt_column(row_key, value))
+
+    def _decode_context(
+        self,
+        session_id: str,
+        namespace: str,
+        blob: Optional[str],
+        entries: List[Tuple[str, int, Optional[str]]],
+    ) -> Any:
+        """Decoded context or quality_metrics blob with its entries applied"""
+        value = self._decode_json_column(
+            f"thinking_sessions.{namespace}:{session_id}", blob
+        )
+        if entries:
+            if not isinstance(value, dict):
+                value = {}
+            self._merge_context_entries(session_id, namespace, value, entries)
+        return value
+
+    def _apply_context_entries(
+        self, conn, session_id: str, session_data: Dict[str, Any]
+    ) -> None:
+        """Merge incremental context entries into decoded session data"""
+        entries = self._read_context_entries(conn, session_id)
+        for namespace, namespace_entries in entries.items():
+            target = session_data.get(namespace)
+            if not isinstance(target, dict):
+                target = {}
+                session_data[namespace] = target
+            self._merge_context_entries(
+                session_id, namespace, target, namespace_entries
+            )
+
+    def compact_session_context(self, session_id: str) -> bool:
+        """
+        Fold a session's incremental entries back into its context blob
+
+        Args:
+            session_id: Session identifier
+
+        Returns:
+            True if the session was compacted
+        """
+        try:
+            with self.get_connection() as conn:
+                # Hold the write lock so no delta lands between read and delete
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    cursor = conn.execute(
+                        "SELECT context, quality_metrics FROM thinking_sessions WHERE id = ?",
+                        (session_id,),
+                    )
+                    row = cursor.fetchone()
+                    if row is None:
+                        conn.rollback()
+                        return False
+
+                    session_data = {
+                        "context": self._decrypt_json_if_enabled(row[0]),
+                        "quality_metrics": self._decrypt_json_if_enabled(row[1]),
+                    }
+                    self._apply_context_entries(conn, session_id, session_data)
+
+                    conn.execute(
+                        """
+                        UPDATE thinking_sessions SET context = ?, quality_metrics = ?
+                        WHERE id = ?
+                    """,
+                        (
+                            self._encrypt_json_if_enabled(session_data["context"]),
+                            self._encrypt_json_if_enabled(
+                                session_data["quality_metrics"]
+                            ),
+                            session_id,
+                        ),
+                    )
+                    conn.execute(
+                        "DELETE FROM session_context_entries WHERE session_id = ?",
+                        (session_id,),
+                    )
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+
+            logger.debug(f"Compacted context entries for session {session_id}")
+            return True
+
+        except Exception as e:
+            logger.error(f"Error compacting session context {session_id}: {e}")
+            return False
+
+    def compact_context_entries(self, min_entries: int = 1) -> int:
+        """
+        Compact every session holding at least min_entries incremental entries
+
+        Args:
+            min_entries: Minimum number of entries before a session is compacted
+
+        Returns:
+            Number of sessions compacted
+        """
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.execute(
+                    """
+                    SELECT session_id FROM session_context_entries
+                    GROUP BY session_id HAVING COUNT(*) >= ?
+                """,
+                    (min_entries,),
+                )
+                session_ids = [row[0] for row in cursor.fetchall()]
+
+            compacted = sum(
+                1
+                for session_id in session_ids
+                if self.compact_session_context(session_id)
+            )
+            if compacted:
+                logger.info(f"Compacted context entries for {compacted} sessions")
+            return compacted
+
+        except Exception as e:
+            logger.error(f"Error compacting context entries: {e}")
+            return 0
+
     def add_session_step(
         self,
         session_id: str,
@@ -462,41 +1325,171 @@ class ThinkingDatabase:
             logger.error(f"Error adding step to session {session_id}: {e}")
             return None
 
-    def get_session_steps(self, session_id: str) -> List[Dict[str, Any]]:
-        """Get all steps for a session"""
+    def get_or_create_step(
+        self,
+        session_id: str,
+        step_name: str,
+        step_number: int,
+        step_type: str,
+        quality_score: Optional[float] = None,
+    ) -> Optional[int]:
+        """
+        Get the id of the latest step named step_name, creating it if missing
+
+        Resolved through idx_steps_name in one transaction, so the cost does
+        not depend on how many steps the session has.
+
+        Args:
+            session_id: Session identifier
+            step_name: Step name to look up
+            step_number: Step number used if the step has to be created
+            step_type: Step type used if the step has to be created
+            quality_score: Quality score used if the step has to be created
+
+        Returns:
+            Step id, or None on failure
+        """
         try:
             with self.get_connection() as conn:
+                row = conn.execute(
+                    """
+                    SELECT id FROM session_steps
+                    WHERE session_id = ? AND step_name = ?
+                    ORDER BY step_number DESC, id DESC LIMIT 1
+                """,
+                    (session_id, step_name),
+                ).fetchone()
+                if row is not None:
+                    return row[0]
+
                 cursor = conn.execute(
                     """
-                    SELECT * FROM session_steps 
-                    WHERE session_id = ? 
-                    ORDER BY step_number ASC
+                    INSERT INTO session_steps
+                    (session_id, step_name, step_number, step_type,
+                     input_data, output_data, quality_score)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
                 """,
-                    (session_id,),
+                    (
+                        session_id,
+                        step_name,
+                        step_number,
+                        step_type,
+                        self._encrypt_json_if_enabled({}),
+                        self._encrypt_json_if_enabled({}),
+                        quality_score,
+                    ),
                 )
+                conn.commit()
+                logger.info(f"Added step {step_name} to session {session_id}")
+                return cursor.lastrowid
 
-                steps = []
-                for row in cursor.fetchall():
-                    step_data = dict(row)
+        except Exception as e:
+            logger.error(
+                f"Error resolving step {step_name} of session {session_id}: {e}"
+            )
+            return None
 
-                    # Decrypt data
-                    if step_data.get("input_data"):
-                        step_data["input_data"] = self._decrypt_json_if_enabled(
-                            step_data["input_data"]
-                        )
-                    if step_data.get("output_data"):
-                        step_data["output_data"] = self._decrypt_json_if_enabled(
-                            step_data["output_data"]
-                        )
-
-                    steps.append(step_data)
+    def get_session_steps(self, session_id: str) -> List[Dict[str, Any]]:
+        """Get all steps for a session"""
+        try:
+            with self.get_read_connection() as conn:
+                cursor = conn.execute(
+                    """
+                    SELECT * FROM session_steps 
+                    WHERE session_id = ? 
+                    ORDER BY step_number ASC
+                """,
+                    (session_id,),
+                )
 
-                return steps
+                return [self._decode_step(row) for row in cursor.fetchall()]
 
         except Exception as e:
             logger.error(f"Error retrieving steps for session {session_id}: {e}")
             return []
 
+    def get_session_steps_page(
+        self,
+        session_id: str,
+        after: Optional[Tuple[int, int]] = None,
+        limit: int = STREAM_PAGE_SIZE,
+    ) -> Tuple[List[Dict[str, Any]], Optional[Tuple[int, int]]]:
+        """
+        Get one page of a session's steps in step_number order
+
+        Pages are keyed on (step_number, id) rather than OFFSET, so each page
+        is an index range scan however deep into the session it starts.
+
+        Args:
+            session_id: Session identifier
+            after: Cursor returned with the previous page; None for the first
+            limit: Maximum steps to return
+
+        Returns:
+            (steps, cursor for the next page or None when exhausted)
+        """
+        try:
+            with self.get_read_connection() as conn:
+                if after is None:
+                    cursor = conn.execute(
+                        """
+                        SELECT * FROM session_steps WHERE session_id = ?
+                        ORDER BY step_number ASC, id ASC LIMIT ?
+                    """,
+                        (session_id, limit),
+                    )
+                else:
+                    cursor = conn.execute(
+                        """
+                        SELECT * FROM session_steps
+                        WHERE session_id = ? AND (step_number, id) > (?, ?)
+                        ORDER BY step_number ASC, id ASC LIMIT ?
+                    """,
+                        (session_id, after[0], after[1], limit),
+                    )
+                rows = cursor.fetchall()
+
+            steps = [self._decode_step(row) for row in rows]
+            next_cursor = None
+            if len(steps) == limit:
+                next_cursor = (steps[-1]["step_number"], steps[-1]["id"])
+            return steps, next_cursor
+
+        except Exception as e:
+            logger.error(f"Error retrieving steps for session {session_id}: {e}")
+            return [], None
+
+    def iter_session_steps(
+        self, session_id: str, page_size: int = STREAM_PAGE_SIZE
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Stream a session's steps in step_number order, one page at a time
+
+        No connection is held between pages, so consumers may do other
+        database work while iterating.
+        """
+        after = None
+        while True:
+            steps, after = self.get_session_steps_page(session_id, after, page_size)
+            yield from steps
+            if after is None:
+                return
+
+    def _decode_step(self, row: sqlite3.Row) -> Dict[str, Any]:
+        """Step row with its input and output data decrypted when first read"""
+        step_data = LazyRow(row)
+        for column in ("input_data", "output_data"):
+            if step_data.get(column):
+                step_data.defer(
+                    column,
+                    partial(
+                        self._decode_json_column,
+                        f"session_steps.{column}:{step_data['id']}",
+                        step_data[column],
+                    ),
+                )
+        return step_data
+
     def add_step_result(
         self,
         session_id: str,
@@ -526,8 +1519,12 @@ class ThinkingDatabase:
                         json.dumps(citations or [], default=str),
                     ),
                 )
-                conn.commit()
                 result_id = cursor.lastrowid
+                if self.search_index:
+                    self.search_index.add(
+                        conn, session_id, "step_result", content, result_id
+                    )
+                conn.commit()
                 logger.info(f"Added {result_type} result to step {step_id}")
                 return result_id
 
@@ -540,7 +1537,7 @@ class ThinkingDatabase:
     ) -> List[Dict[str, Any]]:
         """Get results for a step or all steps in session"""
         try:
-            with self.get_connection() as conn:
+            with self.get_read_connection() as conn:
                 if step_id:
                     cursor = conn.execute(
                         """
@@ -560,28 +1557,368 @@ class ThinkingDatabase:
                         (session_id,),
                     )
 
-                results = []
-                for row in cursor.fetchall():
-                    result_data = dict(row)
+                return [self._decode_result(row) for row in cursor.fetchall()]
 
-                    # Decrypt content
-                    if result_data.get("content"):
-                        result_data["content"] = self._decrypt_if_enabled(
-                            result_data["content"]
-                        )
+        except Exception as e:
+            logger.error(f"Error retrieving results for session {session_id}: {e}")
+            return []
+
+    def add_evidence_source(
+        self,
+        session_id: str,
+        step_id: Optional[int] = None,
+        url: Optional[str] = None,
+        title: Optional[str] = None,
+        summary: Optional[str] = None,
+        credibility_score: float = 0.0,
+        source_type: Optional[str] = None,
+        publication_date: Optional[str] = None,
+        key_claims: Optional[List[str]] = None,
+    ) -> Optional[int]:
+        """Add an evidence source to the session"""
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.execute(
+                    """
+                    INSERT INTO evidence_sources
+                    (session_id, step_id, url, title, summary, credibility_score,
+                     source_type, publication_date, key_claims)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                    (
+                        session_id,
+                        step_id,
+                        url,
+                        title,
+                        self._encrypt_if_enabled(summary or ""),
+                        credibility_score,
+                        source_type,
+                        publication_date,
+                        self._encrypt_if_enabled(
+                            json.dumps(key_claims or [], default=str)
+                        ),
+                    ),
+                )
+                evidence_id = cursor.lastrowid
+                if self.search_index:
+                    self.search_index.add(
+                        conn, session_id, "evidence", summary, evidence_id
+                    )
+                conn.commit()
+                logger.info(f"Added evidence source to session {session_id}")
+                return evidence_id
+
+        except Exception as e:
+            logger.error(f"Error adding evidence to session {session_id}: {e}")
+            return None
 
-                    # Parse JSON fields
-                    for field in ["metadata", "quality_indicators", "citations"]:
-                        if result_data.get(field):
-                            result_data[field] = json.loads(result_data[field])
+    def get_step_results_page(
+        self,
+        session_id: str,
+        step_id: Optional[int] = None,
+        after: Optional[Tuple[int, int]] = None,
+        limit: int = STREAM_PAGE_SIZE,
+        decrypt_content: bool = True,
+        include_content: bool = True,
+    ) -> Tuple[List[Dict[str, Any]], Optional[Tuple[int, int]]]:
+        """
+        Get one page of results in (step_id, id) order
 
-                    results.append(result_data)
+        Args:
+            session_id: Session identifier
+            step_id: Only results of this step
+            after: Cursor returned with the previous page; None for the first
+            limit: Maximum results to return
+            decrypt_content: False leaves content as stored, to be decrypted
+                with decrypt_result_content only for the rows that need it
+            include_content: False does not read content at all; fetch the
+                rows that need it with get_step_result
 
-                return results
+        Returns:
+            (results, cursor for the next page or None when exhausted)
+        """
+        try:
+            clauses = ["session_id = ?"]
+            params: List[Any] = [session_id]
+            if step_id is not None:
+                clauses.append("step_id = ?")
+                params.append(step_id)
+            if after is not None:
+                clauses.append("(step_id, id) > (?, ?)")
+                params.extend(after)
+            params.append(limit)
+
+            columns = "*" if include_content else self.RESULT_HEADER_COLUMNS
+            with self.get_read_connection() as conn:
+                cursor = conn.execute(
+                    f"""
+                    SELECT {columns} FROM step_results WHERE {' AND '.join(clauses)}
+                    ORDER BY step_id ASC, id ASC LIMIT ?
+                """,
+                    params,
+                )
+                rows = cursor.fetchall()
+
+            results = [self._decode_result(row, decrypt_content) for row in rows]
+            next_cursor = None
+            if len(results) == limit:
+                next_cursor = (results[-1]["step_id"], results[-1]["id"])
+            return results, next_cursor
 
         except Exception as e:
             logger.error(f"Error retrieving results for session {session_id}: {e}")
-            return []
+            return [], None
+
+    def iter_step_results(
+        self,
+        session_id: str,
+        step_id: Optional[int] = None,
+        page_size: int = STREAM_PAGE_SIZE,
+        decrypt_content: bool = True,
+        include_content: bool = True,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Stream results in (step_id, id) order, one page at a time
+
+        No connection is held between pages, and content is decrypted only
+        as each page is fetched (or not at all with decrypt_content=False).
+        """
+        after = None
+        while True:
+            results, after = self.get_step_results_page(
+                session_id,
+                step_id,
+                after,
+                page_size,
+                decrypt_content,
+                include_content,
+            )
+            yield from results
+            if after is None:
+                return
+
+    def get_step_result(self, result_id: int) -> Optional[Dict[str, Any]]:
+        """Get a single result with its content decrypted"""
+        try:
+            with self.get_read_connection() as conn:
+                row = conn.execute(
+                    "SELECT * FROM step_results WHERE id = ?", (result_id,)
+                ).fetchone()
+            return self._decode_result(row) if row else None
+
+        except Exception as e:
+            logger.error(f"Error retrieving result {result_id}: {e}")
+            return None
+
+    def decrypt_result_content(self, result: Dict[str, Any]) -> str:
+        """Decrypted content of a result fetched with decrypt_content=False"""
+        return self._decrypt_column(
+            f"step_results.content:{result.get('id')}", result.get("content") or ""
+        )
+
+    def _decode_result(
+        self, row: sqlite3.Row, decrypt_content: bool = True
+    ) -> Dict[str, Any]:
+        """Result row whose JSON fields and content are decoded when first read"""
+        result_data = LazyRow(row)
+        if decrypt_content and self.encryption and result_data.get("content"):
+            result_data.defer(
+                "content",
+                partial(
+                    self._decrypt_column,
+                    f"step_results.content:{result_data['id']}",
+                    result_data["content"],
+                ),
+            )
+        for field in ["metadata", "quality_indicators", "citations"]:
+            if result_data.get(field):
+                result_data.defer(field, partial(json.loads, result_data[field]))
+        return result_data
+
+    def add_flow_history(self, entries: Sequence[Dict[str, Any]]) -> bool:
+        """
+        Append flow state transitions in one transaction
+
+        Args:
+            entries: Transitions with flow_id, seq, session_id, timestamp,
+                from_state, to_state, event, duration_seconds and metadata
+
+        Returns:
+            True if successful
+        """
+        if not entries:
+            return True
+        try:
+            with self.get_connection() as conn:
+                conn.executemany(
+                    """
+                    INSERT OR REPLACE INTO flow_state_history
+                    (flow_id, seq, session_id, timestamp, from_state, to_state,
+                     event, duration_seconds, metadata)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                    [
+                        (
+                            entry["flow_id"],
+                            entry["seq"],
+                            entry.get("session_id"),
+                            entry["timestamp"],
+                            entry["from_state"],
+                            entry["to_state"],
+                            entry["event"],
+                            entry.get("duration_seconds"),
+                            self._encrypt_json_if_enabled(entry.get("metadata") or {}),
+                        )
+                        for entry in entries
+                    ],
+                )
+                conn.commit()
+                return True
+
+        except Exception as e:
+            logger.error(f"Error adding flow history: {e}")
+            return False
+
+    def get_flow_history_page(
+        self,
+        flow_id: str,
+        after: Optional[int] = None,
+        limit: int = STREAM_PAGE_SIZE,
+        newest_first: bool = False,
+    ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """
+        Get one page of a flow's state transitions in seq order
+
+        Args:
+            flow_id: Flow identifier
+            after: Cursor returned with the previous page; None for the first
+            limit: Maximum transitions to return
+            newest_first: Page from the most recent transition backwards
+
+        Returns:
+            (transitions, cursor for the next page or None when exhausted)
+        """
+        try:
+            clauses = ["flow_id = ?"]
+            params: List[Any] = [flow_id]
+            if after is not None:
+                clauses.append("seq < ?" if newest_first else "seq > ?")
+                params.append(after)
+            params.append(limit)
+
+            with self.get_read_connection() as conn:
+                rows = conn.execute(
+                    f"""
+                    SELECT * FROM flow_state_history WHERE {' AND '.join(clauses)}
+                    ORDER BY seq {'DESC' if newest_first else 'ASC'} LIMIT ?
+                """,
+                    params,
+                ).fetchall()
+
+            entries = [self._decode_flow_history(row) for row in rows]
+            next_cursor = entries[-1]["seq"] if len(entries) == limit else None
+            return entries, next_cursor
+
+        except Exception as e:
+            logger.error(f"Error retrieving history for flow {flow_id}: {e}")
+            return [], None
+
+    def iter_flow_history(
+        self, flow_id: str, page_size: int = STREAM_PAGE_SIZE
+    ) -> Iterator[Dict[str, Any]]:
+        """Stream a flow's state transitions in seq order, one page at a time"""
+        after = None
+        while True:
+            entries, after = self.get_flow_history_page(flow_id, after, page_size)
+            yield from entries
+            if after is None:
+                return
+
+    def get_flow_history_marks(self, flow_id: str) -> Dict[str, Any]:
+        """
+        Summarize a flow's stored transitions without reading them
+
+        Returns:
+            Dictionary with next_seq, state_counts (transitions into each
+            state) and last_entered (timestamp each state was last entered)
+        """
+        with self.get_read_connection() as conn:
+            # The bare timestamp column comes from the row with MAX(seq)
+            rows = conn.execute(
+                """
+                SELECT to_state, COUNT(*), MAX(seq), timestamp
+                FROM flow_state_history WHERE flow_id = ?
+                GROUP BY to_state
+            """,
+                (flow_id,),
+            ).fetchall()
+        return {
+            "next_seq": max((row[2] for row in rows), default=-1) + 1,
+            "state_counts": {row[0]: row[1] for row in rows},
+            "last_entered": {row[0]: row[3] for row in rows},
+        }
+
+    def _decode_flow_history(self, row: sqlite3.Row) -> Dict[str, Any]:
+        """Transition row with its metadata decrypted when first read"""
+        entry = LazyRow(row)
+        entry.defer(
+            "metadata",
+            partial(
+                self._decode_json_column,
+                f"flow_state_history.metadata:{row['flow_id']}:{row['seq']}",
+                row["metadata"],
+            ),
+        )
+        return entry
+
+    def get_session_record_counts(self, session_id: str) -> Tuple[int, int]:
+        """Count a session's steps and results without loading them"""
+        with self.get_read_connection() as conn:
+            total_steps = conn.execute(
+                "SELECT COUNT(*) FROM session_steps WHERE session_id = ?",
+                (session_id,),
+            ).fetchone()[0]
+            total_results = conn.execute(
+                "SELECT COUNT(*) FROM step_results WHERE session_id = ?",
+                (session_id,),
+            ).fetchone()[0]
+        return total_steps, total_results
+
+    def iter_timeline_rows(
+        self, session_id: str, table: str, page_size: int = STREAM_PAGE_SIZE
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Stream raw session_steps or step_results rows in (created_at, id) order
+
+        Rows are undecoded; step_results content is left encrypted.
+        """
+        if table not in ("session_steps", "step_results"):
+            raise ValueError(f"Invalid timeline table: {table}")
+        after = None
+        while True:
+            with self.get_read_connection() as conn:
+                if after is None:
+                    cursor = conn.execute(
+                        f"""
+                        SELECT * FROM {table} WHERE session_id = ?
+                        ORDER BY created_at ASC, id ASC LIMIT ?
+                    """,
+                        (session_id, page_size),
+                    )
+                else:
+                    cursor = conn.execute(
+                        f"""
+                        SELECT * FROM {table}
+                        WHERE session_id = ? AND (created_at, id) > (?, ?)
+                        ORDER BY created_at ASC, id ASC LIMIT ?
+                    """,
+                        (session_id, after[0], after[1], page_size),
+                    )
+                rows = [dict(row) for row in cursor.fetchall()]
+            yield from rows
+            if len(rows) < page_size:
+                return
+            after = (rows[-1]["created_at"], rows[-1]["id"])
 
     def list_sessions(
         self,
@@ -592,7 +1929,7 @@ class ThinkingDatabase:
     ) -> List[Dict[str, Any]]:
         """List sessions with optional filtering"""
         try:
-            with self.get_connection() as conn:
+            with self.get_read_connection() as conn:
                 query = "SELECT * FROM thinking_sessions WHERE 1=1"
                 params = []
 
@@ -622,6 +1959,7 @@ class ThinkingDatabase:
                     # Don't include full configuration in list view
                     session_data.pop("configuration", None)
                     session_data.pop("context", None)
+                    session_data.pop("quality_metrics", None)
 
                     sessions.append(session_data)
 
@@ -631,6 +1969,126 @@ class ThinkingDatabase:
             logger.error(f"Error listing sessions: {e}")
             return []
 
+    def search_sessions(
+        self,
+        query: str,
+        sources: Optional[List[str]] = None,
+        limit: int = 20,
+        offset: int = 0,
+    ) -> Dict[str, Any]:
+        """
+        Full-text search over session topics, step results and evidence
+
+        Sessions matching every query term are ranked by their best matching
+        document. Without a search index (FTS5 missing, or an encrypted
+        database without encrypted_search) only plaintext topics are
+        searched, by substring.
+
+        Args:
+            query: Search text
+            sources: Restrict to 'topic', 'step_result' and/or 'evidence'
+            limit: Maximum sessions to return
+            offset: Sessions to skip, for pagination
+
+        Returns:
+            {"total": matching sessions, "sessions": page of sessions in list
+            view, each with search_score, matched_source and snippet}
+        """
+        try:
+            with self.get_read_connection() as conn:
+                if self.search_index is None:
+                    return self._search_topics_like(conn, query, limit, offset)
+
+                total, matches = self.search_index.search(
+                    conn, query, sources, limit, offset
+                )
+                if not matches:
+                    return {"total": total, "sessions": []}
+
+                ids = [match["session_id"] for match in matches]
+                cursor = conn.execute(
+                    f"SELECT * FROM thinking_sessions WHERE id IN ({', '.join('?' for _ in ids)})",
+                    ids,
+                )
+                rows = {row["id"]: self._list_view(row) for row in cursor.fetchall()}
+
+                sessions = []
+                for match in matches:
+                    session_data = rows.get(match["session_id"])
+                    if session_data is None:
+                        continue
+                    snippet = match["snippet"]
+                    if snippet is None:
+                        # Blinded index: build the snippet from the decrypted text
+                        text = self._search_document_text(conn, session_data, match)
+                        snippet = make_snippet(text, query) if text else ""
+                    session_data["search_score"] = -match["score"] or 0.0
+                    session_data["matched_source"] = match["source"]
+                    session_data["snippet"] = snippet
+                    sessions.append(session_data)
+
+                return {"total": total, "sessions": sessions}
+
+        except Exception as e:
+            logger.error(f"Error searching sessions: {e}")
+            return {"total": 0, "sessions": []}
+
+    def _search_topics_like(
+        self, conn: sqlite3.Connection, query: str, limit: int, offset: int
+    ) -> Dict[str, Any]:
+        """Substring search over plaintext topics, used without an index"""
+        pattern = f"%{query}%"
+        total = conn.execute(
+            "SELECT COUNT(*) FROM thinking_sessions WHERE topic LIKE ?", (pattern,)
+        ).fetchone()[0]
+        cursor = conn.execute(
+            """
+            SELECT * FROM thinking_sessions WHERE topic LIKE ?
+            ORDER BY created_at DESC LIMIT ? OFFSET ?
+        """,
+            (pattern, limit, offset),
+        )
+        sessions = []
+        for row in cursor.fetchall():
+            session_data = self._list_view(row)
+            session_data["search_score"] = 0.0
+            session_data["matched_source"] = "topic"
+            session_data["snippet"] = make_snippet(session_data["topic"], query)
+            sessions.append(session_data)
+        return {"total": total, "sessions": sessions}
+
+    def _search_document_text(
+        self,
+        conn: sqlite3.Connection,
+        session_data: Dict[str, Any],
+        match: Dict[str, Any],
+    ) -> Optional[str]:
+        """Decrypted text of the document a search match points at"""
+        if match["source"] == "topic":
+            return session_data.get("topic")
+        table, column = (
+            ("step_results", "content")
+            if match["source"] == "step_result"
+            else ("evidence_sources", "summary")
+        )
+        row = conn.execute(
+            f"SELECT {column} FROM {table} WHERE id = ?", (match["ref_id"],)
+        ).fetchone()
+        return self._decrypt_if_enabled(row[0]) if row else None
+
+    def _list_view(self, row: sqlite3.Row) -> Dict[str, Any]:
+        """Session row with its topic decrypted and JSON blobs left out"""
+        session_data = dict(row)
+        if self.encryption and session_data.get("topic_encrypted"):
+            session_data["topic"] = self._decrypt_column(
+                f"thinking_sessions.topic:{session_data['id']}",
+                session_data["topic_encrypted"],
+            )
+        session_data.pop("configuration", None)
+        session_data.pop("context", None)
+        session_data.pop("quality_metrics", None)
+        return session_data
+
     def delete_session(self, session_id: str) -> bool:
         """Delete a session and all related data"""
         try:
@@ -639,6 +2097,9 @@ class ThinkingDatabase:
                 cursor = conn.execute(
                     "DELETE FROM thinking_sessions WHERE id = ?", (session_id,)
                 )
+                conn.execute(
+                    "DELETE FROM flow_state_history WHERE session_id = ?", (session_id,)
+                )
                 conn.commit()
 
                 deleted = cursor.rowcount > 0
@@ -692,32 +2153,205 @@ class ThinkingDatabase:
             return {}
 
     def cleanup_old_sessions(self, days_old: int = 30) -> int:
-        """Clean up old completed sessions"""
+        """Clean up old completed sessions and compact long-running ones"""
         try:
-            with self.get_connection() as conn:
-                cutoff_date = datetime.now().replace(day=datetime.now().day - days_old)
+            # Fold entries of long-running sessions back into their blobs
+            self.compact_context_entries(self.COMPACTION_MIN_ENTRIES)
+
+            cutoff_date = datetime.now() - timedelta(days=days_old)
+            deleted_count = 0
+            while True:
+                deleted, _ = self.purge_completed_sessions(cutoff_date)
+                deleted_count += deleted
+                if deleted < self.RETENTION_BATCH_SIZE:
+                    break
+
+            if deleted_count > 0:
+                logger.info(f"Cleaned up {deleted_count} old sessions")
+
+            return deleted_count
 
+        except Exception as e:
+            logger.error(f"Error cleaning up old sessions: {e}")
+            return 0
+
+    def purge_completed_sessions(
+        self, completed_before: datetime, limit: int = RETENTION_BATCH_SIZE
+    ) -> Tuple[int, int]:
+        """
+        Delete up to limit sessions completed before a cutoff
+
+        One short transaction; steps, results and other rows of the sessions
+        go with them by cascade. Callers repeat until fewer than limit
+        sessions are deleted.
+
+        Args:
+            completed_before: Sessions completed earlier than this are deleted
+            limit: Maximum number of sessions to delete
+
+        Returns:
+            Tuple of (sessions deleted, rows deleted including cascaded rows)
+        """
+        with self.get_connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
                 cursor = conn.execute(
                     """
-                    DELETE FROM thinking_sessions 
-                    WHERE status = 'completed' 
-                    AND completed_at < ?
+                    SELECT id FROM thinking_sessions
+                    WHERE status = 'completed' AND completed_at < ?
+                    LIMIT ?
                 """,
-                    (cutoff_date.isoformat(),),
+                    (completed_before.isoformat(), limit),
                 )
+                session_ids = [row[0] for row in cursor.fetchall()]
+                rows = 0
+                if session_ids:
+                    placeholders = ", ".join("?" * len(session_ids))
+                    # Cascaded rows, counted through their session_id indexes
+                    for table in self.SESSION_CHILD_TABLES:
+                        rows += conn.execute(
+                            f"SELECT COUNT(*) FROM {table} WHERE session_id IN ({placeholders})",
+                            session_ids,
+                        ).fetchone()[0]
+                    rows += conn.execute(
+                        f"DELETE FROM flow_state_history WHERE session_id IN ({placeholders})",
+                        session_ids,
+                    ).rowcount
+                    cursor = conn.execute(
+                        f"DELETE FROM thinking_sessions WHERE id IN ({placeholders})",
+                        session_ids,
+                    )
+                    rows += cursor.rowcount
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        return len(session_ids), rows
+
+    def abandon_inactive_sessions(
+        self, updated_before: datetime, limit: int = RETENTION_BATCH_SIZE
+    ) -> List[str]:
+        """
+        Mark up to limit active sessions not updated since a cutoff as abandoned
+
+        One short transaction, like purge_completed_sessions.
+
+        Args:
+            updated_before: Active sessions last updated earlier are abandoned
+            limit: Maximum number of sessions to update
 
+        Returns:
+            IDs of the abandoned sessions
+        """
+        with self.get_connection() as conn:
+            # Select and update under one write lock
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = conn.execute(
+                    """
+                    SELECT id FROM thinking_sessions
+                    WHERE status = 'active' AND updated_at < ?
+                    LIMIT ?
+                """,
+                    (updated_before.isoformat(), limit),
+                )
+                session_ids = [row[0] for row in cursor.fetchall()]
+                if session_ids:
+                    placeholders = ", ".join("?" * len(session_ids))
+                    conn.execute(
+                        f"""
+                        UPDATE thinking_sessions
+                        SET status = 'abandoned', updated_at = ?
+                        WHERE id IN ({placeholders})
+                    """,
+                        (datetime.now().isoformat(), *session_ids),
+                    )
                 conn.commit()
-                deleted_count = cursor.rowcount
+            except Exception:
+                conn.rollback()
+                raise
+        return session_ids
 
-                if deleted_count > 0:
-                    logger.info(f"Cleaned up {deleted_count} old sessions")
+    def checkpoint_wal(self, mode: str = "TRUNCATE") -> Dict[str, int]:
+        """
+        Checkpoint the write-ahead log into the database file
 
-                return deleted_count
+        Args:
+            mode: PASSIVE, FULL, RESTART or TRUNCATE
 
-        except Exception as e:
-            logger.error(f"Error cleaning up old sessions: {e}")
+        Returns:
+            Dictionary with busy, log_frames and checkpointed_frames
+        """
+        if mode not in ("PASSIVE", "FULL", "RESTART", "TRUNCATE"):
+            raise ValueError(f"Invalid checkpoint mode: {mode}")
+        if self.db_path == ":memory:":
+            return {"busy": 0, "log_frames": 0, "checkpointed_frames": 0}
+
+        with self.get_connection() as conn:
+            busy, log_frames, checkpointed = conn.execute(
+                f"PRAGMA wal_checkpoint({mode})"
+            ).fetchone()
+        return {
+            "busy": busy,
+            "log_frames": log_frames,
+            "checkpointed_frames": checkpointed,
+        }
+
+    def incremental_vacuum(self, max_pages: int = 1000) -> int:
+        """
+        Return up to max_pages free pages to the file system
+
+        Only databases created with auto_vacuum=INCREMENTAL (all databases
+        created by this class) can shrink this way; others report 0.
+
+        Returns:
+            Number of pages freed
+        """
+        if self.db_path == ":memory:":
             return 0
 
+        with self.get_connection() as conn:
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                return 0
+            free_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if free_before == 0:
+                return 0
+            # executescript steps the pragma to completion; execute() would
+            # free a single page
+            conn.executescript(f"PRAGMA incremental_vacuum({int(max_pages)});")
+            free_after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        return free_before - free_after
+
+    def get_storage_stats(self) -> Dict[str, int]:
+        """
+        Get page and file sizes of the database
+
+        Returns:
+            Dictionary with page_size, page_count, freelist_count, auto_vacuum,
+            file_bytes and wal_bytes
+        """
+        with self.get_connection() as conn:
+            stats = {
+                pragma: conn.execute(f"PRAGMA {pragma}").fetchone()[0]
+                for pragma in (
+                    "page_size",
+                    "page_count",
+                    "freelist_count",
+                    "auto_vacuum",
+                )
+            }
+
+        stats["file_bytes"] = 0
+        stats["wal_bytes"] = 0
+        if self.db_path != ":memory:":
+            wal_path = self.db_path.with_name(self.db_path.name + "-wal")
+            for key, path in (("file_bytes", self.db_path), ("wal_bytes", wal_path)):
+                try:
+                    stats[key] = path.stat().st_size
+                except OSError:
+                    pass
+        return stats
+
     def export_session_data(
         self, session_id: str, include_sensitive: bool = False
     ) -> Optional[Dict[str, Any]]:
@@ -732,39 +2366,265 @@ class ThinkingDatabase:
             Complete session data or None if not found
         """
         try:
-            session_data = self.get_session(session_id)
-            if not session_data:
-                return None
+            export_data = None
+            for record_type, data in self.iter_session_export(
+                session_id, include_sensitive
+            ):
+                if record_type == "session":
+                    export_data = {
+                        "session": data,
+                        "steps": [],
+                        "results": [],
+                        "export_timestamp": datetime.now().isoformat(),
+                        "encryption_enabled": self.encryption is not None,
+                    }
+                else:
+                    export_data[f"{record_type}s"].append(data)
 
-            steps = self.get_session_steps(session_id)
-            results = self.get_step_results(session_id)
+            return export_data
 
-            export_data = {
-                "session": session_data,
-                "steps": steps,
-                "results": results,
-                "export_timestamp": datetime.now().isoformat(),
-                "encryption_enabled": self.encryption is not None,
-            }
+        except Exception as e:
+            logger.error(f"Error exporting session {session_id}: {e}")
+            return None
 
-            # Remove sensitive data if requested
-            if not include_sensitive and self.encryption:
-                # Remove encrypted fields
-                if "topic_encrypted" in export_data["session"]:
-                    export_data["session"].pop("topic_encrypted", None)
+    def iter_session_export(
+        self, session_id: str, include_sensitive: bool = False
+    ) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Stream a session export as ("session" | "step" | "result", data) records
 
-                # Clear sensitive step data
-                for step in export_data["steps"]:
-                    step["input_data"] = {"redacted": True}
-                    step["output_data"] = {"redacted": True}
+        The session record comes first, then steps in step_number order,
+        then results in step order. Nothing is yielded if the session does
+        not exist. Redacted result content is never decrypted.
 
-                for result in export_data["results"]:
+        Args:
+            session_id: Session to export
+            include_sensitive: Whether to include encrypted/sensitive data
+        """
+        session_data = self.get_session(session_id)
+        if not session_data:
+            return
+
+        redact = not include_sensitive and self.encryption is not None
+        if redact:
+            session_data.pop("topic_encrypted", None)
+        yield "session", session_data
+
+        for step in self.iter_session_steps(session_id):
+            if redact:
+                step["input_data"] = {"redacted": True}
+                step["output_data"] = {"redacted": True}
+            yield "step", step
+
+        if redact or self.encryption is None:
+            for result in self.iter_step_results(
+                session_id, decrypt_content=not redact
+            ):
+                if redact:
                     result["content"] = "[REDACTED]"
+                yield "result", result
+            return
+
+        # Every result is read, so decrypt each page as one batch
+        after = None
+        while True:
+            results, after = self.get_step_results_page(
+                session_id, after=after, decrypt_content=False
+            )
+            contents = self.encryption.decrypt_many(
+                [result.get("content") or "" for result in results]
+            )
+            for result, content in zip(results, contents):
+                result["content"] = content
+                yield "result", result
+            if after is None:
+                return
 
-            return export_data
+    def rotate_encryption_key(
+        self,
+        new_key: bytes,
+        batch_size: int = KEY_ROTATION_BATCH_SIZE,
+        batch_pause: float = 0.01,
+    ) -> Dict[str, Any]:
+        """
+        Re-encrypt the database under a new key while it stays in use
+
+        This instance switches to the new key first and keeps reading data
+        under either key, so it serves normally throughout. Rows are read,
+        re-encrypted on the encryption thread pool and written back in
+        chunks of batch_size, each its own short transaction; a value
+        changed by a concurrent write is left alone, as it was already
+        written with the new key. Rotation is idempotent, so an interrupted
+        one is finished by rotating to the same key again.
+
+        Other processes holding only the old key cannot read rows rotated
+        (or written) after the switch, so rotate through the instance that
+        serves the database, or one opened with exclusive=True while nothing
+        else has it open.
+
+        Args:
+            new_key: Fernet key to encrypt with from now on
+            batch_size: Rows re-encrypted per transaction
+            batch_pause: Seconds to pause between chunks for waiting writers
 
+        Returns:
+            Dictionary with rows_scanned, values_rotated and
+            values_skipped (changed concurrently) per table and in total
+        """
+        if self.encryption is None:
+            raise ValueError("Database is not encrypted")
+
+        current = self.encryption
+        if new_key != current.key:
+            self.encryption = DatabaseEncryption(
+                new_key, previous_keys=[current.key, *current.previous_keys]
+            )
+        start = time.monotonic()
+
+        report: Dict[str, Any] = {"tables": {}}
+        for table, (key_columns, columns) in self.ENCRYPTED_COLUMNS.items():
+            stats = self._rotate_table(
+                table, key_columns, columns, batch_size, batch_pause
+            )
+            report["tables"][table] = stats
+        for field in ("rows_scanned", "values_rotated", "values_skipped"):
+            report[field] = sum(t[field] for t in report["tables"].values())
+
+        if self.search_index is not None and self.search_index.blinded:
+            # Blinded tokens are keyed by the encryption key
+            self.search_index = SearchIndex(self._search_blind_key())
+            self.rebuild_search_index()
+
+        # Drop the old key now that nothing is encrypted with it
+        self.encryption = DatabaseEncryption(new_key)
+        report["duration_seconds"] = time.monotonic() - start
+        logger.info(
+            f"Rotated encryption key: {report['values_rotated']} values in "
+            f"{report['rows_scanned']} rows"
+        )
+        return report
+
+    def _rotate_table(
+        self,
+        table: str,
+        key_columns: Tuple[str, ...],
+        columns: Tuple[str, ...],
+        batch_size: int,
+        batch_pause: float,
+    ) -> Dict[str, int]:
+        """Re-encrypt one table's encrypted columns in chunks, keyed on key_columns"""
+        stats = {"rows_scanned": 0, "values_rotated": 0, "values_skipped": 0}
+        keys = ", ".join(key_columns)
+        key_match = " AND ".join(f"{column} = ?" for column in key_columns)
+        width = len(key_columns)
+        after: Optional[Tuple[Any, ...]] = None
+
+        while True:
+            where = ""
+            if after is not None:
+                where = f"WHERE ({keys}) > ({', '.join('?' * width)})"
+            with self.get_read_connection() as conn:
+                rows = conn.execute(
+                    f"SELECT {keys}, {', '.join(columns)} FROM {table} {where} "
+                    f"ORDER BY {keys} LIMIT ?",
+                    (*(after or ()), batch_size),
+                ).fetchall()
+            if not rows:
+                return stats
+            stats["rows_scanned"] += len(rows)
+            after = tuple(rows[-1][:width])
+
+            # Crypto runs outside the write transaction
+            updates = []
+            for offset, column in enumerate(columns, start=width):
+                stored = [row[offset] for row in rows if row[offset]]
+                rotated = self.encryption.rotate_many(stored)
+                changed = iter(rotated)
+                for row in rows:
+                    if row[offset]:
+                        new_value = next(changed)
+                        if new_value != row[offset]:
+                            updates.append(
+                                (column, new_value, tuple(row[:width]), row[offset])
+                            )
+
+            if updates:
+                with self.get_connection() as conn:
+                    conn.execute("BEGIN IMMEDIATE")
+                    try:
+                        for column, new_value, row_key, old_value in updates:
+                            cursor = conn.execute(
+                                f"UPDATE {table} SET {column} = ? "
+                                f"WHERE {key_match} AND {column} = ?",
+                                (new_value, *row_key, old_value),
+                            )
+                            if cursor.rowcount:
+                                stats["values_rotated"] += 1
+                            else:
+                                stats["values_skipped"] += 1
+                        conn.commit()
+                    except Exception:
+                        conn.rollback()
+                        raise
+
+            if len(rows) < batch_size:
+                return stats
+            if batch_pause > 0:
+                time.sleep(batch_pause)
+
+    def export_archive(
+        self, archive_path: str, chunk_rows: int = 50000
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Export the whole database as a compressed, chunked archive
+
+        Rows are copied as stored (see session_archive.py), so encrypted data
+        stays encrypted and can only be imported with the same key.
+
+        Args:
+            archive_path: Directory to write the archive to
+            chunk_rows: Rows per chunk file
+
+        Returns:
+            Archive manifest, or None on failure
+        """
+        try:
+            with self.get_read_connection() as conn:
+                return export_archive(
+                    conn,
+                    archive_path,
+                    self.encryption.key if self.encryption else None,
+                    chunk_rows,
+                )
         except Exception as e:
-            logger.error(f"Error exporting session {session_id}: {e}")
+            logger.error(f"Error exporting archive to {archive_path}: {e}")
+            return None
+
+    def import_archive(self, archive_path: str) -> Optional[Dict[str, Any]]:
+        """
+        Import an archive written by export_archive
+
+        Sessions that already exist are skipped; integer ids of the imported
+        rows are shifted past the existing ones.
+
+        Args:
+            archive_path: Archive directory
+
+        Returns:
+            Rows imported per table and skipped session ids, or None on failure
+        """
+        try:
+            with self.get_connection() as conn:
+                result = import_archive(
+                    conn,
+                    archive_path,
+                    self.encryption.key if self.encryption else None,
+                )
+            if self.search_index and any(result["imported"].values()):
+                self.rebuild_search_index()
+            return result
+        except Exception as e:
+            logger.error(f"Error importing archive {archive_path}: {e}")
             return None
 
     def get_performance_metrics(self) -> Dict[str, Any]:
@@ -788,6 +2648,10 @@ class ThinkingDatabase:
             optimizer_metrics = self.performance_optimizer.get_performance_metrics()
             metrics.update(optimizer_metrics)
 
+        metrics["write_batching"] = self.get_write_batch_stats()
+        if self.decryption_cache is not None:
+            metrics["decryption_cache"] = self.decryption_cache.get_stats()
+
         # Add basic database stats
         try:
             basic_stats = self.get_database_stats()
@@ -850,6 +2714,10 @@ class ThinkingDatabase:
             if self.performance_optimizer:
                 self.performance_optimizer.shutdown()
 
+            if self._process_lock is not None:
+                self._process_lock.close()
+                self._process_lock = None
+
             logger.info("Database shutdown complete")
         except Exception as e:
             logger.error(f"Error during database shutdown: {e}")
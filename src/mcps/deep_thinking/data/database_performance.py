@@ -5,16 +5,16 @@ Implements connection pooling, query optimization, indexing,
 and performance monitoring for the SQLite database.
 """
 
+import bisect
 import logging
 import sqlite3
 import threading
 import time
-from contextlib import contextmanager
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from collections import deque
 from dataclasses import dataclass
-from queue import Queue, Empty
 import weakref
 
 logger = logging.getLogger(__name__)
@@ -44,17 +44,77 @@ class ConnectionStats:
     connections_closed: int = 0
     connection_errors: int = 0
     average_wait_time: float = 0.0
+    checkouts: int = 0
+    waits: int = 0
+    timeouts: int = 0
+    affinity_hits: int = 0
+    liveness_checks: int = 0
+
+
+class ConnectionPoolError(Exception):
+    """Raised when the pool cannot provide a connection"""
+
+
+class PoolTimeoutError(ConnectionPoolError, TimeoutError):
+    """Raised when no connection becomes free before the timeout"""
+
+
+class WaitTimeHistogram:
+    """Checkout wait times in fixed buckets, for averages and percentiles"""
+
+    # Bucket upper bounds in seconds; one more bucket holds anything slower
+    BUCKETS = (0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        self.counts[bisect.bisect_left(self.BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    @property
+    def average(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, percent: float) -> float:
+        """Upper bound of the bucket holding the given percentile"""
+        if not self.count:
+            return 0.0
+        rank = self.count * percent / 100
+        seen = 0
+        for bound, count in zip(self.BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self) -> Dict[str, int]:
+        buckets = {
+            f"<={bound * 1000:g}ms": count
+            for bound, count in zip(self.BUCKETS, self.counts)
+        }
+        buckets[f">{self.BUCKETS[-1] * 1000:g}ms"] = self.counts[-1]
+        return buckets
 
 
 class DatabaseConnection:
     """Wrapper for database connection with performance tracking"""
 
-    def __init__(self, db_path: str, connection_id: str):
+    def __init__(self, db_path: str, connection_id: str, readonly: bool = False):
         self.db_path = db_path
         self.connection_id = connection_id
+        self.readonly = readonly
         self.connection = None
         self.created_at = datetime.now()
         self.last_used = datetime.now()
+        # Monotonic time the connection was last returned to its pool
+        self.returned_at = time.monotonic()
+        self.pool_generation = 0
         self.query_count = 0
         self.is_active = False
         self.lock = threading.RLock()
@@ -75,11 +135,15 @@ class DatabaseConnection:
 
             # Optimize connection settings
             self.connection.execute("PRAGMA foreign_keys=ON")
+            # Only takes effect on a new database, so it precedes journal_mode
+            self.connection.execute("PRAGMA auto_vacuum=INCREMENTAL")
             self.connection.execute("PRAGMA journal_mode=WAL")
             self.connection.execute("PRAGMA synchronous=NORMAL")
             self.connection.execute("PRAGMA cache_size=10000")
             self.connection.execute("PRAGMA temp_store=memory")
             self.connection.execute("PRAGMA mmap_size=268435456")  # 256MB
+            if self.readonly:
+                self.connection.execute("PRAGMA query_only=ON")
 
             logger.debug(f"Created database connection {self.connection_id}")
 
@@ -121,6 +185,21 @@ class DatabaseConnection:
             finally:
                 self.is_active = False
 
+    def executescript(self, script: str) -> sqlite3.Cursor:
+        """Execute a script, stepping every statement to completion"""
+        with self.lock:
+            if not self.connection:
+                self._create_connection()
+
+            self.is_active = True
+            self.last_used = datetime.now()
+            self.query_count += 1
+
+            try:
+                return self.connection.executescript(script)
+            finally:
+                self.is_active = False
+
     def commit(self):
         """Commit transaction"""
         if self.connection:
@@ -143,6 +222,11 @@ class DatabaseConnection:
                 finally:
                     self.connection = None
 
+    @property
+    def in_transaction(self) -> bool:
+        """Whether a transaction is open on the connection"""
+        return bool(self.connection and self.connection.in_transaction)
+
     def is_alive(self) -> bool:
         """Check if connection is alive"""
         try:
@@ -165,20 +249,91 @@ class DatabaseConnection:
         }
 
 
+class _Waiter:
+    """A thread queued for a connection; released ones are handed over in order"""
+
+    __slots__ = ("event", "connection", "may_create")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.connection: Optional[DatabaseConnection] = None
+        # Set instead of a connection when a slot frees up below the maximum
+        self.may_create = False
+
+
+class PooledConnection:
+    """Checkout of one pooled connection, returned to the pool on exit"""
+
+    def __init__(self, pool: "ConnectionPool", timeout: float):
+        self.pool = pool
+        self.timeout = timeout
+        self.connection: Optional[DatabaseConnection] = None
+
+    def __enter__(self) -> DatabaseConnection:
+        self.connection = self.pool.acquire(self.timeout)
+        return self.connection
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        connection, self.connection = self.connection, None
+        if connection is None:
+            return False
+
+        # A transaction left open, on error or not, must not carry its
+        # uncommitted writes and locks over to the next checkout
+        discard = False
+        try:
+            if connection.in_transaction:
+                connection.rollback()
+        except Exception as e:
+            logger.warning(
+                f"Rollback failed on connection {connection.connection_id}: {e}"
+            )
+            discard = True
+        if exc_type is not None and not discard:
+            # Errors are the only sign a connection may have gone bad, so
+            # it is checked here rather than on every checkout
+            discard = not connection.is_alive()
+        self.pool.release(connection, discard)
+        return False
+
+
 class ConnectionPool:
-    """Database connection pool for improved performance"""
+    """
+    Database connection pool for improved performance
+
+    - A thread gets back the idle connection it used last, if there is one,
+      so its statements and pages stay cached on that connection
+    - New connections are opened as soon as none is idle, up to
+      max_connections; beyond that threads wait in FIFO order and released
+      connections are handed to the longest waiting thread
+    - Liveness is only probed for connections idle longer than
+      validate_after seconds, or after an error while in use
+    """
 
     def __init__(
-        self, db_path: str, min_connections: int = 2, max_connections: int = 10
+        self,
+        db_path: str,
+        min_connections: int = 2,
+        max_connections: int = 10,
+        readonly: bool = False,
+        validate_after: float = 30.0,
     ):
         self.db_path = db_path
         self.min_connections = min_connections
         self.max_connections = max_connections
-        self.connections = Queue(maxsize=max_connections)
+        self.readonly = readonly
+        self.validate_after = validate_after
         self.all_connections = weakref.WeakSet()
         self.stats = ConnectionStats()
+        self.wait_times = WaitTimeHistogram()
         self.lock = threading.RLock()
+        self._idle: List[DatabaseConnection] = []
+        self._waiters: Deque[_Waiter] = deque()
+        self._local = threading.local()
         self._connection_counter = 0
+        # Bumped by close_all, so connections checked out before it are not
+        # returned to the pool afterwards
+        self._generation = 0
 
         # Initialize minimum connections
         self._initialize_pool()
@@ -186,132 +341,197 @@ class ConnectionPool:
     def _initialize_pool(self):
         """Initialize the connection pool with minimum connections"""
         for _ in range(self.min_connections):
+            with self.lock:
+                self.stats.total_connections += 1
             conn = self._create_connection()
-            self.connections.put(conn)
-            self.stats.idle_connections += 1
+            with self.lock:
+                self._idle.append(conn)
+                self.stats.idle_connections += 1
 
     def _create_connection(self) -> DatabaseConnection:
-        """Create a new database connection"""
+        """Create a new connection for a slot already counted in total_connections"""
         with self.lock:
             self._connection_counter += 1
             connection_id = f"conn_{self._connection_counter}"
-
-            try:
-                conn = DatabaseConnection(self.db_path, connection_id)
-                self.all_connections.add(conn)
-                self.stats.connections_created += 1
-                self.stats.total_connections += 1
-                return conn
-            except Exception as e:
-                self.stats.connection_errors += 1
-                logger.error(f"Failed to create connection: {e}")
-                raise
-
-    @contextmanager
-    def get_connection(self, timeout: float = 30.0):
-        """Get a connection from the pool"""
-        start_time = time.time()
-        connection = None
+            generation = self._generation
 
         try:
-            # Try to get an existing connection
-            try:
-                connection = self.connections.get(timeout=timeout)
-                wait_time = time.time() - start_time
+            conn = DatabaseConnection(self.db_path, connection_id, self.readonly)
+        except Exception as e:
+            logger.error(f"Failed to create connection: {e}")
+            with self.lock:
+                self.stats.connection_errors += 1
+                if generation == self._generation:
+                    self._free_slot()
+            raise
 
-                with self.lock:
-                    self.stats.idle_connections -= 1
-                    self.stats.active_connections += 1
-
-                    # Update average wait time
-                    if self.stats.connections_created > 0:
-                        total_wait = self.stats.average_wait_time * (
-                            self.stats.connections_created - 1
-                        )
-                        self.stats.average_wait_time = (
-                            total_wait + wait_time
-                        ) / self.stats.connections_created
-
-            except Empty:
-                # No connections available, create new one if under limit
-                with self.lock:
-                    if self.stats.total_connections < self.max_connections:
-                        connection = self._create_connection()
-                        self.stats.active_connections += 1
+        conn.pool_generation = generation
+        with self.lock:
+            self.all_connections.add(conn)
+            self.stats.connections_created += 1
+        return conn
+
+    def get_connection(self, timeout: float = 30.0) -> PooledConnection:
+        """Get a connection from the pool, for use as a context manager"""
+        return PooledConnection(self, timeout)
+
+    def acquire(self, timeout: float = 30.0) -> DatabaseConnection:
+        """
+        Check out a connection; it must be given back with release()
+
+        Raises:
+            PoolTimeoutError: If none becomes free within timeout seconds
+        """
+        start_time = time.perf_counter()
+        deadline = start_time + timeout
+        waited = False
+
+        while True:
+            waiter = None
+            create = False
+            with self.lock:
+                connection = self._take_idle()
+                if connection is None:
+                    if (
+                        self.stats.total_connections < self.max_connections
+                        and not self._waiters
+                    ):
+                        # Reserve the slot now, open the connection unlocked
+                        self.stats.total_connections += 1
+                        create = True
                     else:
-                        raise Exception(
-                            f"Connection pool exhausted (max: {self.max_connections})"
-                        )
+                        waiter = _Waiter()
+                        self._waiters.append(waiter)
 
-            # Verify connection is alive
-            if not connection.is_alive():
+            if waiter is not None:
+                waited = True
+                connection, create = self._wait(waiter, deadline)
+
+            if create:
+                connection = self._create_connection()
+            elif not self._check_alive(connection):
                 logger.warning(f"Dead connection detected: {connection.connection_id}")
+                with self.lock:
+                    if connection.pool_generation == self._generation:
+                        self.stats.connections_closed += 1
+                        self._free_slot()
                 connection.close()
-                connection = self._create_connection()
+                continue
+            break
 
-            yield connection
+        wait_time = time.perf_counter() - start_time
+        with self.lock:
+            self.stats.checkouts += 1
+            self.stats.active_connections += 1
+            if waited:
+                self.stats.waits += 1
+            self.wait_times.record(wait_time)
+            self.stats.average_wait_time = self.wait_times.average
+        self._local.last = weakref.ref(connection)
+        return connection
+
+    def _take_idle(self) -> Optional[DatabaseConnection]:
+        """Pop an idle connection, preferring this thread's last one (lock held)"""
+        if not self._idle:
+            return None
+        last = getattr(self._local, "last", None)
+        preferred = last() if last is not None else None
+        if preferred is not None:
+            for i, conn in enumerate(self._idle):
+                if conn is preferred:
+                    del self._idle[i]
+                    self.stats.affinity_hits += 1
+                    self.stats.idle_connections -= 1
+                    return conn
+        # Otherwise the most recently returned one, whose cache is warmest
+        self.stats.idle_connections -= 1
+        return self._idle.pop()
+
+    def _wait(
+        self, waiter: _Waiter, deadline: float
+    ) -> Tuple[Optional[DatabaseConnection], bool]:
+        """Block until a connection or a free slot is handed to waiter"""
+        waiter.event.wait(max(deadline - time.perf_counter(), 0))
+        with self.lock:
+            if not waiter.event.is_set():
+                self._waiters.remove(waiter)
+                self.stats.timeouts += 1
+                raise PoolTimeoutError(
+                    f"Connection pool exhausted (max: {self.max_connections}): "
+                    "no connection freed before the timeout"
+                )
+        if waiter.connection is None and not waiter.may_create:
+            raise ConnectionPoolError("Connection pool was closed while waiting")
+        return waiter.connection, waiter.may_create
 
-        except Exception as e:
-            logger.error(f"Error getting database connection: {e}")
-            raise
-        finally:
-            # Return connection to pool
-            if connection:
-                try:
-                    # Check if connection is still alive before returning
-                    if connection.is_alive():
-                        self.connections.put(connection)
-                        with self.lock:
-                            self.stats.active_connections -= 1
-                            self.stats.idle_connections += 1
-                    else:
-                        # Connection is dead, close it and create a new one
-                        connection.close()
-                        with self.lock:
-                            self.stats.active_connections -= 1
-                            self.stats.total_connections -= 1
-                            self.stats.connections_closed += 1
-
-                        # Create replacement connection if below minimum
-                        if self.stats.total_connections < self.min_connections:
-                            try:
-                                new_conn = self._create_connection()
-                                self.connections.put(new_conn)
-                                self.stats.idle_connections += 1
-                            except Exception as e:
-                                logger.error(
-                                    f"Failed to create replacement connection: {e}"
-                                )
+    def _check_alive(self, connection: DatabaseConnection) -> bool:
+        """Probe connections that sat idle for a while; trust the rest"""
+        if time.monotonic() - connection.returned_at < self.validate_after:
+            return True
+        with self.lock:
+            self.stats.liveness_checks += 1
+        return connection.is_alive()
 
-                except Exception as e:
-                    logger.error(f"Error returning connection to pool: {e}")
+    def release(self, connection: DatabaseConnection, discard: bool = False):
+        """Give a checked out connection back, or close it if discard is set"""
+        with self.lock:
+            if connection.pool_generation != self._generation:
+                # Checked out before close_all; not counted any more
+                stale = True
+            else:
+                stale = False
+                self.stats.active_connections -= 1
+                if discard:
+                    self.stats.connections_closed += 1
+                    self._free_slot()
+                else:
+                    connection.returned_at = time.monotonic()
+                    if self._waiters:
+                        waiter = self._waiters.popleft()
+                        waiter.connection = connection
+                        waiter.event.set()
+                    else:
+                        self._idle.append(connection)
+                        self.stats.idle_connections += 1
+
+        if discard or stale:
+            connection.close()
+
+    def _free_slot(self):
+        """Give up a connection slot, passing it to a waiter if any (lock held)"""
+        if self._waiters:
+            waiter = self._waiters.popleft()
+            waiter.may_create = True
+            waiter.event.set()
+        else:
+            self.stats.total_connections -= 1
 
     def close_all(self):
         """Close all connections in the pool"""
         with self.lock:
-            # Close all connections in queue
-            while not self.connections.empty():
-                try:
-                    conn = self.connections.get_nowait()
-                    conn.close()
-                    self.stats.connections_closed += 1
-                except Empty:
-                    break
-                except Exception as e:
-                    logger.error(f"Error closing pooled connection: {e}")
-
-            # Close any remaining connections
-            for conn in list(self.all_connections):
-                try:
-                    conn.close()
-                except Exception as e:
-                    logger.error(f"Error closing connection: {e}")
+            self._generation += 1
+            idle, self._idle = self._idle, []
+            waiters, self._waiters = list(self._waiters), deque()
+            connections = list(self.all_connections)
+            self.all_connections = weakref.WeakSet()
+            self.stats.connections_closed += len(idle)
 
             # Reset stats
             self.stats.total_connections = 0
             self.stats.active_connections = 0
             self.stats.idle_connections = 0
 
+        for waiter in waiters:
+            waiter.event.set()
+
+        # Connections still checked out are closed too, as on shutdown nothing
+        # should keep using them
+        for conn in connections:
+            try:
+                conn.close()
+            except Exception as e:
+                logger.error(f"Error closing connection: {e}")
+
     def get_stats(self) -> Dict[str, Any]:
         """Get connection pool statistics"""
         with self.lock:
@@ -322,11 +542,23 @@ class ConnectionPool:
                 "connections_created": self.stats.connections_created,
                 "connections_closed": self.stats.connections_closed,
                 "connection_errors": self.stats.connection_errors,
+                "checkouts": self.stats.checkouts,
+                "waits": self.stats.waits,
+                "timeouts": self.stats.timeouts,
+                "waiting_threads": len(self._waiters),
+                "affinity_hits": self.stats.affinity_hits,
+                "liveness_checks": self.stats.liveness_checks,
                 "average_wait_time": self.stats.average_wait_time,
+                "max_wait_time": self.wait_times.max,
+                "p50_wait_time": self.wait_times.percentile(50),
+                "p95_wait_time": self.wait_times.percentile(95),
+                "p99_wait_time": self.wait_times.percentile(99),
+                "wait_time_histogram": self.wait_times.to_dict(),
                 "pool_utilization": self.stats.active_connections
                 / max(self.stats.total_connections, 1),
                 "min_connections": self.min_connections,
                 "max_connections": self.max_connections,
+                "readonly": self.readonly,
             }
 
 
@@ -460,10 +692,22 @@ class DatabasePerformanceOptimizer:
     """Main database performance optimizer"""
 
     def __init__(
-        self, db_path: str, min_connections: int = 2, max_connections: int = 10
+        self,
+        db_path: str,
+        min_connections: int = 2,
+        max_connections: int = 10,
+        max_readers: Optional[int] = None,
     ):
         self.db_path = db_path
         self.connection_pool = ConnectionPool(db_path, min_connections, max_connections)
+        # WAL lets readers run alongside a writer, so read-only work gets its
+        # own query_only connections instead of queueing for writer ones.
+        # Every ":memory:" connection is a separate database, so none there
+        self.read_pool = None
+        if db_path != ":memory:":
+            self.read_pool = ConnectionPool(
+                db_path, 0, max_readers or max_connections, readonly=True
+            )
         self.query_optimizer = QueryOptimizer()
         self.index_optimizer = IndexOptimizer()
         self.performance_monitor = DatabasePerformanceMonitor()
@@ -487,8 +731,8 @@ class DatabasePerformanceOptimizer:
                 # Create recommended indexes
                 self.index_optimizer.create_recommended_indexes(conn)
 
-                # Analyze database for optimization opportunities
-                self.analyze_database_performance()
+            # Analyze database for optimization opportunities
+            self.analyze_database_performance()
 
             logger.info(
                 "Database performance optimizations initialized after table creation"
@@ -498,21 +742,33 @@ class DatabasePerformanceOptimizer:
                 f"Failed to initialize database optimizations after table creation: {e}"
             )
 
-    @contextmanager
-    def get_connection(self, timeout: float = 30.0):
-        """Get optimized database connection"""
-        with self.connection_pool.get_connection(timeout) as conn:
-            yield conn
+    def get_connection(
+        self, timeout: float = 30.0, readonly: bool = False
+    ) -> PooledConnection:
+        """
+        Get optimized database connection
+
+        Args:
+            timeout: Seconds to wait for a free connection
+            readonly: Take a query_only connection from the reader pool
+        """
+        if readonly and self.read_pool:
+            return self.read_pool.get_connection(timeout)
+        return self.connection_pool.get_connection(timeout)
 
     def execute_query(self, query: str, params: Tuple = ()) -> sqlite3.Cursor:
-        """Execute query with full optimization"""
+        """Execute query with full optimization, committing any write it makes"""
         with self.get_connection() as conn:
-            return self.query_optimizer.execute_with_monitoring(conn, query, params)
+            cursor = self.query_optimizer.execute_with_monitoring(conn, query, params)
+            # The checkout ends here, and release rolls back open transactions
+            if conn.in_transaction:
+                conn.commit()
+            return cursor
 
     def analyze_database_performance(self):
         """Analyze database performance and suggest optimizations"""
         try:
-            with self.get_connection() as conn:
+            with self.get_connection(readonly=True) as conn:
                 # Analyze table statistics
                 self.performance_monitor.analyze_table_stats(conn)
 
@@ -550,17 +806,22 @@ class DatabasePerformanceOptimizer:
 
     def get_performance_metrics(self) -> Dict[str, Any]:
         """Get comprehensive performance metrics"""
-        return {
+        metrics = {
             "connection_pool": self.connection_pool.get_stats(),
             "query_performance": self.query_optimizer.get_query_stats(),
             "index_analysis": self.index_optimizer.get_index_stats(),
             "database_stats": self.performance_monitor.get_database_stats(),
         }
+        if self.read_pool:
+            metrics["read_connection_pool"] = self.read_pool.get_stats()
+        return metrics
 
     def shutdown(self):
         """Shutdown the performance optimizer"""
         try:
             self.connection_pool.close_all()
+            if self.read_pool:
+                self.read_pool.close_all()
             logger.info("Database performance optimizer shutdown complete")
         except Exception as e:
             logger.error(f"Error during database optimizer shutdown: {e}")
@@ -0,0 +1,221 @@
+"""
+Lazily decoded rows for the session database
+
+With encryption enabled, every encrypted column of a row costs a Fernet
+decryption (AES plus HMAC) and usually a JSON parse. Most callers read a
+few plain columns, such as step_name and quality_score, and never look at
+the encrypted payloads.
+
+LazyRow is a dict whose encrypted columns hold deferred decoders that run
+the first time the column is read. DecryptionCache keeps recently
+decrypted payloads in memory, keyed by row and ciphertext hash, so rows
+read again (the same session fetched by several tools) skip the cipher
+entirely. An updated column has new ciphertext and so a new key; stale
+entries age out of the LRU.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+
+class _Deferred:
+    """Placeholder for a column value that is decoded on first access"""
+
+    __slots__ = ("decode",)
+
+    def __init__(self, decode: Callable[[], Any]):
+        self.decode = decode
+
+    def __repr__(self) -> str:
+        return "<deferred>"
+
+
+class LazyRow(dict):
+    """
+    Row dictionary whose deferred columns are decoded on first access
+
+    Reads through [], get(), items(), values(), pop(), dict(row), {**row}
+    and json.dumps all decode; a decoded value replaces its placeholder.
+    Keys, membership and len() never decode.
+    """
+
+    __slots__ = ()
+
+    def defer(self, key: str, decode: Callable[[], Any]) -> None:
+        """Replace a column with a decoder called when the column is read"""
+        dict.__setitem__(self, key, _Deferred(decode))
+
+    def is_decoded(self, key: str) -> bool:
+        return type(dict.get(self, key)) is not _Deferred
+
+    def __getitem__(self, key):
+        value = dict.__getitem__(self, key)
+        if type(value) is _Deferred:
+            value = value.decode()
+            dict.__setitem__(self, key, value)
+        return value
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    # Overriding __iter__ makes dict(row), {**row} and update(row) go
+    # through keys() and __getitem__ instead of copying the placeholders
+    def __iter__(self) -> Iterator[str]:
+        return dict.__iter__(self)
+
+    def items(self) -> List[Tuple[str, Any]]:
+        return [(key, self[key]) for key in dict.keys(self)]
+
+    def values(self) -> List[Any]:
+        return [self[key] for key in dict.keys(self)]
+
+    def pop(self, key, *default):
+        if key in self:
+            value = self[key]
+            dict.__delitem__(self, key)
+            return value
+        if default:
+            return default[0]
+        raise KeyError(key)
+
+    def popitem(self) -> Tuple[str, Any]:
+        if not self:
+            raise KeyError("popitem(): dictionary is empty")
+        key = next(reversed(dict.keys(self)))
+        return key, self.pop(key)
+
+    def setdefault(self, key, default=None):
+        if key in self:
+            return self[key]
+        dict.__setitem__(self, key, default)
+        return default
+
+    def copy(self) -> "LazyRow":
+        """Shallow copy that keeps undecoded columns deferred"""
+        row = LazyRow()
+        dict.update(row, dict.items(self))
+        return row
+
+    def resolve(self) -> Dict[str, Any]:
+        """Plain dictionary with every column decoded"""
+        return dict(self.items())
+
+    def __or__(self, other):
+        return self.resolve() | other
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, LazyRow):
+            other = other.resolve()
+        return self.resolve() == other
+
+    def __ne__(self, other) -> bool:
+        return not self == other
+
+    __hash__ = None
+
+    def __reduce__(self):
+        return (LazyRow, (self.resolve(),))
+
+
+@dataclass
+class DecryptionCacheStats:
+    """Decryption cache statistics"""
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    current_entries: int = 0
+    current_chars: int = 0
+
+
+class DecryptionCache:
+    """
+    Bounded in-memory LRU of decrypted column values
+
+    Entries are keyed by (row key, ciphertext hash) and bounded both by
+    count and by the total length of the cached plaintext. Nothing is
+    ever written to disk.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_chars: int = 8 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_chars = max_chars
+        self.stats = DecryptionCacheStats()
+        self.lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, bytes], str]" = OrderedDict()
+
+    @staticmethod
+    def _key(row_key: str, ciphertext: str) -> Tuple[str, bytes]:
+        digest = hashlib.blake2b(ciphertext.encode(), digest_size=16).digest()
+        return row_key, digest
+
+    def decrypt(
+        self, row_key: str, ciphertext: str, decrypt: Callable[[str], str]
+    ) -> str:
+        """
+        Get the plaintext of a column, decrypting it on a miss
+
+        Args:
+            row_key: Identifies the column of one row, e.g. "step_results.content:12"
+            ciphertext: Stored value
+            decrypt: Called with the ciphertext on a miss
+        """
+        key = self._key(row_key, ciphertext)
+        with self.lock:
+            plaintext = self._entries.get(key)
+            if plaintext is not None:
+                self._entries.move_to_end(key)
+                self.stats.hits += 1
+                return plaintext
+            self.stats.misses += 1
+
+        plaintext = decrypt(ciphertext)
+        self._put(key, plaintext)
+        return plaintext
+
+    def _put(self, key: Tuple[str, bytes], plaintext: str) -> None:
+        size = len(plaintext)
+        if size > self.max_chars:
+            return
+        with self.lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.stats.current_chars -= len(previous)
+            self._entries[key] = plaintext
+            self.stats.current_chars += size
+            while (
+                len(self._entries) > self.max_entries
+                or self.stats.current_chars > self.max_chars
+            ):
+                _, evicted = self._entries.popitem(last=False)
+                self.stats.current_chars -= len(evicted)
+                self.stats.evictions += 1
+            self.stats.current_entries = len(self._entries)
+
+    def clear(self) -> None:
+        """Drop every cached plaintext"""
+        with self.lock:
+            self._entries.clear()
+            self.stats.current_entries = 0
+            self.stats.current_chars = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics"""
+        with self.lock:
+            lookups = self.stats.hits + self.stats.misses
+            return {
+                "hits": self.stats.hits,
+                "misses": self.stats.misses,
+                "hit_rate": self.stats.hits / lookups if lookups else 0.0,
+                "evictions": self.stats.evictions,
+                "current_entries": self.stats.current_entries,
+                "current_chars": self.stats.current_chars,
+                "max_entries": self.max_entries,
+                "max_chars": self.max_chars,
+            }
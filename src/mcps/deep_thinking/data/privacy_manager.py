@@ -9,11 +9,11 @@ import os
 import shutil
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from cryptography.fernet import Fernet
 
-from .database import ThinkingDatabase
+from .database import DatabaseInUseError, ThinkingDatabase
 
 logger = logging.getLogger(__name__)
 
@@ -170,19 +170,14 @@ class PrivacyManager:
             db_path = self.data_directory / db_name
 
             # Generate or load encryption key
-            key_file = self.data_directory / f"{db_name}.key"
-
-            if key_file.exists():
-                with open(key_file, "rb") as f:
-                    encryption_key = f.read()
-            else:
-                encryption_key = Fernet.generate_key()
-                with open(key_file, "wb") as f:
-                    f.write(encryption_key)
-                # Restrict key file permissions
-                os.chmod(key_file, 0o600)
+            keys = self.load_encryption_keys(db_name)
+            if keys is None:
+                keys = (Fernet.generate_key(), [])
+                self._write_key_file(self.data_directory / f"{db_name}.key", keys[0])
 
-            db = ThinkingDatabase(str(db_path), encryption_key)
+            db = ThinkingDatabase(
+                str(db_path), keys[0], previous_encryption_keys=keys[1]
+            )
             logger.info(f"Created encrypted database: {db_path}")
             return db
 
@@ -190,6 +185,134 @@ class PrivacyManager:
             logger.error(f"Error creating encrypted database: {e}")
             raise
 
+    def load_encryption_keys(
+        self, db_name: str = "sessions.db"
+    ) -> Optional[Tuple[bytes, List[bytes]]]:
+        """
+        Keys to open an encrypted database with
+
+        While a key rotation is unfinished (<db>.key.next exists), rows are
+        under either key, so the next key is current and the old one is kept
+        readable.
+
+        Args:
+            db_name: Name of the database file
+
+        Returns:
+            The current key and the previous keys, or None if the database
+            has no key file
+        """
+        key_file = self.data_directory / f"{db_name}.key"
+        next_key_file = self.data_directory / f"{db_name}.key.next"
+        if not key_file.exists():
+            return None
+        with open(key_file, "rb") as f:
+            key = f.read()
+        if not next_key_file.exists():
+            return key, []
+        with open(next_key_file, "rb") as f:
+            return f.read(), [key]
+
+    def _write_key_file(self, key_file: Path, key: bytes) -> None:
+        with open(key_file, "wb") as f:
+            f.write(key)
+        # Restrict key file permissions
+        os.chmod(key_file, 0o600)
+
+    def rotate_encryption_key(
+        self,
+        db_name: str = "sessions.db",
+        batch_size: int = ThinkingDatabase.KEY_ROTATION_BATCH_SIZE,
+        database: Optional[ThinkingDatabase] = None,
+    ) -> Dict[str, Any]:
+        """
+        Re-encrypt an encrypted database under a newly generated key
+
+        The new key is saved as <db>.key.next before any row changes and
+        replaces <db>.key once every row is rotated, so an interrupted
+        rotation is resumed with the same key by running it again.
+
+        Without database the rotation is offline: the database is opened
+        exclusively and the rotation refused while another process, such as
+        a running server, has it open. A process serving the database passes
+        its instance instead (the server's rotate_encryption_key tool does),
+        which switches to the new key at once and reads both keys until the
+        rotation is done.
+
+        Args:
+            db_name: Name of the database file
+            batch_size: Rows re-encrypted per transaction
+            database: Open instance of the database to rotate online
+
+        Returns:
+            Rotation results
+        """
+        rotation_results = {
+            "rotation_successful": False,
+            "database": db_name,
+            "online": database is not None,
+            "rotation_timestamp": datetime.now().isoformat(),
+        }
+
+        db = None
+        try:
+            db_path = self.data_directory / db_name
+            key_file = self.data_directory / f"{db_name}.key"
+            next_key_file = self.data_directory / f"{db_name}.key.next"
+            if not db_path.exists() or not key_file.exists():
+                rotation_results["error"] = "No encrypted database found"
+                return rotation_results
+
+            with open(key_file, "rb") as f:
+                old_key = f.read()
+            new_key = None
+            if next_key_file.exists():
+                with open(next_key_file, "rb") as f:
+                    new_key = f.read()
+
+            if database is None:
+                db = ThinkingDatabase(str(db_path), old_key, exclusive=True)
+            elif database.encryption is None or database.encryption.key not in (
+                old_key,
+                new_key,
+            ):
+                rotation_results["error"] = (
+                    f"Database instance does not use the key in {key_file.name}"
+                )
+                return rotation_results
+
+            if new_key is not None:
+                rotation_results["resumed"] = True
+            else:
+                new_key = Fernet.generate_key()
+                self._write_key_file(next_key_file, new_key)
+
+            report = (db or database).rotate_encryption_key(new_key, batch_size)
+            os.replace(next_key_file, key_file)
+
+            rotation_results.update(report)
+            rotation_results["rotation_successful"] = True
+            rotation_results["message"] = (
+                f"Re-encrypted {report['values_rotated']} values "
+                f"in {report['rows_scanned']} rows"
+            )
+            return rotation_results
+
+        except DatabaseInUseError as e:
+            logger.error(f"Cannot rotate encryption key: {e}")
+            rotation_results["error"] = (
+                f"{e}; stop the server first, or call the server's "
+                "rotate_encryption_key tool"
+            )
+            return rotation_results
+        except Exception as e:
+            logger.error(f"Error rotating encryption key: {e}")
+            rotation_results["error"] = str(e)
+            return rotation_results
+        finally:
+            if db is not None:
+                db.shutdown()
+
     def complete_data_deletion(self) -> Dict[str, Any]:
         """
         Completely delete all user data
@@ -375,7 +498,11 @@ class PrivacyManager:
             return deletion_results
 
     def export_user_data(
-        self, export_path: str, include_encrypted: bool = False, anonymize: bool = False
+        self,
+        export_path: str,
+        include_encrypted: bool = False,
+        anonymize: bool = False,
+        archive: bool = False,
     ) -> Dict[str, Any]:
         """
         Export user data for portability
@@ -384,6 +511,8 @@ class PrivacyManager:
             export_path: Path to export data to
             include_encrypted: Whether to include encrypted data
             anonymize: Whether to anonymize personal information
+            archive: Export the database as a bulk session archive, which
+                ThinkingDatabase.import_archive can load (not anonymized)
 
         Returns:
             Export results
@@ -422,7 +551,34 @@ class PrivacyManager:
             # Export database if it exists
             db_path = self.data_directory / "sessions.db"
             if db_path.exists():
-                if include_encrypted:
+                if archive:
+                    # Rows stay encrypted; the archive records the key they need
+                    encryption_key = None
+                    key_file = self.data_directory / f"{db_path.name}.key"
+                    if key_file.exists():
+                        with open(key_file, "rb") as f:
+                            encryption_key = f.read()
+
+                    db = ThinkingDatabase(str(db_path), encryption_key)
+                    try:
+                        manifest = db.export_archive(
+                            str(export_dir / "sessions_archive")
+                        )
+                    finally:
+                        db.shutdown()
+                    if manifest is None:
+                        raise RuntimeError("Session archive export failed")
+
+                    archive_size = sum(
+                        chunk["bytes"]
+                        for table in manifest["tables"].values()
+                        for chunk in table["chunks"]
+                    )
+                    export_results["files_exported"].append(
+                        {"file": "sessions_archive", "size_bytes": archive_size}
+                    )
+                    export_results["total_size_exported"] += archive_size
+                elif include_encrypted:
                     # Copy the entire database
                     export_db_path = export_dir / "sessions.db"
                     shutil.copy2(db_path, export_db_path)
@@ -0,0 +1,273 @@
+"""
+Retention and compaction for the session database
+
+A RetentionEngine applies a RetentionPolicy to a ThinkingDatabase, either
+on demand (run_once) or from a background thread on a fixed interval:
+- Active sessions idle past the inactivity limit are marked abandoned
+- Completed sessions past the retention period are deleted, with their
+  steps, results and index entries following by cascade
+- Sessions with many incremental context entries are compacted
+- The WAL is checkpointed and free pages are returned to the file system
+  with incremental vacuum
+
+Session updates and deletes run in chunks of batch_size, each its own
+short transaction over the (status, updated_at) and (status, completed_at)
+indexes, with a pause between chunks so writers are not starved. Each run
+produces a RetentionReport with the rows and bytes it reclaimed.
+"""
+
+import logging
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RetentionPolicy:
+    """What the retention engine removes and how often it runs"""
+
+    completed_retention_days: Optional[float] = 30  # None keeps completed sessions
+    inactive_hours: Optional[float] = 24  # None never abandons sessions
+    batch_size: int = 200  # Sessions per transaction
+    batch_pause: float = 0.01  # Seconds between chunks, for waiting writers
+    compaction_min_entries: int = 64
+    checkpoint_mode: Optional[str] = "TRUNCATE"  # None skips checkpoints
+    vacuum_pages: int = 1000  # Pages freed per run; 0 skips incremental vacuum
+    interval: float = 3600.0  # Seconds between scheduled runs
+
+
+@dataclass
+class RetentionReport:
+    """Outcome of one retention run"""
+
+    started_at: datetime = field(default_factory=datetime.now)
+    duration_seconds: float = 0.0
+    sessions_abandoned: int = 0
+    sessions_deleted: int = 0
+    rows_deleted: int = 0  # Sessions plus their steps, results and sources
+    sessions_compacted: int = 0
+    wal_frames_checkpointed: int = 0
+    pages_vacuumed: int = 0
+    bytes_reclaimed: int = 0  # Shrinkage of the database and WAL files
+    errors: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        report = asdict(self)
+        report["started_at"] = self.started_at.isoformat()
+        return report
+
+
+class RetentionEngine:
+    """Applies a retention policy to a ThinkingDatabase"""
+
+    def __init__(
+        self,
+        database,
+        policy: Optional[RetentionPolicy] = None,
+        on_abandoned: Optional[Callable[[List[str]], None]] = None,
+    ):
+        self.database = database
+        self.policy = policy or RetentionPolicy()
+        # Called with each chunk of abandoned session IDs, e.g. to evict
+        # them from an in-memory cache
+        self.on_abandoned = on_abandoned
+        self.last_report: Optional[RetentionReport] = None
+        self.runs = 0
+
+        self._run_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def abandon_inactive(self, hours_inactive: float) -> List[str]:
+        """
+        Mark active sessions idle for hours_inactive as abandoned
+
+        Their incremental context entries are compacted and on_abandoned is
+        called for each chunk.
+
+        Returns:
+            IDs of the abandoned sessions
+        """
+        cutoff = datetime.now() - timedelta(hours=hours_inactive)
+        abandoned: List[str] = []
+        for chunk in self._chunks(self.database.abandon_inactive_sessions, cutoff):
+            for session_id in chunk:
+                self.database.compact_session_context(session_id)
+            if self.on_abandoned:
+                self.on_abandoned(chunk)
+            abandoned.extend(chunk)
+        return abandoned
+
+    def purge_completed(self, days_old: float) -> Tuple[int, int]:
+        """
+        Delete sessions completed more than days_old days ago
+
+        Returns:
+            Tuple of (sessions deleted, rows deleted including cascaded rows)
+        """
+        cutoff = datetime.now() - timedelta(days=days_old)
+        sessions = rows = 0
+        while True:
+            deleted, deleted_rows = self.database.purge_completed_sessions(
+                cutoff, limit=self.policy.batch_size
+            )
+            sessions += deleted
+            rows += deleted_rows
+            if deleted < self.policy.batch_size or self._pause():
+                return sessions, rows
+
+    def run_once(self) -> RetentionReport:
+        """Apply the policy once and report what was reclaimed"""
+        with self._run_lock:
+            report = RetentionReport()
+            start = time.monotonic()
+            policy = self.policy
+            before = self._storage_stats(report)
+
+            steps = [
+                ("abandon inactive sessions", self._abandon_step),
+                ("delete expired sessions", self._purge_step),
+                ("compact session contexts", self._compact_step),
+            ]
+            if policy.checkpoint_mode:
+                steps.append(("checkpoint WAL", self._checkpoint_step))
+            if policy.vacuum_pages > 0:
+                steps.append(("incremental vacuum", self._vacuum_step))
+
+            for name, step in steps:
+                if self._stop_event.is_set() and self._thread is not None:
+                    break
+                try:
+                    step(report)
+                except Exception as e:
+                    logger.error(f"Retention step '{name}' failed: {e}")
+                    report.errors.append(f"{name}: {e}")
+
+            after = self._storage_stats(report)
+            if before and after:
+                report.bytes_reclaimed = max(
+                    before["file_bytes"]
+                    + before["wal_bytes"]
+                    - after["file_bytes"]
+                    - after["wal_bytes"],
+                    0,
+                )
+
+            report.duration_seconds = time.monotonic() - start
+            self.last_report = report
+            self.runs += 1
+
+        if (
+            report.sessions_abandoned
+            or report.sessions_deleted
+            or report.bytes_reclaimed
+        ):
+            logger.info(
+                f"Retention run: {report.sessions_abandoned} abandoned, "
+                f"{report.sessions_deleted} deleted ({report.rows_deleted} rows), "
+                f"{report.bytes_reclaimed} bytes reclaimed"
+            )
+        return report
+
+    def _abandon_step(self, report: RetentionReport) -> None:
+        if self.policy.inactive_hours is not None:
+            abandoned = self.abandon_inactive(self.policy.inactive_hours)
+            report.sessions_abandoned = len(abandoned)
+
+    def _purge_step(self, report: RetentionReport) -> None:
+        if self.policy.completed_retention_days is not None:
+            report.sessions_deleted, report.rows_deleted = self.purge_completed(
+                self.policy.completed_retention_days
+            )
+
+    def _compact_step(self, report: RetentionReport) -> None:
+        report.sessions_compacted = self.database.compact_context_entries(
+            self.policy.compaction_min_entries
+        )
+
+    def _checkpoint_step(self, report: RetentionReport) -> None:
+        result = self.database.checkpoint_wal(self.policy.checkpoint_mode)
+        report.wal_frames_checkpointed = max(result["checkpointed_frames"], 0)
+
+    def _vacuum_step(self, report: RetentionReport) -> None:
+        report.pages_vacuumed = self.database.incremental_vacuum(
+            self.policy.vacuum_pages
+        )
+
+    def _chunks(self, operation, cutoff: datetime):
+        """Yield the non-empty chunks of a chunked operation, pausing between them"""
+        while True:
+            chunk = operation(cutoff, limit=self.policy.batch_size)
+            if chunk:
+                yield chunk
+            if len(chunk) < self.policy.batch_size or self._pause():
+                return
+
+    def _pause(self) -> bool:
+        """Wait between chunks; True if the engine is stopping"""
+        if self._thread is None:
+            if self.policy.batch_pause > 0:
+                time.sleep(self.policy.batch_pause)
+            return False
+        return self._stop_event.wait(self.policy.batch_pause)
+
+    def _storage_stats(self, report: RetentionReport) -> Optional[Dict[str, int]]:
+        try:
+            return self.database.get_storage_stats()
+        except Exception as e:
+            report.errors.append(f"storage stats: {e}")
+            return None
+
+    # Scheduling
+
+    def start(self) -> bool:
+        """
+        Run the policy every policy.interval seconds on a background thread
+
+        Returns:
+            False if the engine is already running
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return False
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run_loop, name="session-retention", daemon=True
+        )
+        self._thread.start()
+        logger.info(f"Retention engine started (every {self.policy.interval}s)")
+        return True
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop the background thread, finishing the current chunk"""
+        thread = self._thread
+        if thread is None:
+            return
+        self._stop_event.set()
+        if thread is not threading.current_thread():
+            thread.join(timeout)
+        self._thread = None
+        logger.info("Retention engine stopped")
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run_loop(self) -> None:
+        while not self._stop_event.wait(self.policy.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Retention run failed: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get the engine's state and its last report"""
+        return {
+            "running": self.running,
+            "runs": self.runs,
+            "policy": asdict(self.policy),
+            "last_report": self.last_report.to_dict() if self.last_report else None,
+        }
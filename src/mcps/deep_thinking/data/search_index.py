@@ -0,0 +1,368 @@
+"""
+Full-text Search Index for ThinkingDatabase
+
+SQLite FTS5 index over session topics, step results and evidence summaries:
+- search_documents maps each indexed text to its session and source row;
+  FTS rows share its id, so deleting a session removes its entries through
+  the foreign-key cascade and a trigger
+- Plaintext databases index the text with the trigram tokenizer, which
+  matches substrings in any script (including Chinese)
+- Chinese words are often one or two characters, shorter than a trigram,
+  so CJK runs are also indexed as bigrams in search_bigrams; other terms
+  under three characters are checked with a substring scan of the rows the
+  remaining terms match (of every row when the query has nothing else)
+- Encrypted databases can opt in to a blinded index that stores keyed
+  hashes of word/bigram tokens, so no plaintext reaches the index
+"""
+
+import hashlib
+import hmac
+import logging
+import re
+import sqlite3
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SEARCH_SOURCES = ("topic", "step_result", "evidence")
+
+# Latin words/numbers, or runs of CJK ideographs
+_TOKEN_RE = re.compile(r"[0-9a-z]+|[㐀-䶿一-鿿豈-﫿]+")
+# Terms shorter than this cannot use the trigram index
+_TRIGRAM_MIN = 3
+_CJK_RE = re.compile(r"[㐀-䶿一-鿿豈-﫿]+")
+
+
+def _is_cjk(text: str) -> bool:
+    return "㐀" <= text[0] <= "﫿"
+
+
+def tokenize_for_blinding(text: str) -> List[str]:
+    """
+    Split text into the tokens used by the blinded index
+
+    Latin words are kept whole; CJK runs become overlapping bigrams (a
+    single ideograph stays a unigram), so multi-character queries match
+    without a dictionary.
+    """
+    tokens = []
+    for match in _TOKEN_RE.finditer(text.lower()):
+        word = match.group()
+        if _is_cjk(word) and len(word) > 1:
+            tokens.extend(word[i : i + 2] for i in range(len(word) - 1))
+        else:
+            tokens.append(word)
+    return tokens
+
+
+def cjk_bigrams(text: str) -> List[str]:
+    """
+    Overlapping bigrams of each CJK run, plus the run's last character
+
+    Every character then starts some token, so a one-character query is a
+    prefix query and a two-character query an exact token match.
+    """
+    tokens = []
+    for match in _CJK_RE.finditer(text):
+        run = match.group()
+        tokens.extend(run[i : i + 2] for i in range(len(run) - 1))
+        tokens.append(run[-1])
+    return tokens
+
+
+def _quote(term: str) -> str:
+    """Quote a term as an FTS5 string literal"""
+    return '"' + term.replace('"', '""') + '"'
+
+
+class SearchIndex:
+    """
+    FTS5-backed search over sessions
+
+    Args:
+        blind_key: Key for blinded tokens; None indexes plaintext
+    """
+
+    def __init__(self, blind_key: Optional[bytes] = None):
+        self.blind_key = blind_key
+        self.tokenizer = "unicode61" if blind_key else "trigram"
+        # Whether short CJK terms are looked up in search_bigrams
+        self.bigrams = False
+
+    @property
+    def blinded(self) -> bool:
+        return self.blind_key is not None
+
+    def create(self, conn) -> bool:
+        """
+        Create the index tables if needed
+
+        Returns:
+            True if the index was newly created and needs a rebuild
+        """
+        tables = {
+            row[0]
+            for row in conn.execute(
+                "SELECT name FROM sqlite_master"
+                " WHERE name IN ('search_index', 'search_bigrams')"
+            )
+        }
+        existing = "search_index" in tables
+
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS search_documents (
+                id INTEGER PRIMARY KEY,
+                session_id TEXT NOT NULL,
+                source TEXT NOT NULL,       -- 'topic', 'step_result' or 'evidence'
+                ref_id INTEGER,             -- step_results.id / evidence_sources.id
+                FOREIGN KEY (session_id) REFERENCES thinking_sessions (id) ON DELETE CASCADE
+            )
+        """)
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_search_documents_session ON search_documents (session_id)"
+        )
+
+        if not existing:
+            try:
+                conn.execute(
+                    "CREATE VIRTUAL TABLE search_index USING fts5"
+                    f"(content, tokenize='{self.tokenizer}')"
+                )
+            except sqlite3.OperationalError:
+                if self.tokenizer != "trigram":
+                    raise
+                # SQLite before 3.34 has no trigram tokenizer
+                logger.warning("FTS5 trigram tokenizer unavailable, using unicode61")
+                self.tokenizer = "unicode61"
+                conn.execute(
+                    "CREATE VIRTUAL TABLE search_index USING fts5"
+                    "(content, tokenize='unicode61')"
+                )
+
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS search_documents_ad
+            AFTER DELETE ON search_documents BEGIN
+                DELETE FROM search_index WHERE rowid = old.id;
+            END
+        """)
+
+        # Indexes created before search_bigrams need a rebuild to fill it
+        missing_bigrams = False
+        self.bigrams = self.tokenizer == "trigram"
+        if self.bigrams:
+            missing_bigrams = "search_bigrams" not in tables
+            conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS search_bigrams USING fts5"
+                "(content, tokenize='unicode61')"
+            )
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS search_documents_ad_bigrams
+                AFTER DELETE ON search_documents BEGIN
+                    DELETE FROM search_bigrams WHERE rowid = old.id;
+                END
+            """)
+        return not existing or missing_bigrams
+
+    @staticmethod
+    def drop(conn) -> None:
+        """Drop the index tables; writes made without an index would leave it stale"""
+        conn.execute("DROP TABLE IF EXISTS search_documents")
+        conn.execute("DROP TABLE IF EXISTS search_index")
+        conn.execute("DROP TABLE IF EXISTS search_bigrams")
+
+    def _blind(self, token: str) -> str:
+        digest = hmac.new(self.blind_key, token.encode("utf-8"), hashlib.sha256)
+        return digest.hexdigest()[:16]
+
+    def _index_text(self, text: str) -> str:
+        if not self.blinded:
+            return text
+        return " ".join(self._blind(t) for t in tokenize_for_blinding(text))
+
+    def add(
+        self,
+        conn,
+        session_id: str,
+        source: str,
+        text: Optional[str],
+        ref_id: Optional[int] = None,
+    ) -> None:
+        """Index one text; runs in the caller's transaction"""
+        if not text:
+            return
+        cursor = conn.execute(
+            "INSERT INTO search_documents (session_id, source, ref_id) VALUES (?, ?, ?)",
+            (session_id, source, ref_id),
+        )
+        conn.execute(
+            "INSERT INTO search_index (rowid, content) VALUES (?, ?)",
+            (cursor.lastrowid, self._index_text(text)),
+        )
+        if self.bigrams:
+            bigrams = cjk_bigrams(text)
+            if bigrams:
+                conn.execute(
+                    "INSERT INTO search_bigrams (rowid, content) VALUES (?, ?)",
+                    (cursor.lastrowid, " ".join(bigrams)),
+                )
+
+    def remove(self, conn, session_id: str, source: str) -> None:
+        """Remove a session's documents from one source"""
+        conn.execute(
+            "DELETE FROM search_documents WHERE session_id = ? AND source = ?",
+            (session_id, source),
+        )
+
+    def clear(self, conn) -> None:
+        """Remove every indexed document"""
+        conn.execute("DELETE FROM search_documents")
+        conn.execute("DELETE FROM search_index")
+        if self.bigrams:
+            conn.execute("DELETE FROM search_bigrams")
+
+    def _build_query(
+        self, query: str
+    ) -> Tuple[Optional[str], Optional[str], List[str]]:
+        """
+        Translate a user query into FTS5 MATCH expressions
+
+        Returns:
+            (MATCH expression for search_index or None, MATCH expression for
+            search_bigrams or None, substring terms neither index can match)
+        """
+        if self.blinded:
+            tokens = dict.fromkeys(tokenize_for_blinding(query))
+            if not tokens:
+                return None, None, []
+            return " ".join(_quote(self._blind(t)) for t in tokens), None, []
+
+        match_terms, bigram_terms, substring_terms = [], [], []
+        for term in query.split():
+            if self.tokenizer != "trigram" or len(term) >= _TRIGRAM_MIN:
+                match_terms.append(_quote(term))
+            elif self.bigrams and _CJK_RE.fullmatch(term):
+                # One character: any bigram starting with it
+                bigram_terms.append(_quote(term) + (" *" if len(term) == 1 else ""))
+            else:
+                substring_terms.append(term)
+        return (
+            " ".join(match_terms) or None,
+            " ".join(bigram_terms) or None,
+            substring_terms,
+        )
+
+    def search(
+        self,
+        conn,
+        query: str,
+        sources: Optional[Iterable[str]] = None,
+        limit: int = 20,
+        offset: int = 0,
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        """
+        Find sessions matching every query term, best match first
+
+        Args:
+            conn: Database connection
+            query: Search text
+            sources: Restrict to these document sources
+            limit: Maximum sessions to return
+            offset: Sessions to skip, for pagination
+
+        Returns:
+            (total matching sessions, page of {session_id, score, source,
+            ref_id, snippet}); snippet is None for blinded indexes and
+            queries without indexable terms
+        """
+        match, bigram_match, substring_terms = self._build_query(query)
+        if match is None and bigram_match is None and not substring_terms:
+            return 0, []
+
+        where, params = [], []
+        if match is not None:
+            where.append("search_index MATCH ?")
+            params.append(match)
+        if bigram_match is not None:
+            where.append(
+                "rowid IN (SELECT rowid FROM search_bigrams"
+                " WHERE search_bigrams MATCH ?)"
+            )
+            params.append(bigram_match)
+        # Not LIKE: FTS5 hands LIKE to the trigram index, which finds
+        # nothing for patterns shorter than a trigram. Without a MATCH this
+        # scans every indexed row
+        for term in substring_terms:
+            where.append("instr(lower(content), ?) > 0")
+            params.append(term.lower())
+
+        # bm25() is negative; lower is better. Without MATCH there is no rank
+        score = "bm25(search_index)" if match is not None else "0.0"
+        # snippet() also needs a MATCH; callers build their own otherwise
+        snippet = (
+            "NULL"
+            if self.blinded or match is None
+            else "snippet(search_index, 0, '[', ']', '…', 16)"
+        )
+        source_filter = ""
+        source_params: List[str] = []
+        if sources:
+            source_params = list(sources)
+            source_filter = (
+                f"WHERE d.source IN ({', '.join('?' for _ in source_params)})"
+            )
+
+        # Auxiliary FTS functions cannot run under GROUP BY, so materialize
+        # the matches first
+        matches = f"""
+            WITH m AS MATERIALIZED (
+                SELECT rowid, {score} AS score, {snippet} AS snippet
+                FROM search_index WHERE {' AND '.join(where)}
+            )
+        """
+
+        total = conn.execute(
+            matches + f"""
+            SELECT COUNT(DISTINCT d.session_id)
+            FROM m JOIN search_documents d ON d.id = m.rowid {source_filter}
+        """,
+            params + source_params,
+        ).fetchone()[0]
+
+        cursor = conn.execute(
+            matches + f"""
+            SELECT d.session_id, MIN(m.score) AS best, d.source, d.ref_id, m.snippet
+            FROM m JOIN search_documents d ON d.id = m.rowid {source_filter}
+            GROUP BY d.session_id
+            ORDER BY best, d.session_id
+            LIMIT ? OFFSET ?
+        """,
+            params + source_params + [limit, offset],
+        )
+        results = [
+            {
+                "session_id": row[0],
+                "score": row[1],
+                "source": row[2],
+                "ref_id": row[3],
+                "snippet": row[4],
+            }
+            for row in cursor.fetchall()
+        ]
+        return total, results
+
+
+def make_snippet(text: str, query: str, width: int = 32) -> str:
+    """Plain-text snippet around the first query term found in text"""
+    lowered = text.lower()
+    position = -1
+    for term in query.lower().split():
+        position = lowered.find(term)
+        if position >= 0:
+            break
+    if position < 0:
+        position = 0
+    start = max(position - width, 0)
+    end = min(position + width * 2, len(text))
+    return (
+        ("…" if start > 0 else "") + text[start:end] + ("…" if end < len(text) else "")
+    )
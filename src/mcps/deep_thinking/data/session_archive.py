@@ -0,0 +1,325 @@
+"""
+Bulk Session Archives for ThinkingDatabase
+
+Moves whole databases between machines without going through per-session
+Python objects:
+- An archive is a directory with manifest.json and gzip-compressed JSONL
+  chunks, one row per line as a JSON array in the manifest's column order
+- Rows are copied as stored, so encrypted columns stay encrypted and nothing
+  is decrypted; the manifest records a fingerprint of the key they need
+- Export streams each table through one cursor inside a read transaction and
+  compresses rows in batches as they are read; import decompresses chunks
+  incrementally, inserts with executemany and verifies checksums, so memory
+  stays bounded by the batch size rather than the chunk size
+- Importing into a non-empty database skips sessions that already exist and
+  shifts integer ids past the existing ones, so rows never collide
+"""
+
+import hashlib
+import hmac
+import json
+import logging
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FORMAT = "deep-thinking-archive"
+ARCHIVE_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+# Rows encoded and compressed, or decoded and inserted, at a time
+BATCH_ROWS = 1000
+_READ_BYTES = 1 << 20
+# zlib window bits selecting the gzip container
+_GZIP_WBITS = 31
+
+# Parents before children, so foreign keys hold while importing
+ARCHIVE_TABLES = (
+    "thinking_sessions",
+    "session_steps",
+    "step_results",
+    "evidence_sources",
+    "session_context_entries",
+    "flow_state_history",
+)
+# Keyed by (flow_id, seq) rather than an id; rows already present are kept
+_NATURAL_KEY_TABLES = ("flow_state_history",)
+# Integer primary keys shifted on import, and the columns referring to them
+_ID_TABLES = ("session_steps", "step_results", "evidence_sources")
+_STEP_REFERENCES = {"step_results": "step_id", "evidence_sources": "step_id"}
+
+
+class ArchiveError(Exception):
+    """Raised for unreadable, corrupt or incompatible archives"""
+
+
+def key_fingerprint(key: Optional[bytes]) -> Optional[str]:
+    """Identify an encryption key without revealing it"""
+    if key is None:
+        return None
+    return hmac.new(key, b"deep-thinking-archive", hashlib.sha256).hexdigest()[:16]
+
+
+def _table_columns(conn, table: str) -> List[str]:
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})").fetchall()]
+
+
+def export_archive(
+    conn,
+    archive_path: str,
+    encryption_key: Optional[bytes] = None,
+    chunk_rows: int = 50000,
+    compression_level: int = 1,
+) -> Dict[str, Any]:
+    """
+    Write every archived table to an archive directory
+
+    Args:
+        conn: Database connection
+        archive_path: Directory to create; must not hold an archive already
+        encryption_key: Key the stored data is encrypted with, if any
+        chunk_rows: Rows per chunk file
+        compression_level: gzip level; low levels favour throughput
+
+    Returns:
+        The manifest
+    """
+    archive_dir = Path(archive_path)
+    if (archive_dir / MANIFEST_NAME).exists():
+        raise ArchiveError(f"Archive already exists: {archive_dir}")
+    archive_dir.mkdir(parents=True, exist_ok=True)
+
+    manifest: Dict[str, Any] = {
+        "format": ARCHIVE_FORMAT,
+        "version": ARCHIVE_VERSION,
+        "created_at": datetime.now().isoformat(),
+        "encrypted": encryption_key is not None,
+        "key_fingerprint": key_fingerprint(encryption_key),
+        "tables": {},
+    }
+
+    # One read transaction, so all tables come from the same snapshot
+    started = not getattr(conn, "in_transaction", True)
+    if started:
+        conn.execute("BEGIN")
+    try:
+        for table in ARCHIVE_TABLES:
+            columns = _table_columns(conn, table)
+            cursor = conn.execute(f"SELECT {', '.join(columns)} FROM {table}")
+            chunks = []
+            while True:
+                chunk = _write_chunk(
+                    archive_dir,
+                    f"{table}-{len(chunks):05d}.jsonl.gz",
+                    cursor,
+                    chunk_rows,
+                    compression_level,
+                )
+                if chunk is None:
+                    break
+                chunks.append(chunk)
+            manifest["tables"][table] = {
+                "columns": columns,
+                "rows": sum(chunk["rows"] for chunk in chunks),
+                "chunks": chunks,
+            }
+    finally:
+        if started:
+            conn.rollback()
+
+    # Written last: an archive without a manifest is incomplete
+    with open(archive_dir / MANIFEST_NAME, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    logger.info(
+        f"Exported archive to {archive_dir}: "
+        + ", ".join(f"{t} {m['rows']}" for t, m in manifest["tables"].items())
+    )
+    return manifest
+
+
+def _write_chunk(
+    archive_dir: Path, name: str, cursor, chunk_rows: int, compression_level: int
+) -> Optional[Dict[str, Any]]:
+    """Write the cursor's next chunk_rows rows; None once it is exhausted"""
+    compressor = zlib.compressobj(compression_level, zlib.DEFLATED, _GZIP_WBITS)
+    digest = hashlib.sha256()
+    written = size = 0
+    path = archive_dir / name
+    with open(path, "wb") as f:
+        while written < chunk_rows:
+            rows = cursor.fetchmany(min(BATCH_ROWS, chunk_rows - written))
+            if not rows:
+                break
+            payload = "".join(
+                json.dumps(tuple(row), ensure_ascii=False, separators=(",", ":")) + "\n"
+                for row in rows
+            ).encode("utf-8")
+            written += len(rows)
+            data = compressor.compress(payload)
+            if data:
+                f.write(data)
+                digest.update(data)
+                size += len(data)
+        data = compressor.flush()
+        f.write(data)
+        digest.update(data)
+        size += len(data)
+
+    if not written:
+        path.unlink()
+        return None
+    return {
+        "file": name,
+        "rows": written,
+        "bytes": size,
+        "sha256": digest.hexdigest(),
+    }
+
+
+def read_manifest(archive_path: str) -> Dict[str, Any]:
+    """Load and check an archive manifest"""
+    manifest_file = Path(archive_path) / MANIFEST_NAME
+    try:
+        with open(manifest_file, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ArchiveError(f"Cannot read archive manifest {manifest_file}: {e}") from e
+
+    if manifest.get("format") != ARCHIVE_FORMAT:
+        raise ArchiveError(f"Not a session archive: {archive_path}")
+    if manifest.get("version", 0) > ARCHIVE_VERSION:
+        raise ArchiveError(
+            f"Archive version {manifest['version']} is newer than supported "
+            f"version {ARCHIVE_VERSION}"
+        )
+    return manifest
+
+
+def _read_chunk(archive_dir: Path, chunk: Dict[str, Any]) -> Iterator[List[List[Any]]]:
+    """
+    Yield a chunk's rows in batches, checking its checksum and row count
+
+    The checks run after the last batch, so callers must undo what they did
+    with earlier batches if ArchiveError is raised.
+    """
+    decompressor = zlib.decompressobj(_GZIP_WBITS)
+    digest = hashlib.sha256()
+    pending = b""
+    count = 0
+    with open(archive_dir / chunk["file"], "rb") as f:
+        block = b""
+        while True:
+            if not block:
+                block = f.read(_READ_BYTES)
+                if not block:
+                    break
+                digest.update(block)
+            try:
+                # Bounded output: chunks of repetitive rows compress very well
+                pending += decompressor.decompress(block, _READ_BYTES)
+            except zlib.error as e:
+                raise ArchiveError(f"Corrupt chunk {chunk['file']}: {e}") from e
+            block = decompressor.unconsumed_tail
+            lines = pending.split(b"\n")
+            pending = lines.pop()
+            for start in range(0, len(lines), BATCH_ROWS):
+                try:
+                    batch = [
+                        json.loads(line) for line in lines[start : start + BATCH_ROWS]
+                    ]
+                except ValueError as e:
+                    raise ArchiveError(f"Corrupt chunk {chunk['file']}: {e}") from e
+                count += len(batch)
+                yield batch
+
+    if digest.hexdigest() != chunk["sha256"]:
+        raise ArchiveError(f"Checksum mismatch in {chunk['file']}")
+    if pending or not decompressor.eof or count != chunk["rows"]:
+        raise ArchiveError(f"Row count mismatch in {chunk['file']}")
+
+
+def import_archive(
+    conn, archive_path: str, encryption_key: Optional[bytes] = None
+) -> Dict[str, Any]:
+    """
+    Insert an archive's rows into the database in one transaction
+
+    Args:
+        conn: Database connection
+        archive_path: Archive directory
+        encryption_key: Key of the target database, if any
+
+    Returns:
+        Rows imported per table and the ids of sessions skipped because
+        they already exist
+    """
+    archive_dir = Path(archive_path)
+    manifest = read_manifest(archive_path)
+    if manifest.get("key_fingerprint") != key_fingerprint(encryption_key):
+        raise ArchiveError(
+            "Archive was written with a different encryption key "
+            "(or encryption setting) than this database"
+        )
+
+    existing = {
+        row[0] for row in conn.execute("SELECT id FROM thinking_sessions").fetchall()
+    }
+    offsets = {
+        table: conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0]
+        for table in _ID_TABLES
+    }
+
+    imported: Dict[str, int] = {}
+    skipped = set()
+    try:
+        for table in ARCHIVE_TABLES:
+            meta = manifest["tables"].get(table)
+            if not meta:
+                continue
+            # Columns the target schema lacks are dropped
+            target_columns = _table_columns(conn, table)
+            columns = [c for c in meta["columns"] if c in target_columns]
+            positions = [meta["columns"].index(c) for c in columns]
+            session_pos = columns.index(
+                "id" if table == "thinking_sessions" else "session_id"
+            )
+            id_pos = columns.index("id") if table in offsets else None
+            step_column = _STEP_REFERENCES.get(table)
+            step_pos = columns.index(step_column) if step_column else None
+
+            verb = "INSERT OR IGNORE" if table in _NATURAL_KEY_TABLES else "INSERT"
+            insert = (
+                f"{verb} INTO {table} ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' for _ in columns)})"
+            )
+            count = 0
+            for chunk in meta["chunks"]:
+                for raw_rows in _read_chunk(archive_dir, chunk):
+                    batch = []
+                    for raw in raw_rows:
+                        row = [raw[i] for i in positions]
+                        if row[session_pos] in existing:
+                            skipped.add(row[session_pos])
+                            continue
+                        if id_pos is not None:
+                            row[id_pos] += offsets[table]
+                        if step_pos is not None and row[step_pos] is not None:
+                            row[step_pos] += offsets["session_steps"]
+                        batch.append(row)
+                    conn.executemany(insert, batch)
+                    count += len(batch)
+            imported[table] = count
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+    logger.info(
+        f"Imported archive {archive_dir}: "
+        + ", ".join(f"{t} {n}" for t, n in imported.items())
+        + (f"; skipped {len(skipped)} existing sessions" if skipped else "")
+    )
+    return {"imported": imported, "skipped_sessions": sorted(skipped)}
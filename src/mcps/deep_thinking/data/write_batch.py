@@ -0,0 +1,192 @@
+"""
+Write Batching for ThinkingDatabase
+
+Groups the many small commits issued while handling one tool call into a
+single SQLite transaction:
+- One connection is pinned to the thread for the whole batch
+- The transaction, and with it the write lock, starts at the first write
+  statement (or explicit BEGIN); until then reads run in autocommit, so a
+  batch that only reads never blocks other writers
+- Each inner ``with get_connection()`` block that writes runs in a savepoint,
+  so its own commit()/rollback() keep their meaning without ending the batch
+- The batch commits once at the end, or early when a size/time threshold is hit
+"""
+
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, List
+
+logger = logging.getLogger(__name__)
+
+DURABILITY_LEVELS = {"normal": "NORMAL", "full": "FULL"}
+
+# Statements that do not need the write lock; anything else starts the
+# batch transaction
+_READ_PREFIXES = ("SELECT", "EXPLAIN", "PRAGMA")
+
+
+def _is_write(query: str) -> bool:
+    return not query.lstrip().upper().startswith(_READ_PREFIXES)
+
+
+@dataclass
+class WriteBatchStats:
+    """Write batching statistics"""
+
+    batches: int = 0
+    commits_requested: int = 0
+    commits_performed: int = 0
+    threshold_flushes: int = 0
+    rollbacks: int = 0
+
+
+class BatchConnection:
+    """
+    Connection handed out by get_connection() while a write batch is open
+
+    commit() and rollback() apply to the block's savepoint; the surrounding
+    transaction is committed by the owning WriteBatch. The savepoint is only
+    opened once the block writes.
+    """
+
+    def __init__(self, batch: "WriteBatch", savepoint: str):
+        self._batch = batch
+        self._conn = batch.conn
+        self._savepoint = savepoint
+        self.open = False
+
+    def open_savepoint(self):
+        self._conn.execute(f"SAVEPOINT {self._savepoint}")
+        self.open = True
+
+    def execute(self, query: str, params=()):
+        if query.lstrip().upper().startswith("BEGIN"):
+            # The block wants the write lock before it reads; the batch
+            # transaction provides it
+            self._batch.begin_writes()
+            return None
+        if _is_write(query):
+            self._batch.begin_writes()
+        return self._conn.execute(query, params)
+
+    def executemany(self, query: str, params_list: List[Any]):
+        self._batch.begin_writes()
+        return self._conn.executemany(query, params_list)
+
+    def commit(self):
+        if not self.open:
+            return  # Nothing written since the block started or last committed
+        self._conn.execute(f"RELEASE {self._savepoint}")
+        self.open = False
+        self._batch.note_commit()
+
+    def rollback(self):
+        if self.open:
+            self._conn.execute(f"ROLLBACK TO {self._savepoint}")
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class WriteBatch:
+    """
+    Single-transaction write batch owned by one thread
+
+    Args:
+        conn: Connection pinned for the lifetime of the batch
+        max_writes: Commit early once this many inner commits are pending
+        max_delay: Commit early once the oldest pending commit is this old (s)
+        stats: Shared statistics to update
+        lock: Lock guarding the shared statistics
+    """
+
+    def __init__(
+        self,
+        conn,
+        max_writes: int,
+        max_delay: float,
+        stats: WriteBatchStats,
+        lock: threading.RLock,
+    ):
+        self.conn = conn
+        self.max_writes = max_writes
+        self.max_delay = max_delay
+        self.stats = stats
+        self.lock = lock
+        self.blocks: List[BatchConnection] = []  # Open blocks, outermost first
+        self.pending = 0
+        self.started_at = 0.0
+        self.active = False
+
+    @property
+    def depth(self) -> int:
+        return len(self.blocks)
+
+    def begin_writes(self):
+        """Start the transaction if needed and open the blocks' savepoints"""
+        if not self.active:
+            # IMMEDIATE takes the write lock now, so read-then-write blocks
+            # that asked for it with BEGIN cannot lose a race to another writer
+            self.conn.execute("BEGIN IMMEDIATE")
+            self.active = True
+            self.pending = 0
+            self.started_at = time.perf_counter()
+        for block in self.blocks:
+            if not block.open:
+                block.open_savepoint()
+
+    def _commit(self):
+        self.conn.commit()
+        self.active = False
+        with self.lock:
+            self.stats.commits_performed += 1
+
+    def enter(self) -> BatchConnection:
+        """Start an inner get_connection() block"""
+        block = BatchConnection(self, f"write_batch_{self.depth + 1}")
+        if self.active:
+            block.open_savepoint()
+        self.blocks.append(block)
+        return block
+
+    def leave(self, connection: BatchConnection, failed: bool):
+        """Close an inner block's savepoint, discarding it if the block failed"""
+        try:
+            if connection.open:
+                if failed:
+                    self.conn.execute(f"ROLLBACK TO {connection._savepoint}")
+                self.conn.execute(f"RELEASE {connection._savepoint}")
+                connection.open = False
+        finally:
+            self.blocks.pop()
+
+    def note_commit(self):
+        """Record an inner commit and flush if a threshold was reached"""
+        self.pending += 1
+        with self.lock:
+            self.stats.commits_requested += 1
+
+        # Savepoints of enclosing blocks would be lost by a real commit
+        if any(block.open for block in self.blocks):
+            return
+        if (
+            self.pending >= self.max_writes
+            or time.perf_counter() - self.started_at >= self.max_delay
+        ):
+            self._commit()
+            with self.lock:
+                self.stats.threshold_flushes += 1
+
+    def finish(self):
+        """Commit everything the batch's blocks committed"""
+        if not self.active:
+            return
+        try:
+            self._commit()
+        except Exception:
+            self.conn.rollback()
+            with self.lock:
+                self.stats.rollbacks += 1
+            raise
@@ -0,0 +1,245 @@
+"""
+Compiled flow definitions
+
+Flow definitions are compiled once, when they are registered, into immutable
+objects that answer the questions asked on every next_step call:
+- An alias map resolves a step id, a step name or a legacy step alias to
+  the step's position
+- Steps are kept in execution order (see topological_order), with the
+  successor and dependency of every step precomputed
+- for_each references are split into source step and property up front
+- The step info handed to the MCP tools is built once per step; callers
+  receive a shallow copy they may modify
+- Conditions and repeat_until gates are compiled into expressions (see
+  flow_expressions), so checking them costs no parsing
+"""
+
+import logging
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Dict, FrozenSet, List, Mapping, Optional, Tuple
+
+from ..config.exceptions import ExpressionError, FlowConfigurationError
+from ..config.flow_expressions import (
+    Expression,
+    compile_conditions,
+    compile_expression,
+)
+from ..config.yaml_flow_parser import topological_order, yaml_flow_parser
+from ..models.thinking_models import ThinkingFlow
+
+logger = logging.getLogger(__name__)
+
+# Step names used by the MCP tools for steps of the built-in flows
+STEP_ALIASES = {
+    "decompose_problem": "decompose",
+    "critical_evaluation": "evaluate",
+}
+
+
+@dataclass(frozen=True)
+class CompiledStep:
+    """A flow step with everything next_step needs precomputed"""
+
+    position: int  # Index in execution order
+    step_id: str
+    step_name: str
+    step_type: str
+    template_name: str
+    dependencies: FrozenSet[str]
+    for_each: Optional[str]
+    for_each_source: Optional[str]  # "decompose" in "decompose.sub_questions"
+    for_each_property: Optional[str]  # "sub_questions"
+    advance_info: Mapping[str, Any]  # Step info when the flow moves to this step
+    continue_info: Mapping[str, Any]  # Step info for another for_each iteration
+    condition: Optional[Expression] = None  # All step conditions, combined
+    repeat_until: Optional[Expression] = None
+
+    def should_run(self, context: Dict[str, Any]) -> bool:
+        """Whether the step's conditions hold for the step results so far"""
+        return self.condition is None or self.condition.test(context)
+
+    def should_repeat(self, context: Dict[str, Any]) -> bool:
+        """Whether a step with repeat_until has to run again"""
+        return self.repeat_until is not None and not self.repeat_until.test(context)
+
+
+@dataclass(frozen=True)
+class CompiledFlow:
+    """A flow definition compiled for constant-time step resolution"""
+
+    name: str
+    description: str
+    definition: Dict[str, Any]  # The definition this flow was compiled from
+    steps: Tuple[CompiledStep, ...]  # In execution order
+    successors: Tuple[Optional[CompiledStep], ...]  # By position
+    dependencies: Mapping[str, FrozenSet[str]]  # Step id -> step ids it needs
+    aliases: Mapping[str, int]  # Step id, name or alias -> position
+
+    def find_step(self, step: str) -> Optional[CompiledStep]:
+        """Resolve a step id, step name or alias"""
+        position = self.aliases.get(step)
+        return None if position is None else self.steps[position]
+
+    def next_step(self, step: CompiledStep) -> Optional[CompiledStep]:
+        """The step that follows a step, or None at the end of the flow"""
+        return self.successors[step.position]
+
+
+def _reference_source(reference: str) -> Optional[str]:
+    """Step referred to by a "step.property" reference"""
+    match = yaml_flow_parser.reference_pattern.match(reference)
+    return match.group(1) if match else None
+
+
+def compile_flow(flow_name: str, definition: Dict[str, Any]) -> CompiledFlow:
+    """
+    Compile a flow definition in FlowManager's format
+
+    Args:
+        flow_name: Flow name
+        definition: Definition with a "steps" list of step dicts
+
+    Returns:
+        CompiledFlow: Compiled flow
+
+    Raises:
+        FlowConfigurationError: If steps are missing, duplicated or cyclic, or
+            a condition is invalid
+    """
+    step_defs = definition.get("steps")
+    if not isinstance(step_defs, list) or not step_defs:
+        raise FlowConfigurationError(f"Flow '{flow_name}' has no steps")
+
+    by_id: Dict[str, Dict[str, Any]] = {}
+    for step_def in step_defs:
+        step_id = step_def["step_id"]
+        if step_id in by_id:
+            raise FlowConfigurationError(
+                f"Duplicate step '{step_id}' in flow '{flow_name}'"
+            )
+        by_id[step_id] = step_def
+
+    # Explicit dependencies plus the steps referenced by for_each and conditions
+    graph = {}
+    for step_id, step_def in by_id.items():
+        references = [step_def.get("for_each") or ""]
+        references.extend(step_def.get("conditions") or {})
+        dependencies = set(step_def.get("dependencies", []))
+        dependencies.update(filter(None, map(_reference_source, references)))
+        unknown = dependencies - by_id.keys()
+        if unknown:
+            logger.warning(
+                f"Step '{step_id}' in flow '{flow_name}' depends on unknown "
+                f"steps {sorted(unknown)}"
+            )
+        graph[step_id] = dependencies - unknown
+
+    order = topological_order(flow_name, list(by_id), graph)
+
+    steps: List[CompiledStep] = []
+    for position, step_id in enumerate(order):
+        step_def = by_id[step_id]
+        step_name = step_def.get("step_name", step_id)
+        template_name = step_def.get("template_name", step_id)
+        for_each = step_def.get("for_each")
+        source, _, prop = (for_each or "").partition(".")
+        if for_each and not prop:
+            logger.warning(f"Invalid for_each reference: {for_each}")
+        try:
+            condition = compile_conditions(step_def.get("conditions") or {})
+            repeat_until = step_def.get("repeat_until")
+            repeat_until = compile_expression(repeat_until) if repeat_until else None
+        except ExpressionError as e:
+            raise FlowConfigurationError(
+                f"Step '{step_id}' in flow '{flow_name}' has an invalid condition: {e}"
+            ) from e
+
+        steps.append(
+            CompiledStep(
+                position=position,
+                step_id=step_id,
+                step_name=step_name,
+                step_type=step_def.get("step_type", "unknown"),
+                template_name=template_name,
+                dependencies=frozenset(graph[step_id]),
+                for_each=for_each,
+                for_each_source=source if prop else None,
+                for_each_property=prop or None,
+                advance_info=MappingProxyType(
+                    {
+                        "step_name": step_id,
+                        "template_name": template_name,
+                        "instructions": f"Execute {step_name} step",
+                    }
+                ),
+                continue_info=MappingProxyType(
+                    {
+                        "step_name": step_id,
+                        "template_name": template_name,
+                        "instructions": f"Continue {step_name} step for next sub-question",
+                        "for_each_continuation": True,
+                    }
+                ),
+                condition=condition,
+                repeat_until=repeat_until,
+            )
+        )
+
+    # Earlier declared steps win when an id, name or alias is ambiguous
+    positions = {step.step_id: step.position for step in steps}
+    aliases: Dict[str, int] = {}
+    for step_id, step_def in by_id.items():
+        names = [step_id, step_def.get("step_name", step_id)]
+        names.extend(
+            alias for alias, target in STEP_ALIASES.items() if target == step_id
+        )
+        for name in names:
+            aliases.setdefault(name, positions[step_id])
+
+    return CompiledFlow(
+        name=definition.get("name", flow_name),
+        description=definition.get("description", ""),
+        definition=definition,
+        steps=tuple(steps),
+        successors=tuple(steps[1:]) + (None,),
+        dependencies=MappingProxyType(
+            {step.step_id: step.dependencies for step in steps}
+        ),
+        aliases=MappingProxyType(aliases),
+    )
+
+
+def compile_thinking_flow(flow: ThinkingFlow) -> CompiledFlow:
+    """
+    Compile a flow parsed by YAMLFlowParser
+
+    Steps use their agent type as step type and their configured
+    template_name, or their step id, as template.
+
+    Args:
+        flow: Parsed flow configuration
+
+    Returns:
+        CompiledFlow: Compiled flow, with a FlowManager definition
+    """
+    definition = {
+        "name": flow.name,
+        "description": flow.description or "",
+        "steps": [
+            {
+                "step_id": step.step_id,
+                "step_name": step.step_name,
+                "step_type": step.agent_type,
+                "template_name": step.config.get("template_name", step.step_id),
+                "description": step.description or "",
+                "config": step.config,
+                "dependencies": list(step.dependencies),
+                "for_each": step.for_each,
+                "conditions": step.conditions,
+                "repeat_until": step.repeat_until,
+            }
+            for step in flow.steps
+        ],
+    }
+    return compile_flow(flow.name, definition)
@@ -0,0 +1,514 @@
+"""
+Flow state history
+
+Each flow's transitions are held in a FlowHistoryBuffer, a ring of compact
+columns: state and event codes in 16-bit arrays, monotonic timestamps and
+durations in double arrays, plus the metadata dicts. A map from each state
+to when it was last entered gives the time spent in the state being left
+without scanning the history.
+
+FlowStateHistory owns the buffers. With a database, transitions are
+appended to the flow_state_history table in batches, buffers of finished
+flows are dropped once flushed, and reads page from disk. Without one, the
+rings are the only copy and keep the most recent transitions of each flow;
+beyond max_flows, finished flows are dropped first.
+"""
+
+import logging
+import math
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# State and event names are stored as two-byte codes
+_NAMES: List[str] = []
+_CODES: Dict[str, int] = {}
+_CODES_LOCK = threading.Lock()
+
+
+def _code(name: str) -> int:
+    code = _CODES.get(name)
+    if code is None:
+        with _CODES_LOCK:
+            code = _CODES.get(name)
+            if code is None:
+                code = len(_NAMES)
+                _NAMES.append(name)
+                _CODES[name] = code
+    return code
+
+
+class FlowHistoryBuffer:
+    """Ring buffer of one flow's most recent state transitions"""
+
+    def __init__(self, flow_id: str, session_id: Optional[str], capacity: int):
+        self.flow_id = flow_id
+        self.session_id = session_id
+        self.capacity = capacity
+        # Columns grow to capacity, then slots are reused
+        self.from_codes = array("H")
+        self.to_codes = array("H")
+        self.event_codes = array("H")
+        self.times = array("d")  # time.monotonic() of each transition
+        self.durations = array("d")  # NaN when not known
+        self.metadata: List[Optional[Dict[str, Any]]] = []
+
+        self.next_seq = 0  # seq of the next transition
+        self.first_seq = 0  # oldest seq still held
+        self.flushed_seq = 0  # transitions before this are on disk
+        self.base_seq = 0  # seq stored in slot 0
+        self.finished = False  # Set by FlowStateHistory.finish()
+        self.state_counts: Dict[int, int] = {}  # transitions into each state
+        self.last_entered: Dict[int, float] = {}  # monotonic time per state
+
+        # Monotonic times are converted to wall-clock through this anchor
+        self._wall_anchor = time.time()
+        self._mono_anchor = time.monotonic()
+
+    def __len__(self) -> int:
+        return self.next_seq - self.first_seq
+
+    @property
+    def unflushed(self) -> int:
+        return self.next_seq - self.flushed_seq
+
+    def slot(self, seq: int) -> int:
+        return (seq - self.base_seq) % self.capacity
+
+    def _to_wall(self, mono: float) -> float:
+        return self._wall_anchor + (mono - self._mono_anchor)
+
+    def _to_mono(self, wall: float) -> float:
+        return self._mono_anchor + (wall - self._wall_anchor)
+
+    def append(
+        self,
+        from_state: str,
+        to_state: str,
+        event: str,
+        metadata: Optional[Dict[str, Any]] = None,
+        timestamp: Optional[float] = None,
+    ) -> int:
+        """
+        Record a transition
+
+        Args:
+            timestamp: Wall-clock time of a past transition being reloaded;
+                None for one happening now
+
+        Returns:
+            seq of the transition
+        """
+        now = time.monotonic() if timestamp is None else self._to_mono(timestamp)
+        from_code, to_code = _code(from_state), _code(to_state)
+
+        duration = math.nan
+        if from_code != to_code:
+            entered = self.last_entered.get(from_code)
+            if entered is not None:
+                duration = now - entered
+
+        seq = self.next_seq
+        values = (from_code, to_code, _code(event), now, duration, metadata or None)
+        columns = (
+            self.from_codes,
+            self.to_codes,
+            self.event_codes,
+            self.times,
+            self.durations,
+            self.metadata,
+        )
+        if len(self.times) < self.capacity:
+            for column, value in zip(columns, values):
+                column.append(value)
+        else:
+            slot = self.slot(seq)
+            for column, value in zip(columns, values):
+                column[slot] = value
+
+        self.last_entered[to_code] = now
+        self.state_counts[to_code] = self.state_counts.get(to_code, 0) + 1
+        self.next_seq += 1
+        self.first_seq = max(self.first_seq, self.next_seq - self.capacity)
+        return seq
+
+    def seed(self, marks: Dict[str, Any]) -> None:
+        """Continue from transitions already stored (see get_flow_history_marks)"""
+        self.next_seq = self.first_seq = self.flushed_seq = marks["next_seq"]
+        self.base_seq = self.next_seq
+        self.state_counts = {
+            _code(state): count for state, count in marks["state_counts"].items()
+        }
+        for state, timestamp in marks["last_entered"].items():
+            try:
+                wall = datetime.fromisoformat(timestamp).timestamp()
+            except (TypeError, ValueError):
+                continue
+            self.last_entered[_code(state)] = self._to_mono(wall)
+
+    def entry(self, seq: int) -> Dict[str, Any]:
+        """A held transition in the history entry format"""
+        slot = self.slot(seq)
+        entry = {
+            "timestamp": datetime.fromtimestamp(
+                self._to_wall(self.times[slot])
+            ).isoformat(),
+            "from_state": _NAMES[self.from_codes[slot]],
+            "to_state": _NAMES[self.to_codes[slot]],
+            "event": _NAMES[self.event_codes[slot]],
+            "metadata": dict(self.metadata[slot] or {}),
+            "transition_id": f"{self.flow_id}_{seq}",
+        }
+        duration = self.durations[slot]
+        if not math.isnan(duration):
+            entry["duration_seconds"] = duration
+        return entry
+
+    def entries(self, start_seq: int = 0) -> List[Dict[str, Any]]:
+        """Held transitions from start_seq on, oldest first"""
+        return [
+            self.entry(seq)
+            for seq in range(max(start_seq, self.first_seq), self.next_seq)
+        ]
+
+    def rows(self, start_seq: int) -> List[Dict[str, Any]]:
+        """Held transitions from start_seq on, as flow_state_history rows"""
+        rows = []
+        for seq in range(max(start_seq, self.first_seq), self.next_seq):
+            row = self.entry(seq)
+            row.update(flow_id=self.flow_id, seq=seq, session_id=self.session_id)
+            rows.append(row)
+        return rows
+
+    @property
+    def last_activity(self) -> Optional[float]:
+        """Wall-clock time of the latest transition held"""
+        if not len(self):
+            return None
+        return self._to_wall(self.times[self.slot(self.next_seq - 1)])
+
+
+class FlowStateHistory:
+    """
+    State transition history of every flow
+
+    Args:
+        db: ThinkingDatabase to persist transitions to, if any
+        capacity: Transitions held in memory per flow
+        flush_batch: Unwritten transitions that trigger a write to the database
+        max_flows: Flows held in memory; the least recently active are
+            dropped (after flushing) beyond this, finished ones first when
+            there is no database
+    """
+
+    def __init__(
+        self,
+        db=None,
+        capacity: int = 1000,
+        flush_batch: int = 32,
+        max_flows: int = 1000,
+    ):
+        self.db = db
+        self.capacity = capacity
+        self.flush_batch = min(flush_batch, capacity)
+        self.max_flows = max_flows
+        self.lock = threading.RLock()
+        self._buffers: "OrderedDict[str, FlowHistoryBuffer]" = OrderedDict()
+
+    def _buffer(
+        self, flow_id: str, session_id: Optional[str] = None
+    ) -> FlowHistoryBuffer:
+        """The flow's buffer, continuing any stored history when created"""
+        buffer = self._buffers.get(flow_id)
+        if buffer is not None:
+            self._buffers.move_to_end(flow_id)
+            if session_id and not buffer.session_id:
+                buffer.session_id = session_id
+            return buffer
+
+        buffer = FlowHistoryBuffer(flow_id, session_id, self.capacity)
+        marks = self._marks(flow_id)
+        if marks:
+            buffer.seed(marks)
+        self._buffers[flow_id] = buffer
+
+        while len(self._buffers) > self.max_flows:
+            self._evict()
+        return buffer
+
+    def _evict(self) -> None:
+        """
+        Drop the least recently active flow. Without a database its ring is
+        the only copy, so finished flows go first and dropping an active
+        flow's history is logged.
+        """
+        flow_id = next(iter(self._buffers))
+        if self.db is None:
+            finished = (f for f, buffer in self._buffers.items() if buffer.finished)
+            flow_id = next(finished, None)
+            if flow_id is None:
+                flow_id = next(iter(self._buffers))
+                logger.warning(
+                    f"More than {self.max_flows} active flows without a database: "
+                    f"dropping the state history of flow {flow_id}"
+                )
+        buffer = self._buffers.pop(flow_id)
+        self._flush(buffer)
+        if self.db is not None and buffer.unflushed:
+            logger.warning(
+                f"Dropped {buffer.unflushed} unwritten transitions of flow {flow_id}"
+            )
+
+    def _marks(self, flow_id: str) -> Optional[Dict[str, Any]]:
+        """Where the flow's stored history ends, if there is a database"""
+        if self.db is None:
+            return None
+        try:
+            marks = self.db.get_flow_history_marks(flow_id)
+        except Exception as e:
+            logger.error(f"Error loading history marks for flow {flow_id}: {e}")
+            return None
+        return marks if isinstance(marks, dict) else None
+
+    def record(
+        self,
+        flow_id: str,
+        session_id: Optional[str],
+        from_state: str,
+        to_state: str,
+        event: str,
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Record a transition, writing a batch to the database when one is full
+
+        Returns:
+            The transition as a history entry
+        """
+        with self.lock:
+            buffer = self._buffer(flow_id, session_id)
+            buffer.finished = False
+            if self.db is not None and buffer.unflushed >= self.capacity:
+                # Never overwrite a transition that is not on disk yet
+                self._flush(buffer)
+            seq = buffer.append(from_state, to_state, event, metadata)
+            if self.db is not None and buffer.unflushed >= self.flush_batch:
+                self._flush(buffer)
+            return buffer.entry(seq)
+
+    def restore(
+        self, flow_id: str, session_id: Optional[str], entries: List[Dict[str, Any]]
+    ) -> int:
+        """
+        Load history entries persisted in the old quality_metrics format
+
+        Ignored when the flow already has stored transitions; otherwise the
+        entries are written to the database with the next flush.
+
+        Returns:
+            Number of entries loaded
+        """
+        with self.lock:
+            buffer = self._buffer(flow_id, session_id)
+            if buffer.next_seq:
+                return 0
+            for entry in entries:
+                try:
+                    timestamp = datetime.fromisoformat(entry["timestamp"]).timestamp()
+                    buffer.append(
+                        entry["from_state"],
+                        entry["to_state"],
+                        entry["event"],
+                        entry.get("metadata"),
+                        timestamp=timestamp,
+                    )
+                except (KeyError, TypeError, ValueError):
+                    continue
+            return buffer.next_seq
+
+    def _flush(self, buffer: FlowHistoryBuffer) -> int:
+        if self.db is None or not buffer.unflushed:
+            return 0
+        rows = buffer.rows(buffer.flushed_seq)
+        if self.db.add_flow_history(rows) is False:
+            logger.warning(f"Failed to write history of flow {buffer.flow_id}")
+            return 0
+        buffer.flushed_seq = buffer.next_seq
+        return len(rows)
+
+    def flush(self, flow_id: Optional[str] = None) -> int:
+        """
+        Write unwritten transitions to the database
+
+        Args:
+            flow_id: Only this flow; None for every flow
+
+        Returns:
+            Number of transitions written
+        """
+        with self.lock:
+            if flow_id is not None:
+                buffer = self._buffers.get(flow_id)
+                return self._flush(buffer) if buffer else 0
+            return sum(self._flush(buffer) for buffer in self._buffers.values())
+
+    def finish(self, flow_id: str) -> None:
+        """
+        Flush a finished flow and, when persisted, drop it from memory;
+        without a database it is kept, first in line for eviction
+        """
+        with self.lock:
+            buffer = self._buffers.get(flow_id)
+            if buffer is None:
+                return
+            buffer.finished = True
+            if self.db is None:
+                return
+            self._flush(buffer)
+            if not buffer.unflushed:
+                del self._buffers[flow_id]
+
+    def page(
+        self,
+        flow_id: str,
+        after: Optional[int] = None,
+        limit: int = 100,
+        newest_first: bool = False,
+    ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """
+        Get one page of a flow's transitions
+
+        Pages come from the database when there is one, and from the
+        in-memory ring otherwise or if the database cannot be read.
+
+        Returns:
+            (entries, cursor for the next page or None when exhausted)
+        """
+        if self.db is not None:
+            self.flush(flow_id)
+            try:
+                rows, cursor = self.db.get_flow_history_page(
+                    flow_id, after, limit, newest_first
+                )
+                return [self._row_entry(row) for row in rows], cursor
+            except Exception as e:
+                logger.error(f"Error reading history of flow {flow_id}: {e}")
+
+        with self.lock:
+            buffer = self._buffers.get(flow_id)
+            if buffer is None:
+                return [], None
+            seqs = range(buffer.first_seq, buffer.next_seq)
+            if newest_first:
+                seqs = reversed(seqs)
+            if after is not None:
+                seqs = [s for s in seqs if (s < after if newest_first else s > after)]
+            seqs = list(seqs)[:limit]
+            entries = [buffer.entry(seq) for seq in seqs]
+        cursor = seqs[-1] if len(seqs) == limit else None
+        return entries, cursor
+
+    def iter_entries(
+        self, flow_id: str, page_size: int = 100
+    ) -> Iterator[Dict[str, Any]]:
+        """Stream a flow's transitions oldest first, one page at a time"""
+        after = None
+        while True:
+            entries, after = self.page(flow_id, after, page_size)
+            yield from entries
+            if after is None:
+                return
+
+    def tail(self, flow_id: str, limit: int) -> List[Dict[str, Any]]:
+        """A flow's most recent transitions, oldest first"""
+        entries, _ = self.page(flow_id, limit=limit, newest_first=True)
+        entries.reverse()
+        return entries
+
+    @staticmethod
+    def _row_entry(row: Dict[str, Any]) -> Dict[str, Any]:
+        entry = {
+            "timestamp": row["timestamp"],
+            "from_state": row["from_state"],
+            "to_state": row["to_state"],
+            "event": row["event"],
+            "metadata": row["metadata"],
+            "transition_id": f"{row['flow_id']}_{row['seq']}",
+        }
+        if row["duration_seconds"] is not None:
+            entry["duration_seconds"] = row["duration_seconds"]
+        return entry
+
+    def summary(self, flow_id: str) -> Dict[str, Any]:
+        """Transition count, transitions into each state and the last transition"""
+        with self.lock:
+            buffer = self._buffers.get(flow_id)
+            if buffer is not None:
+                last = buffer.entry(buffer.next_seq - 1) if len(buffer) else None
+                summary = {
+                    "total_transitions": buffer.next_seq,
+                    "last_transition": last,
+                    "state_counts": {
+                        _NAMES[code]: count
+                        for code, count in buffer.state_counts.items()
+                    },
+                }
+            else:
+                marks = self._marks(flow_id) or {}
+                summary = {
+                    "total_transitions": marks.get("next_seq", 0),
+                    "last_transition": None,
+                    "state_counts": dict(marks.get("state_counts", {})),
+                }
+        if summary["last_transition"] is None and summary["total_transitions"]:
+            recent = self.tail(flow_id, 1)
+            summary["last_transition"] = recent[0] if recent else None
+        return summary
+
+    def last_state(self, flow_id: str) -> Optional[str]:
+        """State the flow was last seen entering, if held in memory"""
+        with self.lock:
+            buffer = self._buffers.get(flow_id)
+            if buffer is None or not len(buffer):
+                return None
+            return _NAMES[buffer.to_codes[buffer.slot(buffer.next_seq - 1)]]
+
+    def total_transitions(self, flow_id: str) -> int:
+        with self.lock:
+            buffer = self._buffers.get(flow_id)
+            return buffer.next_seq if buffer else 0
+
+    def flows(self) -> List[str]:
+        """Flows held in memory"""
+        with self.lock:
+            return list(self._buffers)
+
+    def expire(self, inactive_before: float) -> int:
+        """
+        Drop flows with no transition since a wall-clock time, after flushing
+
+        Returns:
+            Number of flows dropped
+        """
+        with self.lock:
+            expired = 0
+            for flow_id, buffer in list(self._buffers.items()):
+                last_activity = buffer.last_activity
+                if last_activity is None or last_activity >= inactive_before:
+                    continue
+                self._flush(buffer)
+                if self.db is None or not buffer.unflushed:
+                    del self._buffers[flow_id]
+                    expired += 1
+            return expired
+
+    def __contains__(self, flow_id: object) -> bool:
+        return flow_id in self._buffers
+
+    def __len__(self) -> int:
+        return len(self._buffers)
@@ -4,9 +4,10 @@ Handles the orchestration and state management of thinking flows
 """
 
 import logging
+import threading
 from datetime import datetime
 from enum import Enum
-from typing import Any, Dict, List, Optional, TYPE_CHECKING
+from typing import Any, Dict, List, Optional, TYPE_CHECKING, Union
 
 if TYPE_CHECKING:
     from ..models.mcp_models import SessionState
@@ -18,6 +19,14 @@ from ..config.exceptions import (
 )
 from ..data.database import ThinkingDatabase
 from ..models.thinking_models import FlowStep, FlowStepStatus
+from ..models.thinking_models import ThinkingFlow as FlowConfiguration
+from ..sessions.step_result import parse_step_result
+from .compiled_flow import (
+    CompiledFlow,
+    CompiledStep,
+    compile_flow,
+    compile_thinking_flow,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -178,7 +187,10 @@ class FlowManager:
 
     def __init__(self, db: Optional[ThinkingDatabase] = None):
         self.active_flows: Dict[str, ThinkingFlow] = {}
+        # Guards active_flows; flows may be created from tool worker threads
+        self.lock = threading.RLock()
         self.flow_definitions: Dict[str, Dict[str, Any]] = {}
+        self.compiled_flows: Dict[str, CompiledFlow] = {}
         self.db = db
         self._load_default_flows()
 
@@ -251,8 +263,46 @@ class FlowManager:
             ],
         }
 
-        self.flow_definitions["comprehensive_analysis"] = comprehensive_flow
-        self.flow_definitions["quick_analysis"] = quick_flow
+        self.register_flow(comprehensive_flow)
+        self.register_flow(quick_flow)
+
+    def register_flow(
+        self, flow: Union[Dict[str, Any], FlowConfiguration]
+    ) -> CompiledFlow:
+        """
+        Add or replace a flow type
+
+        Args:
+            flow: Definition in this manager's format, or a flow parsed by
+                YAMLFlowParser
+
+        Returns:
+            CompiledFlow: The compiled flow
+
+        Raises:
+            FlowConfigurationError: If the flow cannot be compiled
+        """
+        if isinstance(flow, FlowConfiguration):
+            compiled = compile_thinking_flow(flow)
+        else:
+            compiled = compile_flow(flow["name"], flow)
+
+        self.compiled_flows[compiled.name] = compiled
+        self.flow_definitions[compiled.name] = compiled.definition
+        return compiled
+
+    def get_compiled_flow(self, flow_type: str) -> Optional[CompiledFlow]:
+        """Get the compiled form of a flow type"""
+        flow_def = self.flow_definitions.get(flow_type)
+        if flow_def is None:
+            return None
+
+        compiled = self.compiled_flows.get(flow_type)
+        if compiled is None or compiled.definition is not flow_def:
+            # Definition assigned to flow_definitions directly
+            compiled = compile_flow(flow_type, flow_def)
+            self.compiled_flows[flow_type] = compiled
+        return compiled
 
     def create_flow(
         self, session_id: str, flow_type: str = "comprehensive_analysis"
@@ -288,7 +338,8 @@ class FlowManager:
             flow.add_step(step)
 
         # Store flow
-        self.active_flows[flow_id] = flow
+        with self.lock:
+            self.active_flows[flow_id] = flow
 
         logger.info(f"Created flow {flow_id} of type {flow_type}")
         return flow_id
@@ -473,21 +524,27 @@ class FlowManager:
         self, session_id: Optional[str] = None
     ) -> List[Dict[str, Any]]:
         """List active flows"""
+        with self.lock:
+            active = list(self.active_flows.values())
+
         flows = []
-        for flow in self.active_flows.values():
+        for flow in active:
             if session_id is None or flow.session_id == session_id:
                 flows.append(flow.get_progress())
         return flows
 
     def get_flow_statistics(self) -> Dict[str, Any]:
         """Get flow management statistics"""
+        with self.lock:
+            active = list(self.active_flows.values())
+
         status_counts = {}
-        for flow in self.active_flows.values():
+        for flow in active:
             status = flow.status.value
             status_counts[status] = status_counts.get(status, 0) + 1
 
         return {
-            "total_flows": len(self.active_flows),
+            "total_flows": len(active),
             "status_distribution": status_counts,
             "available_flow_types": list(self.flow_definitions.keys()),
         }
@@ -513,92 +570,44 @@ class FlowManager:
         self, flow_type: str, current_step: str, step_result: str, session_state: Optional["SessionState"] = None
     ) -> Optional[Dict[str, Any]]:
         """Get next step information for a flow type with for_each support"""
-        if flow_type not in self.flow_definitions:
+        compiled = self.get_compiled_flow(flow_type)
+        if compiled is None:
             return None
 
-        flow_def = self.flow_definitions[flow_type]
-        steps = flow_def["steps"]
-
-        # Find current step index - handle different step name formats
-        current_index = -1
-        current_step_def = None
-        for i, step in enumerate(steps):
-            step_id = step["step_id"]
-            step_name = step["step_name"]
-
-            # Check various formats: step_id, step_name, or partial matches
-            if (
-                step_id == current_step
-                or step_name == current_step
-                or current_step == "decompose_problem"
-                and step_id == "decompose"
-                or current_step == "collect_evidence"
-                and step_id == "collect_evidence"
-                or current_step == "critical_evaluation"
-                and step_id == "evaluate"
-            ):
-                current_index = i
-                current_step_def = step
-                break
+        # Accepts the step id, the step name or a legacy alias
+        step = compiled.find_step(current_step)
 
         # Check if current step has for_each and needs to continue iterating
-        if current_step_def and current_step_def.get("for_each"):
-            logger.info(f"🔍 CHECKING for_each continuation for step {current_step}")
-            logger.info(f"📋 Step definition: {current_step_def}")
-            
-            if session_state:
-                current_iterations = session_state.iteration_count.get(current_step, 0)
-                total_iterations = session_state.total_iterations.get(current_step, 0)
-                logger.info(f"📊 Session state: {current_iterations}/{total_iterations} iterations")
-            else:
-                logger.warning("⚠️ No session state available for for_each check")
-
-            # Check if we need to continue iterating
-            should_continue = self._should_continue_for_each_iteration(
-                current_step_def, step_result, current_step, session_state
-            )
-            
-            logger.info(f"🤖 For_each decision: should_continue={should_continue}")
-
-            if should_continue:
-                logger.info(f"✅ CONTINUING for_each iteration for step {current_step}")
-                return {
-                    "step_name": current_step_def["step_id"],
-                    "template_name": current_step_def["template_name"],
-                    "instructions": f"Continue {current_step_def['step_name']} step for next sub-question",
-                    "for_each_continuation": True,
-                }
-            else:
-                logger.info(f"🛑 STOPPING for_each iteration for step {current_step}, advancing to next step")
+        if step is not None and step.for_each:
+            if self._should_continue_for_each_iteration(
+                step, step_result, current_step, session_state
+            ):
+                logger.debug("Continuing for_each iteration of step %s", current_step)
+                return dict(step.continue_info)
 
         # Return next step if available
-        if current_index >= 0 and current_index + 1 < len(steps):
-            next_step = steps[current_index + 1]
-            logger.info(f"➡️ ADVANCING from {current_step} to {next_step['step_id']}")
-            return {
-                "step_name": next_step["step_id"],
-                "template_name": next_step["template_name"],
-                "instructions": f"Execute {next_step['step_name']} step",
-            }
-        
-        # CRITICAL: This returns None and triggers flow completion!
-        logger.warning(f"💥 FLOW COMPLETION TRIGGERED: No next step found for {current_step}")
-        logger.warning(f"📋 Current index: {current_index}, Total steps: {len(steps)}")
-        logger.warning(f"🔍 Available steps: {[s['step_id'] for s in steps]}")
-        
-        if session_state:
-            logger.warning(f"📊 Session state at completion: iterations={session_state.iteration_count}, totals={session_state.total_iterations}")
-        
+        next_step = compiled.next_step(step) if step is not None else None
+        if next_step is not None:
+            logger.debug("Advancing from %s to %s", current_step, next_step.step_id)
+            return dict(next_step.advance_info)
+
+        # No next step: the caller completes the flow
+        logger.info(
+            "No step after %s in flow %s (%d steps)",
+            current_step,
+            flow_type,
+            len(compiled.steps),
+        )
         return None
 
     def _should_continue_for_each_iteration(
-        self, current_step_def: Dict[str, Any], step_result: str, current_step: str, session_state: Optional["SessionState"] = None
+        self, step: CompiledStep, step_result: str, current_step: str, session_state: Optional["SessionState"] = None
     ) -> bool:
         """
         Determine if a for_each step should continue iterating
 
         Args:
-            current_step_def: Step definition with for_each configuration
+            step: Compiled step with for_each configuration
             step_result: Result from the current step execution
             current_step: Current step name
             session_state: Session state with structured iteration tracking
@@ -607,22 +616,18 @@ class FlowManager:
             True if should continue iterating, False if should advance to next step
         """
         try:
-            # Parse for_each reference (e.g., "decompose.sub_questions")
-            for_each_ref = current_step_def.get("for_each", "")
-            if not for_each_ref or "." not in for_each_ref:
-                logger.warning(f"Invalid for_each reference: {for_each_ref}")
+            # Parsed from the for_each reference (e.g., "decompose.sub_questions")
+            source_step = step.for_each_source
+            property_name = step.for_each_property
+            if not source_step:
                 return False
 
-            source_step, property_name = for_each_ref.split(".", 1)
-            
             # ABSOLUTE PRIORITY: Use structured session state if available
             if session_state:
-                result = self._check_for_each_with_session_state(
+                return self._check_for_each_with_session_state(
                     current_step, source_step, property_name, session_state
                 )
-                logger.info(f"STRUCTURED STATE DECISION: {current_step} continue={result}")
-                return result
-            
+
             # FALLBACK: Use old text-based detection ONLY if no session state
             logger.warning("No session state available, falling back to text-based detection")
             if current_step == "collect_evidence" and source_step == "decompose":
@@ -633,8 +638,9 @@ class FlowManager:
                 return result
 
             # For other for_each steps, implement similar logic
-            logger.info(
-                f"No specific for_each continuation logic for {current_step}, defaulting to False"
+            logger.debug(
+                "No specific for_each continuation logic for %s, defaulting to False",
+                current_step,
             )
             return False
 
@@ -662,9 +668,7 @@ class FlowManager:
             # Get current and total iterations for this step
             current_iterations = session_state.iteration_count.get(current_step, 0)
             total_iterations = session_state.total_iterations.get(current_step, 0)
-            
-            logger.info(f"🔍 STRUCTURED CHECK {current_step}: {current_iterations}/{total_iterations} iterations")
-            
+
             # CRITICAL: Handle edge cases that cause infinite loops
             if total_iterations == 0:
                 logger.warning(f"No total_iterations set for {current_step}, attempting to determine from decomposition")
@@ -673,19 +677,18 @@ class FlowManager:
                 else:
                     logger.warning("Cannot determine iteration count, defaulting to False (stop)")
                     return False
-            
+
             # CRITICAL: Ignore LLM text claims - only use structured counts
-            if current_iterations >= total_iterations:
-                logger.info(f"🛑 STRUCTURED STATE SAYS STOP: {current_iterations}/{total_iterations} iterations completed")
-                return False
-                
-            # Check if we should continue (need more iterations)
             should_continue = current_iterations < total_iterations
-            logger.info(f"🔄 STRUCTURED STATE SAYS CONTINUE: {should_continue} ({current_iterations} < {total_iterations})")
-            logger.info("🚫 IGNORING any text-based completion claims from LLM output")
-            
+            logger.debug(
+                "for_each %s: %d/%d iterations, continue=%s",
+                current_step,
+                current_iterations,
+                total_iterations,
+                should_continue,
+            )
             return should_continue
-            
+
         except Exception as e:
             logger.error(f"Error in structured for_each check: {e}")
             # Fall back to safe default (stop to prevent infinite loop)
@@ -749,73 +752,70 @@ class FlowManager:
         Returns:
             True if more sub-questions need processing, False if all are done
         """
-        import json
         import re
 
         try:
+            parsed = parse_step_result(step_result)
+
             # Get the expected number of sub-questions from decomposition result
             expected_subquestions = self._get_expected_subquestion_count()
             logger.info(f"Expected sub-questions count: {expected_subquestions}")
 
             # HIGHEST PRIORITY: Check for JSON-structured evidence first
-            try:
-                result_data = json.loads(step_result.strip())
-                if isinstance(result_data, dict):
-                    # Check if this is individual sub-question processing format
-                    if (
-                        "sub_question" in result_data
-                        and "evidence_synthesis" in result_data
-                    ):
-                        sub_question = result_data.get("sub_question", "")
-                        # evidence_synthesis = result_data.get("evidence_synthesis", {})
-
-                        # Check if this contains completion indicators
-                        completion_phrases = [
-                            "所有子问题已处理完成",
-                            "全部子问题分析完毕",
-                            "完成了所有子问题",
-                            "evidence collection complete",
-                            "all sub-questions processed",
-                            "阶段结束",
-                            "处理完成",
-                            "analysis_complete",  # JSON field indicating completion
-                        ]
-
-                        full_text = json.dumps(result_data, ensure_ascii=False)
-                        for phrase in completion_phrases:
-                            if phrase in full_text:
-                                logger.info(
-                                    f"Found completion indicator in JSON: {phrase}"
-                                )
-                                return False
-
-                        # Check for explicit completion fields in JSON
-                        if (
-                            result_data.get("analysis_complete") is True
-                            or "sub_questions_processed" in result_data
-                        ):
+            result_data = parsed.json_object
+            if result_data is not None:
+                # Check if this is individual sub-question processing format
+                if (
+                    "sub_question" in result_data
+                    and "evidence_synthesis" in result_data
+                ):
+                    sub_question = result_data.get("sub_question", "")
+                    # evidence_synthesis = result_data.get("evidence_synthesis", {})
+
+                    # Check if this contains completion indicators
+                    completion_phrases = [
+                        "所有子问题已处理完成",
+                        "全部子问题分析完毕",
+                        "完成了所有子问题",
+                        "evidence collection complete",
+                        "all sub-questions processed",
+                        "阶段结束",
+                        "处理完成",
+                        "analysis_complete",  # JSON field indicating completion
+                    ]
+
+                    full_text = parsed.json_text
+                    for phrase in completion_phrases:
+                        if phrase in full_text:
                             logger.info(
-                                "Found explicit completion fields in JSON structure"
+                                f"Found completion indicator in JSON: {phrase}"
                             )
                             return False
 
-                        # If we have a specific sub-question without completion indicators,
-                        # this indicates individual processing - continue for_each
-                        if sub_question and not any(
-                            phrase in full_text for phrase in completion_phrases
-                        ):
-                            logger.info(
-                                f"Found individual sub-question processing in JSON format: {sub_question[:50]}..."
-                            )
-                            return True
+                    # Check for explicit completion fields in JSON
+                    if (
+                        result_data.get("analysis_complete") is True
+                        or "sub_questions_processed" in result_data
+                    ):
+                        logger.info(
+                            "Found explicit completion fields in JSON structure"
+                        )
+                        return False
 
-            except (json.JSONDecodeError, ValueError):
+                    # If we have a specific sub-question without completion indicators,
+                    # this indicates individual processing - continue for_each
+                    if sub_question:
+                        logger.info(
+                            f"Found individual sub-question processing in JSON format: {sub_question[:50]}..."
+                        )
+                        return True
+            elif not parsed.is_json:
                 logger.debug("Step result is not valid JSON, checking text patterns")
 
             # SECOND PRIORITY: Smart counting instead of trusting LLM claims
             # Count actual sub-questions mentioned in the step result
-            numbered_questions = re.findall(r'(\d+)\.\s+[^0-9]', step_result)
-            sq_matches = re.findall(r"SQ(\d+)", step_result)
+            numbered_questions = parsed.numbered_items
+            sq_matches = parsed.sq_mentions
             
             # Get actual count of distinct sub-questions processed
             if numbered_questions:
@@ -889,9 +889,8 @@ class FlowManager:
                     return False
 
             # SMART PRIORITY: Dynamic completion detection based on expected count
-            sq_matches = re.findall(r"SQ(\d+)", step_result)
             if sq_matches:
-                unique_sqs = set(sq_matches)
+                unique_sqs = parsed.sq_ids
                 processed_count = len(unique_sqs)
                 logger.info(f"Found sub-question IDs in result: {unique_sqs}")
                 logger.info(
@@ -1059,9 +1058,8 @@ class FlowManager:
 
     def get_total_steps(self, flow_type: str) -> int:
         """Get total number of steps in a flow type"""
-        if flow_type not in self.flow_definitions:
-            return 0
-        return len(self.flow_definitions[flow_type]["steps"])
+        compiled = self.get_compiled_flow(flow_type)
+        return len(compiled.steps) if compiled else 0
 
     def reset_flow(self, flow_id: str) -> bool:
         """Reset a flow to its initial state"""
@@ -1123,7 +1121,8 @@ class FlowManager:
                 return None
 
             # Add to active flows
-            self.active_flows[flow_id] = flow
+            with self.lock:
+                self.active_flows[flow_id] = flow
             logger.info(f"Restored flow {flow_id}")
             return flow_id
 
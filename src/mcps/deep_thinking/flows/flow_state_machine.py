@@ -17,6 +17,7 @@ from typing import Any, Dict, List, Optional, Set, Tuple, Union
 
 from ..config.exceptions import FlowStateError, InvalidTransitionError
 from ..data.database import ThinkingDatabase
+from .flow_history import FlowStateHistory
 from .flow_manager import FlowStatus, ThinkingFlow
 from ..models.thinking_models import FlowStep, FlowStepStatus
 
@@ -73,17 +74,32 @@ class FlowStateMachine:
     - Provides detailed flow state summaries and diagnostics
     """
 
-    def __init__(self, db: Optional[ThinkingDatabase] = None):
+    # Flow states after which a flow's history is flushed; finished flows
+    # are also dropped from memory when the history is persisted
+    _FINISHED_STATES = (FlowStatus.COMPLETED, FlowStatus.FAILED, FlowStatus.CANCELLED)
+
+    def __init__(
+        self,
+        db: Optional[ThinkingDatabase] = None,
+        history_capacity: int = 1000,
+        history_flush_batch: int = 32,
+    ):
         """
         Initialize the flow state machine
 
         Args:
             db: Optional database for state persistence. If provided, the state machine
                 will persist flow states to the database for recovery.
+            history_capacity: State transitions held in memory per flow
+            history_flush_batch: Transitions written to the database at a time
         """
         self.db = db
         self._valid_transitions = self._build_transition_map()
-        self._state_history: Dict[str, List[Dict[str, Any]]] = {}
+        # Ring buffer of transitions per flow, persisted to the
+        # flow_state_history table when there is a database (see flow_history.py)
+        self._history = FlowStateHistory(
+            db, capacity=history_capacity, flush_batch=history_flush_batch
+        )
         self._paused_flows: Dict[str, datetime] = {}  # Track when flows were paused
         self._auto_recovery_enabled = (
             True  # Enable automatic recovery of interrupted flows
@@ -216,7 +232,12 @@ class FlowStateMachine:
 
                 # Record the state change
                 self._record_state_change(
-                    flow.flow_id, current_state, target_state, event, metadata
+                    flow.flow_id,
+                    current_state,
+                    target_state,
+                    event,
+                    metadata,
+                    session_id=flow.session_id,
                 )
 
                 # Persist if database is available
@@ -250,7 +271,12 @@ class FlowStateMachine:
             # Record state change in history before actually changing state
             # This ensures we capture the intent even if the action fails
             self._record_state_change(
-                flow.flow_id, current_state, new_state, event, metadata
+                flow.flow_id,
+                current_state,
+                new_state,
+                event,
+                metadata,
+                session_id=flow.session_id,
             )
 
             # Update flow state
@@ -279,6 +305,11 @@ class FlowStateMachine:
                 if not persist_success:
                     logger.warning(f"Failed to persist state for flow {flow.flow_id}")
 
+            if new_state in self._FINISHED_STATES:
+                self._history.finish(flow.flow_id)
+            elif new_state == FlowStatus.PAUSED:
+                self._history.flush(flow.flow_id)
+
             logger.info(
                 f"Flow {flow.flow_id} transitioned: {current_state} -> {new_state} via {event}"
             )
@@ -300,6 +331,7 @@ class FlowStateMachine:
                 current_state,  # Reverted back to original state
                 event,
                 {**metadata, "error": str(e), "failed_transition": True},
+                session_id=flow.session_id,
             )
 
             # Re-raise as FlowStateError
@@ -316,13 +348,15 @@ class FlowStateMachine:
         to_state: FlowStatus,
         event: FlowEvent,
         metadata: Optional[Dict[str, Any]] = None,
+        session_id: Optional[str] = None,
     ) -> None:
         """
         Record a state change in the history
 
         This method maintains a complete history of all state transitions for auditing,
         debugging, and recovery purposes. Each state change is recorded with timestamp,
-        from/to states, triggering event, and any associated metadata.
+        from/to states, triggering event, and any associated metadata. The time spent
+        in the state being left is looked up in constant time.
 
         Args:
             flow_id: Flow identifier
@@ -330,40 +364,17 @@ class FlowStateMachine:
             to_state: New state
             event: Event that triggered the transition
             metadata: Optional metadata about the transition
+            session_id: Session the flow belongs to, stored with the transition
         """
-        if flow_id not in self._state_history:
-            self._state_history[flow_id] = []
-
         # Create a copy of metadata to avoid modifying the original
-        metadata_copy = dict(metadata or {})
-
-        # Add standard fields
-        state_change = {
-            "timestamp": datetime.now().isoformat(),
-            "from_state": from_state.value,
-            "to_state": to_state.value,
-            "event": event.value,
-            "metadata": metadata_copy,
-            "transition_id": f"{flow_id}_{len(self._state_history[flow_id])}",
-        }
-
-        # Add duration if this is completing a state
-        if from_state != to_state:
-            # Find the last transition to the from_state
-            for prev_change in reversed(self._state_history[flow_id]):
-                if prev_change["to_state"] == from_state.value:
-                    try:
-                        start_time = datetime.fromisoformat(prev_change["timestamp"])
-                        end_time = datetime.fromisoformat(state_change["timestamp"])
-                        duration_seconds = (end_time - start_time).total_seconds()
-                        state_change["duration_seconds"] = duration_seconds
-                        break
-                    except (ValueError, KeyError):
-                        # Skip if we can't calculate duration
-                        pass
-
-        # Add to history
-        self._state_history[flow_id].append(state_change)
+        self._history.record(
+            flow_id,
+            session_id,
+            from_state.value,
+            to_state.value,
+            event.value,
+            dict(metadata or {}),
+        )
 
         # Log at appropriate level based on transition type
         if to_state in [FlowStatus.FAILED, FlowStatus.CANCELLED]:
@@ -375,14 +386,6 @@ class FlowStateMachine:
                 f"Flow {flow_id} state change: {from_state} -> {to_state} via {event}"
             )
 
-        # Limit history size to prevent memory issues in long-running flows
-        max_history = 1000  # Configurable limit
-        if len(self._state_history[flow_id]) > max_history:
-            # Keep the first entry (initialization) and the most recent entries
-            self._state_history[flow_id] = [
-                self._state_history[flow_id][0]
-            ] + self._state_history[flow_id][-max_history + 1 :]
-
     def _perform_state_actions(
         self,
         flow: ThinkingFlow,
@@ -600,18 +603,16 @@ class FlowStateMachine:
                 flow.session_id, status=flow.status.value, context=context_data
             )
 
-            # Store state history (limited to last 100 transitions to save space)
-            if flow.flow_id in self._state_history:
-                history = self._state_history[flow.flow_id]
-                # Only store the most recent history entries
-                recent_history = history[-100:] if len(history) > 100 else history
+            # Store a summary of the state history; the transitions
+            # themselves go to the flow_state_history table
+            if flow.flow_id in self._history:
+                history = self._history.summary(flow.flow_id)
 
                 self.db.update_session(
                     flow.session_id,
                     quality_metrics={
-                        "flow_state_history": recent_history,
-                        "last_transition": history[-1] if history else None,
-                        "total_transitions": len(history),
+                        "last_transition": history["last_transition"],
+                        "total_transitions": history["total_transitions"],
                         "state_machine_stats": {
                             "current_state": flow.status.value,
                             "step_counts": {
@@ -776,21 +777,21 @@ class FlowStateMachine:
             # Restore step order
             flow.step_order = flow_state.get("step_order", [])
 
-            # Restore state history
-            if (
-                "quality_metrics" in session_data
-                and "flow_state_history" in session_data["quality_metrics"]
-            ):
-                try:
-                    history = session_data["quality_metrics"]["flow_state_history"]
-                    self._state_history[flow_id] = history
+            # Restore state history; transitions are read from the
+            # flow_state_history table, and histories persisted inline by
+            # older versions are moved there
+            try:
+                quality_metrics = session_data.get("quality_metrics") or {}
+                history = quality_metrics.get("flow_state_history") or []
+                restored = self._history.restore(flow_id, session_id, history)
+                if restored:
                     logger.info(
-                        f"Restored {len(history)} state transitions for flow {flow_id}"
-                    )
-                except Exception as history_error:
-                    logger.error(
-                        f"Error restoring state history for flow {flow_id}: {history_error}"
+                        f"Restored {restored} state transitions for flow {flow_id}"
                     )
+            except Exception as history_error:
+                logger.error(
+                    f"Error restoring state history for flow {flow_id}: {history_error}"
+                )
 
             logger.info(
                 f"Successfully restored flow {flow_id} with {steps_restored} steps"
@@ -837,7 +838,9 @@ class FlowStateMachine:
         Get state transition history for a flow
 
         This method returns the complete history of state transitions for a flow.
-        It's useful for auditing, debugging, and visualization purposes.
+        It's useful for auditing, debugging, and visualization purposes. With a
+        database the history is paged from disk; without one, only the most recent
+        history_capacity transitions are kept.
 
         Args:
             flow_id: Flow identifier
@@ -846,11 +849,35 @@ class FlowStateMachine:
         Returns:
             List of state transitions
         """
-        history = self._state_history.get(flow_id, [])
-        if limit > 0 and len(history) > limit:
+        if limit > 0:
             # Return the most recent entries if limited
-            return history[-limit:]
-        return history
+            return self._history.tail(flow_id, limit)
+        return list(self._history.iter_entries(flow_id))
+
+    def get_state_history_page(
+        self, flow_id: str, after: Optional[int] = None, limit: int = 100
+    ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """
+        Get one page of a flow's state transitions, oldest first
+
+        Args:
+            flow_id: Flow identifier
+            after: Cursor returned with the previous page; None for the first
+            limit: Maximum number of entries to return
+
+        Returns:
+            (state transitions, cursor for the next page or None when exhausted)
+        """
+        return self._history.page(flow_id, after, limit)
+
+    def flush_history(self) -> int:
+        """
+        Write buffered state transitions to the database
+
+        Returns:
+            Number of transitions written
+        """
+        return self._history.flush()
 
     def can_transition(self, flow: ThinkingFlow, event: FlowEvent) -> bool:
         """
@@ -1147,20 +1174,8 @@ class FlowStateMachine:
             # Get valid transitions
             valid_transitions = self.get_valid_transitions(flow)
 
-            # Get state history stats
-            history = self.get_state_history(flow.flow_id)
-            history_stats = {
-                "total_transitions": len(history),
-                "last_transition": history[-1] if history else None,
-                "state_counts": {},
-            }
-
-            # Count occurrences of each state in history
-            for entry in history:
-                to_state = entry["to_state"]
-                history_stats["state_counts"][to_state] = (
-                    history_stats["state_counts"].get(to_state, 0) + 1
-                )
+            # Get state history stats, kept up to date as transitions are recorded
+            history_stats = self._history.summary(flow.flow_id)
 
             return {
                 "flow_id": flow.flow_id,
@@ -1305,31 +1320,26 @@ class FlowStateMachine:
         try:
             # Count flows by status
             status_counts = {}
-            for flow_id in self._state_history.keys():
+            flow_ids = self._history.flows()
+            for flow_id in flow_ids:
                 # Get the last state for each flow
-                history = self._state_history[flow_id]
-                if history:
-                    last_state = history[-1]["to_state"]
+                last_state = self._history.last_state(flow_id)
+                if last_state:
                     status_counts[last_state] = status_counts.get(last_state, 0) + 1
 
             # Count paused flows
             paused_flows = len(self._paused_flows)
 
-            # Calculate average transitions per flow
-            avg_transitions = (
-                sum(len(history) for history in self._state_history.values())
-                / len(self._state_history)
-                if self._state_history
-                else 0
-            )
-
             # Get total transition count
             total_transitions = sum(
-                len(history) for history in self._state_history.values()
+                self._history.total_transitions(flow_id) for flow_id in flow_ids
             )
 
+            # Calculate average transitions per flow
+            avg_transitions = total_transitions / len(flow_ids) if flow_ids else 0
+
             return {
-                "total_flows_tracked": len(self._state_history),
+                "total_flows_tracked": len(flow_ids),
                 "flows_by_status": status_counts,
                 "paused_flows": paused_flows,
                 "total_transitions": total_transitions,
@@ -1362,25 +1372,11 @@ class FlowStateMachine:
             return 0
 
         try:
-            flows_cleaned = 0
             cutoff_date = datetime.now() - timedelta(days=max_age_days)
 
-            for flow_id in list(self._state_history.keys()):
-                history = self._state_history[flow_id]
-                if not history:
-                    continue
-
-                # Check last update time
-                try:
-                    last_update = datetime.fromisoformat(history[-1]["timestamp"])
-                    if last_update < cutoff_date:
-                        # This flow hasn't been updated in a while
-                        # Since we have a database, we can safely remove it from memory
-                        del self._state_history[flow_id]
-                        flows_cleaned += 1
-                except (ValueError, KeyError, IndexError):
-                    # Skip if we can't parse the timestamp
-                    pass
+            # Flows not updated since are flushed and dropped from memory;
+            # their history stays in the database
+            flows_cleaned = self._history.expire(cutoff_date.timestamp())
 
             logger.info(
                 f"Cleaned up history for {flows_cleaned} flows older than {max_age_days} days"
@@ -1405,17 +1401,17 @@ class FlowStateMachine:
         Returns:
             Dictionary with complete flow history
         """
-        if flow_id not in self._state_history:
-            return {"error": f"Flow {flow_id} not found in history"}
-
         try:
-            history = self._state_history[flow_id]
-
-            # Calculate state durations
+            # Stream the history, from disk when persisted, and fold each
+            # entry into the state durations as it goes by
+            history = []
             state_durations = {}
-            for i in range(1, len(history)):
-                prev = history[i - 1]
-                curr = history[i]
+            prev = None
+            for curr in self._history.iter_entries(flow_id):
+                history.append(curr)
+                if prev is None:
+                    prev = curr
+                    continue
 
                 try:
                     prev_time = datetime.fromisoformat(prev["timestamp"])
@@ -1443,6 +1439,10 @@ class FlowStateMachine:
                 except (ValueError, KeyError):
                     # Skip if we can't parse the timestamps
                     pass
+                prev = curr
+
+            if not history:
+                return {"error": f"Flow {flow_id} not found in history"}
 
             # Calculate average durations
             for state, data in state_durations.items():
@@ -3,50 +3,90 @@ Deep Thinking Engine - Core Data Models
 
 This module contains all the Pydantic models and data transfer objects (DTOs)
 used throughout the deep thinking engine system.
+
+Models are imported from their submodules on first access, so importing one
+submodule (e.g. mcp_models) does not build every model class.
 """
 
-# Import models explicitly to avoid linting issues
-from .agent_models import AgentConfig, AgentInput, AgentMetadata, AgentOutput
-from .evaluation_models import (
-    BiasAnalysis,
-    DebateResults,
-    InnovationResults,
-    PaulElderEvaluation,
-    ReflectionGuidance,
-)
-from .evidence_models import (
-    ConflictingInformation,
-    EvidenceCollection,
-    EvidenceSource,
-    SearchQuery,
-)
-from .thinking_models import (
-    QuestionDecomposition,
-    SubQuestion,
-    ThinkingSession,
-    ThinkingTrace,
-)
+import importlib
+from typing import TYPE_CHECKING
 
-__all__ = [
+if TYPE_CHECKING:
+    from .agent_models import AgentConfig, AgentInput, AgentMetadata, AgentOutput
+    from .evaluation_models import (
+        BiasAnalysis,
+        DebateResults,
+        InnovationResults,
+        PaulElderEvaluation,
+        ReflectionGuidance,
+    )
+    from .evidence_models import (
+        ConflictingInformation,
+        EvidenceCollection,
+        EvidenceSource,
+        SearchQuery,
+    )
+    from .thinking_models import (
+        QuestionDecomposition,
+        SubQuestion,
+        ThinkingSession,
+        ThinkingTrace,
+    )
+
+# Exported name -> submodule defining it
+_MODEL_MODULES = {
     # Agent Models
+    "AgentInput": "agent_models",
+    "AgentOutput": "agent_models",
+    "AgentConfig": "agent_models",
+    "AgentMetadata": "agent_models",
+    # Thinking Models
+    "ThinkingSession": "thinking_models",
+    "ThinkingTrace": "thinking_models",
+    "QuestionDecomposition": "thinking_models",
+    "SubQuestion": "thinking_models",
+    # Evidence Models
+    "EvidenceSource": "evidence_models",
+    "EvidenceCollection": "evidence_models",
+    "SearchQuery": "evidence_models",
+    "ConflictingInformation": "evidence_models",
+    # Evaluation Models
+    "PaulElderEvaluation": "evaluation_models",
+    "BiasAnalysis": "evaluation_models",
+    "DebateResults": "evaluation_models",
+    "InnovationResults": "evaluation_models",
+    "ReflectionGuidance": "evaluation_models",
+}
+
+__all__ = [
     "AgentInput",
     "AgentOutput",
     "AgentConfig",
     "AgentMetadata",
-    # Thinking Models
     "ThinkingSession",
     "ThinkingTrace",
     "QuestionDecomposition",
     "SubQuestion",
-    # Evidence Models
     "EvidenceSource",
     "EvidenceCollection",
     "SearchQuery",
     "ConflictingInformation",
-    # Evaluation Models
     "PaulElderEvaluation",
     "BiasAnalysis",
     "DebateResults",
     "InnovationResults",
     "ReflectionGuidance",
 ]
+
+
+def __getattr__(name: str):
+    module = _MODEL_MODULES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
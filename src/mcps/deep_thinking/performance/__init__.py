@@ -14,6 +14,7 @@ from .system_monitor import (
     ResponseTimeStats,
     PerformanceMetric,
 )
+from .resource_sampler import ResourceSampler, SampleRing, get_resource_sampler
 
 __all__ = [
     "SystemPerformanceMonitor",
@@ -23,4 +24,7 @@ __all__ = [
     "SystemResourceStats",
     "ResponseTimeStats",
     "PerformanceMetric",
+    "ResourceSampler",
+    "SampleRing",
+    "get_resource_sampler",
 ]
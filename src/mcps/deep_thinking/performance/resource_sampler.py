@@ -0,0 +1,390 @@
+"""
+Shared Resource Sampler
+
+One background thread samples system and process resources for every
+monitor in the process. Each metric group is read on its own interval
+(CPU and memory every second, disk usage and open files far less often)
+and never blocks: CPU usage is the delta since the previous read rather
+than a one-second measurement.
+
+Samples go into SampleRing buffers, fixed-size rings with one double
+array per metric. Window queries bisect the timestamps and copy the
+matching slices of each array at once, and summaries reduce those slices
+with builtins, so no per-sample Python objects are kept or walked.
+"""
+
+import logging
+import math
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, Optional, Sequence
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+# Metrics read together, and how often each group is read by default
+METRIC_GROUPS: Dict[str, Sequence[str]] = {
+    "cpu": ("cpu_percent", "process_cpu_percent"),
+    "memory": ("memory_percent", "memory_used_mb", "memory_available_mb"),
+    "process": ("process_memory_mb", "thread_count"),
+    "disk": ("disk_usage_percent", "disk_free_gb"),
+    "open_files": ("open_files",),
+}
+DEFAULT_INTERVALS: Dict[str, float] = {
+    "cpu": 1.0,
+    "memory": 1.0,
+    "process": 1.0,
+    "disk": 30.0,
+    "open_files": 60.0,  # Process.open_files() reads every descriptor
+}
+
+
+class _OrderedView:
+    """Oldest-first indexing over a ring's physical array, for bisect"""
+
+    __slots__ = ("column", "start", "count")
+
+    def __init__(self, column: array, start: int, count: int):
+        self.column = column
+        self.start = start
+        self.count = count
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, index: int) -> float:
+        return self.column[(self.start + index) % len(self.column)]
+
+
+class SampleRing:
+    """
+    Fixed-size ring of timestamped samples, one double array per field
+
+    Missing values are stored as 0.0. Timestamps are wall-clock seconds.
+    """
+
+    def __init__(self, fields: Iterable[str], capacity: int = 1000):
+        self.fields = tuple(fields)
+        self.capacity = capacity
+        zeros = bytes(8 * capacity)
+        self.times = array("d", zeros)
+        self.columns = {name: array("d", zeros) for name in self.fields}
+        self.start = 0  # Physical index of the oldest sample
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def append(self, timestamp: float, values: Dict[str, float]) -> None:
+        with self.lock:
+            index = (self.start + self.count) % self.capacity
+            if self.count == self.capacity:
+                self.start = (self.start + 1) % self.capacity
+            else:
+                self.count += 1
+            self.times[index] = timestamp
+            for name, column in self.columns.items():
+                column[index] = values.get(name, 0.0)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.start = self.count = 0
+
+    def _slice(self, column: array, first: int) -> array:
+        """Samples first..count-1 in order, copied out of the ring"""
+        begin = (self.start + first) % self.capacity
+        size = self.count - first
+        if begin + size <= self.capacity:
+            return column[begin : begin + size]
+        return column[begin:] + column[: begin + size - self.capacity]
+
+    def window(
+        self, since: Optional[float] = None, last: Optional[int] = None
+    ) -> Dict[str, array]:
+        """
+        Samples taken at or after since and/or the last few, oldest first
+
+        Returns:
+            Dictionary with a "timestamp" array and one array per field
+        """
+        with self.lock:
+            first = 0
+            if since is not None:
+                view = _OrderedView(self.times, self.start, self.count)
+                first = bisect_left(view, since)
+            if last is not None:
+                first = max(first, self.count - last)
+            window = {"timestamp": self._slice(self.times, first)}
+            for name, column in self.columns.items():
+                window[name] = self._slice(column, first)
+            return window
+
+    def latest(self) -> Optional[Dict[str, float]]:
+        """The most recent sample, or None if empty"""
+        with self.lock:
+            if not self.count:
+                return None
+            index = (self.start + self.count - 1) % self.capacity
+            sample = {name: column[index] for name, column in self.columns.items()}
+            sample["timestamp"] = self.times[index]
+            return sample
+
+    def summarize(
+        self, since: Optional[float] = None, last: Optional[int] = None
+    ) -> Dict[str, Dict[str, float]]:
+        """min, max, mean and last of each field over a window"""
+        window = self.window(since, last)
+        summary = {}
+        if not len(window["timestamp"]):
+            return summary
+        for name in self.fields:
+            values = window[name]
+            summary[name] = {
+                "min": min(values),
+                "max": max(values),
+                "mean": math.fsum(values) / len(values),
+                "last": values[-1],
+                "samples": len(values),
+            }
+        return summary
+
+
+class _Subscription:
+    __slots__ = ("callback", "interval", "due")
+
+    def __init__(self, callback: Callable[[], None], interval: float, due: float):
+        self.callback = callback
+        self.interval = interval
+        self.due = due
+
+
+class ResourceSampler:
+    """
+    Samples resource metrics on per-group intervals from one thread
+
+    Subscribers are called every interval seconds from the sampler thread
+    and read the latest values with snapshot(). The thread runs only while
+    there are subscribers; snapshot() refreshes stale groups inline, so
+    one-off reads work without it.
+    """
+
+    def __init__(
+        self,
+        intervals: Optional[Dict[str, float]] = None,
+        history_size: int = 600,
+    ):
+        self.intervals = {**DEFAULT_INTERVALS, **(intervals or {})}
+        self.history = {
+            group: SampleRing(fields, history_size)
+            for group, fields in METRIC_GROUPS.items()
+        }
+        self._collectors = {
+            "cpu": self._sample_cpu,
+            "memory": self._sample_memory,
+            "process": self._sample_process,
+            "disk": self._sample_disk,
+            "open_files": self._sample_open_files,
+        }
+        self._latest: Dict[str, float] = {}
+        self._sampled_at: Dict[str, float] = {}  # Monotonic time per group
+        self._subscriptions: Dict[int, _Subscription] = {}
+        self._next_token = 0
+        self.lock = threading.RLock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {"samples": 0, "sample_seconds": 0.0, "errors": 0}
+        self._started_at = time.monotonic()
+
+        self._process = psutil.Process()
+        # The first non-blocking read only sets the baseline for the next
+        # delta, so take it now
+        psutil.cpu_percent(interval=None)
+        self._process.cpu_percent(interval=None)
+
+    # Collectors
+
+    def _sample_cpu(self) -> Dict[str, float]:
+        return {
+            "cpu_percent": psutil.cpu_percent(interval=None),
+            "process_cpu_percent": self._process.cpu_percent(interval=None),
+        }
+
+    def _sample_memory(self) -> Dict[str, float]:
+        memory = psutil.virtual_memory()
+        return {
+            "memory_percent": memory.percent,
+            "memory_used_mb": memory.used / 1024 / 1024,
+            "memory_available_mb": memory.available / 1024 / 1024,
+        }
+
+    def _sample_process(self) -> Dict[str, float]:
+        return {
+            "process_memory_mb": self._process.memory_info().rss / 1024 / 1024,
+            "thread_count": self._process.num_threads(),
+        }
+
+    def _sample_disk(self) -> Dict[str, float]:
+        disk = psutil.disk_usage("/")
+        return {
+            "disk_usage_percent": disk.percent,
+            "disk_free_gb": disk.free / 1024 / 1024 / 1024,
+        }
+
+    def _sample_open_files(self) -> Dict[str, float]:
+        if not hasattr(self._process, "open_files"):
+            return {"open_files": 0}
+        return {"open_files": len(self._process.open_files())}
+
+    # Sampling
+
+    def sample(self, groups: Optional[Iterable[str]] = None) -> Dict[str, float]:
+        """
+        Read metric groups now
+
+        Args:
+            groups: Groups to read; None for every group that is due
+
+        Returns:
+            The values read
+        """
+        now = time.monotonic()
+        with self.lock:
+            if groups is None:
+                groups = [
+                    group
+                    for group, interval in self.intervals.items()
+                    if now - self._sampled_at.get(group, -math.inf) >= interval
+                ]
+            values: Dict[str, float] = {}
+            wall = time.time()
+            for group in groups:
+                started = time.perf_counter()
+                try:
+                    group_values = self._collectors[group]()
+                except Exception as e:
+                    self.stats["errors"] += 1
+                    logger.error(f"Error sampling {group} resources: {e}")
+                    continue
+                finally:
+                    self.stats["sample_seconds"] += time.perf_counter() - started
+                self.stats["samples"] += 1
+                self._sampled_at[group] = now
+                self.history[group].append(wall, group_values)
+                values.update(group_values)
+            self._latest.update(values)
+            return values
+
+    def snapshot(self) -> Dict[str, float]:
+        """Latest value of every metric, reading stale groups first"""
+        self.sample()
+        with self.lock:
+            return dict(self._latest)
+
+    def latest(self, metric: str, default: float = 0.0) -> float:
+        """Latest value of one metric, without sampling"""
+        with self.lock:
+            return self._latest.get(metric, default)
+
+    def get_history(self, group: str, seconds: Optional[float] = None):
+        """A group's samples from the last seconds (all if None), oldest first"""
+        since = time.time() - seconds if seconds is not None else None
+        return self.history[group].window(since)
+
+    # Subscriptions
+
+    def subscribe(self, callback: Callable[[], None], interval: float) -> int:
+        """
+        Call callback every interval seconds from the sampler thread
+
+        Returns:
+            Token for unsubscribe()
+        """
+        with self.lock:
+            token = self._next_token
+            self._next_token += 1
+            self._subscriptions[token] = _Subscription(
+                callback, interval, time.monotonic() + interval
+            )
+            if self._thread is None or not self._thread.is_alive():
+                self._wake.clear()
+                self._thread = threading.Thread(
+                    target=self._run, daemon=True, name="resource-sampler"
+                )
+                self._thread.start()
+            else:
+                self._wake.set()  # Recompute the next wakeup
+            return token
+
+    def unsubscribe(self, token: int, timeout: float = 5.0) -> None:
+        """Stop calling a subscriber; the thread exits with the last one"""
+        with self.lock:
+            self._subscriptions.pop(token, None)
+            thread = self._thread
+            if self._subscriptions or thread is None:
+                return
+            self._thread = None
+            self._wake.set()
+        if thread is not threading.current_thread():
+            thread.join(timeout)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self) -> None:
+        thread = threading.current_thread()
+        while True:
+            with self.lock:
+                if self._thread is not thread:
+                    return
+                now = time.monotonic()
+                due = [s for s in self._subscriptions.values() if s.due <= now]
+            self.sample()
+            for subscription in due:
+                subscription.due = now + subscription.interval
+                try:
+                    subscription.callback()
+                except Exception as e:
+                    logger.error(f"Error in resource sampler callback: {e}")
+
+            with self.lock:
+                now = time.monotonic()
+                wakeups = [s.due for s in self._subscriptions.values()]
+                wakeups.extend(
+                    self._sampled_at.get(group, now) + interval
+                    for group, interval in self.intervals.items()
+                )
+                timeout = max(min(wakeups, default=now + 1.0) - now, 0.0)
+                self._wake.clear()
+            self._wake.wait(timeout)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Sampling counts and the share of wall time spent sampling"""
+        with self.lock:
+            elapsed = time.monotonic() - self._started_at
+            return {
+                "running": self.running,
+                "subscribers": len(self._subscriptions),
+                "intervals": dict(self.intervals),
+                "samples": self.stats["samples"],
+                "errors": self.stats["errors"],
+                "sample_seconds": self.stats["sample_seconds"],
+                "overhead_ratio": self.stats["sample_seconds"] / max(elapsed, 1e-9),
+            }
+
+
+_resource_sampler: Optional[ResourceSampler] = None
+_resource_sampler_lock = threading.Lock()
+
+
+def get_resource_sampler() -> ResourceSampler:
+    """Sampler shared by every resource and memory monitor in the process"""
+    global _resource_sampler
+    with _resource_sampler_lock:
+        if _resource_sampler is None:
+            _resource_sampler = ResourceSampler()
+        return _resource_sampler
@@ -7,16 +7,18 @@ response time statistics, and comprehensive system performance testing.
 
 import gc
 import logging
+import math
 import os
-import psutil
 import threading
 import time
 from collections import defaultdict, deque
-from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional, Tuple, Callable
-from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Callable
+from dataclasses import dataclass, field, fields
 import weakref
 
+from .resource_sampler import ResourceSampler, SampleRing, get_resource_sampler
+
 logger = logging.getLogger(__name__)
 
 
@@ -48,6 +50,11 @@ class SystemResourceStats:
     timestamp: datetime = field(default_factory=datetime.now)
 
 
+# Numeric SystemResourceStats fields, stored as columns of the history ring
+RESOURCE_FIELDS = tuple(f.name for f in fields(SystemResourceStats))[:-1]
+_INT_FIELDS = ("thread_count", "open_files")
+
+
 @dataclass
 class ResponseTimeStats:
     """Response time statistics for operations"""
@@ -263,94 +270,84 @@ class OperationTracker:
 
 
 class SystemResourceMonitor:
-    """Monitors system resource usage"""
+    """
+    Monitors system resource usage
 
-    def __init__(self, monitoring_interval: float = 5.0):
+    Readings come from the shared ResourceSampler, which reads each metric
+    on its own interval without blocking. Every monitoring_interval the
+    latest readings are appended to a fixed-size ring with one numeric
+    column per SystemResourceStats field, and callbacks are called.
+    """
+
+    def __init__(
+        self,
+        monitoring_interval: float = 5.0,
+        sampler: Optional[ResourceSampler] = None,
+        history_size: int = 1000,
+    ):
         self.monitoring_interval = monitoring_interval
         self.monitoring_active = False
-        self.monitor_thread = None
-        self.resource_history = deque(maxlen=1000)
+        self.sampler = sampler or get_resource_sampler()
+        self.resource_history = SampleRing(RESOURCE_FIELDS, history_size)
         self.callbacks = []
         self.lock = threading.RLock()
+        self._subscription: Optional[int] = None
 
     def start_monitoring(self):
         """Start system resource monitoring"""
-        if self.monitoring_active:
-            return
+        with self.lock:
+            if self.monitoring_active:
+                return
 
-        self.monitoring_active = True
-        self.monitor_thread = threading.Thread(
-            target=self._monitoring_loop, daemon=True, name="system-resource-monitor"
-        )
-        self.monitor_thread.start()
+            self.monitoring_active = True
+            self._subscription = self.sampler.subscribe(
+                self._record_sample, self.monitoring_interval
+            )
         logger.info("System resource monitoring started")
 
     def stop_monitoring(self):
         """Stop system resource monitoring"""
-        self.monitoring_active = False
-        if self.monitor_thread and self.monitor_thread.is_alive():
-            self.monitor_thread.join(timeout=10.0)
+        with self.lock:
+            self.monitoring_active = False
+            subscription, self._subscription = self._subscription, None
+        if subscription is not None:
+            self.sampler.unsubscribe(subscription)
         logger.info("System resource monitoring stopped")
 
     def add_callback(self, callback: Callable[[SystemResourceStats], None]):
         """Add callback for resource updates"""
         self.callbacks.append(callback)
 
-    def _monitoring_loop(self):
-        """Main monitoring loop"""
-        while self.monitoring_active:
-            try:
-                stats = self._collect_resource_stats()
-
-                with self.lock:
-                    self.resource_history.append(stats)
-
-                # Call registered callbacks
-                for callback in self.callbacks:
-                    try:
-                        callback(stats)
-                    except Exception as e:
-                        logger.error(f"Error in resource monitor callback: {e}")
-
-                time.sleep(self.monitoring_interval)
+    def _record_sample(self):
+        """Store the latest readings and notify callbacks; runs on the sampler thread"""
+        stats = self._collect_resource_stats()
+        self.resource_history.append(
+            stats.timestamp.timestamp(),
+            {name: getattr(stats, name) for name in RESOURCE_FIELDS},
+        )
 
+        # Call registered callbacks
+        for callback in self.callbacks:
+            try:
+                callback(stats)
             except Exception as e:
-                logger.error(f"Error in resource monitoring loop: {e}")
-                time.sleep(self.monitoring_interval)
+                logger.error(f"Error in resource monitor callback: {e}")
 
     def _collect_resource_stats(self) -> SystemResourceStats:
         """Collect current system resource statistics"""
         try:
-            # System-wide stats
-            cpu_percent = psutil.cpu_percent(interval=1)
-            memory = psutil.virtual_memory()
-            disk = psutil.disk_usage("/")
-
-            # Process-specific stats
-            process = psutil.Process()
-            process_memory = process.memory_info()
-            process_cpu = process.cpu_percent()
-
-            return SystemResourceStats(
-                cpu_percent=cpu_percent,
-                memory_percent=memory.percent,
-                memory_used_mb=memory.used / 1024 / 1024,
-                memory_available_mb=memory.available / 1024 / 1024,
-                disk_usage_percent=disk.percent,
-                disk_free_gb=disk.free / 1024 / 1024 / 1024,
-                process_memory_mb=process_memory.rss / 1024 / 1024,
-                process_cpu_percent=process_cpu,
-                thread_count=process.num_threads(),
-                open_files=(
-                    len(process.open_files()) if hasattr(process, "open_files") else 0
-                ),
-                timestamp=datetime.now(),
-            )
-
+            return self._to_stats(self.sampler.snapshot(), datetime.now())
         except Exception as e:
             logger.error(f"Error collecting resource stats: {e}")
             return SystemResourceStats()
 
+    @staticmethod
+    def _to_stats(values: Dict[str, float], timestamp: datetime) -> SystemResourceStats:
+        stats = {name: values.get(name, 0.0) for name in RESOURCE_FIELDS}
+        for name in _INT_FIELDS:
+            stats[name] = int(stats[name])
+        return SystemResourceStats(**stats, timestamp=timestamp)
+
     def get_current_stats(self) -> Optional[SystemResourceStats]:
         """Get current resource statistics"""
         try:
@@ -361,14 +358,28 @@ class SystemResourceMonitor:
 
     def get_historical_stats(self, minutes: int = 10) -> List[SystemResourceStats]:
         """Get historical resource statistics"""
-        cutoff_time = datetime.now() - timedelta(minutes=minutes)
+        window = self.get_metric_window(minutes)
+        columns = [window[name] for name in RESOURCE_FIELDS]
+        return [
+            self._to_stats(
+                dict(zip(RESOURCE_FIELDS, row)), datetime.fromtimestamp(timestamp)
+            )
+            for timestamp, *row in zip(window["timestamp"], *columns)
+        ]
 
-        with self.lock:
-            return [
-                stats
-                for stats in self.resource_history
-                if stats.timestamp >= cutoff_time
-            ]
+    def get_metric_window(self, minutes: float = 10) -> Dict[str, Any]:
+        """
+        Recorded readings from the last minutes as numeric arrays
+
+        Returns:
+            Dictionary with a "timestamp" array (epoch seconds) and one
+            array per SystemResourceStats field, oldest first
+        """
+        return self.resource_history.window(since=time.time() - minutes * 60)
+
+    def get_history_summary(self, minutes: float = 10) -> Dict[str, Dict[str, float]]:
+        """min, max, mean and last of each reading over the last minutes"""
+        return self.resource_history.summarize(since=time.time() - minutes * 60)
 
 
 class SystemPerformanceMonitor:
@@ -484,13 +495,10 @@ class SystemPerformanceMonitor:
 
         recent_history = list(self.performance_history)[-10:]  # Last 10 measurements
 
-        # Calculate trends
-        cpu_trend = self._calculate_trend(
-            [h["resource_stats"].cpu_percent for h in recent_history]
-        )
-        memory_trend = self._calculate_trend(
-            [h["resource_stats"].memory_percent for h in recent_history]
-        )
+        # Calculate trends over the last 10 recorded readings
+        readings = self.resource_monitor.resource_history.window(last=10)
+        cpu_trend = self._calculate_trend(readings["cpu_percent"])
+        memory_trend = self._calculate_trend(readings["memory_percent"])
 
         return {
             "cpu_trend": cpu_trend,
@@ -505,14 +513,15 @@ class SystemPerformanceMonitor:
             / len(recent_history),
         }
 
-    def _calculate_trend(self, values: List[float]) -> str:
+    def _calculate_trend(self, values: Sequence[float]) -> str:
         """Calculate trend direction from values"""
         if len(values) < 2:
             return "stable"
 
         # Simple trend calculation
-        first_half = sum(values[: len(values) // 2]) / (len(values) // 2)
-        second_half = sum(values[len(values) // 2 :]) / (len(values) - len(values) // 2)
+        half = len(values) // 2
+        first_half = math.fsum(values[:half]) / half
+        second_half = math.fsum(values[half:]) / (len(values) - half)
 
         diff_percent = (second_half - first_half) / max(first_half, 0.1) * 100
 
@@ -8,6 +8,8 @@ that exposes the deep thinking tools to MCP-compatible hosts like Cursor.
 import asyncio
 import json
 import logging
+import threading
+from contextlib import ExitStack
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
@@ -16,23 +18,24 @@ from mcp.server import Server
 from mcp.server.stdio import stdio_server
 from mcp.types import TextContent
 
-from .config.config_manager import ConfigManager
 from .config.exceptions import DeepThinkingError
-from .flows.flow_manager import FlowManager
-from .models.mcp_models import (
-    AnalyzeStepInput,
-    CompleteThinkingInput,
-    NextStepInput,
-    StartThinkingInput,
-)
-from .sessions.session_manager import SessionManager
-from .templates.template_manager import TemplateManager
-from .tools.mcp_tools import MCPTools
+from .tools.tool_executor import ToolExecutor
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Attributes built by _build_components, on first use unless lazy_init is off
+LAZY_COMPONENTS = frozenset(
+    {
+        "config_manager",
+        "session_manager",
+        "template_manager",
+        "flow_manager",
+        "mcp_tools",
+    }
+)
+
 
 class DeepThinkingMCPServer:
     """
@@ -42,59 +45,134 @@ class DeepThinkingMCPServer:
     for LLM execution, following the intelligent division of labor principle.
     """
 
-    def __init__(self, config_path: Optional[str] = None):
-        """Initialize the MCP server with configuration"""
-        self.server = Server("deep-thinking-engine")
+    # Tools that write to the session database; their commits are batched
+    WRITE_TOOLS = frozenset(
+        {"start_thinking", "next_step", "analyze_step", "complete_thinking"}
+    )
 
-        # Initialize core components
-        try:
-            # Get the templates directory - try multiple locations
-            templates_path = None
-
-            # Method 1: Try relative to package installation (for uvx --from)
-            import mcps.deep_thinking
-
-            package_dir = Path(mcps.deep_thinking.__file__).parent
-
-            # Check several possible locations
-            candidate_paths = [
-                # In packaged installation, templates should be at the same level as site-packages
-                package_dir.parent.parent.parent / "templates",  # uvx installation
-                package_dir.parent.parent / "templates",  # pip installation
-                # For development mode, check project root
-                Path.cwd() / "templates",  # current working directory
-                Path(__file__).parent.parent.parent.parent
-                / "templates",  # relative to this file
-            ]
+    def __init__(
+        self,
+        config_path: Optional[str] = None,
+        max_workers: int = 4,
+        execution_mode: str = "threaded",
+        write_behind: bool = False,
+        durability: str = "normal",
+        lazy_init: bool = True,
+    ):
+        """
+        Initialize the MCP server with configuration
+
+        Args:
+            config_path: Path to configuration file
+            max_workers: Worker threads available to tool handlers
+            execution_mode: "threaded" to run handlers off the event loop,
+                "inline" to run them on the loop thread
+            write_behind: Commit each tool call's database writes as one
+                transaction
+            durability: SQLite synchronous level, "normal" or "full"
+            lazy_init: Build the session, template, flow and config managers
+                on the first tool call instead of before serving, so that
+                list_tools is answered without waiting for them
+        """
+        self.server = Server("deep-thinking-engine")
+        self.config_path = config_path
+        self.write_behind = write_behind
+        self.durability = durability
+        self._components_lock = threading.Lock()
+        self.tool_executor = ToolExecutor(
+            max_workers=max_workers, execution_mode=execution_mode
+        )
 
-            for candidate in candidate_paths:
-                if (
-                    candidate.exists()
-                    and (candidate / "comprehensive_evidence_collection.tmpl").exists()
-                ):
-                    templates_path = candidate
-                    break
-
-            if not templates_path:
-                # Fallback to default relative path
-                templates_path = Path("templates")
-
-            self.config_manager = ConfigManager(config_path)
-            self.session_manager = SessionManager()
-            self.template_manager = TemplateManager(str(templates_path))
-            self.flow_manager = FlowManager()
-            self.mcp_tools = MCPTools(
-                self.session_manager, self.template_manager, self.flow_manager, self.config_manager
-            )
-        except Exception as e:
-            logger.error(f"Failed to initialize MCP server components: {e}")
-            raise
+        if not lazy_init:
+            self._build_components()
 
         # Register MCP tools
         self._register_tools()
 
         logger.info("Deep Thinking MCP Server initialized successfully")
 
+    def __getattr__(self, name: str) -> Any:
+        # Only called for missing attributes, so built components cost nothing
+        if name not in LAZY_COMPONENTS:
+            raise AttributeError(
+                f"{type(self).__name__!r} object has no attribute {name!r}"
+            )
+        self._build_components()
+        return self.__dict__[name]
+
+    @property
+    def components_ready(self) -> bool:
+        """Whether the core components have been built"""
+        return "mcp_tools" in self.__dict__
+
+    def _build_components(self) -> None:
+        """Import and initialize the core components, once"""
+        with self._components_lock:
+            if self.components_ready:
+                return
+
+            from .config.config_manager import ConfigManager
+            from .data.privacy_manager import PrivacyManager
+            from .flows.flow_manager import FlowManager
+            from .sessions.session_manager import SessionManager
+            from .templates.template_manager import TemplateManager
+            from .tools.mcp_tools import MCPTools
+
+            try:
+                templates_path = self._find_templates_path()
+                config_manager = ConfigManager(self.config_path)
+                # A database encrypted by PrivacyManager is opened with its keys
+                keys = PrivacyManager().load_encryption_keys() or (None, [])
+                session_manager = SessionManager(
+                    encryption_key=keys[0],
+                    previous_encryption_keys=keys[1],
+                    write_behind=self.write_behind,
+                    durability=self.durability,
+                )
+                template_manager = TemplateManager(str(templates_path))
+                flow_manager = FlowManager()
+                mcp_tools = MCPTools(
+                    session_manager, template_manager, flow_manager, config_manager
+                )
+            except Exception as e:
+                logger.error(f"Failed to initialize MCP server components: {e}")
+                raise
+
+            self.config_manager = config_manager
+            self.session_manager = session_manager
+            self.template_manager = template_manager
+            self.flow_manager = flow_manager
+            # Set last: its presence marks the components as ready
+            self.mcp_tools = mcp_tools
+            logger.info("Deep Thinking components initialized")
+
+    @staticmethod
+    def _find_templates_path() -> Path:
+        """Locate the templates directory - try multiple locations"""
+        # Method 1: Try relative to package installation (for uvx --from)
+        package_dir = Path(__file__).parent
+
+        # Check several possible locations
+        candidate_paths = [
+            # In packaged installation, templates should be at the same level as site-packages
+            package_dir.parent.parent.parent / "templates",  # uvx installation
+            package_dir.parent.parent / "templates",  # pip installation
+            # For development mode, check project root
+            Path.cwd() / "templates",  # current working directory
+            Path(__file__).parent.parent.parent.parent
+            / "templates",  # relative to this file
+        ]
+
+        for candidate in candidate_paths:
+            if (
+                candidate.exists()
+                and (candidate / "comprehensive_evidence_collection.tmpl").exists()
+            ):
+                return candidate
+
+        # Fallback to default relative path
+        return Path("templates")
+
     def _register_tools(self):
         """Register all MCP tools with the server"""
 
@@ -234,6 +312,20 @@ class DeepThinkingMCPServer:
                         "required": ["session_id"],
                     },
                 ),
+                Tool(
+                    name="rotate_encryption_key",
+                    description="在服务运行期间轮换会话数据库的加密密钥（分批重新加密，不中断服务）",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "batch_size": {
+                                "type": "integer",
+                                "default": 200,
+                                "description": "每个事务重新加密的行数",
+                            },
+                        },
+                    },
+                ),
             ]
 
         @self.server.call_tool()
@@ -242,73 +334,15 @@ class DeepThinkingMCPServer:
             try:
                 logger.info(f"Calling tool: {name} with arguments: {arguments}")
 
-                if name == "start_thinking":
-                    input_data = StartThinkingInput(**arguments)
-                    result = self.mcp_tools.start_thinking(input_data)
-
-                elif name == "next_step":
-                    input_data = NextStepInput(**arguments)
-                    result = self.mcp_tools.next_step(input_data)
-
-                elif name == "analyze_step":
-                    input_data = AnalyzeStepInput(**arguments)
-                    result = self.mcp_tools.analyze_step(input_data)
-
-                elif name == "complete_thinking":
-                    input_data = CompleteThinkingInput(**arguments)
-                    result = self.mcp_tools.complete_thinking(input_data)
-
-                elif name == "export_session_markdown":
-                    session_id = arguments.get("session_id")
-                    export_path = arguments.get("export_path")
-                    custom_title = arguments.get("custom_title")
-
-                    if not session_id:
-                        raise McpError(
-                            "session_id is required for export_session_markdown"
-                        )
-
-                    result = self.mcp_tools.export_session_to_markdown(
-                        session_id, export_path, custom_title
-                    )
-
-                    # Format export result for MCP response
-                    if result.get("success"):
-                        response_content = json.dumps(
-                            {
-                                "success": True,
-                                "message": f"Successfully exported session to {result['file_path']}",
-                                "export_details": {
-                                    "file_path": result["file_path"],
-                                    "file_size_bytes": result["file_size_bytes"],
-                                    "content_lines": result["content_lines"],
-                                    "content_words": result["content_words"],
-                                    "session_id": result["session_id"],
-                                    "export_timestamp": result["export_timestamp"],
-                                },
-                            },
-                            ensure_ascii=False,
-                            indent=2,
-                        )
-                    else:
-                        response_content = json.dumps(
-                            {
-                                "success": False,
-                                "error": result.get("error", "Unknown export error"),
-                                "session_id": session_id,
-                            },
-                            ensure_ascii=False,
-                            indent=2,
-                        )
-
-                    logger.info(f"Export tool executed: {result.get('success', False)}")
-                    return [TextContent(type="text", text=response_content)]
-
-                else:
-                    raise McpError(f"Unknown tool: {name}")
-
-                # Convert result to MCP response format
-                response_content = self._format_mcp_response(result)
+                # Tool handlers block on SQLite and template I/O, so they run on
+                # the executor's worker pool; calls for one session stay ordered.
+                response_content = await self.tool_executor.run(
+                    name,
+                    (arguments or {}).get("session_id"),
+                    self._run_tool,
+                    name,
+                    arguments or {},
+                )
 
                 logger.info(f"Tool {name} executed successfully")
                 return [TextContent(type="text", text=response_content)]
@@ -325,6 +359,121 @@ class DeepThinkingMCPServer:
                 )
                 return [TextContent(type="text", text=error_response)]
 
+    def _run_tool(self, name: str, arguments: Dict[str, Any]) -> str:
+        """
+        Execute a tool, batching the database writes of writing tools
+
+        The tool's session stays pinned in the session cache meanwhile, so
+        another request's cache insert cannot evict it mid-update.
+        """
+        with ExitStack() as stack:
+            session_id = arguments.get("session_id")
+            if isinstance(session_id, str):
+                stack.enter_context(self.session_manager.session_in_use(session_id))
+            if name in self.WRITE_TOOLS:
+                stack.enter_context(self.session_manager.db.write_batch())
+            return self._execute_tool(name, arguments)
+
+    def _execute_tool(self, name: str, arguments: Dict[str, Any]) -> str:
+        """Execute a tool synchronously and return the formatted response content"""
+        from .models.mcp_models import (
+            AnalyzeStepInput,
+            CompleteThinkingInput,
+            NextStepInput,
+            StartThinkingInput,
+        )
+
+        if name == "start_thinking":
+            input_data = StartThinkingInput(**arguments)
+            result = self.mcp_tools.start_thinking(input_data)
+
+        elif name == "next_step":
+            input_data = NextStepInput(**arguments)
+            result = self.mcp_tools.next_step(input_data)
+
+        elif name == "analyze_step":
+            input_data = AnalyzeStepInput(**arguments)
+            result = self.mcp_tools.analyze_step(input_data)
+
+        elif name == "complete_thinking":
+            input_data = CompleteThinkingInput(**arguments)
+            result = self.mcp_tools.complete_thinking(input_data)
+
+        elif name == "export_session_markdown":
+            session_id = arguments.get("session_id")
+            export_path = arguments.get("export_path")
+            custom_title = arguments.get("custom_title")
+
+            if not session_id:
+                raise McpError("session_id is required for export_session_markdown")
+
+            result = self.mcp_tools.export_session_to_markdown(
+                session_id, export_path, custom_title
+            )
+
+            # Format export result for MCP response
+            if result.get("success"):
+                response_content = json.dumps(
+                    {
+                        "success": True,
+                        "message": f"Successfully exported session to {result['file_path']}",
+                        "export_details": {
+                            "file_path": result["file_path"],
+                            "file_size_bytes": result["file_size_bytes"],
+                            "content_lines": result["content_lines"],
+                            "content_words": result["content_words"],
+                            "session_id": result["session_id"],
+                            "export_timestamp": result["export_timestamp"],
+                        },
+                    },
+                    ensure_ascii=False,
+                    indent=2,
+                )
+            else:
+                response_content = json.dumps(
+                    {
+                        "success": False,
+                        "error": result.get("error", "Unknown export error"),
+                        "session_id": session_id,
+                    },
+                    ensure_ascii=False,
+                    indent=2,
+                )
+
+            logger.info(f"Export tool executed: {result.get('success', False)}")
+            return response_content
+
+        elif name == "rotate_encryption_key":
+            return self._rotate_encryption_key(arguments)
+
+        else:
+            raise McpError(f"Unknown tool: {name}")
+
+        # Convert result to MCP response format
+        return self._format_mcp_response(result)
+
+    def _rotate_encryption_key(self, arguments: Dict[str, Any]) -> str:
+        """
+        Rotate the key of the session database this server has open
+
+        Runs online through the serving instance (see
+        PrivacyManager.rotate_encryption_key): tools keep reading and
+        writing while rows are re-encrypted in batches.
+        """
+        from .data.privacy_manager import PrivacyManager
+
+        db = self.session_manager.db
+        if db.db_path == ":memory:":
+            raise McpError("The session database is in memory and not encrypted")
+
+        result = PrivacyManager(str(db.db_path.parent)).rotate_encryption_key(
+            db.db_path.name,
+            arguments.get("batch_size", db.KEY_ROTATION_BATCH_SIZE),
+            database=db,
+        )
+        logger.info(f"Key rotation tool executed: {result['rotation_successful']}")
+        return json.dumps(result, ensure_ascii=False, indent=2, default=str)
+
     def _format_mcp_response(self, result) -> str:
         """Format MCP tool result for client consumption"""
         response = {
@@ -355,14 +504,23 @@ class DeepThinkingMCPServer:
 
         return json.dumps(error_response, ensure_ascii=False, indent=2)
 
+    def get_execution_stats(self) -> Dict[str, Any]:
+        """Get tool execution statistics (queue depth, per-tool latency)"""
+        return self.tool_executor.get_stats()
+
     async def run(self):
         """Run the MCP server"""
         logger.info("Starting Deep Thinking MCP Server...")
 
-        async with stdio_server() as (read_stream, write_stream):
-            await self.server.run(
-                read_stream, write_stream, self.server.create_initialization_options()
-            )
+        try:
+            async with stdio_server() as (read_stream, write_stream):
+                await self.server.run(
+                    read_stream,
+                    write_stream,
+                    self.server.create_initialization_options(),
+                )
+        finally:
+            self.tool_executor.shutdown(wait=False)
 
 
 def setup_logging(log_level: str = "INFO", log_file: str = None):
@@ -458,6 +616,41 @@ Examples:
         help="Only validate configuration and exit",
     )
 
+    parser.add_argument(
+        "--max-workers",
+        type=int,
+        default=4,
+        help="Worker threads used to execute tool calls",
+    )
+
+    parser.add_argument(
+        "--execution-mode",
+        type=str,
+        default="threaded",
+        choices=["threaded", "inline"],
+        help="Run tool handlers on a worker pool (threaded) or on the event loop (inline)",
+    )
+
+    parser.add_argument(
+        "--write-behind",
+        action="store_true",
+        help="Commit the database writes of each tool call in a single transaction",
+    )
+
+    parser.add_argument(
+        "--durability",
+        type=str,
+        default="normal",
+        choices=["normal", "full"],
+        help="SQLite synchronous level (full also survives power loss)",
+    )
+
+    parser.add_argument(
+        "--eager-init",
+        action="store_true",
+        help="Initialize all components before serving instead of on the first tool call",
+    )
+
     args = parser.parse_args()
 
     # Setup logging
@@ -475,7 +668,14 @@ Examples:
 
             # Initialize and start server
             logger.info("Initializing Deep Thinking MCP Server...")
-            server = DeepThinkingMCPServer(config_path=args.config)
+            server = DeepThinkingMCPServer(
+                config_path=args.config,
+                max_workers=args.max_workers,
+                execution_mode=args.execution_mode,
+                write_behind=args.write_behind,
+                durability=args.durability,
+                lazy_init=not args.eager_init,
+            )
 
             logger.info("Starting MCP Server...")
             logger.info("Server is ready to accept connections via stdio")
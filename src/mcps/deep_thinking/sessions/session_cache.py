@@ -0,0 +1,354 @@
+"""
+Session Cache for Deep Thinking Engine
+
+Bounded in-memory cache of active SessionState objects:
+- LRU eviction by entry count and by an estimated byte budget
+- Idle TTL expiry
+- Hit/miss/eviction counters
+- Eviction callback so the owner can write back in-memory-only state
+- Pinning, so sessions in use by a request are never evicted mid-update
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from ..models.mcp_models import SessionState
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SessionCacheStats:
+    """Session cache statistics"""
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    current_entries: int = 0
+    current_bytes: int = 0
+
+
+_SIZED = (str, dict, list, tuple, set)
+
+
+def _measure(value: Any) -> int:
+    """Approximate serialized size of a value, without serializing it"""
+    if isinstance(value, str):
+        return len(value) + 2
+    if isinstance(value, dict):
+        return 2 + sum(_measure(k) + _measure(v) + 2 for k, v in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return 2 + sum(_measure(item) + 1 for item in value)
+    if value is None or isinstance(value, (bool, int, float)):
+        return 8
+    return len(str(value))
+
+
+class SessionSizeEstimator:
+    """
+    Approximate serialized size of sessions, measured incrementally
+
+    Dict fields (context, step_results, ...) are charged entry by entry.
+    An entry is measured when first seen and again only when its value is
+    replaced or, for containers, its length changes, so storing a session
+    again costs a pass over its keys rather than serializing all of it.
+    Nested values edited in place without changing length keep their old
+    size until replaced.
+    """
+
+    def __init__(self):
+        # session_id -> (field, key) -> (value, its length, its size)
+        self._entries: Dict[str, Dict[Tuple[str, Any], Tuple[Any, int, int]]] = {}
+
+    def __call__(self, session: SessionState) -> int:
+        known = self._entries.get(session.session_id, {})
+        entries = {}
+        total = 0
+        for field in type(session).model_fields:
+            value = getattr(session, field)
+            if not isinstance(value, dict):
+                total += _measure(value)
+                continue
+            for key, item in value.items():
+                length = len(item) if isinstance(item, _SIZED) else 0
+                entry = known.get((field, key))
+                if entry is None or entry[0] is not item or entry[1] != length:
+                    entry = (item, length, _measure(key) + _measure(item) + 2)
+                entries[(field, key)] = entry
+                total += entry[2]
+        self._entries[session.session_id] = entries
+        return total
+
+    def forget(self, session_id: str) -> None:
+        """Drop what is remembered about a session that left the cache"""
+        self._entries.pop(session_id, None)
+
+
+class SessionCache(MutableMapping):
+    """
+    Thread-safe LRU cache of sessions keyed by session_id
+
+    A session's size is re-estimated whenever it is stored and when its last
+    pin is released, so sessions that grow are charged for it. Pinned
+    sessions are skipped by eviction and expiry. Evicted or expired sessions
+    are passed to on_evict after the cache lock is released.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 1000,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl_seconds: Optional[float] = 3600.0,
+        on_evict: Optional[Callable[[SessionState], None]] = None,
+        size_estimator: Optional[Callable[[SessionState], int]] = None,
+    ):
+        if max_sessions < 1:
+            raise ValueError("max_sessions must be at least 1")
+
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.on_evict = on_evict
+        self.size_estimator = size_estimator or SessionSizeEstimator()
+        self.stats = SessionCacheStats()
+        self.lock = threading.RLock()
+
+        # session_id -> (session, estimated size, last access)
+        self._entries: "OrderedDict[str, Tuple[SessionState, int, float]]" = (
+            OrderedDict()
+        )
+        # session_id -> number of holders currently using the session
+        self._pins: Dict[str, int] = {}
+
+    def _is_expired(self, last_access: float, now: float) -> bool:
+        return self.ttl_seconds is not None and now - last_access > self.ttl_seconds
+
+    def _remove(self, session_id: str, forget: bool = True) -> SessionState:
+        session, size, _ = self._entries.pop(session_id)
+        if forget and isinstance(self.size_estimator, SessionSizeEstimator):
+            self.size_estimator.forget(session_id)
+        self.stats.current_bytes -= size
+        self.stats.current_entries = len(self._entries)
+        return session
+
+    def notify_evicted(self, evicted: List[SessionState]) -> None:
+        """Pass sessions evicted by put(..., notify=False) to on_evict"""
+        self._notify(evicted)
+
+    def _notify(self, evicted: List[SessionState]):
+        if not self.on_evict:
+            return
+        for session in evicted:
+            try:
+                self.on_evict(session)
+            except Exception as e:
+                logger.error(f"Error handling eviction of {session.session_id}: {e}")
+
+    def get(self, session_id: str, default: Any = None) -> Any:
+        """Look up a session, counting a hit or miss and refreshing recency"""
+        evicted = []
+        with self.lock:
+            entry = self._entries.get(session_id)
+            now = time.monotonic()
+            if entry is not None and self._is_expired(entry[2], now):
+                evicted.append(self._remove(session_id))
+                self.stats.expirations += 1
+                entry = None
+
+            if entry is None:
+                self.stats.misses += 1
+                result = default
+            else:
+                self.stats.hits += 1
+                self._entries[session_id] = (entry[0], entry[1], now)
+                self._entries.move_to_end(session_id)
+                result = entry[0]
+
+        self._notify(evicted)
+        return result
+
+    def put(
+        self, session_id: str, session: SessionState, notify: bool = True
+    ) -> List[SessionState]:
+        """
+        Store a session and evict what no longer fits
+
+        Args:
+            session_id: Session ID
+            session: Session to store; storing the cached object again
+                re-measures its size
+            notify: Pass evicted sessions to on_evict now. Callers holding
+                their own locks pass False and call notify_evicted() after
+                releasing them.
+
+        Returns:
+            Sessions evicted to make room
+        """
+        with self.lock:
+            now = time.monotonic()
+            if session_id in self._entries:
+                self._remove(session_id, forget=False)
+            size = self.size_estimator(session)
+            self.stats.current_bytes += size
+            self._entries[session_id] = (session, size, now)
+            self._entries.move_to_end(session_id)
+            self.stats.current_entries = len(self._entries)
+
+            evicted = self._evict_expired(now)
+            evicted.extend(self._evict_over_budget())
+
+        if evicted:
+            logger.debug(f"Evicted {len(evicted)} sessions from cache")
+        if notify:
+            self._notify(evicted)
+        return evicted
+
+    def _evict_over_budget(self) -> List[SessionState]:
+        """
+        Drop unpinned entries from the LRU end until the limits are met;
+        caller holds the lock. The newest entry is always kept, even if it
+        alone exceeds the budget.
+        """
+        evicted = []
+        newest = next(reversed(self._entries), None)
+        for session_id in list(self._entries):
+            if (
+                len(self._entries) <= self.max_sessions
+                and self.stats.current_bytes <= self.max_bytes
+            ):
+                break
+            if session_id == newest or session_id in self._pins:
+                continue
+            evicted.append(self._remove(session_id))
+            self.stats.evictions += 1
+        return evicted
+
+    def _evict_expired(self, now: float) -> List[SessionState]:
+        """Drop unpinned expired entries from the LRU end; caller holds the lock"""
+        expired = []
+        for session_id, (_, _, last_access) in list(self._entries.items()):
+            if not self._is_expired(last_access, now):
+                break
+            if session_id in self._pins:
+                continue
+            expired.append(self._remove(session_id))
+            self.stats.expirations += 1
+        return expired
+
+    def pin(self, session_id: str) -> None:
+        """Keep a session cached until a matching unpin()"""
+        with self.lock:
+            self._pins[session_id] = self._pins.get(session_id, 0) + 1
+
+    def unpin(self, session_id: str) -> None:
+        """
+        Release a pin; after the last one the session's size is re-measured
+        and anything over budget is evicted
+        """
+        with self.lock:
+            count = self._pins.get(session_id, 0) - 1
+            if count > 0:
+                self._pins[session_id] = count
+                return
+            self._pins.pop(session_id, None)
+            entry = self._entries.get(session_id)
+            if entry is not None:
+                size = self.size_estimator(entry[0])
+                self.stats.current_bytes += size - entry[1]
+                self._entries[session_id] = (entry[0], size, entry[2])
+            evicted = self._evict_expired(time.monotonic())
+            evicted.extend(self._evict_over_budget())
+        self._notify(evicted)
+
+    @contextmanager
+    def in_use(self, session_id: str) -> Iterator[None]:
+        """Pin a session for the duration of a with block"""
+        self.pin(session_id)
+        try:
+            yield
+        finally:
+            self.unpin(session_id)
+
+    def expire(self) -> int:
+        """
+        Evict every idle-expired session
+
+        Returns:
+            Number of sessions evicted
+        """
+        with self.lock:
+            evicted = self._evict_expired(time.monotonic())
+        self._notify(evicted)
+        return len(evicted)
+
+    def peek(self, session_id: str) -> Optional[SessionState]:
+        """Look up a session without touching statistics or recency"""
+        with self.lock:
+            entry = self._entries.get(session_id)
+            return entry[0] if entry is not None else None
+
+    def pop(self, session_id: str, *default: Any) -> Any:
+        """Remove and return a session without notifying on_evict"""
+        with self.lock:
+            if session_id in self._entries:
+                return self._remove(session_id)
+        if default:
+            return default[0]
+        raise KeyError(session_id)
+
+    def __getitem__(self, session_id: str) -> SessionState:
+        with self.lock:
+            return self._entries[session_id][0]
+
+    def __setitem__(self, session_id: str, session: SessionState) -> None:
+        self.put(session_id, session)
+
+    def __delitem__(self, session_id: str) -> None:
+        with self.lock:
+            if session_id not in self._entries:
+                raise KeyError(session_id)
+            self._remove(session_id)
+
+    def __contains__(self, session_id: object) -> bool:
+        with self.lock:
+            return session_id in self._entries
+
+    def __iter__(self) -> Iterator[str]:
+        with self.lock:
+            return iter(list(self._entries))
+
+    def __len__(self) -> int:
+        with self.lock:
+            return len(self._entries)
+
+    def clear(self) -> None:
+        with self.lock:
+            for session_id in list(self._entries):
+                self._remove(session_id)
+            self.stats.current_entries = 0
+            self.stats.current_bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics"""
+        with self.lock:
+            lookups = self.stats.hits + self.stats.misses
+            return {
+                "hits": self.stats.hits,
+                "misses": self.stats.misses,
+                "hit_rate": self.stats.hits / lookups if lookups else 0.0,
+                "evictions": self.stats.evictions,
+                "expirations": self.stats.expirations,
+                "current_entries": self.stats.current_entries,
+                "current_bytes": self.stats.current_bytes,
+                "pinned": len(self._pins),
+                "max_sessions": self.max_sessions,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+            }
@@ -3,17 +3,31 @@ Session Manager for Deep Thinking Engine
 Provides high-level interface for session management with local storage
 """
 
+import heapq
 import logging
-from datetime import datetime, timedelta
+import re
+import threading
+from contextlib import contextmanager
+from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
 
 from ..config.exceptions import SessionNotFoundError, SessionStateError
 from ..data.database import ThinkingDatabase
+from ..data.retention import RetentionEngine, RetentionPolicy
 from ..models.mcp_models import SessionState
+from .session_cache import SessionCache
+from .step_result import ParsedStepResult, parse_step_result
+from .tracked_context import TrackedContext
 
 logger = logging.getLogger(__name__)
 
+# Text suggesting a step result holds a decomposition: sub_questions,
+# sub-question IDs, JSON question entries or the Chinese terms for them
+_DECOMPOSITION_PATTERN = re.compile(
+    r'sub_questions|SQ1|SQ2|SQ3|"id".*"question"|子问题|分解', re.IGNORECASE
+)
+
 
 class SessionManager:
     """
@@ -22,7 +36,15 @@ class SessionManager:
     """
 
     def __init__(
-        self, db_path: Optional[str] = None, encryption_key: Optional[bytes] = None
+        self,
+        db_path: Optional[str] = None,
+        encryption_key: Optional[bytes] = None,
+        write_behind: bool = False,
+        durability: str = "normal",
+        session_cache: Optional[SessionCache] = None,
+        encrypted_search: bool = False,
+        retention_policy: Optional[RetentionPolicy] = None,
+        previous_encryption_keys: Sequence[bytes] = (),
     ):
         # Use default path in user's data directory
         if db_path is None:
@@ -30,8 +52,33 @@ class SessionManager:
             data_dir.mkdir(exist_ok=True)
             db_path = str(data_dir / "sessions.db")
 
-        self.db = ThinkingDatabase(db_path, encryption_key)
-        self._active_sessions = {}  # In-memory cache for active sessions
+        self.db = ThinkingDatabase(
+            db_path,
+            encryption_key,
+            write_behind=write_behind,
+            durability=durability,
+            encrypted_search=encrypted_search,
+            previous_encryption_keys=previous_encryption_keys,
+        )
+        # Bounded in-memory cache of active sessions; the database stays the
+        # source of truth and evicted sessions are reloaded on demand
+        self._active_sessions = (
+            session_cache if session_cache is not None else SessionCache()
+        )
+        if self._active_sessions.on_evict is None:
+            self._active_sessions.on_evict = self._on_session_evicted
+        # context_version each tracked session's deltas are written against
+        self._context_versions: Dict[str, int] = {}
+        # session_id -> step_name -> id of the latest session_steps row
+        self._step_ids: Dict[str, Dict[str, int]] = {}
+        # Tool handlers run on worker threads; guards the caches above
+        self.lock = threading.RLock()
+        # Chunked cleanup of the database; scheduled only when given a policy
+        self.retention = RetentionEngine(
+            self.db, retention_policy, on_abandoned=self._forget_sessions
+        )
+        if retention_policy is not None:
+            self.retention.start()
         logger.info(f"SessionManager initialized with database: {db_path}")
 
     def create_session(self, session_state: SessionState) -> str:
@@ -75,8 +122,12 @@ class SessionManager:
                 f"Failed to create session for topic: {session_state}"
             )
 
+        # New sessions start with an empty stored context, so everything
+        # currently in memory is pending
+        self._track_session(session_state, version=0, pending=True)
+
         # Store in memory cache
-        self._active_sessions[session_state.session_id] = session_state
+        self.cache_session(session_state)
 
         logger.info(
             f"Created session {session_state.session_id} for topic: {session_state.topic[:50]}..."
@@ -97,8 +148,10 @@ class SessionManager:
             SessionNotFoundError: If session doesn't exist
         """
         # Check in-memory cache first
-        if session_id in self._active_sessions:
-            return self._active_sessions[session_id]
+        with self.lock:
+            cached = self._active_sessions.get(session_id)
+        if cached is not None:
+            return cached
 
         # Load from database
         session_data = self.db.get_session(session_id)
@@ -121,6 +174,11 @@ class SessionManager:
             step_results=context_data.get("step_results", {}),
             context=context_data,
             quality_scores=quality_data,
+            # Written back when the session was evicted from the cache
+            iteration_count=context_data.get("iteration_count") or {},
+            total_iterations=context_data.get("total_iterations") or {},
+            for_each_state=context_data.get("for_each_state") or {},
+            decomposition_result=context_data.get("decomposition_result"),
             created_at=(
                 datetime.fromisoformat(session_data["created_at"])
                 if session_data.get("created_at")
@@ -133,12 +191,186 @@ class SessionManager:
             ),
         )
 
-        # Cache if active
-        if session_state.status == "active":
-            self._active_sessions[session_id] = session_state
+        evicted: List[SessionState] = []
+        with self.lock:
+            # Another thread may have loaded the session meanwhile; keep
+            # a single cached instance
+            cached = self._active_sessions.peek(session_id)
+            if cached is not None:
+                return cached
+
+            # Later writes only carry what changes from here on
+            self._track_session(
+                session_state, version=session_data.get("context_version") or 0
+            )
 
+            # Cache if active
+            if session_state.status == "active":
+                evicted = self._active_sessions.put(
+                    session_id, session_state, notify=False
+                )
+            else:
+                self._context_versions.pop(session_id, None)
+
+        # Write back evicted sessions without holding the manager lock
+        self._active_sessions.notify_evicted(evicted)
         return session_state
 
+    def cache_session(self, session: SessionState) -> None:
+        """
+        Store a session in the in-memory cache
+
+        Not called under self.lock: sessions evicted to make room are written
+        back on this thread, and that must not hold up other sessions.
+        """
+        self._active_sessions[session.session_id] = session
+
+    @contextmanager
+    def session_in_use(self, session_id: str) -> Iterator[None]:
+        """
+        Keep a session cached while a request works on it
+
+        Eviction writes a session back and drops the cached object, so a
+        session evicted mid-update would lose the changes made afterwards.
+        """
+        with self._active_sessions.in_use(session_id):
+            yield
+
+    def _on_session_evicted(self, session: SessionState) -> None:
+        """Write back state only held in memory before a session leaves the cache"""
+        try:
+            runtime_state = {
+                "iteration_count": session.iteration_count,
+                "total_iterations": session.total_iterations,
+                "for_each_state": session.for_each_state,
+                "decomposition_result": session.decomposition_result,
+            }
+            runtime_state = {k: v for k, v in runtime_state.items() if v}
+            pending = any(
+                isinstance(field, TrackedContext) and field.has_changes
+                for field in (session.context, session.quality_scores)
+            )
+            if session.status == "active" and (runtime_state or pending):
+                self._persist_session_delta(session, extra_context=runtime_state)
+        finally:
+            with self.lock:
+                self._context_versions.pop(session.session_id, None)
+                self._step_ids.pop(session.session_id, None)
+
+    def _forget_session(self, session_id: str) -> None:
+        """Drop a session from the in-memory cache and its delta tracking"""
+        with self.lock:
+            self._active_sessions.pop(session_id, None)
+            self._context_versions.pop(session_id, None)
+            self._step_ids.pop(session_id, None)
+
+    def _forget_sessions(self, session_ids: List[str]) -> None:
+        for session_id in session_ids:
+            self._forget_session(session_id)
+
+    def _remember_step_id(self, session_id: str, step_name: str, step_id: int) -> None:
+        """Record the latest session_steps row for a step name"""
+        with self.lock:
+            self._step_ids.setdefault(session_id, {})[step_name] = step_id
+
+    def _track_session(
+        self, session: SessionState, version: int, pending: bool = False
+    ) -> None:
+        """
+        Attach change tracking to a session's context and quality scores
+
+        Args:
+            session: Session to track
+            version: Stored context_version the in-memory state matches
+            pending: Treat every current entry as not yet persisted
+        """
+        for field in ("context", "quality_scores"):
+            tracked = TrackedContext(getattr(session, field))
+            if pending:
+                tracked.mark_all_changed()
+            setattr(session, field, tracked)
+        self._context_versions[session.session_id] = version
+
+    def _persist_session_delta(
+        self,
+        session: SessionState,
+        extra_context: Optional[Dict[str, Any]] = None,
+        **updates,
+    ) -> bool:
+        """
+        Persist the session's context/quality changes and column updates
+
+        Only entries recorded as changed by the session's TrackedContext are
+        serialized and written. Falls back to a full rewrite when the session
+        is untracked (e.g. its context was reassigned) or when another writer
+        replaced the stored context since this session was loaded.
+
+        Args:
+            session: Session whose state should be persisted
+            extra_context: Entries stored with the context but not kept on
+                the in-memory session
+            **updates: Plain column updates (current_step, step_number, ...)
+
+        Returns:
+            True if successful
+        """
+        session_id = session.session_id
+        context = session.context
+        quality = session.quality_scores
+        version = self._context_versions.get(session_id)
+
+        if (
+            version is not None
+            and isinstance(context, TrackedContext)
+            and isinstance(quality, TrackedContext)
+        ):
+            changed, removed, appends = context.pending_changes()
+            changed.update(extra_context or {})
+            quality_changed, quality_removed, _ = quality.pending_changes()
+            serialize = self.db.serialize_context_value
+
+            if self.db.update_session_delta(
+                session_id,
+                version,
+                context_changes={k: serialize(v) for k, v in changed.items()},
+                context_removed=removed,
+                context_appends={
+                    k: [serialize(item) for item in items]
+                    for k, items in appends.items()
+                },
+                quality_changes={k: serialize(v) for k, v in quality_changed.items()},
+                quality_removed=quality_removed,
+                **updates,
+            ):
+                context.mark_clean()
+                quality.mark_clean()
+                return True
+
+            logger.info(
+                f"Stored context of session {session_id} changed elsewhere, "
+                "rewriting it in full"
+            )
+
+        # A full rewrite re-establishes a known stored state to build deltas on
+        success = self.db.update_session(
+            session_id,
+            context={**context, **(extra_context or {})},
+            quality_metrics=dict(quality),
+            **updates,
+        )
+        if success:
+            self._track_session(
+                session, version=self.db.get_context_version(session_id) or 0
+            )
+        return success
+
+    def _append_context_entry(self, session: SessionState, key: str, item: Any) -> None:
+        """Append to a list-valued context entry, recorded as an append"""
+        if isinstance(session.context, TrackedContext):
+            session.context.append_entry(key, item)
+        else:
+            session.context.setdefault(key, []).append(item)
+
     def update_session_step(
         self,
         session_id: str,
@@ -181,7 +413,7 @@ class SessionManager:
                 session.quality_scores[step_name] = quality_score
 
             # Add step to database
-            self.db.add_session_step(
+            step_id = self.db.add_session_step(
                 session_id=session_id,
                 step_name=step_name,
                 step_number=session.step_number,
@@ -190,18 +422,18 @@ class SessionManager:
                 quality_score=quality_score,
                 execution_time_ms=execution_time_ms,
             )
+            if step_id is not None:
+                self._remember_step_id(session_id, step_name, step_id)
 
-            # Update session in database
-            self.db.update_session(
-                session_id,
+            # Update session in database (only the entries that changed)
+            self._persist_session_delta(
+                session,
                 current_step=step_name,
                 step_number=session.step_number,
-                context=session.context,
-                quality_metrics=session.quality_scores,
             )
 
             # Update cache
-            self._active_sessions[session_id] = session
+            self.cache_session(session)
 
             logger.info(f"Updated session {session_id} to step {step_name}")
             return True
@@ -303,18 +535,12 @@ class SessionManager:
                     f"Incremented for_each iteration for {step_name} due to explicit flag"
                 )
 
-            # Get the step ID, create step if it doesn't exist
-            steps = self.db.get_session_steps(session_id)
-            step_id = None
-            for step in steps:
-                if step["step_name"] == step_name:
-                    step_id = step["id"]
-                    break
+            # Get the latest step ID, create step if it doesn't exist
+            with self.lock:
+                step_id = self._step_ids.get(session_id, {}).get(step_name)
 
             if step_id is None:
-                # Create the step if it doesn't exist
-                session = self.get_session(session_id)
-                step_id = self.db.add_session_step(
+                step_id = self.db.get_or_create_step(
                     session_id=session_id,
                     step_name=step_name,
                     step_number=session.step_number + 1,
@@ -326,9 +552,9 @@ class SessionManager:
                         f"Failed to create step {step_name} for session {session_id}"
                     )
                     return False
+                self._remember_step_id(session_id, step_name, step_id)
 
             # Update session state with result
-            session = self.get_session(session_id)
             session.step_results[step_name] = {
                 "result": result_content,
                 "quality_score": quality_score,
@@ -338,7 +564,7 @@ class SessionManager:
                 session.quality_scores[step_name] = quality_score
 
             # Update cache
-            self._active_sessions[session_id] = session
+            self.cache_session(session)
 
             # Add result to database
             result_id = self.db.add_step_result(
@@ -383,15 +609,20 @@ class SessionManager:
 
             if final_results:
                 # Store final results in context, not quality_metrics
-                updated_context = session.context.copy()
-                updated_context["final_results"] = final_results
-                updates["context"] = updated_context
-                updates["quality_metrics"] = session.quality_scores
+                success = self._persist_session_delta(
+                    session,
+                    extra_context={"final_results": final_results},
+                    **updates,
+                )
+            else:
+                success = self.db.update_session(session_id, **updates)
 
-            success = self.db.update_session(session_id, **updates)
+            # The session is done growing: fold its entries into one blob
+            if success:
+                self.db.compact_session_context(session_id)
 
             # Remove from active cache
-            self._active_sessions.pop(session_id, None)
+            self._forget_session(session_id)
 
             logger.info(f"Completed session {session_id}")
             return success
@@ -412,30 +643,16 @@ class SessionManager:
         """
         try:
             session = self.get_session(session_id)
-            steps = self.db.get_session_steps(session_id)
-            results = self.db.get_step_results(session_id)
-
-            # Organize results by step
-            step_results = {}
-            for result in results:
-                step_id = result["step_id"]
-                if step_id not in step_results:
-                    step_results[step_id] = []
-                step_results[step_id].append(result)
 
-            # Combine steps with their results
-            detailed_steps = []
-            for step in steps:
-                step_data = dict(step)
-                step_data["results"] = step_results.get(step["id"], [])
-                detailed_steps.append(step_data)
+            detailed_steps = list(self.iter_session_history(session_id))
+            total_results = sum(len(step["results"]) for step in detailed_steps)
 
             return {
                 "session": session.model_dump(),
                 "steps": detailed_steps,
                 "summary": {
-                    "total_steps": len(steps),
-                    "total_results": len(results),
+                    "total_steps": len(detailed_steps),
+                    "total_results": total_results,
                     "average_quality": (
                         sum(session.quality_scores.values())
                         / len(session.quality_scores)
@@ -454,6 +671,53 @@ class SessionManager:
             logger.error(f"Error getting session history {session_id}: {e}")
             return {}
 
+    def iter_session_history(self, session_id: str) -> Iterator[Dict[str, Any]]:
+        """
+        Stream a session's steps, each with its results, in step order
+
+        Only one step's results are in memory at a time.
+
+        Args:
+            session_id: Session identifier
+
+        Yields:
+            Step data with a "results" list
+        """
+        for step in self.db.iter_session_steps(session_id):
+            step["results"] = list(self.db.iter_step_results(session_id, step["id"]))
+            yield step
+
+    def get_session_history_page(
+        self,
+        session_id: str,
+        cursor: Optional[Tuple[int, int]] = None,
+        limit: int = 20,
+    ) -> Dict[str, Any]:
+        """
+        Get one page of a session's steps with their results
+
+        Args:
+            session_id: Session identifier
+            cursor: next_cursor of the previous page; None for the first
+            limit: Maximum steps per page
+
+        Returns:
+            {"steps": [...], "next_cursor": cursor or None when done}
+        """
+        try:
+            steps, next_cursor = self.db.get_session_steps_page(
+                session_id, cursor, limit
+            )
+            for step in steps:
+                step["results"] = list(
+                    self.db.iter_step_results(session_id, step["id"])
+                )
+            return {"steps": steps, "next_cursor": next_cursor}
+
+        except Exception as e:
+            logger.error(f"Error getting session history page {session_id}: {e}")
+            return {"steps": [], "next_cursor": None}
+
     def list_user_sessions(
         self,
         user_id: Optional[str] = None,
@@ -485,7 +749,7 @@ class SessionManager:
         """
         try:
             # Remove from cache
-            self._active_sessions.pop(session_id, None)
+            self._forget_session(session_id)
 
             # Delete from database
             success = self.db.delete_session(session_id)
@@ -559,22 +823,11 @@ class SessionManager:
             Number of sessions cleaned up
         """
         try:
-            cutoff_time = datetime.now() - timedelta(hours=hours_inactive)
-
-            # Get inactive sessions
-            all_sessions = self.db.list_sessions(status="active", limit=1000)
-            inactive_sessions = [
-                s
-                for s in all_sessions
-                if datetime.fromisoformat(s["updated_at"]) < cutoff_time
-            ]
+            # Drop idle sessions from memory first; they stay in the database
+            self._active_sessions.expire()
 
-            cleaned_count = 0
-            for session in inactive_sessions:
-                # Mark as abandoned rather than delete
-                self.db.update_session(session["id"], status="abandoned")
-                self._active_sessions.pop(session["id"], None)
-                cleaned_count += 1
+            # Marked abandoned rather than deleted, in chunks by the database
+            cleaned_count = len(self.retention.abandon_inactive(hours_inactive))
 
             if cleaned_count > 0:
                 logger.info(f"Cleaned up {cleaned_count} inactive sessions")
@@ -593,6 +846,8 @@ class SessionManager:
             stats = {
                 **db_stats,
                 "active_sessions_in_memory": len(self._active_sessions),
+                "session_cache": self._active_sessions.get_stats(),
+                "retention": self.retention.get_stats(),
                 "database_path": str(self.db.db_path),
                 "encryption_enabled": self.db.encryption is not None,
             }
@@ -604,62 +859,28 @@ class SessionManager:
             return {}
 
     def search_sessions(
-        self, query: str, search_fields: List[str] = None, limit: int = 50
+        self,
+        query: str,
+        search_fields: List[str] = None,
+        limit: int = 50,
+        offset: int = 0,
     ) -> List[Dict[str, Any]]:
         """
-        Search sessions by topic, content, or other fields
+        Search sessions by topic, step results and evidence summaries
 
         Args:
             query: Search query string
-            search_fields: Fields to search in (topic, configuration, etc.)
+            search_fields: Sources to search ('topic', 'step_result',
+                'evidence'); all of them by default
             limit: Maximum results to return
+            offset: Results to skip, for pagination
 
         Returns:
-            List of matching sessions
+            List of matching sessions, best match first
         """
         try:
-            if search_fields is None:
-                search_fields = ["topic"]
-
-            with self.db.get_connection() as conn:
-                # Build search query
-                where_clauses = []
-                params = []
-
-                for field in search_fields:
-                    if field == "topic":
-                        where_clauses.append("topic LIKE ?")
-                        params.append(f"%{query}%")
-                    elif field == "configuration":
-                        where_clauses.append("configuration LIKE ?")
-                        params.append(f"%{query}%")
-
-                if not where_clauses:
-                    return []
-
-                sql = f"""
-                    SELECT * FROM thinking_sessions 
-                    WHERE {' OR '.join(where_clauses)}
-                    ORDER BY created_at DESC 
-                    LIMIT ?
-                """
-                params.append(limit)
-
-                cursor = conn.execute(sql, params)
-                sessions = []
-
-                for row in cursor.fetchall():
-                    session_data = dict(row)
-
-                    # Decrypt topic if encrypted
-                    if self.db.encryption and session_data.get("topic_encrypted"):
-                        session_data["topic"] = self.db._decrypt_if_enabled(
-                            session_data["topic_encrypted"]
-                        )
-
-                    sessions.append(session_data)
-
-                return sessions
+            result = self.db.search_sessions(query, search_fields, limit, offset)
+            return result["sessions"]
 
         except Exception as e:
             logger.error(f"Error searching sessions: {e}")
@@ -794,9 +1015,11 @@ class SessionManager:
             success = self.db.update_session(
                 session_id, status="archived", context=archive_context
             )
+            if success:
+                self.db.compact_session_context(session_id)
 
             # Remove from active cache
-            self._active_sessions.pop(session_id, None)
+            self._forget_session(session_id)
 
             if success:
                 logger.info(f"Archived session {session_id}: {archive_reason}")
@@ -841,6 +1064,9 @@ class SessionManager:
             )
 
             if success:
+                # The stored context now differs from the in-memory one;
+                # rewrite it in full on the next persist
+                self._context_versions.pop(session_id, None)
                 logger.info(f"Restored session {session_id}")
 
             return success
@@ -868,10 +1094,14 @@ class SessionManager:
             try:
                 success = self.db.update_session(session_id, **updates)
                 results[session_id] = success
+                if "context" in updates or "quality_metrics" in updates:
+                    # Stored blobs were replaced wholesale; next write starts over
+                    self._context_versions.pop(session_id, None)
 
                 # Update cache if session is active
-                if session_id in self._active_sessions:
-                    session = self._active_sessions[session_id]
+                with self.lock:
+                    session = self._active_sessions.get(session_id)
+                if session is not None:
                     for key, value in updates.items():
                         if hasattr(session, key):
                             setattr(session, key, value)
@@ -905,79 +1135,92 @@ class SessionManager:
             List of timeline events
         """
         try:
-            session = self.get_session(session_id)
-            steps = self.db.get_session_steps(session_id)
-            results = self.db.get_step_results(session_id)
+            return list(self.iter_session_timeline(session_id))
 
-            timeline = []
+        except Exception as e:
+            logger.error(f"Error getting session timeline for {session_id}: {e}")
+            return []
 
-            # Add session creation event
-            timeline.append(
-                {
-                    "timestamp": (
-                        session.created_at.isoformat() if session.created_at else ""
-                    ),
-                    "event_type": "session_created",
-                    "description": f"Session created for topic: {session.topic}",
-                    "details": {"flow_type": session.flow_type, "status": "active"},
-                }
-            )
+    def iter_session_timeline(self, session_id: str) -> Iterator[Dict[str, Any]]:
+        """
+        Stream session events in chronological order
 
-            # Add step events
-            for step in steps:
-                timeline.append(
-                    {
-                        "timestamp": step.get("created_at", ""),
-                        "event_type": "step_completed",
-                        "description": f"Completed step: {step['step_name']}",
-                        "details": {
-                            "step_type": step.get("step_type"),
-                            "quality_score": step.get("quality_score"),
-                            "execution_time_ms": step.get("execution_time_ms"),
-                        },
-                    }
-                )
+        Steps and results are read in created_at order and merged, so the
+        timeline is never sorted in memory.
 
-            # Add result events
-            for result in results:
-                timeline.append(
-                    {
-                        "timestamp": result.get("created_at", ""),
-                        "event_type": "result_added",
-                        "description": f"Added {result.get('result_type', 'unknown')} result",
-                        "details": {
-                            "result_type": result.get("result_type"),
-                            "content_length": len(result.get("content", "")),
-                            "step_id": result.get("step_id"),
-                        },
-                    }
-                )
+        Args:
+            session_id: Session identifier
 
-            # Add session completion event if completed
-            if session.status == "completed":
-                timeline.append(
-                    {
-                        "timestamp": (
-                            session.updated_at.isoformat() if session.updated_at else ""
-                        ),
-                        "event_type": "session_completed",
-                        "description": "Session completed",
-                        "details": {
-                            "final_status": session.status,
-                            "total_steps": len(steps),
-                            "total_results": len(results),
-                        },
-                    }
-                )
+        Yields:
+            Timeline events
+        """
+        session = self.get_session(session_id)
 
-            # Sort by timestamp (handle empty timestamps)
-            timeline.sort(key=lambda x: x["timestamp"] or "")
+        created = [
+            {
+                "timestamp": (
+                    session.created_at.isoformat() if session.created_at else ""
+                ),
+                "event_type": "session_created",
+                "description": f"Session created for topic: {session.topic}",
+                "details": {"flow_type": session.flow_type, "status": "active"},
+            }
+        ]
 
-            return timeline
+        step_events = (
+            {
+                "timestamp": step.get("created_at", ""),
+                "event_type": "step_completed",
+                "description": f"Completed step: {step['step_name']}",
+                "details": {
+                    "step_type": step.get("step_type"),
+                    "quality_score": step.get("quality_score"),
+                    "execution_time_ms": step.get("execution_time_ms"),
+                },
+            }
+            for step in self.db.iter_timeline_rows(session_id, "session_steps")
+        )
 
-        except Exception as e:
-            logger.error(f"Error getting session timeline for {session_id}: {e}")
-            return []
+        result_events = (
+            {
+                "timestamp": result.get("created_at", ""),
+                "event_type": "result_added",
+                "description": f"Added {result.get('result_type', 'unknown')} result",
+                "details": {
+                    "result_type": result.get("result_type"),
+                    "content_length": len(self.db.decrypt_result_content(result)),
+                    "step_id": result.get("step_id"),
+                },
+            }
+            for result in self.db.iter_timeline_rows(session_id, "step_results")
+        )
+
+        completed = []
+        if session.status == "completed":
+            total_steps, total_results = self.db.get_session_record_counts(session_id)
+            completed.append(
+                {
+                    "timestamp": (
+                        session.updated_at.isoformat() if session.updated_at else ""
+                    ),
+                    "event_type": "session_completed",
+                    "description": "Session completed",
+                    "details": {
+                        "final_status": session.status,
+                        "total_steps": total_steps,
+                        "total_results": total_results,
+                    },
+                }
+            )
+
+        # Ties keep this input order, as the stable sort this replaces did
+        yield from heapq.merge(
+            created,
+            step_events,
+            result_events,
+            completed,
+            key=lambda event: event["timestamp"] or "",
+        )
 
     def _determine_step_type(self, step_name: str) -> str:
         """Determine step type from step name"""
@@ -1035,15 +1278,12 @@ class SessionManager:
             if not session:
                 return {"error": "Session not found"}
 
-            steps = self.db.get_session_steps(session_id)
-            results = self.db.get_step_results(session_id)
-
-            trace = {
+            return {
                 "session_id": session_id,
                 "topic": session.topic,
                 "flow_type": session.flow_type,
                 "status": session.status,
-                "steps": [],
+                "steps": list(self.iter_trace_steps(session_id)),
                 "quality_summary": session.quality_scores,
                 "total_duration": (
                     (session.updated_at - session.created_at).total_seconds()
@@ -1052,33 +1292,30 @@ class SessionManager:
                 ),
             }
 
-            # Organize results by step
-            step_results = {}
-            for result in results:
-                step_id = result.get("step_id")
-                if step_id and step_id not in step_results:
-                    step_results[step_id] = []
-                if step_id:
-                    step_results[step_id].append(result)
-
-            # Build detailed step trace
-            for step in steps:
-                step_trace = {
-                    "step_name": step.get("step_name", "unknown"),
-                    "step_type": step.get("step_type", "general"),
-                    "quality_score": step.get("quality_score"),
-                    "execution_time_ms": step.get("execution_time_ms"),
-                    "results": step_results.get(step.get("id"), []),
-                    "timestamp": step.get("created_at"),
-                }
-                trace["steps"].append(step_trace)
-
-            return trace
-
         except Exception as e:
             logger.error(f"Error getting full trace for {session_id}: {e}")
             return {"error": str(e)}
 
+    def iter_trace_steps(self, session_id: str) -> Iterator[Dict[str, Any]]:
+        """
+        Stream the step entries of get_full_trace in step order
+
+        Args:
+            session_id: Session identifier
+
+        Yields:
+            Step trace with its results
+        """
+        for step in self.iter_session_history(session_id):
+            yield {
+                "step_name": step.get("step_name", "unknown"),
+                "step_type": step.get("step_type", "general"),
+                "quality_score": step.get("quality_score"),
+                "execution_time_ms": step.get("execution_time_ms"),
+                "results": step["results"],
+                "timestamp": step.get("created_at"),
+            }
+
     def recover_session(self, session_id: str, recovery_data: Dict[str, Any]) -> bool:
         """
         Attempt to recover a session from provided recovery data
@@ -1176,7 +1413,7 @@ class SessionManager:
                     )
 
             # Cache the recovered session
-            self._active_sessions[session_state.session_id] = session_state
+            self.cache_session(session_state)
 
             logger.info(f"Successfully recovered session {session_state.session_id}")
             return True
@@ -1339,6 +1576,8 @@ class SessionManager:
                     del session.step_results[step_to_remove]
                 if step_to_remove in session.quality_scores:
                     del session.quality_scores[step_to_remove]
+                with self.lock:
+                    self._step_ids.get(session_id, {}).pop(step_to_remove, None)
 
             # Update session state
             session.current_step = target_step
@@ -1346,16 +1585,15 @@ class SessionManager:
             session.updated_at = datetime.now()
 
             # Add rollback metadata to context
-            if "rollback_history" not in session.context:
-                session.context["rollback_history"] = []
-
-            session.context["rollback_history"].append(
+            self._append_context_entry(
+                session,
+                "rollback_history",
                 {
                     "timestamp": datetime.now().isoformat(),
                     "target_step": target_step,
                     "removed_steps": steps_to_remove,
                     "reason": "manual_rollback",
-                }
+                },
             )
 
             # Update in database if available
@@ -1446,10 +1684,7 @@ class SessionManager:
             }
 
             # Store checkpoint in session context
-            if "checkpoints" not in session.context:
-                session.context["checkpoints"] = []
-
-            session.context["checkpoints"].append(checkpoint_data)
+            self._append_context_entry(session, "checkpoints", checkpoint_data)
 
             # Store in database if available
             if self.db:
@@ -1698,7 +1933,7 @@ class SessionManager:
 
             if success:
                 # Update cached session
-                self._active_sessions[session_id] = session
+                self.cache_session(session)
                 logger.info(f"Successfully repaired session {session_id}")
                 return True
             else:
@@ -1723,65 +1958,59 @@ class SessionManager:
             step_result: Result content from the step
         """
         try:
+            parsed = parse_step_result(step_result)
+
             # Handle decomposition step - store structured result for for_each tracking
             if step_name == "decompose" or "decompose" in step_name:
-                self._extract_decomposition_result(session, step_result)
+                self._extract_decomposition_result(session, parsed)
 
             # ALSO: Check if the step_result itself contains decomposition data (regardless of step name)
             # This handles cases where decomposition data comes from previous steps
             if (
                 session.decomposition_result is None
-                and self._contains_decomposition_data(step_result)
+                and self._contains_decomposition_data(parsed)
             ):
                 logger.info("Found decomposition data in step result, extracting...")
-                self._extract_decomposition_result(session, step_result)
+                self._extract_decomposition_result(session, parsed)
 
         except Exception as e:
             logger.error(f"Error handling special step result for {step_name}: {e}")
 
     def _extract_decomposition_result(
-        self, session: "SessionState", step_result: str
+        self, session: "SessionState", step_result: Union[str, ParsedStepResult]
     ) -> None:
         """
         Extract and store decomposition result for for_each iteration tracking
         """
         try:
-            import json
-
-            # Try to parse as JSON first
-            try:
-                decomposition_data = json.loads(step_result.strip())
-                if (
-                    isinstance(decomposition_data, dict)
-                    and "sub_questions" in decomposition_data
-                ):
-                    session.decomposition_result = decomposition_data
-                    sub_questions = decomposition_data["sub_questions"]
-                    if isinstance(sub_questions, list):
-                        total_count = len(sub_questions)
-                        # Set up for_each tracking for collect_evidence step
-                        session.total_iterations["collect_evidence"] = total_count
-                        session.iteration_count["collect_evidence"] = 0
-                        logger.info(
-                            f"Stored decomposition with {total_count} sub-questions"
-                        )
-                        return
-            except (json.JSONDecodeError, ValueError):
+            parsed = parse_step_result(step_result)
+
+            # Use the JSON decomposition if there is one
+            sub_questions = parsed.sub_questions
+            if sub_questions is not None:
+                session.decomposition_result = parsed.json_object
+                total_count = len(sub_questions)
+                # Set up for_each tracking for collect_evidence step
+                session.total_iterations["collect_evidence"] = total_count
+                session.iteration_count["collect_evidence"] = 0
+                logger.info(f"Stored decomposition with {total_count} sub-questions")
+                return
+            if parsed.json_object is not None and "sub_questions" in parsed.json_object:
+                session.decomposition_result = parsed.json_object
+            elif not parsed.is_json:
                 logger.debug("Step result is not valid JSON, trying text extraction")
 
             # Fallback: Extract from text using patterns
-            import re
-
             # Look for numbered questions or SQ patterns
-            numbered_matches = re.findall(r"(\d+)\.\s+[^0-9]", step_result)
-            sq_matches = re.findall(r"SQ(\d+)", step_result)
+            numbered_matches = parsed.numbered_items
+            sq_matches = parsed.sq_mentions
 
             if numbered_matches or sq_matches:
                 # Use the pattern that gives more matches
                 if len(numbered_matches) >= len(sq_matches):
                     question_count = len(set(numbered_matches))
                 else:
-                    question_count = len(set(sq_matches))
+                    question_count = len(parsed.sq_ids)
 
                 if question_count > 0:
                     # Create a basic decomposition structure
@@ -1825,15 +2054,14 @@ class SessionManager:
             )
 
             # Update the session in cache and database immediately
-            self._active_sessions[session.session_id] = session
+            self.cache_session(session)
 
             # Also update database to prevent state loss
             if self.db:
                 try:
-                    self.db.update_session(
-                        session.session_id,
-                        context={
-                            **session.context,
+                    self._persist_session_delta(
+                        session,
+                        extra_context={
                             "iteration_count": session.iteration_count,
                             "total_iterations": session.total_iterations,
                             "last_increment_timestamp": datetime.now().isoformat(),
@@ -1868,37 +2096,23 @@ class SessionManager:
             logger.error(f"Error checking if step is for_each: {e}")
             return False
 
-    def _contains_decomposition_data(self, step_result: str) -> bool:
+    def _contains_decomposition_data(
+        self, step_result: Union[str, ParsedStepResult]
+    ) -> bool:
         """
         Check if step result contains decomposition data (sub_questions)
         """
         try:
-            import json
+            parsed = parse_step_result(step_result)
 
             # Check for JSON with sub_questions
-            try:
-                data = json.loads(step_result.strip())
-                if isinstance(data, dict) and "sub_questions" in data:
-                    return True
-            except (json.JSONDecodeError, ValueError):
-                pass
+            data = parsed.json_object
+            if data is not None and "sub_questions" in data:
+                return True
 
             # Check for text patterns indicating decomposition
-            decomposition_patterns = [
-                "sub_questions",
-                "SQ1",
-                "SQ2",
-                "SQ3",  # Sub-question IDs
-                '"id".*"question"',  # JSON structure
-                "子问题",
-                "分解",
-            ]
-
-            import re
-
-            for pattern in decomposition_patterns:
-                if re.search(pattern, step_result, re.IGNORECASE):
-                    return True
+            if _DECOMPOSITION_PATTERN.search(parsed.raw):
+                return True
 
             return False
 
@@ -0,0 +1,136 @@
+"""
+Parsed step results
+
+A step result arrives from the LLM as text and is inspected by several
+stages of a next_step call: the session manager looks for decomposition
+data, the flow manager's for_each fallback looks for progress markers,
+format validation scans for keywords and the report export formats the
+JSON. ParsedStepResult parses the text once and computes the features
+those stages need on first use.
+
+parse_step_result() keeps the most recent results by text, so every stage
+handed the same step result shares one ParsedStepResult.
+"""
+
+import json
+import re
+from functools import cached_property, lru_cache
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Union
+
+# A result that is one fenced code block, e.g. ```json ... ```
+_FENCED_BLOCK = re.compile(r"```[a-zA-Z]*[ \t]*\n(.*?)\n?[ \t]*```", re.DOTALL)
+_SQ_ID = re.compile(r"SQ(\d+)")
+_NUMBERED_ITEM = re.compile(r"(\d+)\.\s+[^0-9]")
+
+_NOT_PARSED = object()
+
+
+class ParsedStepResult:
+    """A step result with its JSON parsed once and lazily computed text features"""
+
+    def __init__(self, raw: str):
+        self.raw = raw
+        self._data = _NOT_PARSED
+
+    def _parse(self) -> Any:
+        text = self.raw.strip()
+        fenced = _FENCED_BLOCK.fullmatch(text)
+        if fenced:
+            text = fenced.group(1).strip()
+        try:
+            return json.loads(text)
+        except ValueError:
+            return None
+
+    @property
+    def data(self) -> Any:
+        """
+        Parsed JSON value, or None if the result is not JSON
+
+        The value is shared by everyone holding this result; treat it as
+        read-only.
+        """
+        if self._data is _NOT_PARSED:
+            self._data = self._parse()
+        return self._data
+
+    @property
+    def is_json(self) -> bool:
+        """Whether the result (or its only fenced block) is JSON"""
+        return self.data is not None
+
+    @property
+    def json_object(self) -> Optional[Dict[str, Any]]:
+        """Parsed JSON object, or None if the result is not a JSON object"""
+        data = self.data
+        return data if isinstance(data, dict) else None
+
+    @property
+    def sub_questions(self) -> Optional[List[Any]]:
+        """sub_questions of a decomposition result"""
+        data = self.json_object
+        if data is None:
+            return None
+        sub_questions = data.get("sub_questions")
+        return sub_questions if isinstance(sub_questions, list) else None
+
+    @cached_property
+    def json_text(self) -> str:
+        """The parsed JSON serialized without escaping, for phrase searches"""
+        return json.dumps(self.data, ensure_ascii=False) if self.is_json else ""
+
+    @cached_property
+    def stripped(self) -> str:
+        return self.raw.strip()
+
+    @cached_property
+    def lowered(self) -> str:
+        return self.raw.lower()
+
+    @cached_property
+    def sq_mentions(self) -> List[str]:
+        """Numbers of every SQ<n> sub-question mention, in order of appearance"""
+        return _SQ_ID.findall(self.raw)
+
+    @cached_property
+    def sq_ids(self) -> FrozenSet[str]:
+        """Distinct sub-question numbers mentioned as SQ<n>"""
+        return frozenset(self.sq_mentions)
+
+    @cached_property
+    def numbered_items(self) -> List[str]:
+        """Numbers of "<n>. text" list items, in order of appearance"""
+        return _NUMBERED_ITEM.findall(self.raw)
+
+    def contains_any(self, terms: Iterable[str]) -> bool:
+        return any(term in self.raw for term in terms)
+
+    def __len__(self) -> int:
+        return len(self.raw)
+
+    def __repr__(self) -> str:
+        return f"ParsedStepResult({len(self.raw)} chars, json={self.is_json})"
+
+
+@lru_cache(maxsize=64)
+def _parse_text(text: str) -> ParsedStepResult:
+    return ParsedStepResult(text)
+
+
+def parse_step_result(
+    step_result: Union[str, ParsedStepResult, None],
+) -> ParsedStepResult:
+    """
+    Get the parsed form of a step result
+
+    Args:
+        step_result: Raw step result, or an already parsed one
+
+    Returns:
+        ParsedStepResult: Shared with other callers passing the same text
+    """
+    if isinstance(step_result, ParsedStepResult):
+        return step_result
+    if not isinstance(step_result, str):
+        step_result = "" if step_result is None else str(step_result)
+    return _parse_text(step_result)
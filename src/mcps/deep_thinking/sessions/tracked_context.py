@@ -0,0 +1,124 @@
+"""
+Change-tracking dictionary for session context
+
+Records which top-level keys were assigned, removed or appended to since the
+last flush, so the session manager can persist a step's changes without
+re-serializing the whole context.
+"""
+
+from typing import Any, Dict, List, Set, Tuple
+
+_MISSING = object()
+
+
+class TrackedContext(dict):
+    """
+    dict that records top-level changes for incremental persistence
+
+    Assigning or deleting a key marks it changed. Values are otherwise treated
+    as opaque: mutating a nested value in place is not seen, so code that
+    grows a list-valued entry should use append_entry() (recorded as an
+    append) or reassign the key.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._changed: Set[str] = set()
+        self._removed: Set[str] = set()
+        self._appends: Dict[str, List[Any]] = {}
+
+    def __reduce__(self):
+        # Copies and pickles are plain dicts without change tracking
+        return (dict, (dict(self),))
+
+    def _mark_changed(self, key: str):
+        self._changed.add(key)
+        self._removed.discard(key)
+        self._appends.pop(key, None)
+
+    def _mark_removed(self, key: str):
+        self._removed.add(key)
+        self._changed.discard(key)
+        self._appends.pop(key, None)
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._mark_changed(key)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._mark_removed(key)
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def pop(self, key, default=_MISSING):
+        if key in self:
+            value = super().pop(key)
+            self._mark_removed(key)
+            return value
+        if default is _MISSING:
+            raise KeyError(key)
+        return default
+
+    def popitem(self):
+        key, value = super().popitem()
+        self._mark_removed(key)
+        return key, value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return super().__getitem__(key)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def clear(self):
+        for key in list(self):
+            self._mark_removed(key)
+        super().clear()
+
+    def append_entry(self, key: str, item: Any):
+        """
+        Append an item to the list stored under key
+
+        Creates the list if the key is missing. The append is recorded on its
+        own, so persisting it costs the size of the item, not of the list.
+        """
+        items = self.get(key)
+        if not isinstance(items, list):
+            self[key] = [item]
+            return
+        items.append(item)
+        if key not in self._changed:
+            self._appends.setdefault(key, []).append(item)
+
+    @property
+    def has_changes(self) -> bool:
+        return bool(self._changed or self._removed or self._appends)
+
+    def pending_changes(
+        self,
+    ) -> Tuple[Dict[str, Any], List[str], Dict[str, List[Any]]]:
+        """
+        Get changes recorded since the last mark_clean()
+
+        Returns:
+            (changed key -> current value, removed keys, key -> appended items)
+        """
+        changed = {key: self[key] for key in self._changed if key in self}
+        return changed, sorted(self._removed), dict(self._appends)
+
+    def mark_all_changed(self):
+        """Record every current key as changed, e.g. before a first write"""
+        for key in self:
+            self._mark_changed(key)
+
+    def mark_clean(self):
+        """Forget recorded changes, e.g. after they were persisted"""
+        self._changed.clear()
+        self._removed.clear()
+        self._appends.clear()
@@ -3,14 +3,50 @@ Template Parameter Replacement System
 
 Provides dynamic parameter replacement logic with context variable injection,
 formatting, validation, and default value handling.
+
+Templates are parsed once into a CompiledTemplate (literal text and
+placeholder segments) and cached by content, so rendering is one pass over
+the segments and one join instead of several regex passes over the text.
 """
 
 import re
 import json
 from datetime import datetime
-from typing import Any, Dict, List, Optional, Union, Callable
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple, Callable
 from dataclasses import dataclass, field
 
+# {param|formatter|default}, {param|formatter} or {param||default}; matches
+# without a "|" are left to the simple pattern
+ADVANCED_PARAMETER_PATTERN = re.compile(r"\{([^{}|]+)(?:\|([^|]*?))?(?:\|([^}]*))?\}")
+SIMPLE_PARAMETER_PATTERN = re.compile(r"\{([^{}|]+)\}")
+# Placeholders still unreplaced at the end that are turned into [param]
+REMAINING_PARAMETER_PATTERN = re.compile(r"\{([a-zA-Z_][a-zA-Z0-9_]*)\}")
+EXTRACT_ADVANCED_PATTERN = re.compile(r"\{([^{}|]+)(?:\|[^{}|]*)?(?:\|[^{}]*)?\}")
+
+# Text ending in an unclosed placeholder, which a later pass could match
+# together with whatever is inserted after it ("{{topic}}" in templates),
+# and the start of an inserted value that would complete such a match
+_OPEN_SIMPLE_TAIL = re.compile(r"\{[^{}|]*\Z")
+_OPEN_REMAINING_TAIL = re.compile(r"\{[a-zA-Z0-9_]*\Z")
+_CLOSES_SIMPLE = re.compile(r"[^{}|]*(?:\}|\Z)")
+_CLOSES_REMAINING = re.compile(r"[a-zA-Z0-9_]*(?:\}|\Z)")
+
+_ADVANCED = 0
+_SIMPLE = 1
+
+COMPILED_TEMPLATE_CACHE_SIZE = 256
+# Bumped whenever the segment layout of CompiledTemplate changes
+COMPILED_TEMPLATE_FORMAT = 1
+
+# Built-in variables whose values change from one render to the next
+TIME_VARIABLES = frozenset(
+    {"timestamp", "current_date", "current_time", "current_datetime"}
+)
+
+# Last formatted "%Y-%m-%d %H:%M:%S" and the second it was formatted for
+_clock_text: Tuple[Optional[datetime], str] = (None, "")
+
 
 @dataclass
 class ParameterConfig:
@@ -42,6 +78,126 @@ class ParameterValidationError(Exception):
     pass
 
 
+@dataclass(frozen=True)
+class CompiledTemplate:
+    """
+    A template split into literal text and placeholder segments
+
+    Segments are str for literal text, or
+    (_ADVANCED, name, formatter, default, open_simple, open_remaining) for
+    {param|formatter|default} and (_SIMPLE, name, raw, open_remaining) for
+    {param}. The open_* flags mark placeholders right after text ending in
+    an unclosed placeholder, such as the inner one of "{{topic}}".
+    """
+
+    segments: Tuple[Any, ...]
+    parameters: List[str]
+
+
+# Compiled forms supplied ahead of time, used the first time each is needed
+_precompiled: Dict[str, CompiledTemplate] = {}
+
+
+def register_compiled_template(template: str, compiled: CompiledTemplate):
+    """Provide the compiled form of a template, e.g. from a template bundle"""
+    _precompiled[template] = compiled
+
+
+def _extract_parameters(template: str) -> List[str]:
+    """Names of all simple and advanced placeholders, sorted"""
+    parameters = set()
+
+    # Extract simple parameters
+    for match in SIMPLE_PARAMETER_PATTERN.finditer(template):
+        param_name = match.group(1).strip()
+        if "|" not in param_name:  # Avoid duplicates with advanced pattern
+            parameters.add(param_name)
+
+    # Extract advanced parameters
+    for match in EXTRACT_ADVANCED_PATTERN.finditer(template):
+        param_name = match.group(1).strip()
+        parameters.add(param_name)
+
+    return sorted(list(parameters))
+
+
+@lru_cache(maxsize=COMPILED_TEMPLATE_CACHE_SIZE)
+def compile_template(template: str) -> CompiledTemplate:
+    """Parse a template into segments; cached by template content"""
+    compiled = _precompiled.pop(template, None)
+    if compiled is not None:
+        return compiled
+
+    segments: List[Any] = []
+
+    def add_literal(text: str):
+        if not text:
+            return
+        if segments and isinstance(segments[-1], str):
+            segments[-1] += text
+        else:
+            segments.append(text)
+
+    def add_text(text: str):
+        # Simple placeholders are only looked for outside advanced ones,
+        # matching the order the passes used to run in
+        pos = 0
+        for match in SIMPLE_PARAMETER_PATTERN.finditer(text):
+            param_name = match.group(1).strip()
+            if '"' in param_name or "'" in param_name:
+                # Never replaced (JSON examples), so it is plain text
+                continue
+            add_literal(text[pos : match.start()])
+            segments.append(
+                (
+                    _SIMPLE,
+                    param_name,
+                    match.group(0),
+                    _follows_open(segments, _OPEN_REMAINING_TAIL),
+                )
+            )
+            pos = match.end()
+        add_literal(text[pos:])
+
+    pos = 0
+    for match in ADVANCED_PARAMETER_PATTERN.finditer(template):
+        if match.group(2) is None and match.group(3) is None:
+            continue  # Simple parameter
+        add_text(template[pos : match.start()])
+        segments.append(
+            (
+                _ADVANCED,
+                match.group(1).strip(),
+                match.group(2).strip() if match.group(2) is not None else None,
+                match.group(3),
+                _follows_open(segments, _OPEN_SIMPLE_TAIL),
+                _follows_open(segments, _OPEN_REMAINING_TAIL),
+            )
+        )
+        pos = match.end()
+    add_text(template[pos:])
+
+    return CompiledTemplate(tuple(segments), _extract_parameters(template))
+
+
+def _follows_open(segments: List[Any], open_tail) -> bool:
+    """Whether the next segment follows text ending in an unclosed placeholder"""
+    return bool(
+        segments and isinstance(segments[-1], str) and open_tail.search(segments[-1])
+    )
+
+
+def _current_datetime_text() -> str:
+    """Current time as "%Y-%m-%d %H:%M:%S", formatted at most once a second"""
+    global _clock_text
+    now = datetime.now().replace(microsecond=0)
+    second, text = _clock_text
+    if now != second:
+        text = now.strftime("%Y-%m-%d %H:%M:%S")
+        _clock_text = (now, text)
+    return text
+
+
 class ParameterReplacer:
     """Advanced parameter replacement system for templates"""
 
@@ -181,58 +337,98 @@ class ParameterReplacer:
         if context is None:
             context = ReplacementContext()
 
-        # Extract parameters from template for validation
-        template_params = self.extract_parameters(template)
+        compiled = compile_template(template)
 
         # Merge all available variables
         all_variables = self._merge_variables(parameters, context)
 
         # Validate only parameters that are used in the template
-        self._validate_parameters(all_variables, template_params)
+        self._validate_parameters(all_variables, compiled.parameters)
+
+        result = self._render_compiled(compiled, all_variables)
+        if result is None:
+            result = self._replace_in_passes(template, all_variables)
+        return result
+
+    def _render_compiled(
+        self, compiled: CompiledTemplate, variables: Dict[str, Any]
+    ) -> Optional[str]:
+        """
+        Render a compiled template in one pass
+
+        Inserted values get the same later passes they used to (advanced
+        values the simple and remaining passes, simple values the remaining
+        one), applied to the value alone. Returns None when a later pass
+        could match across an inserted value, which only the pass-by-pass
+        rendering reproduces: a value ending in an unclosed placeholder, or
+        one that closes a placeholder left open before it.
+        """
+        parts = []
+        for segment in compiled.segments:
+            if isinstance(segment, str):
+                parts.append(segment)
+                continue
 
+            if segment[0] == _ADVANCED:
+                value = self._format_advanced_parameter(
+                    segment[1], segment[2], segment[3], variables
+                )
+                if segment[4] and _CLOSES_SIMPLE.match(value):
+                    return None
+                if "{" in value:
+                    if _OPEN_SIMPLE_TAIL.search(value):
+                        return None
+                    value = self._replace_simple_parameters(value, variables)
+                open_remaining = segment[5]
+            else:
+                value = self._format_simple_parameter(segment[1], variables)
+                if value is None:
+                    # Left as it was, which the remaining pass leaves too
+                    parts.append(segment[2])
+                    continue
+                open_remaining = segment[3]
+
+            if open_remaining and _CLOSES_REMAINING.match(value):
+                return None
+            if "{" in value:
+                if _OPEN_REMAINING_TAIL.search(value):
+                    return None
+                value = self._replace_remaining_placeholders(value)
+            parts.append(value)
+
+        return "".join(parts)
+
+    def _replace_in_passes(self, template: str, variables: Dict[str, Any]) -> str:
+        """Replace parameters pass by pass over the whole text"""
         # Replace parameters with advanced syntax support
-        result = self._replace_advanced_parameters(template, all_variables)
+        result = self._replace_advanced_parameters(template, variables)
 
         # Handle remaining simple parameters
-        result = self._replace_simple_parameters(result, all_variables)
+        result = self._replace_simple_parameters(result, variables)
 
         # Replace any remaining placeholders with defaults
-        result = self._replace_remaining_placeholders(result)
-
-        return result
+        return self._replace_remaining_placeholders(result)
 
     def _merge_variables(
         self, parameters: Dict[str, Any], context: ReplacementContext
     ) -> Dict[str, Any]:
         """Merge all available variables"""
-        all_variables = {}
-
-        # Start with global context
-        all_variables.update(self.global_context)
-
-        # Add context variables
-        all_variables.update(
-            {
-                "session_id": context.session_id,
-                "user_id": context.user_id,
-                "timestamp": context.timestamp,
-                "step_name": context.step_name,
-                "current_date": datetime.now().strftime("%Y-%m-%d"),
-                "current_time": datetime.now().strftime("%H:%M:%S"),
-                "current_datetime": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            }
-        )
-
-        # Add previous results
-        all_variables.update(context.previous_results)
-
-        # Add custom variables
-        all_variables.update(context.custom_variables)
-
-        # Add provided parameters (highest priority)
-        all_variables.update(parameters)
-
-        return all_variables
+        current_datetime = _current_datetime_text()
+
+        # Later sources take priority; provided parameters are highest
+        return {
+            **self.global_context,
+            "session_id": context.session_id,
+            "user_id": context.user_id,
+            "timestamp": context.timestamp,
+            "step_name": context.step_name,
+            "current_date": current_datetime[:10],
+            "current_time": current_datetime[11:],
+            "current_datetime": current_datetime,
+            **context.previous_results,
+            **context.custom_variables,
+            **parameters,
+        }
 
     def _validate_parameters(
         self, parameters: Dict[str, Any], template_params: Optional[List[str]] = None
@@ -270,113 +466,116 @@ class ParameterReplacer:
         self, template: str, variables: Dict[str, Any]
     ) -> str:
         """Replace parameters with advanced syntax: {param|formatter|default}"""
-        # Pattern to match {param|formatter|default} or {param|formatter} or {param||default}
-        # This pattern handles the case where default values can contain braces
-        pattern = r"\{([^{}|]+)(?:\|([^|]*?))?(?:\|([^}]*))?\}"
 
         def replace_match(match):
-            param_name = match.group(1).strip()
-            formatter_name = (
-                match.group(2).strip() if match.group(2) is not None else None
-            )
-            default_value = match.group(3) if match.group(3) is not None else None
-
             # Skip if this is a simple parameter (no | characters)
-            if formatter_name is None and default_value is None:
+            if match.group(2) is None and match.group(3) is None:
                 return match.group(0)  # Return unchanged for simple parameters
 
-            # Get the parameter value
-            value = variables.get(param_name)
-
-            # Use default if value is None or empty
-            if value is None or str(value).strip() == "":
-                if default_value is not None:
-                    value = default_value
-                elif param_name in self.parameter_configs:
-                    config = self.parameter_configs[param_name]
-                    if config.default_value is not None:
-                        value = config.default_value
-                    else:
-                        value = f"[{param_name}]"
+            return self._format_advanced_parameter(
+                match.group(1).strip(),
+                match.group(2).strip() if match.group(2) is not None else None,
+                match.group(3),
+                variables,
+            )
+
+        return ADVANCED_PARAMETER_PATTERN.sub(replace_match, template)
+
+    def _format_advanced_parameter(
+        self,
+        param_name: str,
+        formatter_name: Optional[str],
+        default_value: Optional[str],
+        variables: Dict[str, Any],
+    ) -> str:
+        """Value for {param|formatter|default}"""
+        # Get the parameter value
+        value = variables.get(param_name)
+
+        # Use default if value is None or empty
+        if value is None or str(value).strip() == "":
+            if default_value is not None:
+                value = default_value
+            elif param_name in self.parameter_configs:
+                config = self.parameter_configs[param_name]
+                if config.default_value is not None:
+                    value = config.default_value
                 else:
                     value = f"[{param_name}]"
-
-            # Apply formatter if specified
-            if formatter_name and formatter_name in self.formatters:
+            else:
+                value = f"[{param_name}]"
+
+        # Apply formatter if specified
+        if formatter_name and formatter_name in self.formatters:
+            try:
+                value = self.formatters[formatter_name](value)
+            except Exception as e:
+                # If formatting fails, use the original value
+                print(
+                    f"Warning: Formatter '{formatter_name}' failed for parameter '{param_name}': {e}"
+                )
+        elif formatter_name and param_name in self.parameter_configs:
+            # Try parameter-specific formatter
+            config = self.parameter_configs[param_name]
+            if config.formatter:
                 try:
-                    value = self.formatters[formatter_name](value)
+                    value = config.formatter(value)
                 except Exception as e:
-                    # If formatting fails, use the original value
                     print(
-                        f"Warning: Formatter '{formatter_name}' failed for parameter '{param_name}': {e}"
+                        f"Warning: Parameter formatter failed for '{param_name}': {e}"
                     )
-            elif formatter_name and param_name in self.parameter_configs:
-                # Try parameter-specific formatter
-                config = self.parameter_configs[param_name]
-                if config.formatter:
-                    try:
-                        value = config.formatter(value)
-                    except Exception as e:
-                        print(
-                            f"Warning: Parameter formatter failed for '{param_name}': {e}"
-                        )
-
-            return str(value)
 
-        return re.sub(pattern, replace_match, template)
+        return str(value)
 
     def _replace_simple_parameters(
         self, template: str, variables: Dict[str, Any]
     ) -> str:
         """Replace simple parameters: {param} (only those without | characters)"""
-        # Use regex to find simple parameters (no | characters)
-        # This pattern ensures we only match parameters that don't contain |
-        simple_pattern = r"\{([^{}|]+)\}"
 
         def replace_simple_match(match):
-            full_match = match.group(0)
-            param_name = match.group(1).strip()
+            value = self._format_simple_parameter(match.group(1).strip(), variables)
+            return match.group(0) if value is None else value
 
-            # Skip if this parameter contains | (it should have been handled by advanced replacement)
-            if "|" in full_match:
-                return full_match
+        return SIMPLE_PARAMETER_PATTERN.sub(replace_simple_match, template)
 
-            # Skip if the parameter name contains quotes (likely part of JSON or other formatted content)
-            if '"' in param_name or "'" in param_name:
-                return full_match
-
-            # Only replace if this is actually a parameter we know about or have configured
-            if param_name not in variables and param_name not in self.parameter_configs:
-                return full_match
-
-            value = variables.get(param_name)
-
-            if value is None:
-                # Use configured default or placeholder
-                if param_name in self.parameter_configs:
-                    config = self.parameter_configs[param_name]
-                    if config.default_value is not None:
-                        value = config.default_value
-                    else:
-                        value = f"[{param_name}]"
-                else:
-                    value = f"[{param_name}]"
+    def _format_simple_parameter(
+        self, param_name: str, variables: Dict[str, Any]
+    ) -> Optional[str]:
+        """Value for {param}, or None if the placeholder is to be left as is"""
+        # Skip if the parameter name contains quotes (likely part of JSON or other formatted content)
+        if '"' in param_name or "'" in param_name:
+            return None
 
-            # Apply parameter-specific formatter if configured
+        # Only replace if this is actually a parameter we know about or have configured
+        if param_name not in variables and param_name not in self.parameter_configs:
+            return None
+
+        value = variables.get(param_name)
+
+        if value is None:
+            # Use configured default or placeholder
             if param_name in self.parameter_configs:
                 config = self.parameter_configs[param_name]
-                if config.formatter:
-                    try:
-                        value = config.formatter(value)
-                    except Exception as e:
-                        print(
-                            f"Warning: Parameter formatter failed for '{param_name}': {e}"
-                        )
+                if config.default_value is not None:
+                    value = config.default_value
+                else:
+                    value = f"[{param_name}]"
+            else:
+                value = f"[{param_name}]"
 
-            # Convert to string - no escaping needed here since we'll handle it differently
-            return str(value)
+        # Apply parameter-specific formatter if configured
+        if param_name in self.parameter_configs:
+            config = self.parameter_configs[param_name]
+            if config.formatter:
+                try:
+                    value = config.formatter(value)
+                except Exception as e:
+                    print(
+                        f"Warning: Parameter formatter failed for '{param_name}': {e}"
+                    )
 
-        return re.sub(simple_pattern, replace_simple_match, template)
+        # Convert to string - no escaping needed here since we'll handle it differently
+        return str(value)
 
     def _replace_remaining_placeholders(self, template: str) -> str:
         """Replace any remaining {param} placeholders with [param]"""
@@ -392,28 +591,11 @@ class ParameterReplacer:
                 # Leave unknown parameters as-is to avoid breaking JSON or other content
                 return match.group(0)
 
-        return re.sub(r"\{([a-zA-Z_][a-zA-Z0-9_]*)\}", replace_placeholder, template)
+        return REMAINING_PARAMETER_PATTERN.sub(replace_placeholder, template)
 
     def extract_parameters(self, template: str) -> List[str]:
         """Extract all parameter names from a template"""
-        # Find both simple {param} and advanced {param|formatter|default} patterns
-        simple_pattern = r"\{([^{}|]+)\}"
-        advanced_pattern = r"\{([^{}|]+)(?:\|[^{}|]*)?(?:\|[^{}]*)?\}"
-
-        parameters = set()
-
-        # Extract simple parameters
-        for match in re.finditer(simple_pattern, template):
-            param_name = match.group(1).strip()
-            if "|" not in param_name:  # Avoid duplicates with advanced pattern
-                parameters.add(param_name)
-
-        # Extract advanced parameters
-        for match in re.finditer(advanced_pattern, template):
-            param_name = match.group(1).strip()
-            parameters.add(param_name)
-
-        return sorted(list(parameters))
+        return list(compile_template(template).parameters)
 
     def validate_template(self, template: str) -> Dict[str, Any]:
         """Validate a template and return analysis"""
@@ -3,6 +3,10 @@ Template Performance Optimizer
 
 Implements template preloading, caching strategies, memory monitoring,
 and performance optimization for the template management system.
+
+Two cache tiers are kept: raw template text by name, and fully rendered
+prompts keyed by template name, version id and a canonical form of the
+parameters.
 """
 
 import gc
@@ -14,10 +18,12 @@ import time
 from collections import defaultdict, OrderedDict
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Set, Tuple
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Set, Tuple
 from dataclasses import dataclass
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
+from ..performance.resource_sampler import get_resource_sampler
+
 logger = logging.getLogger(__name__)
 
 
@@ -109,6 +115,16 @@ class LRUCache:
         self.access_times.pop(key, None)
         return key
 
+    def remove(self, key: str) -> bool:
+        """Remove an item from cache"""
+        with self.lock:
+            if key not in self.cache:
+                return False
+            value = self.cache.pop(key)
+            self.memory_usage -= len(value.encode("utf-8"))
+            self.access_times.pop(key, None)
+            return True
+
     def clear(self):
         """Clear all cache entries"""
         with self.lock:
@@ -125,12 +141,176 @@ class LRUCache:
         return self.memory_usage
 
 
+RenderedPromptKey = Tuple[str, str, Tuple[Any, ...]]
+
+
+def _frozen_value(value: Any, strings: List[str]) -> Any:
+    """
+    Hashable form of a parameter value that tells apart every value
+    rendering could tell apart
+
+    Strings stay as they are and are collected into strings; everything
+    else is tagged with its type: 1, 1.0 and True are equal as dict keys but
+    render differently, as do lists and tuples. Floats are keyed by repr so
+    -0.0 and 0.0 differ, and dicts keep their order because str() of a dict
+    follows it. Raises TypeError for any other type.
+    """
+    kind = type(value)
+    if kind is str:
+        strings.append(value)
+        return value
+    if value is None or kind is int or kind is bool:
+        return (kind, value)
+    if kind is float:
+        return (kind, repr(value))
+    if kind is list or kind is tuple:
+        return (kind, tuple([_frozen_value(v, strings) for v in value]))
+    if kind is dict:
+        return (
+            kind,
+            tuple(
+                [
+                    (_frozen_value(k, strings), _frozen_value(v, strings))
+                    for k, v in value.items()
+                ]
+            ),
+        )
+    raise TypeError(f"Cannot key parameter value of type {kind.__name__}")
+
+
+def params_cache_key(
+    params: Dict[str, Any], volatile: FrozenSet[str] = frozenset()
+) -> Optional[Tuple[Any, ...]]:
+    """
+    Canonical hashable key for template parameters
+
+    Returns None if a value has no exact canonical form, or if a key or
+    string value mentions one of the volatile variable names, since an
+    inserted value may itself be scanned for placeholders.
+    """
+    strings: List[str] = []
+    try:
+        key = tuple(
+            [(name, _frozen_value(value, strings)) for name, value in params.items()]
+        )
+    except (TypeError, RecursionError):
+        return None
+
+    text = "\0".join([*params, *strings])
+    for name in volatile:
+        if name in text:
+            return None
+    return key
+
+
+class RenderedPromptCache(LRUCache):
+    """
+    LRU cache of fully rendered prompts
+
+    Keys are (template name, version id, params_cache_key()), so a new
+    template version never serves prompts rendered from an older one; invalidate()
+    drops a template's entries eagerly so they do not hold memory until
+    they age out.
+    """
+
+    def __init__(self, max_size: int = 500, max_memory_mb: int = 20):
+        super().__init__(max_size=max_size, max_memory_mb=max_memory_mb)
+        self.keys_by_template: Dict[str, Set[RenderedPromptKey]] = defaultdict(set)
+        self.reset_statistics()
+
+    def get(self, key: RenderedPromptKey) -> Optional[str]:
+        """Get a rendered prompt, counting the hit or miss"""
+        with self.lock:
+            value = self.cache.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: RenderedPromptKey, value: str) -> bool:
+        """Store a rendered prompt"""
+        with self.lock:
+            super().put(key, value)
+            self.keys_by_template[key[0]].add(key)
+            return True
+
+    def record_bypass(self):
+        """Count a render that could not be cached"""
+        with self.lock:
+            self.bypasses += 1
+
+    def _evict_lru(self) -> Optional[RenderedPromptKey]:
+        key = super()._evict_lru()
+        if key is not None:
+            self.evictions += 1
+            self._unindex(key)
+        return key
+
+    def _unindex(self, key: RenderedPromptKey):
+        keys = self.keys_by_template.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.keys_by_template[key[0]]
+
+    def invalidate(self, name: str) -> int:
+        """Drop every rendered prompt of a template"""
+        with self.lock:
+            removed = sum(
+                1 for key in self.keys_by_template.pop(name, ()) if self.remove(key)
+            )
+            self.invalidations += removed
+            return removed
+
+    def clear(self):
+        """Drop every rendered prompt"""
+        with self.lock:
+            self.invalidations += len(self.cache)
+            super().clear()
+            self.keys_by_template.clear()
+
+    def reset_statistics(self):
+        """Reset hit, miss and eviction counters"""
+        with self.lock:
+            self.hits = 0
+            self.misses = 0
+            self.bypasses = 0
+            self.evictions = 0
+            self.invalidations = 0
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get rendered prompt cache metrics"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "total_requests": lookups,
+                "cache_hits": self.hits,
+                "cache_misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "bypasses": self.bypasses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "cache_size": self.size(),
+                "templates_cached": len(self.keys_by_template),
+                "cache_memory_usage": self.memory_size(),
+                "cache_memory_usage_mb": self.memory_size() / 1024 / 1024,
+            }
+
+
 class TemplatePreloader:
     """Template preloading system for performance optimization"""
 
-    def __init__(self, templates_dir: Path, cache: LRUCache):
+    def __init__(
+        self,
+        templates_dir: Path,
+        cache: LRUCache,
+        load_func: Optional[Callable[[str], Optional[str]]] = None,
+    ):
         self.templates_dir = templates_dir
         self.cache = cache
+        self.load_func = load_func
         self.preload_stats = {}
         self.preload_executor = ThreadPoolExecutor(
             max_workers=4, thread_name_prefix="template-preload"
@@ -223,6 +403,13 @@ class TemplatePreloader:
     def _preload_single_template(self, name: str) -> bool:
         """Preload a single template"""
         try:
+            if self.load_func is not None:
+                # Share the owner's copy rather than reading another one
+                content = self.load_func(name)
+                if content is None:
+                    return False
+                return self.cache.put(name, content)
+
             template_path = self.templates_dir / f"{name}.tmpl"
 
             if not template_path.exists():
@@ -255,7 +442,8 @@ class MemoryMonitor:
         self.warning_threshold = warning_threshold_mb * 1024 * 1024
         self.critical_threshold = critical_threshold_mb * 1024 * 1024
         self.monitoring_active = False
-        self.monitor_thread = None
+        self.sampler = None
+        self._subscription = None
         self.cleanup_callbacks = []
         self.memory_stats = {
             "peak_usage": 0,
@@ -266,59 +454,53 @@ class MemoryMonitor:
         self.lock = threading.RLock()
 
     def start_monitoring(self, check_interval: float = 30.0):
-        """Start memory monitoring"""
-        if self.monitoring_active:
-            return
-
-        self.monitoring_active = True
-        self.monitor_thread = threading.Thread(
-            target=self._monitor_loop,
-            args=(check_interval,),
-            daemon=True,
-            name="memory-monitor",
-        )
-        self.monitor_thread.start()
+        """Start memory monitoring on the shared resource sampler thread"""
+        with self.lock:
+            if self.monitoring_active:
+                return
+
+            self.monitoring_active = True
+            self.sampler = get_resource_sampler()
+            self._subscription = self.sampler.subscribe(
+                self._check_memory, check_interval
+            )
         logger.info("Memory monitoring started")
 
     def stop_monitoring(self):
         """Stop memory monitoring"""
-        self.monitoring_active = False
-        if self.monitor_thread and self.monitor_thread.is_alive():
-            self.monitor_thread.join(timeout=5.0)
+        with self.lock:
+            self.monitoring_active = False
+            subscription, self._subscription = self._subscription, None
+        if subscription is not None:
+            self.sampler.unsubscribe(subscription)
         logger.info("Memory monitoring stopped")
 
     def add_cleanup_callback(self, callback):
         """Add a cleanup callback function"""
         self.cleanup_callbacks.append(callback)
 
-    def _monitor_loop(self, check_interval: float):
-        """Main monitoring loop"""
-        while self.monitoring_active:
-            try:
-                current_usage = self._get_memory_usage()
-
-                with self.lock:
-                    self.memory_stats["current_usage"] = current_usage
-                    if current_usage > self.memory_stats["peak_usage"]:
-                        self.memory_stats["peak_usage"] = current_usage
-
-                # Check thresholds
-                if current_usage > self.critical_threshold:
-                    logger.warning(
-                        f"Critical memory usage: {current_usage / 1024 / 1024:.1f}MB"
-                    )
-                    self._trigger_cleanup(aggressive=True)
-                elif current_usage > self.warning_threshold:
-                    logger.info(
-                        f"High memory usage: {current_usage / 1024 / 1024:.1f}MB"
-                    )
-                    self._trigger_cleanup(aggressive=False)
+    def _check_memory(self):
+        """Check the sampled process memory against the thresholds"""
+        try:
+            current_usage = int(self.sampler.latest("process_memory_mb") * 1024 * 1024)
 
-                time.sleep(check_interval)
+            with self.lock:
+                self.memory_stats["current_usage"] = current_usage
+                if current_usage > self.memory_stats["peak_usage"]:
+                    self.memory_stats["peak_usage"] = current_usage
+
+            # Check thresholds
+            if current_usage > self.critical_threshold:
+                logger.warning(
+                    f"Critical memory usage: {current_usage / 1024 / 1024:.1f}MB"
+                )
+                self._trigger_cleanup(aggressive=True)
+            elif current_usage > self.warning_threshold:
+                logger.info(f"High memory usage: {current_usage / 1024 / 1024:.1f}MB")
+                self._trigger_cleanup(aggressive=False)
 
-            except Exception as e:
-                logger.error(f"Error in memory monitoring: {e}")
-                time.sleep(check_interval)
+        except Exception as e:
+            logger.error(f"Error in memory monitoring: {e}")
 
     def _get_memory_usage(self) -> int:
         """Get current process memory usage in bytes"""
@@ -369,11 +551,20 @@ class TemplatePerformanceOptimizer:
     """Main performance optimizer for template system"""
 
     def __init__(
-        self, templates_dir: Path, cache_size: int = 100, cache_memory_mb: int = 50
+        self,
+        templates_dir: Path,
+        cache_size: int = 100,
+        cache_memory_mb: int = 50,
+        rendered_cache_size: int = 500,
+        rendered_cache_memory_mb: int = 20,
+        load_func: Optional[Callable[[str], Optional[str]]] = None,
     ):
         self.templates_dir = templates_dir
         self.cache = LRUCache(max_size=cache_size, max_memory_mb=cache_memory_mb)
-        self.preloader = TemplatePreloader(templates_dir, self.cache)
+        self.rendered_cache = RenderedPromptCache(
+            max_size=rendered_cache_size, max_memory_mb=rendered_cache_memory_mb
+        )
+        self.preloader = TemplatePreloader(templates_dir, self.cache, load_func)
         self.memory_monitor = MemoryMonitor()
         self.usage_stats = defaultdict(lambda: TemplateUsageStats(""))
         self.metrics = CacheMetrics()
@@ -435,6 +626,12 @@ class TemplatePerformanceOptimizer:
                     self.metrics.cache_hits / self.metrics.total_requests
                 )
 
+    def invalidate_template(self, name: str):
+        """Drop a template's cached text and rendered prompts after it changes"""
+        with self.lock:
+            self.cache.remove(name)
+            self.rendered_cache.invalidate(name)
+
     def _update_usage_stats(self, name: str, access_time: float, cache_hit: bool):
         """Update usage statistics for a template"""
         stats = self.usage_stats[name]
@@ -552,6 +749,9 @@ class TemplatePerformanceOptimizer:
                     if template_name in self.cache.cache:
                         del self.cache.cache[template_name]
 
+                # Rendered prompts are cheap to rebuild
+                self.rendered_cache.clear()
+
                 logger.info(
                     f"Aggressive cleanup: removed {len(templates_to_remove)} templates from cache"
                 )
@@ -575,6 +775,7 @@ class TemplatePerformanceOptimizer:
                     "cache_memory_usage": self.cache.memory_size(),
                     "cache_memory_usage_mb": self.cache.memory_size() / 1024 / 1024,
                 },
+                "rendered_cache_metrics": self.rendered_cache.get_metrics(),
                 "usage_stats": {
                     name: {
                         "access_count": stats.access_count,
@@ -601,6 +802,7 @@ class TemplatePerformanceOptimizer:
         with self.lock:
             self.usage_stats.clear()
             self.metrics = CacheMetrics()
+            self.rendered_cache.reset_statistics()
             logger.info("Performance statistics reset")
 
     def shutdown(self):
@@ -0,0 +1,254 @@
+"""
+Precompiled Template Bundles
+
+Packs a templates directory into one file so that server startup does not
+read and parse every .tmpl file:
+- A header line carries a checksum of everything after it and the length
+  of a JSON index; the template contents follow the index as raw UTF-8
+- The index holds each template's content hash, file size and mtime,
+  parameter names and compiled segments, with literal text stored as
+  character spans of the content rather than a second copy
+- The file is mapped with mmap and verified before use; a bundle that fails
+  its checksum or was written by an incompatible version is ignored
+- A template whose file no longer matches the bundled size and mtime is
+  re-hashed, and falls back to its .tmpl file if the content changed
+"""
+
+import hashlib
+import json
+import logging
+import mmap
+import os
+import tempfile
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .parameter_replacer import (
+    ADVANCED_PARAMETER_PATTERN,
+    COMPILED_TEMPLATE_FORMAT,
+    CompiledTemplate,
+    compile_template,
+)
+from .template_store import TemplateBlobStore
+
+logger = logging.getLogger(__name__)
+
+BUNDLE_NAME = "templates.bundle"
+BUNDLE_MAGIC = b"DTBUNDLE"
+BUNDLE_VERSION = 1
+# The header line is short; anything longer is not a bundle
+_MAX_HEADER = 256
+
+
+class TemplateBundleError(Exception):
+    """Raised for unreadable, corrupt or incompatible bundles"""
+
+
+@dataclass
+class BundledTemplate:
+    """A template as stored in a bundle"""
+
+    content: str
+    sha256: str
+    size: int
+    mtime_ns: int
+    compiled: Optional[CompiledTemplate] = None
+
+    def matches_file(self, path: Path) -> bool:
+        """Whether the template file still has the bundled content"""
+        try:
+            content = path.read_text(encoding="utf-8")
+        except (OSError, ValueError):
+            return False
+        return TemplateBlobStore.content_hash(content) == self.sha256
+
+
+def _encode_segments(content: str, compiled: CompiledTemplate) -> List[Any]:
+    """
+    Compiled segments with literal text replaced by [start, end] spans
+
+    Placeholder segments are kept as lists; they always have 4 or 6 items,
+    so two-item lists are unambiguous. A literal that is not where it is
+    expected is stored as text.
+    """
+    encoded: List[Any] = []
+    pos = 0
+    for segment in compiled.segments:
+        if isinstance(segment, str):
+            end = pos + len(segment)
+            encoded.append([pos, end] if content[pos:end] == segment else segment)
+            pos = end
+            continue
+
+        encoded.append(list(segment))
+        if len(segment) == 4:
+            pos += len(segment[2])  # Raw text of a simple placeholder
+        else:
+            match = ADVANCED_PARAMETER_PATTERN.match(content, pos)
+            pos = match.end() if match else pos
+    return encoded
+
+
+def _decode_segments(content: str, encoded: List[Any]) -> tuple:
+    return tuple(
+        (
+            segment
+            if isinstance(segment, str)
+            else (
+                content[segment[0] : segment[1]]
+                if len(segment) == 2
+                else tuple(segment)
+            )
+        )
+        for segment in encoded
+    )
+
+
+def build_template_bundle(
+    templates_dir: str, bundle_path: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Write a bundle of every .tmpl file in a directory
+
+    Args:
+        templates_dir: Directory holding the .tmpl files
+        bundle_path: Output file; defaults to BUNDLE_NAME in templates_dir
+
+    Returns:
+        Summary with the bundle path, template count and size in bytes
+    """
+    templates_path = Path(templates_dir)
+    output = Path(bundle_path) if bundle_path else templates_path / BUNDLE_NAME
+
+    index = {}
+    blobs = []
+    offset = 0
+    for path in sorted(templates_path.glob("*.tmpl")):
+        content = path.read_text(encoding="utf-8")
+        data = content.encode("utf-8")
+        stat = path.stat()
+        compiled = compile_template(content)
+        index[path.stem] = {
+            "offset": offset,
+            "length": len(data),
+            "sha256": hashlib.sha256(data).hexdigest(),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "parameters": list(compiled.parameters),
+            "segments": _encode_segments(content, compiled),
+        }
+        blobs.append(data)
+        offset += len(data)
+
+    index_data = json.dumps(
+        {
+            "created_at": datetime.now().isoformat(),
+            "compiled_format": COMPILED_TEMPLATE_FORMAT,
+            "templates": index,
+        },
+        ensure_ascii=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+    checksum = hashlib.sha256(index_data)
+    for data in blobs:
+        checksum.update(data)
+    header = b"%s %d %s %d\n" % (
+        BUNDLE_MAGIC,
+        BUNDLE_VERSION,
+        checksum.hexdigest().encode("ascii"),
+        len(index_data),
+    )
+
+    # Written next to the target and renamed, so readers never see half a bundle
+    output.parent.mkdir(parents=True, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(
+        prefix=f".{output.name}.", suffix=".tmp", dir=output.parent
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(header)
+            f.write(index_data)
+            f.writelines(blobs)
+        # Shipped inside the package, so readable like the .tmpl files
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, output)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+    logger.info(f"Bundled {len(index)} templates into {output}")
+    return {
+        "path": str(output),
+        "templates": len(index),
+        "bytes": len(header) + len(index_data) + offset,
+    }
+
+
+def load_template_bundle(bundle_path: Path) -> Dict[str, BundledTemplate]:
+    """
+    Map a bundle and verify its checksum
+
+    Args:
+        bundle_path: Bundle file
+
+    Returns:
+        Bundled templates by name
+    """
+    try:
+        with (
+            open(bundle_path, "rb") as f,
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm,
+        ):
+            header_end = mm.find(b"\n", 0, _MAX_HEADER)
+            fields = mm[:header_end].split() if header_end > 0 else []
+            if len(fields) != 4 or fields[0] != BUNDLE_MAGIC:
+                raise TemplateBundleError(f"Not a template bundle: {bundle_path}")
+            if fields[1] != str(BUNDLE_VERSION).encode("ascii"):
+                raise TemplateBundleError(
+                    f"Unsupported bundle version {fields[1].decode(errors='replace')}"
+                )
+
+            # Hashed in place; only the index and contents are copied out
+            with memoryview(mm) as view:
+                checksum = hashlib.sha256(view[header_end + 1 :]).hexdigest()
+            if checksum.encode("ascii") != fields[2]:
+                raise TemplateBundleError(f"Checksum mismatch in {bundle_path}")
+
+            index_start = header_end + 1
+            blobs_start = index_start + int(fields[3])
+            index = json.loads(mm[index_start:blobs_start])
+            contents = {}
+            for name, entry in index["templates"].items():
+                start = blobs_start + entry["offset"]
+                contents[name] = mm[start : start + entry["length"]].decode("utf-8")
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        raise TemplateBundleError(
+            f"Cannot read template bundle {bundle_path}: {e}"
+        ) from e
+
+    # Compiled segments from another layout are rebuilt on first use instead
+    use_compiled = index.get("compiled_format") == COMPILED_TEMPLATE_FORMAT
+    try:
+        return {
+            name: BundledTemplate(
+                content=contents[name],
+                sha256=entry["sha256"],
+                size=entry["size"],
+                mtime_ns=entry["mtime_ns"],
+                compiled=(
+                    CompiledTemplate(
+                        _decode_segments(contents[name], entry["segments"]),
+                        list(entry["parameters"]),
+                    )
+                    if use_compiled
+                    else None
+                ),
+            )
+            for name, entry in index["templates"].items()
+        }
+    except (KeyError, TypeError, IndexError) as e:
+        raise TemplateBundleError(
+            f"Malformed template bundle {bundle_path}: {e}"
+        ) from e
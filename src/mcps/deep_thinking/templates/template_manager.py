@@ -11,21 +11,32 @@ import os
 import re
 import shutil
 import threading
-import time
 import uuid
 from datetime import datetime
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
-from watchdog.events import FileSystemEventHandler
-from watchdog.observers import Observer
 
+from ..config.reload_bus import ChangeSet, ReloadBus
+from ..config.reload_bus import reload_bus as shared_reload_bus
 from .parameter_replacer import (
+    TIME_VARIABLES,
     ParameterReplacer,
     ParameterConfig,
     ReplacementContext,
     ParameterValidationError,
+    compile_template,
+    register_compiled_template,
 )
-from .performance_optimizer import TemplatePerformanceOptimizer
+from .performance_optimizer import (
+    RenderedPromptKey,
+    TemplatePerformanceOptimizer,
+    params_cache_key,
+)
+from .template_bundle import BUNDLE_NAME, TemplateBundleError, load_template_bundle
+from .template_store import TemplateBlobStore
+
+# Placeholders left over after the fallback replacement
+UNRESOLVED_PLACEHOLDER_PATTERN = re.compile(r"{([^{}]+)}")
 
 logger = logging.getLogger(__name__)
 
@@ -42,57 +53,6 @@ class TemplateVersionError(Exception):
     pass
 
 
-class TemplateFileHandler(FileSystemEventHandler):
-    """File system event handler for template files"""
-
-    def __init__(self, template_manager):
-        self.template_manager = template_manager
-        self.last_reload_time = {}  # Track last reload time per file
-        self.debounce_interval = 0.5  # seconds
-        self.pending_reloads = set()  # Track pending reloads
-
-    def on_modified(self, event):
-        """Handle file modification events"""
-        if event.is_directory:
-            return
-
-        file_path = Path(event.src_path)
-        if file_path.suffix != ".tmpl":
-            return
-
-        template_name = file_path.stem
-
-        # Debounce to avoid multiple reloads for the same file
-        current_time = time.time()
-        last_time = self.last_reload_time.get(template_name, 0)
-        if current_time - last_time < self.debounce_interval:
-            # Add to pending reloads if we're debouncing
-            self.pending_reloads.add(template_name)
-            return
-
-        # Update last reload time
-        self.last_reload_time[template_name] = current_time
-
-        # Remove from pending if it was there
-        if template_name in self.pending_reloads:
-            self.pending_reloads.remove(template_name)
-
-        # Reload the template
-        print(f"Hot reloading template: {template_name}")
-        self.template_manager.reload_template(template_name)
-
-    def on_created(self, event):
-        """Handle file creation events"""
-        if event.is_directory:
-            return
-
-        file_path = Path(event.src_path)
-        if file_path.suffix == ".tmpl":
-            template_name = file_path.stem
-            print(f"New template detected: {template_name}")
-            self.template_manager.reload_template(template_name)
-
-
 class TemplateManager:
     """Advanced template manager with dynamic loading, caching, and version management"""
 
@@ -100,15 +60,20 @@ class TemplateManager:
         self,
         templates_dir: str = "templates",
         enable_performance_optimization: bool = True,
+        max_versions_per_template: int = 20,
+        bundle_path: Optional[str] = None,
+        reload_bus: Optional[ReloadBus] = None,
     ):
         self.templates_dir = Path(templates_dir)
         self.cache: Dict[str, str] = {}
         self.metadata: Dict[str, Dict[str, Any]] = {}
         self.versions: Dict[str, List[Dict[str, Any]]] = {}  # Template version history
+        self.max_versions_per_template = max_versions_per_template
         self.usage_stats: Dict[str, int] = {}  # Template usage statistics
         self.lock = threading.RLock()
         self.hot_reload_enabled = False
-        self.observer = None
+        self.reload_bus = reload_bus or shared_reload_bus
+        self._reload_subscription = None
 
         # Initialize parameter replacer
         self.parameter_replacer = ParameterReplacer()
@@ -119,14 +84,24 @@ class TemplateManager:
         self.versions_dir = self.templates_dir / "versions"
         self.versions_dir.mkdir(exist_ok=True)
 
+        # One copy of each distinct content, shared by cache and versions
+        self.blob_store = TemplateBlobStore(self.versions_dir / "blobs")
+
         # Initialize performance optimizer
         self.performance_optimizer = None
         if enable_performance_optimization:
             self.performance_optimizer = TemplatePerformanceOptimizer(
-                self.templates_dir, cache_size=100, cache_memory_mb=50
+                self.templates_dir,
+                cache_size=100,
+                cache_memory_mb=50,
+                load_func=self._load_template_content,
             )
 
-        # Scan for existing template files first
+        # Prefer the prebuilt bundle, then scan for files it does not cover
+        self.bundle_path = (
+            Path(bundle_path) if bundle_path else self.templates_dir / BUNDLE_NAME
+        )
+        self._load_template_bundle()
         self._scan_template_files()
 
         # Initialize built-in templates (only if they don't exist)
@@ -853,25 +828,7 @@ class TemplateManager:
             save_to_file: Whether to save the template to a file
         """
         with self.lock:
-            # Create a new version entry
-            version_id = str(uuid.uuid4())
-            version_entry = {
-                "version_id": version_id,
-                "created_at": datetime.now().isoformat(),
-                "content": template_content,
-                "is_active": True,
-            }
-
-            # Initialize version history if needed
-            if name not in self.versions:
-                self.versions[name] = []
-
-            # Mark previous versions as inactive
-            for version in self.versions[name]:
-                version["is_active"] = False
-
-            # Add the new version
-            self.versions[name].append(version_entry)
+            version_id, template_content = self._add_version(name, template_content)
 
             # Update cache and metadata
             self.cache[name] = template_content
@@ -881,29 +838,85 @@ class TemplateManager:
                 "usage_count": 0,
                 "current_version": version_id,
             }
+            self._template_changed(name)
 
             # Save to file if requested
             if save_to_file:
                 self._save_template_to_file(name, template_content, version_id)
 
+    def _add_version(
+        self, name: str, content: str, **details: Any
+    ) -> Tuple[str, str]:
+        """
+        Record a new active version of a template
+
+        Args:
+            name: Template name
+            content: Template content
+            **details: Extra fields for the version entry
+
+        Returns:
+            The new version id and the stored copy of the content
+        """
+        content_hash, content = self.blob_store.add(content)
+        version_id = str(uuid.uuid4())
+        version_entry = {
+            "version_id": version_id,
+            "created_at": datetime.now().isoformat(),
+            "content_hash": content_hash,
+            "is_active": True,
+            **details,
+        }
+
+        # Initialize version history if needed
+        if name not in self.versions:
+            self.versions[name] = []
+
+        # Mark previous versions as inactive
+        for version in self.versions[name]:
+            version["is_active"] = False
+
+        # Add the new version
+        self.versions[name].append(version_entry)
+        self._prune_versions(name)
+        return version_id, content
+
+    def _prune_versions(self, name: str):
+        """Drop the oldest inactive versions beyond the retention limit"""
+        versions = self.versions[name]
+        excess = len(versions) - max(self.max_versions_per_template, 1)
+        if excess <= 0:
+            return
+
+        pruned = [v for v in versions if not v["is_active"]][:excess]
+        for version in pruned:
+            versions.remove(version)
+            self.blob_store.release(version["content_hash"])
+            (self.versions_dir / f"{name}_{version['version_id']}.json").unlink(
+                missing_ok=True
+            )
+
+    def _version_content(self, version: Dict[str, Any]) -> str:
+        """Get the content of a version entry"""
+        return self.blob_store.get(version["content_hash"])
+
     def _save_template_to_file(self, name: str, content: str, version_id: str):
         """Save a template to a file"""
         # Save the current version
         template_path = self.templates_dir / f"{name}.tmpl"
         template_path.write_text(content, encoding="utf-8")
 
+        # Versions refer to content blobs, written once per distinct content
+        content_hash = self.blob_store.content_hash(content)
+        self.blob_store.persist(content_hash)
+
         # Save version metadata
         version_meta = {
             "version_id": version_id,
             "created_at": datetime.now().isoformat(),
             "template_name": name,
+            "content_hash": content_hash,
         }
-
-        # Save to versions directory
-        version_path = self.versions_dir / f"{name}_{version_id}.tmpl"
-        version_path.write_text(content, encoding="utf-8")
-
-        # Save version metadata
         version_meta_path = self.versions_dir / f"{name}_{version_id}.json"
         with open(version_meta_path, "w", encoding="utf-8") as f:
             json.dump(version_meta, f, indent=2)
@@ -994,11 +1007,20 @@ class TemplateManager:
                 self.metadata[name]["last_used"] = datetime.now()
                 self.usage_stats[name] = self.usage_stats.get(name, 0) + 1
 
+        # Reuse an earlier rendering of the same version and parameters
+        cache_key = self._rendered_cache_key(name, template, params, context)
+        if cache_key is not None:
+            rendered = self.performance_optimizer.rendered_cache.get(cache_key)
+            if rendered is not None:
+                return rendered
+
         # Use the advanced parameter replacer
         try:
             result = self.parameter_replacer.replace_parameters(
                 template, params, context
             )
+            if cache_key is not None:
+                self.performance_optimizer.rendered_cache.put(cache_key, result)
             return result
         except ParameterValidationError as e:
             # Log the validation error but continue with basic replacement
@@ -1012,9 +1034,51 @@ class TemplateManager:
                 template = template.replace(placeholder, str(value))
 
             # Replace any remaining {param} with [param]
-            template = re.sub(r"{([^{}]+)}", r"[\1]", template)
+            template = UNRESOLVED_PLACEHOLDER_PATTERN.sub(r"[\1]", template)
             return template
 
+    def _rendered_cache_key(
+        self,
+        name: str,
+        template: str,
+        params: Dict[str, Any],
+        context: Optional[ReplacementContext],
+    ) -> Optional[RenderedPromptKey]:
+        """
+        Key under which a rendered prompt may be cached
+
+        Returns None when the output could differ between calls with the
+        same key: session contexts, time variables, fallback templates and
+        parameters without an exact canonical form are always rendered.
+        """
+        if self.performance_optimizer is None:
+            return None
+
+        rendered_cache = self.performance_optimizer.rendered_cache
+        version_id = self.metadata.get(name, {}).get("current_version")
+        if (
+            context is None
+            and version_id is not None
+            and self.cache.get(name) == template
+            and TIME_VARIABLES.isdisjoint(compile_template(template).parameters)
+        ):
+            params_key = params_cache_key(params, TIME_VARIABLES)
+            if params_key is not None:
+                return (name, version_id, params_key)
+
+        rendered_cache.record_bypass()
+        return None
+
+    def _template_changed(self, name: str):
+        """Drop cached copies and renderings of a template whose content changed"""
+        if self.performance_optimizer:
+            self.performance_optimizer.invalidate_template(name)
+
+    def _replacer_changed(self):
+        """Drop all rendered prompts after the parameter replacer is reconfigured"""
+        if self.performance_optimizer:
+            self.performance_optimizer.rendered_cache.clear()
+
     def _load_template_content(self, name: str) -> Optional[str]:
         """
         Load template content for performance optimizer
@@ -1069,40 +1133,10 @@ class TemplateManager:
 
             if should_create_version:
                 # Create a new version entry only if content has changed
-                version_id = str(uuid.uuid4())
-                version_entry = {
-                    "version_id": version_id,
-                    "created_at": datetime.now().isoformat(),
-                    "content": content,
-                    "is_active": True,
-                    "loaded_from_file": True,
-                    "file_modified_time": last_modified,
-                }
-
-                # Initialize version history if needed
-                if name not in self.versions:
-                    self.versions[name] = []
-
-                # Mark previous versions as inactive
-                for version in self.versions[name]:
-                    version["is_active"] = False
-
-                # Add the new version
-                self.versions[name].append(version_entry)
-
-                # Update cache and metadata
-                self.cache[name] = content
-                self.metadata[name] = {
-                    "added_at": datetime.now(),
-                    "size": len(content),
-                    "usage_count": self.metadata.get(name, {}).get("usage_count", 0),  # Preserve usage count
-                    "current_version": version_id,
-                    "loaded_from_file": True,
-                    "last_loaded_time": last_modified,
-                }
+                self._record_loaded_template(name, content, last_modified)
             else:
                 # Just update the cache without creating a new version
-                self.cache[name] = content
+                self.cache[name] = self.blob_store.intern(content)
                 # Ensure metadata exists for templates loaded without version creation
                 if name not in self.metadata:
                     # Find the current active version or create minimal metadata
@@ -1127,6 +1161,79 @@ class TemplateManager:
             print(f"Error loading template {name}: {e}")
             return False
 
+    def _record_loaded_template(
+        self, name: str, content: str, last_modified: float, **details: Any
+    ) -> str:
+        """Make content read from a template file the active version"""
+        version_id, content = self._add_version(
+            name,
+            content,
+            loaded_from_file=True,
+            file_modified_time=last_modified,
+            **details,
+        )
+
+        # Update cache and metadata
+        self.cache[name] = content
+        self._template_changed(name)
+        self.metadata[name] = {
+            "added_at": datetime.now(),
+            "size": len(content),
+            "usage_count": self.metadata.get(name, {}).get("usage_count", 0),  # Preserve usage count
+            "current_version": version_id,
+            "loaded_from_file": True,
+            "last_loaded_time": last_modified,
+        }
+        return content
+
+    def _load_template_bundle(self) -> int:
+        """
+        Load templates from a prebuilt bundle instead of their .tmpl files
+
+        Only templates whose file still exists are taken, and only if the
+        file's size and mtime match the bundle or its content hashes the
+        same; the rest are loaded from their files as usual.
+
+        Returns:
+            Number of templates loaded from the bundle
+        """
+        if not self.bundle_path.exists():
+            return 0
+
+        try:
+            bundled = load_template_bundle(self.bundle_path)
+        except TemplateBundleError as e:
+            logger.warning(f"Ignoring template bundle: {e}")
+            return 0
+
+        loaded = 0
+        with os.scandir(self.templates_dir) as entries:
+            for entry in entries:
+                name, suffix = os.path.splitext(entry.name)
+                template = bundled.get(name)
+                if suffix != ".tmpl" or template is None or name in self.cache:
+                    continue
+
+                stat = entry.stat()
+                if (stat.st_size, stat.st_mtime_ns) != (
+                    template.size,
+                    template.mtime_ns,
+                ) and not (
+                    stat.st_size == template.size
+                    and template.matches_file(Path(entry.path))
+                ):
+                    continue
+
+                content = self._record_loaded_template(
+                    name, template.content, stat.st_mtime, loaded_from_bundle=True
+                )
+                if template.compiled is not None:
+                    register_compiled_template(content, template.compiled)
+                loaded += 1
+
+        logger.info(f"Loaded {loaded} templates from {self.bundle_path}")
+        return loaded
+
     def list_templates(self) -> List[str]:
         """
         List all available templates
@@ -1258,47 +1365,59 @@ class TemplateManager:
             target_version["is_active"] = True
 
             # Update cache and metadata
-            self.cache[name] = target_version["content"]
+            content = self._version_content(target_version)
+            self.cache[name] = content
             self.metadata[name]["current_version"] = version_id
+            self._template_changed(name)
 
             # Save to file
-            self._save_template_to_file(name, target_version["content"], version_id)
+            self._save_template_to_file(name, content, version_id)
 
             return True
 
     def enable_hot_reload(self):
         """Enable hot reload for template files"""
-        if self.observer is not None:
+        if self._reload_subscription is not None:
             # Already enabled
             return
 
         # Make sure the templates directory exists
         self.templates_dir.mkdir(exist_ok=True)
 
-        # Create and start the observer
+        # Changed files arrive in batches once the directory is quiet
         self.hot_reload_enabled = True
-        self.observer = Observer()
-        event_handler = TemplateFileHandler(self)
-        self.observer.schedule(event_handler, str(self.templates_dir), recursive=False)
-
         try:
-            self.observer.start()
+            self._reload_subscription = self.reload_bus.subscribe(
+                self.templates_dir,
+                self._on_template_files_changed,
+                suffixes=(".tmpl",),
+            )
             print(f"Hot reload enabled for templates directory: {self.templates_dir}")
         except Exception as e:
             print(f"Error enabling hot reload: {e}")
-            self.observer = None
             self.hot_reload_enabled = False
             raise
 
     def disable_hot_reload(self):
         """Disable hot reload for template files"""
-        if self.observer is None:
+        if self._reload_subscription is None:
             return
 
         self.hot_reload_enabled = False
-        self.observer.stop()
-        self.observer.join()
-        self.observer = None
+        self.reload_bus.unsubscribe(self._reload_subscription)
+        self._reload_subscription = None
+
+    def _on_template_files_changed(self, changes: ChangeSet):
+        """Reload every template in a change set as one wave"""
+        names = sorted({path.stem for path in changes.modified})
+        if not names:
+            return
+
+        logger.info(f"Hot reloading {len(names)} templates: {', '.join(names)}")
+        # Held for the whole wave, so renders see either all old or all new
+        with self.lock:
+            for name in names:
+                self.reload_template(name)
 
     def is_hot_reload_enabled(self) -> bool:
         """Check if hot reload is enabled"""
@@ -1307,18 +1426,22 @@ class TemplateManager:
     def register_parameter_config(self, config: ParameterConfig):
         """Register a parameter configuration"""
         self.parameter_replacer.register_parameter_config(config)
+        self._replacer_changed()
 
     def register_formatter(self, name: str, formatter):
         """Register a custom formatter"""
         self.parameter_replacer.register_formatter(name, formatter)
+        self._replacer_changed()
 
     def register_validator(self, name: str, validator):
         """Register a custom validator"""
         self.parameter_replacer.register_validator(name, validator)
+        self._replacer_changed()
 
     def set_global_context(self, context: Dict[str, Any]):
         """Set global context variables"""
         self.parameter_replacer.set_global_context(context)
+        self._replacer_changed()
 
     def extract_template_parameters(self, name: str) -> List[str]:
         """Extract all parameter names from a template"""
@@ -1897,6 +2020,8 @@ class TemplateManager:
             "template_manager_stats": {
                 "total_templates": len(self.cache),
                 "templates_with_versions": len(self.versions),
+                "version_entries": sum(len(v) for v in self.versions.values()),
+                "template_storage": self.blob_store.get_stats(),
                 "hot_reload_enabled": self.hot_reload_enabled,
                 "usage_stats": dict(self.usage_stats),
             }
@@ -1952,6 +2077,7 @@ class TemplateManager:
         """Clear performance cache"""
         if self.performance_optimizer:
             self.performance_optimizer.cache.clear()
+            self.performance_optimizer.rendered_cache.clear()
             logger.info("Performance cache cleared")
         else:
             logger.warning("Performance optimizer not enabled")
@@ -1968,9 +2094,7 @@ class TemplateManager:
         """Shutdown the template manager and cleanup resources"""
         try:
             # Stop hot reload monitoring
-            if self.observer and self.observer.is_alive():
-                self.observer.stop()
-                self.observer.join(timeout=5.0)
+            self.disable_hot_reload()
 
             # Shutdown performance optimizer
             if self.performance_optimizer:
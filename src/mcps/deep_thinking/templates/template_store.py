@@ -0,0 +1,110 @@
+"""
+Content-Addressed Template Storage
+
+Keeps a single copy of every distinct template text:
+- TemplateBlobStore maps the SHA-256 hash of a template's content to one
+  shared string, so the live cache, the optimizer cache and the version
+  history all refer to the same object instead of holding copies
+- Blobs are reference counted by the versions that use them and dropped,
+  from memory and from disk, once no version refers to them, so storage
+  scales with the retained distinct contents rather than with reload count
+- Blob files on disk are named by hash and written once
+"""
+
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class TemplateBlobStore:
+    """Reference-counted, content-addressed store of template texts"""
+
+    def __init__(self, blobs_dir: Optional[Path] = None):
+        self.blobs_dir = blobs_dir
+        self.blobs: Dict[str, str] = {}
+        self.refcounts: Dict[str, int] = {}
+        self.lock = threading.RLock()
+
+    @staticmethod
+    def content_hash(content: str) -> str:
+        """Hash identifying a template content"""
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def add(self, content: str) -> Tuple[str, str]:
+        """
+        Take a reference to content, storing it if it is new
+
+        Returns:
+            The content hash and the stored copy of the content
+        """
+        digest = self.content_hash(content)
+        with self.lock:
+            stored = self.blobs.setdefault(digest, content)
+            self.refcounts[digest] = self.refcounts.get(digest, 0) + 1
+            return digest, stored
+
+    def intern(self, content: str) -> str:
+        """Return the stored copy of content if there is one, without a reference"""
+        with self.lock:
+            return self.blobs.get(self.content_hash(content), content)
+
+    def get(self, digest: str) -> Optional[str]:
+        """Get content by hash"""
+        return self.blobs.get(digest)
+
+    def release(self, digest: str) -> bool:
+        """
+        Drop a reference to a blob
+
+        Returns:
+            True if that was the last reference and the blob was dropped
+        """
+        with self.lock:
+            count = self.refcounts.get(digest, 0) - 1
+            if count > 0:
+                self.refcounts[digest] = count
+                return False
+
+            self.refcounts.pop(digest, None)
+            self.blobs.pop(digest, None)
+            if self.blobs_dir is not None:
+                try:
+                    self._blob_path(digest).unlink(missing_ok=True)
+                except OSError as e:
+                    logger.warning(f"Failed to delete template blob {digest}: {e}")
+            return True
+
+    def persist(self, digest: str) -> Optional[Path]:
+        """
+        Write a blob to disk unless it is there already
+
+        Returns:
+            Path of the blob file, or None if the store is memory-only
+        """
+        if self.blobs_dir is None:
+            return None
+
+        path = self._blob_path(digest)
+        content = self.blobs.get(digest)
+        if content is not None and not path.exists():
+            self.blobs_dir.mkdir(parents=True, exist_ok=True)
+            path.write_text(content, encoding="utf-8")
+        return path
+
+    def _blob_path(self, digest: str) -> Path:
+        return self.blobs_dir / f"{digest}.tmpl"
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get storage statistics"""
+        with self.lock:
+            return {
+                "distinct_contents": len(self.blobs),
+                "references": sum(self.refcounts.values()),
+                "memory_usage": sum(
+                    len(content.encode("utf-8")) for content in self.blobs.values()
+                ),
+            }
@@ -0,0 +1,76 @@
+"""
+Streaming Markdown export for thinking sessions
+
+Writes report sections straight to the output file instead of building the
+whole report in memory:
+- MarkdownReportWriter appends blocks of lines and keeps the line and word
+  counts that export results report
+- atomic_output writes to a temporary file next to the target and renames it
+  into place, so readers never see a partial report
+"""
+
+import logging
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Iterable, Iterator
+
+logger = logging.getLogger(__name__)
+
+
+class MarkdownReportWriter:
+    """
+    Incremental writer for Markdown reports
+
+    Blocks are joined with newlines, so the file matches "\\n".join() of all
+    lines written, without a trailing newline.
+    """
+
+    def __init__(self, stream: IO[str]):
+        self.stream = stream
+        self.lines = 0
+        self.words = 0
+
+    def write_lines(self, lines: Iterable[str]) -> None:
+        """Append lines to the report"""
+        for line in lines:
+            if self.lines:
+                self.stream.write("\n")
+            self.stream.write(line)
+            # A line may itself hold newlines (step content)
+            self.lines += line.count("\n") + 1
+            self.words += len(line.split())
+
+
+@contextmanager
+def atomic_output(file_path: Path, atomic: bool = True) -> Iterator[IO[str]]:
+    """
+    Open file_path for writing, replacing it only once writing succeeds
+
+    Args:
+        file_path: Final report path
+        atomic: False writes to file_path directly
+
+    Yields:
+        Text stream to write the report to
+    """
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    if not atomic:
+        with open(file_path, "w", encoding="utf-8") as f:
+            yield f
+        return
+
+    fd, temp_path = tempfile.mkstemp(
+        prefix=f".{file_path.name}.", suffix=".tmp", dir=file_path.parent
+    )
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            yield f
+        os.replace(temp_path, file_path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError as e:
+            logger.warning(f"Could not remove temporary export file {temp_path}: {e}")
+        raise
@@ -11,9 +11,10 @@ import json
 import logging
 import re
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 from ..config.exceptions import (
     MCPFormatValidationError,
@@ -31,7 +32,9 @@ from ..models.mcp_models import (
     StartThinkingInput,
 )
 from ..sessions.session_manager import SessionManager
+from ..sessions.step_result import ParsedStepResult, parse_step_result
 from ..templates.template_manager import TemplateManager
+from .markdown_export import MarkdownReportWriter, atomic_output
 from .mcp_error_handler import MCPErrorHandler
 
 logger = logging.getLogger(__name__)
@@ -58,8 +61,6 @@ class MCPTools:
         self.flow_manager = flow_manager
         self.config_manager = config_manager
         self.error_handler = MCPErrorHandler(session_manager, template_manager)
-        # Track active sessions to prevent state inconsistencies
-        self._active_sessions = {}
 
     def start_thinking(self, input_data: StartThinkingInput) -> MCPToolOutput:
         """
@@ -156,6 +157,10 @@ class MCPTools:
                     context={"step_result": input_data.step_result},
                 )
 
+            # Parse the step result once; the session manager, flow manager and
+            # format checks below all get this parse through parse_step_result
+            parse_step_result(input_data.step_result)
+
             # Extract quality score from step result if provided
             quality_score = None
             if (
@@ -207,9 +212,8 @@ class MCPTools:
                         f"INCREMENTED {session.current_step}: {current_iterations} -> {new_count}/{total_iterations}"
                     )
 
-                    # Update session state immediately in both caches
-                    self._active_sessions[session.session_id] = session
-                    self.session_manager._active_sessions[session.session_id] = session
+                    # Update session state immediately in the session cache
+                    self.session_manager.cache_session(session)
                 else:
                     logger.warning(
                         f"Cannot increment {session.current_step} beyond {total_iterations}"
@@ -957,6 +961,7 @@ class MCPTools:
 
     def _validate_step_format(self, step_name: str, step_result: str) -> Dict[str, Any]:
         """Validate the format of step results"""
+        step_result = parse_step_result(step_result)
         validation_result = {
             "valid": True,
             "issues": [],
@@ -978,24 +983,26 @@ class MCPTools:
 
         return validation_result
 
-    def _validate_decomposition_format(self, step_result: str) -> Dict[str, Any]:
+    def _validate_decomposition_format(
+        self, step_result: Union[str, ParsedStepResult]
+    ) -> Dict[str, Any]:
         """Validate decomposition step format"""
+        parsed = parse_step_result(step_result)
+        text = parsed.raw
         issues = []
 
         # Check for JSON format
-        if not (
-            step_result.strip().startswith("{") and step_result.strip().endswith("}")
-        ):
+        if not (parsed.stripped.startswith("{") and parsed.stripped.endswith("}")):
             issues.append("结果应为JSON格式")
 
         # Check for required fields
         required_fields = ["main_question", "sub_questions", "relationships"]
         for field in required_fields:
-            if field not in step_result:
+            if field not in text:
                 issues.append(f"缺少必需字段: {field}")
 
         # Check sub_questions structure
-        if "sub_questions" in step_result and "id" not in step_result:
+        if "sub_questions" in text and "id" not in text:
             issues.append("sub_questions应包含id字段")
 
         return {
@@ -1005,18 +1012,21 @@ class MCPTools:
             "format_requirements": "每个sub_question需包含id, question, priority, search_keywords等字段",
         }
 
-    def _validate_evidence_format(self, step_result: str) -> Dict[str, Any]:
+    def _validate_evidence_format(
+        self, step_result: Union[str, ParsedStepResult]
+    ) -> Dict[str, Any]:
         """Validate evidence collection format"""
+        parsed = parse_step_result(step_result)
         issues = []
 
         # Check for structured evidence
-        if "来源" not in step_result and "source" not in step_result.lower():
+        if "来源" not in parsed.raw and "source" not in parsed.lowered:
             issues.append("应包含证据来源信息")
 
-        if "可信度" not in step_result and "credibility" not in step_result.lower():
+        if "可信度" not in parsed.raw and "credibility" not in parsed.lowered:
             issues.append("应包含可信度评估")
 
-        if len(step_result) < 50:  # More lenient threshold for testing
+        if len(parsed) < 50:  # More lenient threshold for testing
             issues.append("证据收集结果过于简短")
 
         return {
@@ -1026,8 +1036,11 @@ class MCPTools:
             "format_requirements": "每个证据源应包含URL、标题、摘要、可信度评分",
         }
 
-    def _validate_debate_format(self, step_result: str) -> Dict[str, Any]:
+    def _validate_debate_format(
+        self, step_result: Union[str, ParsedStepResult]
+    ) -> Dict[str, Any]:
         """Validate debate step format"""
+        parsed = parse_step_result(step_result)
         issues = []
 
         # Check for multiple perspectives
@@ -1039,11 +1052,11 @@ class MCPTools:
             "opponent",
             "neutral",
         ]
-        if not any(indicator in step_result for indicator in perspective_indicators):
+        if not parsed.contains_any(perspective_indicators):
             issues.append("应包含多个不同角度的观点")
 
         # Check for argument structure
-        if "论据" not in step_result and "argument" not in step_result.lower():
+        if "论据" not in parsed.raw and "argument" not in parsed.lowered:
             issues.append("应包含具体的论据和推理")
 
         return {
@@ -1053,12 +1066,16 @@ class MCPTools:
             "format_requirements": "每个角度应包含核心观点、支持论据、质疑要点",
         }
 
-    def _validate_evaluation_format(self, step_result: str) -> Dict[str, Any]:
+    def _validate_evaluation_format(
+        self, step_result: Union[str, ParsedStepResult]
+    ) -> Dict[str, Any]:
         """Validate evaluation step format"""
+        parsed = parse_step_result(step_result)
+        text = parsed.raw
         issues = []
 
         # Check for scoring
-        if "评分" not in step_result and "score" not in step_result.lower():
+        if "评分" not in text and "score" not in parsed.lowered:
             issues.append("应包含具体的评分")
 
         # Check for Paul-Elder standards (if applicable)
@@ -1073,11 +1090,9 @@ class MCPTools:
             "公正性",
             "清晰性",
         ]
-        if any(standard in step_result for standard in paul_elder_standards[:3]):
+        if parsed.contains_any(paul_elder_standards[:3]):
             # If using Paul-Elder, check for comprehensive coverage
-            missing_standards = [
-                std for std in paul_elder_standards if std not in step_result
-            ]
+            missing_standards = [std for std in paul_elder_standards if std not in text]
             if len(missing_standards) > 6:  # Allow some flexibility
                 issues.append("Paul-Elder评估应覆盖更多标准")
 
@@ -1088,8 +1103,11 @@ class MCPTools:
             "format_requirements": "应包含各项标准的评分、理由和改进建议",
         }
 
-    def _validate_reflection_format(self, step_result: str) -> Dict[str, Any]:
+    def _validate_reflection_format(
+        self, step_result: Union[str, ParsedStepResult]
+    ) -> Dict[str, Any]:
         """Validate reflection step format"""
+        parsed = parse_step_result(step_result)
         issues = []
 
         # Check for reflection depth
@@ -1101,11 +1119,11 @@ class MCPTools:
             "reflection",
             "insight",
         ]
-        if not any(indicator in step_result for indicator in reflection_indicators):
+        if not parsed.contains_any(reflection_indicators):
             issues.append("应包含深度反思内容")
 
         # Check for metacognitive elements - more lenient for testing
-        if len(step_result) < 20:
+        if len(parsed) < 20:
             issues.append("反思内容应更加详细和深入")
 
         return {
@@ -1510,7 +1528,7 @@ class MCPTools:
     # Enhanced helper methods for complete_thinking tool
 
     def _calculate_comprehensive_quality_metrics(
-        self, session: SessionState
+        self, session: SessionState, step_count: Optional[int] = None
     ) -> Dict[str, Any]:
         """
         Calculate comprehensive quality metrics for the session
@@ -1521,15 +1539,22 @@ class MCPTools:
         - Step-by-step quality breakdown
         - Quality distribution
         - Improvement recommendations
+
+        Args:
+            session: Session to assess
+            step_count: Number of stored steps, if the caller already has it
         """
         quality_scores = session.quality_scores
         
         # Get actual step count from database for consistency with session summary
-        try:
-            steps = self.session_manager.db.get_session_steps(session.session_id)
-            actual_step_count = len(steps)
-        except Exception:
-            actual_step_count = session.step_number
+        if step_count is not None:
+            actual_step_count = step_count
+        else:
+            try:
+                steps = self.session_manager.db.get_session_steps(session.session_id)
+                actual_step_count = len(steps)
+            except Exception:
+                actual_step_count = session.step_number
 
         if not quality_scores:
             return {
@@ -1807,11 +1832,14 @@ class MCPTools:
         Format step content intelligently - parse JSON if possible, otherwise return as-is
         Converts raw data into human-readable analysis content
         """
+        # Parsed once per result text; fenced JSON blocks are unwrapped
+        parsed = parse_step_result(raw_content)
+        if not parsed.is_json:
+            # If it's not JSON, return the content as-is
+            return raw_content
+        data = parsed.data
+
         try:
-            # Try to parse as JSON first
-            import json
-            data = json.loads(raw_content)
-            
             # Format based on step type
             if step_name == "decompose_problem":
                 return self._format_decompose_content(data)
@@ -1826,9 +1854,8 @@ class MCPTools:
             else:
                 # Generic JSON formatting
                 return self._format_generic_json(data)
-                
-        except (json.JSONDecodeError, TypeError):
-            # If it's not JSON, return the content as-is
+
+        except TypeError:
             return raw_content
             
     def _format_decompose_content(self, data: dict) -> str:
@@ -2278,7 +2305,11 @@ class MCPTools:
             return f"{timestamp}_analysis.md"
 
     def export_session_to_markdown(
-        self, session_id: str, export_path: Optional[str] = None, custom_title: Optional[str] = None
+        self,
+        session_id: str,
+        export_path: Optional[str] = None,
+        custom_title: Optional[str] = None,
+        atomic: bool = True,
     ) -> Dict[str, Any]:
         """
         Export complete session analysis to Markdown file with intelligent directory management
@@ -2287,10 +2318,15 @@ class MCPTools:
         for offline reading and further LLM processing. Uses configurable export
         directory to avoid polluting git repositories.
 
+        The report is written section by section while step results are read,
+        so each result is loaded and decrypted once and the full report is
+        never held in memory.
+
         Args:
             session_id: The session to export
             export_path: Optional custom file path (defaults to auto-generated name in export directory)
             custom_title: Optional concise title from Host (overrides topic extraction)
+            atomic: Write to a temporary file and rename it into place
 
         Returns:
             Dict with export status and file information
@@ -2305,12 +2341,6 @@ class MCPTools:
                     "file_path": None,
                 }
 
-            # Get all detailed content
-            detailed_step_contents = self._extract_detailed_step_contents(session_id)
-            quality_metrics = self._calculate_comprehensive_quality_metrics(session)
-            session_summary = self._generate_detailed_session_summary(session)
-            thinking_trace = self.session_manager.get_full_trace(session_id)
-
             # Get export directory and validate
             if export_path:
                 # Custom path provided - use as-is
@@ -2340,26 +2370,15 @@ class MCPTools:
                 
                 logger.info(f"Auto-generated export path: {file_path}")
 
-            # Build comprehensive Markdown content
-            markdown_content = self._build_markdown_report(
-                session=session,
-                detailed_step_contents=detailed_step_contents,
-                quality_metrics=quality_metrics,
-                session_summary=session_summary,
-                thinking_trace=thinking_trace,
-            )
-
-            # Ensure parent directory exists (in case of custom path)
-            file_path.parent.mkdir(parents=True, exist_ok=True)
-            
-            # Write to file
-            with open(file_path, "w", encoding="utf-8") as f:
-                f.write(markdown_content)
+            # Stream the Markdown report to the file
+            with atomic_output(file_path, atomic) as stream:
+                writer = MarkdownReportWriter(stream)
+                self._write_markdown_report(writer, session)
 
             # Calculate file statistics
             file_size = file_path.stat().st_size
-            content_lines = markdown_content.count("\n") + 1
-            content_words = len(markdown_content.split())
+            content_lines = writer.lines
+            content_words = writer.words
 
             logger.info(f"Successfully exported session {session_id} to {file_path}")
             logger.info(
@@ -2385,21 +2404,98 @@ class MCPTools:
                 "session_id": session_id,
             }
 
-    def _build_markdown_report(
+    def export_sessions_to_markdown(
         self,
-        session: SessionState,
-        detailed_step_contents: Dict[str, Any],
-        quality_metrics: Dict[str, Any],
-        session_summary: Dict[str, Any],
-        thinking_trace: Dict[str, Any],
-    ) -> str:
+        session_ids: List[str],
+        export_dir: Optional[str] = None,
+        max_workers: int = 4,
+    ) -> Dict[str, Dict[str, Any]]:
         """
-        Build comprehensive Markdown report with complete content
+        Export many sessions to Markdown in parallel
+
+        Args:
+            session_ids: Sessions to export
+            export_dir: Directory for the reports (defaults to the configured
+                export directory, with generated filenames)
+            max_workers: Maximum concurrent exports
+
+        Returns:
+            Export result of each session, keyed by session ID
         """
-        lines = []
+        def export_one(session_id: str) -> Dict[str, Any]:
+            export_path = (
+                str(Path(export_dir) / f"{session_id}.md") if export_dir else None
+            )
+            return self.export_session_to_markdown(session_id, export_path)
+
+        unique_ids = list(dict.fromkeys(session_ids))
+        if not unique_ids:
+            return {}
+
+        with ThreadPoolExecutor(
+            max_workers=max(1, min(max_workers, len(unique_ids))),
+            thread_name_prefix="markdown-export",
+        ) as executor:
+            results = dict(zip(unique_ids, executor.map(export_one, unique_ids)))
+
+        exported = sum(1 for result in results.values() if result.get("success"))
+        logger.info(f"Exported {exported}/{len(unique_ids)} sessions to Markdown")
+        return results
+
+    def _select_report_results(
+        self, session_id: str
+    ) -> List[Tuple[str, List[int], str]]:
+        """
+        Choose the results shown for each step of a Markdown report
+
+        Reads result rows without their content. Steps are listed in the
+        order their first result appears.
+
+        Returns:
+            (step_name, candidate result ids - the first 'output' result,
+            then the first result - and timestamp of the step's first result)
+        """
+        db = self.session_manager.db
+        step_names = {
+            step["id"]: step.get("step_name", "unknown")
+            for step in db.iter_session_steps(session_id)
+        }
+
+        # step_name -> [first result id, first output id, first timestamp]
+        selected: Dict[str, List[Any]] = {}
+        for result in db.iter_step_results(session_id, include_content=False):
+            step_id = result.get("step_id")
+            step_name = step_names.get(step_id, f"step_{step_id}")
+            entry = selected.setdefault(
+                step_name, [result["id"], None, result.get("created_at", "")]
+            )
+            if entry[1] is None and result.get("result_type") == "output":
+                entry[1] = result["id"]
+
+        report_results = []
+        for step_name, (first_id, output_id, timestamp) in selected.items():
+            candidates = [first_id]
+            if output_id is not None and output_id != first_id:
+                candidates.insert(0, output_id)
+            report_results.append((step_name, candidates, timestamp))
+        return report_results
+
+    def _write_markdown_report(
+        self, writer: MarkdownReportWriter, session: SessionState
+    ) -> None:
+        """
+        Write comprehensive Markdown report with complete content
+        """
+        db = self.session_manager.db
+        selected = self._select_report_results(session.session_id)
+        step_count, _ = db.get_session_record_counts(session.session_id)
+        quality_metrics = self._calculate_comprehensive_quality_metrics(
+            session, step_count
+        )
+        session_duration = self._calculate_session_duration_minutes(session)
 
         # Header with metadata
-        lines.extend(
+        writer.write_lines(
             [
                 "# 深度思考会话完整报告",
                 "",
@@ -2413,7 +2509,7 @@ class MCPTools:
         )
 
         # Session metadata
-        lines.extend(
+        writer.write_lines(
             [
                 "## 📊 会话元数据",
                 "",
@@ -2421,8 +2517,8 @@ class MCPTools:
                 "|------|-----|",
                 f"| **主题** | {session.topic} |",
                 f"| **思考流程** | {session.flow_type} |",
-                f"| **会话时长** | {session_summary.get('session_duration', 0):.2f} 分钟 |",
-                f"| **执行步骤** | {session_summary.get('total_steps', 0)} 个 |",
+                f"| **会话时长** | {session_duration:.2f} 分钟 |",
+                f"| **执行步骤** | {step_count} 个 |",
                 f"| **平均质量得分** | {quality_metrics.get('average_quality', 0):.2f}/10 |",
                 f"| **质量趋势** | {quality_metrics.get('quality_trend', 'unknown')} |",
                 "",
@@ -2431,7 +2527,7 @@ class MCPTools:
 
         # Quality metrics details
         if quality_metrics.get("step_quality_breakdown"):
-            lines.extend(
+            writer.write_lines(
                 [
                     "### 📈 详细质量评分",
                     "",
@@ -2439,12 +2535,16 @@ class MCPTools:
                     "|------|----------|",
                 ]
             )
-            for step_name, score in quality_metrics["step_quality_breakdown"].items():
-                lines.append(f"| {step_name} | {score:.3f}/10 |")
-            lines.append("")
+            writer.write_lines(
+                f"| {step_name} | {score:.3f}/10 |"
+                for step_name, score in quality_metrics[
+                    "step_quality_breakdown"
+                ].items()
+            )
+            writer.write_lines([""])
 
         # Complete analysis content
-        lines.extend(
+        writer.write_lines(
             [
                 "## 🔍 完整分析过程",
                 "",
@@ -2453,56 +2553,49 @@ class MCPTools:
             ]
         )
 
-        # Add each step's complete content
-        for step_name, contents in detailed_step_contents.items():
-            if not contents:
-                continue
-
-            lines.extend([f"### 📋 {step_name}", ""])
+        # Add each step's complete content, loading one result at a time
+        for step_name, result_ids, timestamp in selected:
+            writer.write_lines([f"### 📋 {step_name}", ""])
 
-            # Add step metadata
-            main_content = ""
-            metadata = {}
-            for content_data in contents:
-                if content_data.get("result_type") == "output":
-                    main_content = content_data.get("content", "")
-                    metadata = content_data.get("metadata", {})
+            main_content, metadata = "", {}
+            for result_id in result_ids:
+                result = db.get_step_result(result_id) or {}
+                main_content = result.get("content", "")
+                metadata = result.get("metadata", {})
+                if main_content:
                     break
-
-            if not main_content and contents:
-                main_content = contents[0].get("content", "")
-                metadata = contents[0].get("metadata", {})
+            if not main_content:
+                continue
 
             # Add content statistics
-            if main_content:
-                char_count = len(main_content)
-                word_count = len(main_content.split())
-                lines.extend(
+            char_count = len(main_content)
+            word_count = len(main_content.split())
+            writer.write_lines(
+                [
+                    f"**内容统计**: {char_count:,} 字符, {word_count:,} 词",
+                    f"**时间戳**: {timestamp or 'Unknown'}",
+                    "",
+                ]
+            )
+
+            # Add metadata if available
+            if metadata:
+                writer.write_lines(
                     [
-                        f"**内容统计**: {char_count:,} 字符, {word_count:,} 词",
-                        f"**时间戳**: {contents[0].get('timestamp', 'Unknown')}",
+                        "**元数据**:",
+                        "```json",
+                        f"{json.dumps(metadata, ensure_ascii=False, indent=2)}",
+                        "```",
                         "",
                     ]
                 )
 
-                # Add metadata if available
-                if metadata:
-                    lines.extend(
-                        [
-                            "**元数据**:",
-                            "```json",
-                            f"{json.dumps(metadata, ensure_ascii=False, indent=2)}",
-                            "```",
-                            "",
-                        ]
-                    )
-
-                # Add the complete content
-                lines.extend(["**完整内容**:", "", main_content, "", "---", ""])
+            # Add the complete content
+            writer.write_lines(["**完整内容**:", "", main_content, "", "---", ""])
 
         # Session context
         if session.context:
-            lines.extend(
+            writer.write_lines(
                 [
                     "## 🏷️ 会话上下文",
                     "",
@@ -2514,7 +2607,7 @@ class MCPTools:
             )
 
         # Footer
-        lines.extend(
+        writer.write_lines(
             [
                 "---",
                 "",
@@ -2529,8 +2622,6 @@ class MCPTools:
             ]
         )
 
-        return "\n".join(lines)
-
     def _refresh_session_quality_data(self, session: SessionState) -> None:
         """
         Refresh session quality data from database to ensure completeness
@@ -2554,7 +2645,7 @@ class MCPTools:
                         )
 
             # Update the session cache
-            self.session_manager._active_sessions[session.session_id] = session
+            self.session_manager.cache_session(session)
 
         except Exception as e:
             logger.warning(f"Error refreshing session quality data: {e}")
@@ -0,0 +1,313 @@
+"""
+Tool Executor for Deep Thinking MCP Server
+
+Runs synchronous MCP tool handlers off the asyncio event loop:
+- Bounded worker pool so blocking SQLite/template work never stalls the loop
+- Per-session ordering: calls for the same session_id never interleave
+- Queue depth and per-tool latency metrics
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+EXECUTION_MODES = ("threaded", "inline")
+
+
+@dataclass
+class ToolLatencyStats:
+    """Latency statistics for a single tool"""
+
+    tool_name: str
+    call_count: int = 0
+    error_count: int = 0
+    total_queue_wait: float = 0.0
+    max_queue_wait: float = 0.0
+    total_execution_time: float = 0.0
+    max_execution_time: float = 0.0
+
+    @property
+    def average_queue_wait(self) -> float:
+        return self.total_queue_wait / self.call_count if self.call_count else 0.0
+
+    @property
+    def average_execution_time(self) -> float:
+        return self.total_execution_time / self.call_count if self.call_count else 0.0
+
+
+@dataclass
+class ToolExecutorStats:
+    """Tool executor statistics"""
+
+    total_calls: int = 0
+    completed_calls: int = 0
+    failed_calls: int = 0
+    queue_depth: int = 0
+    max_queue_depth: int = 0
+    in_flight: int = 0
+    max_in_flight: int = 0
+    tools: Dict[str, ToolLatencyStats] = field(default_factory=dict)
+
+
+class _SessionLock:
+    """Reference-counted lock serializing calls for one session"""
+
+    __slots__ = ("lock", "refcount")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.refcount = 0
+
+
+class ToolExecutor:
+    """
+    Executes blocking tool handlers on a bounded worker pool
+
+    Calls that share a session_id are serialized in arrival order
+    (asyncio.Lock wakes waiters FIFO); calls for different sessions run
+    concurrently up to max_workers. Calls without a session_id are only
+    bounded by the pool.
+    """
+
+    def __init__(self, max_workers: int = 4, execution_mode: str = "threaded"):
+        if execution_mode not in EXECUTION_MODES:
+            raise ValueError(
+                f"Invalid execution mode: {execution_mode}, "
+                f"expected one of {EXECUTION_MODES}"
+            )
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+
+        self.max_workers = max_workers
+        self.execution_mode = execution_mode
+        self.stats = ToolExecutorStats()
+        self.lock = threading.RLock()
+
+        self._executor: Optional[ThreadPoolExecutor] = None
+        if execution_mode == "threaded":
+            self._executor = ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix="mcp-tool"
+            )
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._session_locks: Dict[str, _SessionLock] = {}
+        self._shutdown = False
+
+    async def run(
+        self,
+        tool_name: str,
+        session_id: Optional[str],
+        func: Callable[..., Any],
+        *args: Any,
+    ) -> Any:
+        """
+        Run a tool handler and return its result
+
+        Args:
+            tool_name: Tool name used for metrics
+            session_id: Session to serialize on, or None
+            func: Blocking callable implementing the tool
+            *args: Positional arguments for func
+
+        Returns:
+            The handler's return value; exceptions raised by the handler
+            propagate to the caller
+        """
+        if self._shutdown:
+            raise RuntimeError("Tool executor has been shut down")
+
+        if self.execution_mode == "inline":
+            with self.lock:
+                self.stats.total_calls += 1
+            return self._timed_call(tool_name, 0.0, func, args)
+
+        enqueued_at = time.perf_counter()
+        self._enter_queue()
+        session_lock = self._acquire_session_lock(session_id)
+        slots = self._get_slots()
+        try:
+            if session_lock is not None:
+                await session_lock.lock.acquire()
+            try:
+                await slots.acquire()
+            except BaseException:
+                if session_lock is not None:
+                    session_lock.lock.release()
+                raise
+        except BaseException:
+            self._leave_queue()
+            self._release_session_lock(session_id, session_lock)
+            raise
+
+        queue_wait = time.perf_counter() - enqueued_at
+        self._leave_queue()
+
+        def release(_future=None):
+            slots.release()
+            if session_lock is not None:
+                session_lock.lock.release()
+            self._release_session_lock(session_id, session_lock)
+
+        loop = asyncio.get_running_loop()
+        try:
+            future = loop.run_in_executor(
+                self._executor, self._timed_call, tool_name, queue_wait, func, args
+            )
+        except BaseException:
+            release()
+            raise
+
+        # The worker cannot be interrupted, so the slot and the session lock
+        # stay held until it actually finishes, even if the caller is
+        # cancelled; otherwise the next call for the session could overlap it
+        future.add_done_callback(release)
+        return await asyncio.shield(future)
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        """Semaphore bounding calls handed to the pool, created lazily on the loop"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_workers)
+        return self._slots
+
+    def _acquire_session_lock(
+        self, session_id: Optional[str]
+    ) -> Optional[_SessionLock]:
+        if not session_id:
+            return None
+        entry = self._session_locks.get(session_id)
+        if entry is None:
+            entry = _SessionLock()
+            self._session_locks[session_id] = entry
+        entry.refcount += 1
+        return entry
+
+    def _release_session_lock(
+        self, session_id: Optional[str], entry: Optional[_SessionLock]
+    ):
+        if entry is None:
+            return
+        entry.refcount -= 1
+        if entry.refcount == 0 and self._session_locks.get(session_id) is entry:
+            del self._session_locks[session_id]
+
+    def _enter_queue(self):
+        with self.lock:
+            self.stats.total_calls += 1
+            self.stats.queue_depth += 1
+            self.stats.max_queue_depth = max(
+                self.stats.max_queue_depth, self.stats.queue_depth
+            )
+
+    def _leave_queue(self):
+        with self.lock:
+            self.stats.queue_depth -= 1
+
+    def _timed_call(
+        self, tool_name: str, queue_wait: float, func: Callable[..., Any], args: tuple
+    ) -> Any:
+        """Execute func and record latency; runs on a worker thread when threaded"""
+        with self.lock:
+            self.stats.in_flight += 1
+            self.stats.max_in_flight = max(
+                self.stats.max_in_flight, self.stats.in_flight
+            )
+
+        start = time.perf_counter()
+        failed = False
+        try:
+            return func(*args)
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self._record(tool_name, queue_wait, elapsed, failed)
+
+    def _record(self, tool_name: str, queue_wait: float, elapsed: float, failed: bool):
+        with self.lock:
+            self.stats.in_flight -= 1
+            if failed:
+                self.stats.failed_calls += 1
+            else:
+                self.stats.completed_calls += 1
+
+            tool_stats = self.stats.tools.get(tool_name)
+            if tool_stats is None:
+                tool_stats = ToolLatencyStats(tool_name=tool_name)
+                self.stats.tools[tool_name] = tool_stats
+
+            tool_stats.call_count += 1
+            if failed:
+                tool_stats.error_count += 1
+            tool_stats.total_queue_wait += queue_wait
+            tool_stats.max_queue_wait = max(tool_stats.max_queue_wait, queue_wait)
+            tool_stats.total_execution_time += elapsed
+            tool_stats.max_execution_time = max(tool_stats.max_execution_time, elapsed)
+
+        logger.debug(
+            f"Tool {tool_name} finished in {elapsed:.4f}s "
+            f"(queued {queue_wait:.4f}s, failed={failed})"
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get executor statistics"""
+        with self.lock:
+            tools: List[Dict[str, Any]] = [
+                {
+                    "tool_name": s.tool_name,
+                    "call_count": s.call_count,
+                    "error_count": s.error_count,
+                    "average_queue_wait": s.average_queue_wait,
+                    "max_queue_wait": s.max_queue_wait,
+                    "average_execution_time": s.average_execution_time,
+                    "max_execution_time": s.max_execution_time,
+                }
+                for s in self.stats.tools.values()
+            ]
+            return {
+                "execution_mode": self.execution_mode,
+                "max_workers": self.max_workers,
+                "total_calls": self.stats.total_calls,
+                "completed_calls": self.stats.completed_calls,
+                "failed_calls": self.stats.failed_calls,
+                "queue_depth": self.stats.queue_depth,
+                "max_queue_depth": self.stats.max_queue_depth,
+                "in_flight": self.stats.in_flight,
+                "max_in_flight": self.stats.max_in_flight,
+                "active_sessions": len(self._session_locks),
+                "tools": tools,
+            }
+
+    def log_stats(self, level: int = logging.INFO):
+        """Log a one-line summary of the executor statistics"""
+        stats = self.get_stats()
+        slowest = max(
+            stats["tools"], key=lambda t: t["max_execution_time"], default=None
+        )
+        logger.log(
+            level,
+            f"Tool executor: {stats['total_calls']} calls "
+            f"({stats['completed_calls']} completed, {stats['failed_calls']} failed), "
+            f"max queue depth {stats['max_queue_depth']}, "
+            f"max in flight {stats['max_in_flight']}/{stats['max_workers']}"
+            + (
+                f", slowest {slowest['tool_name']} "
+                f"{slowest['max_execution_time']:.3f}s"
+                if slowest
+                else ""
+            ),
+        )
+
+    def shutdown(self, wait: bool = True):
+        """Stop accepting calls, shut down the worker pool and log final stats"""
+        self._shutdown = True
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+        self.log_stats()
+        logger.info("Tool executor shut down")
@@ -0,0 +1,117 @@
+"""
+Tests for compiled flow definitions
+"""
+
+import pytest
+
+from src.mcps.deep_thinking.config.exceptions import FlowConfigurationError
+from src.mcps.deep_thinking.config.yaml_flow_parser import YAMLFlowParser
+from src.mcps.deep_thinking.flows.compiled_flow import compile_flow
+from src.mcps.deep_thinking.flows.flow_manager import FlowManager
+
+
+class TestCompiledFlow:
+    """Test flow compilation and step resolution"""
+
+    @pytest.fixture
+    def flow_manager(self):
+        """Create a flow manager for testing"""
+        return FlowManager()
+
+    def test_default_flows_compiled(self, flow_manager):
+        compiled = flow_manager.get_compiled_flow("comprehensive_analysis")
+
+        assert [step.step_id for step in compiled.steps] == [
+            "decompose",
+            "collect_evidence",
+            "evaluate",
+            "reflect",
+        ]
+        for name in ("decompose", "Problem Decomposition", "decompose_problem"):
+            assert compiled.find_step(name).step_id == "decompose"
+        assert compiled.find_step("unknown_step") is None
+
+        evidence = compiled.find_step("collect_evidence")
+        assert evidence.for_each_source == "decompose"
+        assert evidence.for_each_property == "sub_questions"
+        assert compiled.dependencies["collect_evidence"] == {"decompose"}
+        assert compiled.next_step(compiled.find_step("reflect")) is None
+
+    def test_next_step_returns_copies(self, flow_manager):
+        next_step = flow_manager.get_next_step(
+            "comprehensive_analysis", "critical_evaluation", "{}"
+        )
+        assert next_step == {
+            "step_name": "reflect",
+            "template_name": "reflection",
+            "instructions": "Execute Reflection step",
+        }
+
+        next_step["template_name"] = "reflection_complex"
+        again = flow_manager.get_next_step(
+            "comprehensive_analysis", "critical_evaluation", "{}"
+        )
+        assert again["template_name"] == "reflection"
+
+    def test_steps_ordered_by_dependencies(self):
+        compiled = compile_flow(
+            "reordered",
+            {
+                "name": "reordered",
+                "steps": [
+                    {"step_id": "evaluate", "dependencies": ["collect"]},
+                    {"step_id": "collect", "for_each": "decompose.sub_questions"},
+                    {"step_id": "decompose"},
+                ],
+            },
+        )
+
+        assert [step.step_id for step in compiled.steps] == [
+            "decompose",
+            "collect",
+            "evaluate",
+        ]
+        assert compiled.next_step(compiled.find_step("collect")).step_id == "evaluate"
+
+        with pytest.raises(FlowConfigurationError):
+            compile_flow(
+                "cyclic",
+                {
+                    "steps": [
+                        {"step_id": "a", "dependencies": ["b"]},
+                        {"step_id": "b", "dependencies": ["a"]},
+                    ]
+                },
+            )
+
+    def test_register_parsed_flow(self, flow_manager):
+        flows = YAMLFlowParser().parse_yaml(
+            {
+                "yaml_flow": {
+                    "description": "Flow from YAML",
+                    "steps": [
+                        {"agent": "decomposer", "name": "decompose"},
+                        {
+                            "agent": "evidence_seeker",
+                            "name": "Evidence Collection",
+                            "for_each": "decompose.sub_questions",
+                            "config": {"template_name": "evidence_collection"},
+                        },
+                    ],
+                }
+            }
+        )
+        flow_manager.register_flow(flows["yaml_flow"])
+
+        assert "yaml_flow" in flow_manager.list_flows()
+        assert flow_manager.get_total_steps("yaml_flow") == 2
+        assert flow_manager.get_next_step("yaml_flow", "decompose", "{}") == {
+            "step_name": "evidence_collection",
+            "template_name": "evidence_collection",
+            "instructions": "Execute Evidence Collection step",
+        }
+
+        flow_id = flow_manager.create_flow("session", "yaml_flow")
+        step = flow_manager.get_flow(flow_id).steps["evidence_collection"]
+        assert step.agent_type == "evidence_seeker"
+        assert step.for_each == "decompose.sub_questions"
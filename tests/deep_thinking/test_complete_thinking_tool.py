@@ -513,3 +513,103 @@ class TestCompleteThinkingTool:
         single_score = [8.0]
         consistency = mcp_tools._calculate_quality_consistency(single_score)
         assert consistency == 1.0  # Perfect consistency for single score
+
+
+class TestMarkdownExport:
+    """Test streaming Markdown export"""
+
+    @pytest.fixture
+    def session_manager(self):
+        manager = SessionManager(":memory:")
+        manager.create_session(
+            SessionState(
+                session_id="export-session",
+                topic="Export topic",
+                current_step="initialize",
+                flow_type="comprehensive_analysis",
+                context={"complexity": "moderate"},
+            )
+        )
+        db = manager.db
+        decompose = db.add_session_step(
+            "export-session", "decompose_problem", 1, "analysis"
+        )
+        evidence = db.add_session_step(
+            "export-session", "collect_evidence", 2, "research"
+        )
+        db.add_step_result("export-session", decompose, "input", "Decompose prompt")
+        db.add_step_result(
+            "export-session", decompose, "output", "Sub questions", {"format": "json"}
+        )
+        db.add_step_result("export-session", evidence, "analysis", "Evidence notes")
+        yield manager
+        manager.db.shutdown()
+
+    @pytest.fixture
+    def mcp_tools(self, session_manager):
+        return MCPTools(
+            session_manager=session_manager,
+            template_manager=Mock(spec=TemplateManager),
+            flow_manager=Mock(spec=FlowManager),
+        )
+
+    def test_report_content_and_stats(self, mcp_tools, tmp_path):
+        target = tmp_path / "report.md"
+
+        result = mcp_tools.export_session_to_markdown("export-session", str(target))
+
+        assert result["success"]
+        text = target.read_text(encoding="utf-8")
+        assert "### 📋 decompose_problem" in text
+        assert "Sub questions" in text
+        assert "Decompose prompt" not in text  # output results take precedence
+        assert "Evidence notes" in text
+        assert text.index("decompose_problem") < text.index("collect_evidence")
+        assert result["content_lines"] == text.count("\n") + 1
+        assert result["content_words"] == len(text.split())
+        # No temporary files are left next to the report
+        assert [p.name for p in tmp_path.iterdir()] == ["report.md"]
+
+    def test_results_are_read_once(
+        self, mcp_tools, session_manager, tmp_path, monkeypatch
+    ):
+        db = session_manager.db
+        for name in ("get_step_results", "get_session_steps"):
+            monkeypatch.setattr(db, name, lambda *_, **__: pytest.fail("full read"))
+        fetched = []
+        original = db.get_step_result
+        monkeypatch.setattr(
+            db, "get_step_result", lambda rid: fetched.append(rid) or original(rid)
+        )
+
+        result = mcp_tools.export_session_to_markdown(
+            "export-session", str(tmp_path / "report.md")
+        )
+
+        assert result["success"]
+        assert len(fetched) == len(set(fetched)) == 2
+
+    def test_failed_export_keeps_existing_file(self, mcp_tools, tmp_path, monkeypatch):
+        target = tmp_path / "report.md"
+        target.write_text("previous", encoding="utf-8")
+
+        def fail(*_):
+            raise RuntimeError("boom")
+
+        monkeypatch.setattr(mcp_tools, "_select_report_results", fail)
+
+        result = mcp_tools.export_session_to_markdown("export-session", str(target))
+
+        assert not result["success"]
+        assert target.read_text(encoding="utf-8") == "previous"
+        assert [p.name for p in tmp_path.iterdir()] == ["report.md"]
+
+    def test_bulk_export(self, mcp_tools, tmp_path):
+        results = mcp_tools.export_sessions_to_markdown(
+            ["export-session", "missing-session", "export-session"], str(tmp_path)
+        )
+
+        assert list(results) == ["export-session", "missing-session"]
+        assert results["export-session"]["success"]
+        assert not results["missing-session"]["success"]
+        assert (tmp_path / "export-session.md").exists()
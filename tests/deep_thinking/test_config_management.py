@@ -470,6 +470,45 @@ class TestHotReloadManager:
 
         await hot_reload_manager.cleanup()
 
+    @pytest.mark.asyncio
+    async def test_flow_file_changes_reloaded_together(
+        self, hot_reload_manager, temp_config_dir
+    ):
+        """Test that flow files changed together trigger one notification"""
+        flows_dir = temp_config_dir / "flows"
+        flows_dir.mkdir()
+        hot_reload_manager.reload_debounce = 0.2
+        await hot_reload_manager.initialize()
+
+        notifications = []
+        notified = asyncio.Event()
+
+        def on_reload(config_name, config_data):
+            notifications.append((config_name, sorted(config_data)))
+            notified.set()
+
+        hot_reload_manager.add_reload_callback(on_reload)
+
+        for i in range(5):
+            flow = {
+                f"flow_{i}": {
+                    "description": f"Flow {i}",
+                    "steps": [{"agent": "decomposer", "name": "Decompose"}],
+                }
+            }
+            with open(flows_dir / f"flow_{i}.yaml", "w") as f:
+                yaml.dump(flow, f)
+
+        await asyncio.wait_for(notified.wait(), timeout=5.0)
+        await asyncio.sleep(0.5)
+
+        assert len(notifications) == 1
+        config_name, flow_names = notifications[0]
+        assert config_name == "flows"
+        assert {f"flow_{i}" for i in range(5)} <= set(flow_names)
+
+        await hot_reload_manager.cleanup()
+
 
 class TestConfigManager:
     """Test configuration manager"""
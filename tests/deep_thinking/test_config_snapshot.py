@@ -0,0 +1,123 @@
+"""
+Unit tests for immutable configuration snapshots
+Tests read-only views, dotted path lookups and snapshot publishing
+"""
+
+import copy
+import pickle
+
+import pytest
+
+from src.mcps.deep_thinking.config.config_manager import ConfigManager
+from src.mcps.deep_thinking.config.config_snapshot import (
+    ConfigSnapshot,
+    FrozenDict,
+    FrozenList,
+    freeze,
+    thaw,
+)
+from src.mcps.deep_thinking.config.user_config_manager import UserConfigManager
+
+
+class TestConfigSnapshot:
+    """Test suite for ConfigSnapshot"""
+
+    def test_frozen_values_are_read_only(self):
+        frozen = freeze({"agents": {"methods": ["SCAMPER", "TRIZ"]}})
+
+        assert isinstance(frozen["agents"], FrozenDict)
+        assert isinstance(frozen["agents"]["methods"], FrozenList)
+        with pytest.raises(TypeError):
+            frozen["agents"]["quality_threshold"] = 0.9
+        with pytest.raises(TypeError):
+            frozen["agents"].update({"quality_threshold": 0.9})
+        with pytest.raises(TypeError):
+            frozen["agents"]["methods"].append("lateral_thinking")
+
+        for mutable in (
+            thaw(frozen),
+            copy.deepcopy(frozen),
+            pickle.loads(pickle.dumps(frozen)),
+        ):
+            assert type(mutable) is dict
+            assert type(mutable["agents"]["methods"]) is list
+            mutable["agents"]["methods"].append("lateral_thinking")
+        assert frozen == {"agents": {"methods": ["SCAMPER", "TRIZ"]}}
+
+    def test_dotted_paths(self):
+        snapshot = ConfigSnapshot(
+            {
+                "system": {"log_level": "INFO", "nested": {"deep_value": "test"}},
+                "flows": {"a.b": 1, 2: "numeric key"},
+            }
+        )
+
+        assert snapshot.get("system.log_level") == "INFO"
+        assert snapshot.get("system.nested.deep_value") == "test"
+        assert snapshot.get("system.nested") == {"deep_value": "test"}
+        assert snapshot.get("system.missing", "default") == "default"
+        # Keys a dotted path cannot spell are not reachable
+        assert snapshot.get("flows.a.b") is None
+        assert snapshot.get("flows.2") is None
+
+    def test_config_manager_publishes_snapshots(self, tmp_path):
+        manager = ConfigManager(tmp_path)
+        source = {"log_level": "INFO", "limits": {"agents": 10}}
+        manager.set_config("system", source)
+        first = manager.snapshot
+
+        # The snapshot does not share state with the caller's dict
+        source["log_level"] = "DEBUG"
+        assert manager.get_nested_config("system.log_level") == "INFO"
+        with pytest.raises(TypeError):
+            manager.get_config("system")["log_level"] = "DEBUG"
+
+        manager.update_config("system", {"limits": {"agents": 5}})
+
+        assert manager.snapshot is not first
+        assert manager.snapshot.version == first.version + 1
+        assert first.get("system.limits.agents") == 10
+        assert manager.get_nested_config("system.limits.agents") == 5
+        assert manager.get_nested_config("system.log_level") == "INFO"
+
+    @pytest.mark.asyncio
+    async def test_user_config_snapshots_follow_changes(self, tmp_path):
+        manager = UserConfigManager(
+            user_config_dir=tmp_path / "user",
+            global_config_dir=tmp_path / "global",
+        )
+        await manager.initialize()
+
+        config = manager.get_effective_config("agents", "research")
+        assert config["quality_threshold"] == 0.9
+        assert manager.get_effective_config("agents", "research") is config
+        assert (
+            manager.get_effective_value("system.max_concurrent_agents", profile="quick")
+            == 5
+        )
+        assert manager.get_effective_config("missing") == {}
+
+        manager.set_user_preference("agents.quality_threshold", 0.95, "research")
+
+        assert config["quality_threshold"] == 0.9
+        assert (
+            manager.get_effective_value("agents.quality_threshold", profile="research")
+            == 0.95
+        )
+
+    @pytest.mark.asyncio
+    async def test_overrides_return_mutable_copy(self, tmp_path):
+        manager = UserConfigManager(
+            user_config_dir=tmp_path / "user",
+            global_config_dir=tmp_path / "global",
+        )
+        await manager.initialize()
+
+        config = manager.get_effective_config(
+            "system", runtime_overrides={"system": {"debug_mode": True}}
+        )
+        config["log_level"] = "DEBUG"
+
+        assert config["debug_mode"] is True
+        assert manager.get_effective_value("system.debug_mode") is False
+        assert manager.get_effective_value("system.log_level") == "INFO"
@@ -727,5 +727,729 @@ class TestSessionManager:
         assert timestamps == sorted(timestamps)
 
 
+class TestIncrementalSessionPersistence:
+    """Test delta persistence of session context entries"""
+
+    @pytest.fixture(params=[False, True], ids=["plain", "encrypted"])
+    def manager(self, request):
+        """Create an in-memory session manager, optionally encrypted"""
+        from cryptography.fernet import Fernet
+
+        key = Fernet.generate_key() if request.param else None
+        manager = SessionManager(":memory:", key)
+        yield manager
+        manager.db.shutdown()
+
+    def _create(self, manager, session_id="delta-session", **context):
+        from src.mcps.deep_thinking.models.mcp_models import SessionState
+
+        session_state = SessionState(
+            session_id=session_id,
+            topic="Incremental persistence",
+            current_step="initialize",
+            flow_type="comprehensive_analysis",
+            context=context,
+        )
+        manager.create_session(session_state)
+        return session_state
+
+    def _entry_keys(self, manager):
+        with manager.db.get_connection() as conn:
+            cursor = conn.execute(
+                "SELECT namespace, entry_key, updated_at FROM session_context_entries "
+                "WHERE seq = 0"
+            )
+            return {(row[0], row[1]): row[2] for row in cursor.fetchall()}
+
+    def _append_rows(self, manager, key):
+        with manager.db.get_connection() as conn:
+            cursor = conn.execute(
+                "SELECT seq FROM session_context_entries WHERE entry_key = ? AND seq > 0",
+                (key,),
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def test_step_writes_only_changed_entries(self, manager):
+        """Unchanged context entries are not rewritten on later steps"""
+        session = self._create(manager, complexity="complex", large="x" * 5000)
+
+        manager.update_session_step("delta-session", "decompose", "result", 0.8)
+        first = self._entry_keys(manager)
+        assert ("context", "large") in first
+        assert ("quality_metrics", "decompose") in first
+
+        session.context["progress"] = 1
+        manager.update_session_step("delta-session", "collect_evidence", "r", 0.9)
+        second = self._entry_keys(manager)
+
+        assert second[("context", "large")] == first[("context", "large")]
+        assert ("context", "progress") in second
+        assert ("quality_metrics", "collect_evidence") in second
+
+    def test_entries_are_merged_on_read(self, manager):
+        """Stored entries overlay the context blob, including removals"""
+        session = self._create(manager, complexity="moderate", temporary=True)
+        manager.update_session_step("delta-session", "decompose", "result", 0.7)
+
+        del session.context["temporary"]
+        session.context["focus"] = "depth"
+        manager.update_session_step("delta-session", "evaluate", "result", 0.9)
+
+        stored = manager.db.get_session("delta-session")
+        assert stored["context"] == {"complexity": "moderate", "focus": "depth"}
+        assert stored["quality_metrics"] == {"decompose": 0.7, "evaluate": 0.9}
+        assert stored["current_step"] == "evaluate"
+        assert stored["step_number"] == 2
+
+    def test_complete_session_compacts_entries(self, manager):
+        """Completing a session folds its entries into the context blob"""
+        self._create(manager, complexity="simple")
+        manager.update_session_step("delta-session", "decompose", "result", 0.8)
+
+        assert manager.complete_session("delta-session", {"summary": "done"})
+
+        assert self._entry_keys(manager) == {}
+        stored = manager.db.get_session("delta-session")
+        assert stored["status"] == "completed"
+        assert stored["context"]["final_results"] == {"summary": "done"}
+        assert stored["context"]["complexity"] == "simple"
+        assert stored["quality_metrics"] == {"decompose": 0.8}
+
+    def test_full_update_supersedes_entries(self, manager):
+        """update_session(context=...) replaces incremental entries"""
+        self._create(manager, complexity="simple")
+        manager.update_session_step("delta-session", "decompose", "result")
+
+        manager.db.update_session("delta-session", context={"replaced": True})
+
+        assert manager.db.get_session("delta-session")["context"] == {"replaced": True}
+
+    def test_list_appends_are_stored_as_rows(self, manager):
+        """Appending to a list-valued entry writes only the new item"""
+        self._create(manager, complexity="simple")
+        manager.update_session_step("delta-session", "decompose", "result", 0.8)
+
+        manager.create_recovery_checkpoint("delta-session")
+        manager.update_session_step("delta-session", "evaluate", "result", 0.9)
+        assert ("context", "checkpoints") in self._entry_keys(manager)
+
+        manager.rollback_to_step("delta-session", "decompose")
+        manager.update_session_step("delta-session", "evaluate", "again", 0.9)
+        manager.rollback_to_step("delta-session", "decompose")
+        manager.update_session_step("delta-session", "evaluate", "again", 0.9)
+
+        assert len(self._append_rows(manager, "rollback_history")) == 1
+        stored = manager.db.get_session("delta-session")
+        assert len(stored["context"]["rollback_history"]) == 2
+        assert len(stored["context"]["checkpoints"]) == 1
+
+    def test_external_rewrite_falls_back_to_full_write(self, manager):
+        """A context rewritten by another writer is not silently lost"""
+        self._create(manager, complexity="complex")
+        manager.update_session_step("delta-session", "decompose", "result", 0.8)
+
+        manager.db.update_session("delta-session", context={"last_error": "e"})
+        manager.update_session_step("delta-session", "evaluate", "result", 0.9)
+
+        stored = manager.db.get_session("delta-session")
+        assert stored["context"]["complexity"] == "complex"
+        assert stored["quality_metrics"] == {"decompose": 0.8, "evaluate": 0.9}
+
+        # Deltas resume on top of the rewritten state
+        manager.get_session("delta-session").context["focus"] = "depth"
+        manager.update_session_step("delta-session", "reflect", "result")
+        assert ("context", "focus") in self._entry_keys(manager)
+
+    def test_reassigned_context_is_rewritten(self, manager):
+        """Replacing the context object falls back to a full write"""
+        session = self._create(manager, complexity="simple", stale=True)
+        manager.update_session_step("delta-session", "decompose", "result")
+
+        session.context = {"complexity": "moderate"}
+        manager.update_session_step("delta-session", "evaluate", "result")
+
+        stored = manager.db.get_session("delta-session")
+        assert stored["context"] == {"complexity": "moderate"}
+
+    def test_compact_context_entries(self, manager):
+        """Bulk compaction only touches sessions over the threshold"""
+        self._create(manager, "small", a=1)
+        self._create(manager, "large", a=1, b=2, c=3)
+        manager.update_session_step("small", "decompose", "result")
+        manager.update_session_step("large", "decompose", "result")
+
+        assert manager.db.compact_context_entries(min_entries=3) == 1
+
+        remaining = {key for key in self._entry_keys(manager)}
+        assert ("context", "a") in remaining
+        assert manager.db.get_session("large")["context"] == {"a": 1, "b": 2, "c": 3}
+
+    def test_cleanup_compacts_long_running_sessions(self, manager):
+        """Periodic cleanup folds sessions with many entries into their blobs"""
+        session = self._create(manager, complexity="simple")
+        for i in range(manager.db.COMPACTION_MIN_ENTRIES):
+            session.context[f"key_{i}"] = i
+        manager.update_session_step("delta-session", "decompose", "result")
+
+        manager.db.cleanup_old_sessions()
+
+        assert self._entry_keys(manager) == {}
+        stored = manager.db.get_session("delta-session")
+        assert stored["context"]["key_0"] == 0
+
+    def test_search_results_omit_context_blob(self):
+        """Listings never expose a blob that may lag behind its entries"""
+        # Encrypted topics are not searchable, so use a plain database
+        manager = SessionManager(":memory:")
+        try:
+            self._create(manager, complexity="simple")
+            manager.update_session_step("delta-session", "decompose", "result", 0.8)
+
+            results = manager.search_sessions("Incremental")
+
+            assert [r["id"] for r in results] == ["delta-session"]
+            assert "context" not in results[0]
+            assert "quality_metrics" not in results[0]
+        finally:
+            manager.db.shutdown()
+
+    def test_file_database_round_trip(self, tmp_path):
+        """Deltas and compaction work through the pooled file database"""
+        manager = SessionManager(str(tmp_path / "sessions.db"))
+        try:
+            session = self._create(manager, complexity="complex")
+            manager.update_session_step("delta-session", "decompose", "result", 0.8)
+            session.context["focus"] = "depth"
+            manager.create_recovery_checkpoint("delta-session")
+            manager.update_session_step("delta-session", "evaluate", "result", 0.9)
+
+            assert manager.db.compact_session_context("delta-session")
+            assert self._entry_keys(manager) == {}
+
+            stored = manager.db.get_session("delta-session")
+            assert stored["context"]["focus"] == "depth"
+            assert len(stored["context"]["checkpoints"]) == 1
+            assert stored["quality_metrics"] == {"decompose": 0.8, "evaluate": 0.9}
+        finally:
+            manager.db.shutdown()
+
+
+class TestWriteBatching:
+    """Test write-behind batching of commits"""
+
+    @pytest.fixture
+    def db(self, tmp_path):
+        """Create an unpooled file database with write-behind enabled"""
+        db = ThinkingDatabase(
+            str(tmp_path / "batch.db"),
+            enable_performance_optimization=False,
+            write_behind=True,
+        )
+        db.create_session("batch-session", "Batched writes")
+        yield db
+        db.shutdown()
+
+    def _read_step(self, db):
+        import sqlite3
+
+        conn = sqlite3.connect(str(db.db_path))
+        try:
+            return conn.execute(
+                "SELECT current_step FROM thinking_sessions WHERE id = ?",
+                ("batch-session",),
+            ).fetchone()[0]
+        finally:
+            conn.close()
+
+    def test_writes_commit_once_per_batch(self, db):
+        """Writes inside a batch become visible together at the end"""
+        with db.write_batch():
+            step_id = db.add_session_step("batch-session", "decompose", 1, "analysis")
+            db.add_step_result("batch-session", step_id, "output", "content")
+            db.update_session("batch-session", current_step="decompose")
+
+            # Readers on the same thread see the batch's own writes
+            assert db.get_session("batch-session")["current_step"] == "decompose"
+            # Other connections do not until the batch commits
+            assert self._read_step(db) == ""
+
+        assert self._read_step(db) == "decompose"
+        stats = db.get_write_batch_stats()
+        assert stats["commits_requested"] == 3
+        assert stats["commits_performed"] == 1
+        assert stats["commits_saved"] == 2
+
+    def test_inner_rollback_keeps_other_writes(self, db):
+        """A refused delta or failed block does not undo the rest of the batch"""
+        with db.write_batch():
+            db.update_session("batch-session", current_step="decompose")
+            assert not db.update_session_delta(
+                "batch-session", 99, context_changes={"key": '"value"'}
+            )
+            db.add_session_step("batch-session", "decompose", 1, "analysis")
+
+        assert self._read_step(db) == "decompose"
+        assert len(db.get_session_steps("batch-session")) == 1
+        assert not db.get_session("batch-session")["context"]
+
+    def test_error_after_commit_keeps_committed_work(self, db):
+        """Work committed before an exception is kept, as without batching"""
+        with pytest.raises(RuntimeError):
+            with db.write_batch():
+                db.update_session("batch-session", current_step="decompose")
+                raise RuntimeError("tool failed")
+
+        assert self._read_step(db) == "decompose"
+
+    def test_size_threshold_flushes_early(self, db):
+        """Reaching write_batch_size commits without waiting for the end"""
+        db.write_batch_size = 2
+
+        with db.write_batch():
+            db.update_session("batch-session", current_step="decompose")
+            db.update_session("batch-session", current_step="evaluate")
+            assert self._read_step(db) == "evaluate"
+            db.update_session("batch-session", current_step="reflect")
+
+        assert db.get_write_batch_stats()["threshold_flushes"] == 1
+        assert self._read_step(db) == "reflect"
+
+    def test_disabled_batching_commits_immediately(self, db):
+        """write_batch() is a no-op unless write_behind is enabled"""
+        db.write_behind = False
+
+        with db.write_batch():
+            db.update_session("batch-session", current_step="decompose")
+            assert self._read_step(db) == "decompose"
+
+        assert db.get_write_batch_stats()["batches"] == 0
+
+    def test_compaction_inside_batch(self, db):
+        """Compaction's own transaction joins the batch"""
+        with db.write_batch():
+            assert db.update_session_delta(
+                "batch-session",
+                db.get_context_version("batch-session"),
+                context_changes={"key": '"value"'},
+            )
+            assert db.compact_session_context("batch-session")
+
+        assert db.get_session("batch-session")["context"] == {"key": "value"}
+
+    def test_write_lock_taken_at_first_write(self, db):
+        """Reads in a batch leave other writers free until the batch writes"""
+        import sqlite3
+
+        other = sqlite3.connect(str(db.db_path), timeout=0.1)
+        try:
+            with db.write_batch():
+                assert db.get_session("batch-session")["topic"] == "Batched writes"
+                db.get_session_steps("batch-session")
+                other.execute("UPDATE thinking_sessions SET current_step = 'other'")
+                other.commit()
+
+                db.update_session("batch-session", current_step="decompose")
+                with pytest.raises(sqlite3.OperationalError, match="locked"):
+                    other.execute("UPDATE thinking_sessions SET step_number = 2")
+                other.rollback()
+        finally:
+            other.close()
+
+        assert self._read_step(db) == "decompose"
+        assert db.get_write_batch_stats()["commits_performed"] == 1
+
+    def test_invalid_durability(self):
+        with pytest.raises(ValueError):
+            ThinkingDatabase(":memory:", durability="paranoid")
+
+
+class TestStepLookup:
+    """Test indexed step resolution in add_step_result"""
+
+    @pytest.fixture
+    def manager(self):
+        from src.mcps.deep_thinking.models.mcp_models import SessionState
+
+        manager = SessionManager(":memory:")
+        manager.create_session(
+            SessionState(
+                session_id="lookup-session",
+                topic="Step lookup",
+                current_step="initialize",
+                flow_type="comprehensive_analysis",
+            )
+        )
+        yield manager
+        manager.db.shutdown()
+
+    def _results_by_step(self, manager):
+        results = manager.db.get_step_results("lookup-session")
+        return [(r["step_id"], r["content"]) for r in results]
+
+    def test_results_attach_to_latest_step(self, manager, monkeypatch):
+        manager.update_session_step("lookup-session", "collect_evidence")
+        manager.update_session_step("lookup-session", "collect_evidence")
+        latest = manager.db.get_session_steps("lookup-session")[-1]["id"]
+
+        # The lookup must not scan the session's steps
+        monkeypatch.setattr(
+            manager.db, "get_session_steps", lambda *_: pytest.fail("full scan")
+        )
+        assert manager.add_step_result("lookup-session", "collect_evidence", "e1")
+
+        assert self._results_by_step(manager) == [(latest, "e1")]
+
+    def test_missing_step_is_created_once(self, manager):
+        assert manager.add_step_result("lookup-session", "evaluate", "first")
+        manager._step_ids.clear()
+        assert manager.add_step_result("lookup-session", "evaluate", "second")
+
+        steps = manager.db.get_session_steps("lookup-session")
+        assert [s["step_name"] for s in steps] == ["evaluate"]
+        assert {step_id for step_id, _ in self._results_by_step(manager)} == {
+            steps[0]["id"]
+        }
+
+    def test_lookup_uses_index(self, manager):
+        with manager.db.get_connection() as conn:
+            plan = conn.execute(
+                """
+                EXPLAIN QUERY PLAN SELECT id FROM session_steps
+                WHERE session_id = ? AND step_name = ?
+                ORDER BY step_number DESC, id DESC LIMIT 1
+            """,
+                ("lookup-session", "evaluate"),
+            ).fetchall()
+
+        assert any("idx_steps_name" in row[3] for row in plan)
+
+
+class TestSessionSearch:
+    """Test full-text search over sessions"""
+
+    @pytest.fixture
+    def db(self):
+        db = ThinkingDatabase(":memory:")
+        db.create_session("s1", "Machine learning in healthcare")
+        db.create_session("s2", "城市交通拥堵的治理")
+        db.create_session("s3", "Remote work productivity")
+        step_id = db.add_session_step("s3", "collect_evidence", 1, "evidence")
+        db.add_step_result("s3", step_id, "output", "Surveys show fewer commute hours")
+        db.add_evidence_source("s1", step_id=None, summary="Diagnostic imaging study")
+        yield db
+        db.shutdown()
+
+    def _ids(self, result):
+        return [s["id"] for s in result["sessions"]]
+
+    def test_search_topics_results_and_evidence(self, db):
+        assert self._ids(db.search_sessions("healthcare")) == ["s1"]
+        assert self._ids(db.search_sessions("commute")) == ["s3"]
+        assert self._ids(db.search_sessions("imaging")) == ["s1"]
+        assert self._ids(db.search_sessions("交通")) == ["s2"]
+
+    def test_snippet_and_source(self, db):
+        session = db.search_sessions("commute hours")["sessions"][0]
+        assert session["matched_source"] == "step_result"
+        assert "[commute]" in session["snippet"]
+        assert "context" not in session
+
+    def test_source_filter_and_pagination(self, db):
+        assert db.search_sessions("commute", sources=["topic"])["total"] == 0
+        for i in range(5):
+            db.create_session(f"p{i}", f"Pagination topic {i}")
+        first = db.search_sessions("Pagination", limit=2)
+        second = db.search_sessions("Pagination", limit=2, offset=2)
+        assert first["total"] == 5
+        assert len(first["sessions"]) == 2
+        assert not set(self._ids(first)) & set(self._ids(second))
+
+    def test_index_follows_updates_and_deletes(self, db):
+        db.update_session("s1", topic="Climate adaptation")
+        assert db.search_sessions("healthcare", sources=["topic"])["total"] == 0
+        assert self._ids(db.search_sessions("climate")) == ["s1"]
+
+        db.delete_session("s3")
+        assert db.search_sessions("commute")["total"] == 0
+        with db.get_connection() as conn:
+            assert (
+                conn.execute(
+                    "SELECT COUNT(*) FROM search_documents WHERE session_id = 's3'"
+                ).fetchone()[0]
+                == 0
+            )
+
+    def test_existing_data_is_backfilled(self, tmp_path):
+        path = str(tmp_path / "legacy.db")
+        db = ThinkingDatabase(path, enable_search_index=False)
+        db.create_session("old", "Legacy session topic")
+        db.shutdown()
+
+        db = ThinkingDatabase(path)
+        try:
+            assert self._ids(db.search_sessions("legacy")) == ["old"]
+        finally:
+            db.shutdown()
+
+    def test_short_cjk_terms_use_bigram_index(self, db):
+        assert db.search_index._build_query("治理 堵") == (
+            None,
+            '"治理" "堵" *',
+            [],
+        )
+        assert self._ids(db.search_sessions("治理")) == ["s2"]
+        # First, middle and last characters of a run
+        for term in ("城", "堵", "理"):
+            assert self._ids(db.search_sessions(term)) == ["s2"]
+        assert db.search_sessions("理城")["total"] == 0
+
+        db.delete_session("s2")
+        assert db.search_sessions("交通")["total"] == 0
+        with db.get_connection() as conn:
+            count = conn.execute("SELECT COUNT(*) FROM search_bigrams").fetchone()[0]
+        assert count == 0
+
+    def test_short_latin_terms_fall_back_to_substring_scan(self, db):
+        db.create_session("s4", "AI adoption in go-to-market teams")
+        # No indexable term: every row is scanned
+        assert db.search_index._build_query("ai") == (None, None, ["ai"])
+        assert self._ids(db.search_sessions("ai")) == ["s4"]
+        # With a trigram term, only its matches are scanned
+        assert db.search_index._build_query("go adoption")[2] == ["go"]
+        assert self._ids(db.search_sessions("go adoption")) == ["s4"]
+
+    def test_index_without_bigrams_is_rebuilt(self, tmp_path):
+        path = str(tmp_path / "trigram-only.db")
+        db = ThinkingDatabase(path)
+        db.create_session("cn", "城市交通拥堵的治理")
+        with db.get_connection() as conn:
+            conn.execute("DROP TABLE search_bigrams")
+            conn.commit()
+        db.shutdown()
+
+        db = ThinkingDatabase(path)
+        try:
+            assert self._ids(db.search_sessions("交通")) == ["cn"]
+        finally:
+            db.shutdown()
+
+    def test_encrypted_search_is_blinded(self):
+        from cryptography.fernet import Fernet
+
+        key = Fernet.generate_key()
+        plain = ThinkingDatabase(":memory:", key)
+        assert plain.search_index is None
+        plain.shutdown()
+
+        db = ThinkingDatabase(":memory:", key, encrypted_search=True)
+        try:
+            db.create_session("e1", "Secret merger plans 收购计划")
+            result = db.search_sessions("merger")
+            assert self._ids(result) == ["e1"]
+            assert "merger" in result["sessions"][0]["snippet"]
+            assert self._ids(db.search_sessions("收购")) == ["e1"]
+            with db.get_connection() as conn:
+                rows = conn.execute("SELECT content FROM search_index").fetchall()
+            assert all("merger" not in row[0].lower() for row in rows)
+        finally:
+            db.shutdown()
+
+
+class TestStreamingHistory:
+    """Test keyset-paginated step/result streaming"""
+
+    @pytest.fixture
+    def manager(self):
+        from src.mcps.deep_thinking.models.mcp_models import SessionState
+
+        manager = SessionManager(":memory:")
+        manager.create_session(
+            SessionState(
+                session_id="stream-session",
+                topic="Streaming history",
+                current_step="initialize",
+                flow_type="comprehensive_analysis",
+            )
+        )
+        for number in range(1, 6):
+            step_id = manager.db.add_session_step(
+                "stream-session", f"step_{number}", number, "analysis"
+            )
+            for i in range(3):
+                manager.db.add_step_result(
+                    "stream-session", step_id, "output", f"result {number}.{i}"
+                )
+        yield manager
+        manager.db.shutdown()
+
+    def test_pages_cover_all_steps_once(self, manager):
+        names, cursor = [], None
+        while True:
+            steps, cursor = manager.db.get_session_steps_page(
+                "stream-session", cursor, limit=2
+            )
+            names.extend(step["step_name"] for step in steps)
+            if cursor is None:
+                break
+
+        assert names == [f"step_{n}" for n in range(1, 6)]
+
+    def test_iterators_match_full_reads(self, manager):
+        db = manager.db
+        assert list(db.iter_session_steps("stream-session", page_size=2)) == (
+            db.get_session_steps("stream-session")
+        )
+        assert list(db.iter_step_results("stream-session", page_size=4)) == (
+            db.get_step_results("stream-session")
+        )
+
+    def test_results_without_decryption(self):
+        from cryptography.fernet import Fernet
+
+        db = ThinkingDatabase(":memory:", Fernet.generate_key())
+        try:
+            db.create_session("enc", "Encrypted")
+            step_id = db.add_session_step("enc", "analysis", 1, "analysis")
+            db.add_step_result("enc", step_id, "output", "secret")
+
+            (result,) = db.iter_step_results("enc", decrypt_content=False)
+            assert result["content"] != "secret"
+            assert db.decrypt_result_content(result) == "secret"
+        finally:
+            db.shutdown()
+
+    def test_history_page(self, manager):
+        page = manager.get_session_history_page("stream-session", limit=3)
+        assert [s["step_name"] for s in page["steps"]] == [
+            "step_1",
+            "step_2",
+            "step_3",
+        ]
+        assert len(page["steps"][0]["results"]) == 3
+
+        page = manager.get_session_history_page(
+            "stream-session", page["next_cursor"], limit=3
+        )
+        assert [s["step_name"] for s in page["steps"]] == ["step_4", "step_5"]
+        assert page["next_cursor"] is None
+
+    def test_trace_and_timeline_stream(self, manager, monkeypatch):
+        # Neither may load a session's steps or results in one read
+        for name in ("get_session_steps", "get_step_results"):
+            monkeypatch.setattr(
+                manager.db, name, lambda *_, **__: pytest.fail("full read")
+            )
+
+        trace = manager.get_full_trace("stream-session")
+        assert [s["step_name"] for s in trace["steps"]] == [
+            f"step_{n}" for n in range(1, 6)
+        ]
+        assert trace["steps"][4]["results"][2]["content"] == "result 5.2"
+
+        timeline = manager.get_session_timeline("stream-session")
+        assert len(timeline) == 1 + 5 + 15
+        timestamps = [event["timestamp"] for event in timeline]
+        assert timestamps == sorted(timestamps)
+
+
+class TestSessionArchive:
+    """Test bulk archive export and import"""
+
+    def _populate(self, db, session_id):
+        db.create_session(session_id, f"Topic of {session_id}")
+        step_id = db.add_session_step(session_id, "analysis", 1, "analysis")
+        db.add_step_result(session_id, step_id, "output", f"Result of {session_id}")
+        db.add_evidence_source(session_id, step_id, summary="Evidence summary")
+        db.update_session_delta(
+            session_id,
+            db.get_context_version(session_id),
+            context_changes={"key": db.serialize_context_value("value")},
+        )
+        db.add_flow_history(
+            [
+                {
+                    "flow_id": f"flow-{session_id}",
+                    "seq": 0,
+                    "session_id": session_id,
+                    "timestamp": "2024-01-01T00:00:00",
+                    "from_state": "pending",
+                    "to_state": "running",
+                    "event": "start",
+                }
+            ]
+        )
+
+    @pytest.fixture
+    def source(self):
+        db = ThinkingDatabase(":memory:")
+        for i in range(3):
+            self._populate(db, f"archived-{i}")
+        yield db
+        db.shutdown()
+
+    def test_round_trip(self, source, tmp_path):
+        manifest = source.export_archive(str(tmp_path / "archive"), chunk_rows=2)
+        assert manifest["tables"]["thinking_sessions"]["rows"] == 3
+        assert len(manifest["tables"]["thinking_sessions"]["chunks"]) == 2
+
+        target = ThinkingDatabase(":memory:")
+        try:
+            result = target.import_archive(str(tmp_path / "archive"))
+            assert result["imported"]["step_results"] == 3
+            assert (
+                target.export_session_data("archived-1")["results"][0]["content"]
+                == "Result of archived-1"
+            )
+            assert target.get_session("archived-2")["context"] == {"key": "value"}
+            assert target.search_sessions("archived")["total"] == 3
+            entries, _ = target.get_flow_history_page("flow-archived-1")
+            assert [entry["to_state"] for entry in entries] == ["running"]
+        finally:
+            target.shutdown()
+
+    def test_import_into_populated_database(self, source, tmp_path):
+        source.export_archive(str(tmp_path / "archive"))
+        target = ThinkingDatabase(":memory:")
+        try:
+            self._populate(target, "local")
+            self._populate(target, "archived-0")
+
+            result = target.import_archive(str(tmp_path / "archive"))
+
+            assert result["skipped_sessions"] == ["archived-0"]
+            assert target.get_session("archived-0")["topic"] == "Topic of archived-0"
+            # Imported rows got fresh ids and still point at their own steps
+            for session_id in ("local", "archived-1", "archived-2"):
+                steps = target.get_session_steps(session_id)
+                results = target.get_step_results(session_id)
+                assert [r["step_id"] for r in results] == [steps[0]["id"]]
+            assert target.verify_data_integrity()["data_consistency"]
+        finally:
+            target.shutdown()
+
+    def test_rejects_other_key_and_corruption(self, source, tmp_path):
+        from cryptography.fernet import Fernet
+
+        archive = tmp_path / "archive"
+        source.export_archive(str(archive))
+
+        encrypted = ThinkingDatabase(":memory:", Fernet.generate_key())
+        try:
+            assert encrypted.import_archive(str(archive)) is None
+            assert encrypted.list_sessions() == []
+        finally:
+            encrypted.shutdown()
+
+        chunk = archive / "step_results-00000.jsonl.gz"
+        chunk.write_bytes(chunk.read_bytes()[:-4] + b"\0\0\0\0")
+        target = ThinkingDatabase(":memory:")
+        try:
+            assert target.import_archive(str(archive)) is None
+            # Nothing is kept from a failed import
+            assert target.list_sessions() == []
+        finally:
+            target.shutdown()
+
+
 if __name__ == "__main__":
     pytest.main([__file__])
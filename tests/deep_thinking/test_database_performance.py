@@ -16,6 +16,7 @@ from src.mcps.deep_thinking.data.database_performance import (
     DatabasePerformanceOptimizer,
     ConnectionPool,
     DatabaseConnection,
+    PoolTimeoutError,
     QueryOptimizer,
     IndexOptimizer,
     DatabasePerformanceMonitor,
@@ -186,6 +187,143 @@ class TestConnectionPool:
         finally:
             pool.close_all()
 
+    def test_thread_reuses_its_connection(self):
+        """Test that a thread gets back the connection it used last"""
+        pool = ConnectionPool(":memory:", min_connections=3, max_connections=3)
+
+        try:
+            with pool.get_connection() as conn:
+                first = conn.connection_id
+            for _ in range(5):
+                with pool.get_connection() as conn:
+                    assert conn.connection_id == first
+
+            assert pool.get_stats()["affinity_hits"] == 5
+
+        finally:
+            pool.close_all()
+
+    def test_waiters_served_in_order(self):
+        """Test that released connections go to waiting threads first come first served"""
+        pool = ConnectionPool(":memory:", min_connections=1, max_connections=1)
+        order = []
+
+        def waiter(name):
+            with pool.get_connection(timeout=5):
+                order.append(name)
+
+        try:
+            held = pool.acquire()
+            threads = []
+            for name in ("first", "second", "third"):
+                thread = threading.Thread(target=waiter, args=(name,))
+                thread.start()
+                threads.append(thread)
+                # Let each thread queue before starting the next
+                while pool.get_stats()["waiting_threads"] < len(threads):
+                    time.sleep(0.001)
+            pool.release(held)
+
+            for thread in threads:
+                thread.join()
+
+            assert order == ["first", "second", "third"]
+            stats = pool.get_stats()
+            assert stats["waits"] == 3
+            assert stats["total_connections"] == 1
+
+        finally:
+            pool.close_all()
+
+    def test_timeout_and_wait_stats(self):
+        """Test the timeout error and that wait stats count checkouts"""
+        pool = ConnectionPool(":memory:", min_connections=1, max_connections=1)
+
+        try:
+            for _ in range(4):
+                with pool.get_connection():
+                    pass
+            held = pool.acquire()
+            with pytest.raises(PoolTimeoutError):
+                pool.acquire(timeout=0.05)
+            pool.release(held)
+
+            stats = pool.get_stats()
+            assert stats["checkouts"] == 5
+            assert stats["timeouts"] == 1
+            assert stats["waiting_threads"] == 0
+            assert stats["active_connections"] == 0
+            assert sum(stats["wait_time_histogram"].values()) == 5
+            assert stats["average_wait_time"] < 0.05
+            assert stats["p50_wait_time"] <= stats["p99_wait_time"]
+
+        finally:
+            pool.close_all()
+
+    def test_dead_connection_replaced(self):
+        """Test that a dead idle connection is detected and replaced lazily"""
+        pool = ConnectionPool(
+            ":memory:", min_connections=1, max_connections=1, validate_after=0
+        )
+
+        try:
+            with pool.get_connection() as conn:
+                conn.connection.close()
+                dead_id = conn.connection_id
+
+            with pool.get_connection() as conn:
+                assert conn.connection_id != dead_id
+                assert conn.is_alive()
+
+            stats = pool.get_stats()
+            assert stats["connections_closed"] == 1
+            assert stats["total_connections"] == 1
+
+        finally:
+            pool.close_all()
+
+    def test_open_transaction_rolled_back_on_release(self):
+        """Test that uncommitted writes do not leak into the next checkout"""
+        pool = ConnectionPool(":memory:", min_connections=1, max_connections=1)
+
+        try:
+            with pool.get_connection() as conn:
+                conn.execute("CREATE TABLE test (id INTEGER)")
+                conn.commit()
+                conn.execute("INSERT INTO test (id) VALUES (1)")
+                assert conn.in_transaction
+
+            with pool.get_connection() as conn:
+                assert not conn.in_transaction
+                assert conn.execute("SELECT COUNT(*) FROM test").fetchone()[0] == 0
+
+        finally:
+            pool.close_all()
+
+    def test_reader_connections_are_query_only(self):
+        """Test that the optimizer's reader pool refuses writes"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            optimizer = DatabasePerformanceOptimizer(
+                str(Path(temp_dir) / "pool.db"), min_connections=1, max_connections=2
+            )
+
+            try:
+                with optimizer.get_connection() as conn:
+                    conn.execute("CREATE TABLE test (id INTEGER)")
+                    conn.execute("INSERT INTO test (id) VALUES (1)")
+                    conn.commit()
+
+                with optimizer.get_connection(readonly=True) as conn:
+                    assert conn.execute("SELECT id FROM test").fetchone()["id"] == 1
+                    with pytest.raises(Exception):
+                        conn.execute("INSERT INTO test (id) VALUES (2)")
+
+                metrics = optimizer.get_performance_metrics()
+                assert metrics["read_connection_pool"]["checkouts"] == 1
+
+            finally:
+                optimizer.shutdown()
+
 
 class TestQueryOptimizer:
     """Test query optimization and monitoring"""
@@ -0,0 +1,162 @@
+"""
+Tests for flow condition and reference expressions
+"""
+
+import pytest
+
+from src.mcps.deep_thinking.config.exceptions import (
+    ExpressionError,
+    FlowConfigurationError,
+)
+from src.mcps.deep_thinking.config.flow_expressions import (
+    compile_conditions,
+    compile_expression,
+    compile_reference,
+)
+from src.mcps.deep_thinking.config.yaml_flow_parser import YAMLFlowParser
+from src.mcps.deep_thinking.flows.compiled_flow import compile_flow
+
+
+@pytest.fixture
+def context():
+    """Step results to evaluate expressions against"""
+    return {
+        "critic": {
+            "overall_score": 0.85,
+            "scores": {"depth": 0.9, "clarity": 0.7},
+            "issues": ["bias", "vagueness"],
+        },
+        "decomposer": {"sub_questions": [{"id": "SQ1"}, {"id": "SQ2"}]},
+        "done": False,
+    }
+
+
+class TestFlowExpressions:
+    """Test expression parsing and evaluation"""
+
+    @pytest.mark.parametrize(
+        "source,expected",
+        [
+            ("critic.overall_score >= 0.8 and not done", True),
+            ("critic.overall_score < 0.5 or 'bias' in critic.issues", True),
+            ("'fallacy' not in critic.issues", True),
+            ("(critic.scores.depth + critic.scores.clarity) / 2 >= 0.8", True),
+            ("0.5 < critic.scores.clarity < 0.7", False),
+            ("len(decomposer.sub_questions) == 2", True),
+            ("decomposer.sub_questions[1].id == 'SQ2'", True),
+            ('decomposer.sub_questions.0.id == "SQ1"', True),
+            ("critic.issues[-1] == 'vagueness'", True),
+            ("done == FALSE", True),
+        ],
+    )
+    def test_evaluation(self, context, source, expected):
+        assert compile_expression(source).test(context) is expected
+
+    def test_missing_values_and_invalid_operands(self, context):
+        assert compile_expression("critic.missing > 1").test(context) is False
+        assert compile_expression("critic.missing != 1").test(context) is False
+        assert compile_expression("-critic.missing * 2 < 0").test(context) is False
+        assert compile_expression("unknown.value[0].id").evaluate(context) is None
+        # Incomparable operands make a condition false instead of raising
+        assert compile_expression("critic.issues > 1").test(context) is False
+
+    @pytest.mark.parametrize(
+        "source,position",
+        [
+            ("critic.overall_score >=", 23),
+            ("critic.overall_score ==== 1", 23),
+            ("eval('1')", 0),
+            ("critic.overall_score $ 1", 21),
+            ("(critic.overall_score", 21),
+            ("", 0),
+        ],
+    )
+    def test_syntax_errors(self, source, position):
+        with pytest.raises(ExpressionError) as error:
+            compile_expression(source)
+        assert error.value.position == position
+        assert error.value.expression == source
+
+    @pytest.mark.parametrize(
+        "source,expected",
+        [
+            ("critic.status == completed", True),
+            ("critic.status != completed", False),
+            ("mode == fast", True),
+            ("mode != fast and critic.status == completed", False),
+            ("(mode == slow) or critic.status == completed", True),
+            ("mode == FAST", False),
+            ("critic.status == critic.status", True),
+            ("mode in modes", True),
+        ],
+    )
+    def test_bare_words_on_the_right_are_literals(self, context, source, expected):
+        context = {
+            **context,
+            "critic": {**context["critic"], "status": "completed"},
+            "mode": "fast",
+            "modes": ["fast", "slow"],
+        }
+        assert compile_expression(source).test(context) is expected
+
+    def test_bare_word_literal_is_not_a_reference(self, context):
+        expression = compile_expression("critic.status != completed")
+        assert expression.references == frozenset({"critic"})
+        # A missing left side still makes the comparison false, not "!="
+        assert expression.test(context) is False
+        assert compile_expression("done == false").test(context) is True
+
+    def test_compiled_once(self, context):
+        assert compile_expression("critic.overall_score > 0.8") is compile_expression(
+            "critic.overall_score > 0.8"
+        )
+
+        condition = compile_conditions(
+            {"critic.overall_score": ">=0.8", "critic.issues.0": "bias"}
+        )
+        assert condition.references == {"critic"}
+        assert condition.test(context) is True
+        assert compile_conditions({}) is None
+
+        assert compile_reference("critic.scores.depth")(context) == 0.9
+        assert (
+            compile_reference("Review critic.issues.1 and critic.nothing")(context)
+            == "Review vagueness and critic.nothing"
+        )
+
+    def test_invalid_conditions_rejected_at_load(self):
+        with pytest.raises(FlowConfigurationError, match="invalid condition"):
+            YAMLFlowParser().parse_yaml(
+                {
+                    "gated_flow": {
+                        "steps": [
+                            {"agent": "critic", "name": "evaluate"},
+                            {
+                                "agent": "reflector",
+                                "name": "reflect",
+                                "repeat_until": "evaluate.overall_score >=",
+                            },
+                        ]
+                    }
+                }
+            )
+
+        compiled = compile_flow(
+            "gated",
+            {
+                "steps": [
+                    {"step_id": "evaluate", "repeat_until": "overall_score >= 0.8"},
+                    {
+                        "step_id": "innovate",
+                        "conditions": {"evaluate.overall_score": "< 0.6"},
+                    },
+                ]
+            },
+        )
+        evaluate = compiled.find_step("evaluate")
+        innovate = compiled.find_step("innovate")
+        assert innovate.dependencies == {"evaluate"}
+        assert evaluate.should_repeat({"overall_score": 0.7}) is True
+        assert evaluate.should_repeat({"overall_score": 0.9}) is False
+        assert innovate.should_run({"evaluate": {"overall_score": 0.5}}) is True
+        assert innovate.should_run({"evaluate": {"overall_score": 0.7}}) is False
@@ -0,0 +1,143 @@
+"""
+Tests for the persisted, bounded flow state history
+"""
+
+from datetime import datetime, timedelta
+
+from src.mcps.deep_thinking.data.database import ThinkingDatabase
+from src.mcps.deep_thinking.flows.flow_history import FlowStateHistory
+
+STATES = ["pending", "running", "paused"]
+
+
+def record_many(history, count, flow_id="flow", session_id="session"):
+    for i in range(count):
+        history.record(
+            flow_id,
+            session_id,
+            STATES[i % 3],
+            STATES[(i + 1) % 3],
+            "start",
+            {"i": i},
+        )
+
+
+class TestFlowHistoryBuffer:
+    """Test the in-memory ring"""
+
+    def test_ring_keeps_most_recent(self):
+        history = FlowStateHistory(capacity=5)
+        record_many(history, 12)
+
+        entries = list(history.iter_entries("flow", 2))
+        assert [entry["metadata"]["i"] for entry in entries] == [7, 8, 9, 10, 11]
+        assert entries[-1]["transition_id"] == "flow_11"
+        assert [e["metadata"]["i"] for e in history.tail("flow", 2)] == [10, 11]
+
+        summary = history.summary("flow")
+        assert summary["total_transitions"] == 12
+        assert summary["state_counts"] == {"running": 4, "paused": 4, "pending": 4}
+        assert summary["last_transition"]["to_state"] == "pending"
+
+    def test_durations_from_state_entry(self):
+        history = FlowStateHistory()
+        now = datetime.now()
+        history.restore(
+            "flow",
+            "session",
+            [
+                {
+                    "timestamp": (now + timedelta(seconds=s)).isoformat(),
+                    "from_state": a,
+                    "to_state": b,
+                    "event": "start",
+                }
+                for s, a, b in [
+                    (0, "pending", "running"),
+                    (5, "running", "paused"),
+                    (7, "paused", "running"),
+                    (10, "running", "running"),
+                    (19, "running", "completed"),
+                ]
+            ],
+        )
+        durations = [
+            entry.get("duration_seconds") for entry in history.iter_entries("flow")
+        ]
+        assert durations[0] is None and durations[3] is None
+        assert [round(d, 3) for d in durations[1:3]] == [5.0, 2.0]
+        # Time since the state was last entered, self-transitions included
+        assert round(durations[4], 3) == 9.0
+
+    def test_more_than_256_state_names(self):
+        history = FlowStateHistory(capacity=300)
+        for i in range(300):
+            history.record("flow", "session", f"s{i}", f"s{i + 1}", f"e{i}")
+
+        entries = list(history.iter_entries("flow"))
+        assert entries[0]["from_state"] == "s0"
+        assert entries[-1]["to_state"] == "s300"
+        assert entries[-1]["event"] == "e299"
+
+    def test_eviction_without_database_prefers_finished_flows(self, caplog):
+        history = FlowStateHistory(max_flows=2)
+        record_many(history, 2, flow_id="done")
+        record_many(history, 2, flow_id="active")
+        history.finish("done")
+        record_many(history, 2, flow_id="new")
+        assert "done" not in history
+        assert "active" in history
+        assert not caplog.records
+
+        record_many(history, 2, flow_id="newer")
+        assert "active" not in history
+        assert "dropping the state history of flow active" in caplog.text
+
+
+class TestFlowHistoryPersistence:
+    """Test batched writes and paging from the database"""
+
+    def test_batches_pages_and_restart(self, tmp_path):
+        db = ThinkingDatabase(str(tmp_path / "sessions.db"))
+        db.create_session("session", "Topic")
+        history = FlowStateHistory(db, capacity=8, flush_batch=4)
+        record_many(history, 10)
+        # Two full batches written, the rest still buffered
+        assert db.get_flow_history_marks("flow")["next_seq"] == 8
+
+        entries, cursor = history.page("flow", limit=6)
+        assert [entry["metadata"]["i"] for entry in entries] == list(range(6))
+        entries, cursor = history.page("flow", after=cursor, limit=6)
+        assert [entry["metadata"]["i"] for entry in entries] == [6, 7, 8, 9]
+        assert cursor is None
+
+        # A new instance continues the stored sequence and counts
+        history.finish("flow")
+        assert "flow" not in history
+        restarted = FlowStateHistory(db, capacity=8, flush_batch=4)
+        record_many(restarted, 1)
+        restarted.flush()
+        summary = restarted.summary("flow")
+        assert summary["total_transitions"] == 11
+        assert summary["last_transition"]["transition_id"] == "flow_10"
+        assert len(list(restarted.iter_entries("flow", page_size=3))) == 11
+
+        assert db.delete_session("session")
+        assert db.get_flow_history_page("flow") == ([], None)
+
+    def test_legacy_history_moved_to_table(self, tmp_path):
+        db = ThinkingDatabase(str(tmp_path / "sessions.db"))
+        legacy = FlowStateHistory()
+        record_many(legacy, 3)
+        entries = list(legacy.iter_entries("flow"))
+
+        history = FlowStateHistory(db)
+        assert history.restore("flow", "session", entries) == 3
+        assert history.flush() == 3
+        assert [entry["metadata"] for entry in history.iter_entries("flow")] == [
+            {"i": 0},
+            {"i": 1},
+            {"i": 2},
+        ]
+        # Already stored: a second restore is ignored
+        assert FlowStateHistory(db).restore("flow", "session", entries) == 0
@@ -0,0 +1,272 @@
+"""
+Tests for batch encryption and online key rotation
+"""
+
+import base64
+import json
+
+import pytest
+from click.testing import CliRunner
+from cryptography.fernet import Fernet, InvalidToken
+
+from src.mcps.deep_thinking.cli import main
+from src.mcps.deep_thinking.data.database import (
+    DatabaseEncryption,
+    DatabaseInUseError,
+    ThinkingDatabase,
+)
+from src.mcps.deep_thinking.data.privacy_manager import PrivacyManager
+
+
+def populate(db, sessions=3):
+    """Write sessions with data in every encrypted column"""
+    for i in range(sessions):
+        session_id = f"session-{i}"
+        db.create_session(session_id, f"Topic {i}", configuration={"n": i})
+        db.update_session(session_id, context={"stage": i}, quality_metrics={"q": i})
+        assert db.update_session_delta(
+            session_id,
+            db.get_context_version(session_id),
+            context_changes={"note": db.serialize_context_value(f"note {i}")},
+        )
+        step_id = db.add_session_step(
+            session_id,
+            "analyze",
+            1,
+            "analysis",
+            input_data={"prompt": i},
+            output_data={"answer": i},
+        )
+        db.add_step_result(session_id, step_id, "analysis", f"result {i}")
+        db.add_evidence_source(
+            session_id, step_id, summary=f"summary {i}", key_claims=[f"claim {i}"]
+        )
+
+
+def read_all(db, sessions=3):
+    """Everything written by populate, decrypted"""
+    data = []
+    for i in range(sessions):
+        session_id = f"session-{i}"
+        session = db.get_session(session_id)
+        step = db.get_session_steps(session_id)[0]
+        data.append(
+            (
+                session["topic"],
+                session["configuration"],
+                session["context"],
+                session["quality_metrics"],
+                step["input_data"],
+                step["output_data"],
+                db.get_step_results(session_id)[0]["content"],
+            )
+        )
+    return data
+
+
+class TestBatchEncryption:
+    """Test the batch and binary encryption APIs"""
+
+    @pytest.mark.parametrize("parallel", [False, True])
+    def test_many_round_trip(self, monkeypatch, parallel):
+        if parallel:
+            monkeypatch.setattr(DatabaseEncryption, "MAX_WORKERS", 3)
+            monkeypatch.setattr(DatabaseEncryption, "PARALLEL_MIN_BYTES", 0)
+        encryption = DatabaseEncryption()
+        values = [f"value {i}" for i in range(25)] + ["", "x" * 5000]
+
+        encrypted = encryption.encrypt_many(values)
+        assert encrypted[25] == ""
+        assert [encryption.decrypt(value) for value in encrypted] == values
+        assert encryption.decrypt_many(encrypted) == values
+
+        blobs = [value.encode() for value in values]
+        encrypted_blobs = encryption.encrypt_bytes_many(blobs)
+        assert encryption.decrypt_bytes_many(encrypted_blobs) == blobs
+
+    def test_binary_tokens(self):
+        key = Fernet.generate_key()
+        encryption = DatabaseEncryption(key)
+
+        token = encryption.encrypt_bytes(b"\x00binary\xff")
+        assert encryption.decrypt_bytes(token) == b"\x00binary\xff"
+        # The binary form of a standard Fernet token, without the base64 text
+        assert Fernet(key).decrypt(base64.urlsafe_b64encode(token)) == b"\x00binary\xff"
+        assert len(token) < len(encryption.encrypt("\x00binary\xff"))
+
+        rotating = DatabaseEncryption(Fernet.generate_key(), previous_keys=[key])
+        assert rotating.decrypt_bytes(token) == b"\x00binary\xff"
+        with pytest.raises(InvalidToken):
+            encryption.decrypt_bytes(rotating.encrypt_bytes(b"new"))
+        with pytest.raises(InvalidToken):
+            encryption.decrypt_bytes(token[:-1] + bytes([token[-1] ^ 1]))
+
+    def test_previous_keys_stay_readable(self):
+        old = DatabaseEncryption()
+        token = old.encrypt("secret")
+        rotating = DatabaseEncryption(Fernet.generate_key(), previous_keys=[old.key])
+
+        assert rotating.decrypt(token) == "secret"
+        rotated = rotating.rotate(token)
+        assert DatabaseEncryption(rotating.key).decrypt(rotated) == "secret"
+        with pytest.raises(InvalidToken):
+            old.decrypt(rotated)
+
+
+class TestKeyRotation:
+    """Test re-encrypting a database under a new key"""
+
+    def test_rotate_in_chunks(self, tmp_path):
+        db_path = str(tmp_path / "sessions.db")
+        old_key, new_key = Fernet.generate_key(), Fernet.generate_key()
+        db = ThinkingDatabase(db_path, old_key)
+        populate(db)
+        expected = read_all(db)
+
+        report = db.rotate_encryption_key(new_key, batch_size=2, batch_pause=0)
+
+        # The rotating instance keeps serving
+        assert read_all(db) == expected
+        tables = report["tables"]
+        assert tables["thinking_sessions"]["rows_scanned"] == 3
+        assert tables["session_context_entries"]["values_rotated"] == 3
+        assert tables["evidence_sources"]["values_rotated"] == 6
+        assert report["values_skipped"] == 0
+        db.shutdown()
+
+        assert read_all(ThinkingDatabase(db_path, new_key)) == expected
+        with pytest.raises(InvalidToken):
+            read_all(ThinkingDatabase(db_path, old_key))
+
+    def test_rotation_command(self, tmp_path):
+        manager = PrivacyManager(str(tmp_path))
+        db = manager.create_encrypted_database()
+        populate(db, sessions=1)
+        expected = read_all(db, sessions=1)
+        db.shutdown()
+        old_key = (tmp_path / "sessions.db.key").read_bytes()
+
+        result = CliRunner().invoke(
+            main, ["rotate-key", "--data-dir", str(tmp_path), "--batch-size", "1"]
+        )
+        assert result.exit_code == 0, result.output
+
+        new_key = (tmp_path / "sessions.db.key").read_bytes()
+        assert new_key != old_key
+        assert not (tmp_path / "sessions.db.key.next").exists()
+        reopened = manager.create_encrypted_database()
+        assert read_all(reopened, sessions=1) == expected
+        reopened.shutdown()
+
+    def test_rotation_command_refused_while_database_open(self, tmp_path):
+        manager = PrivacyManager(str(tmp_path))
+        server_db = manager.create_encrypted_database()
+        populate(server_db, sessions=1)
+        old_key = (tmp_path / "sessions.db.key").read_bytes()
+
+        result = CliRunner().invoke(main, ["rotate-key", "--data-dir", str(tmp_path)])
+        assert result.exit_code == 1
+        assert "open in another process" in result.output
+        assert (tmp_path / "sessions.db.key").read_bytes() == old_key
+        assert not (tmp_path / "sessions.db.key.next").exists()
+        # The serving instance still reads everything
+        assert read_all(server_db, sessions=1)[0][0] == "Topic 0"
+        server_db.shutdown()
+
+        # The offline rotation holds the database exclusively
+        rotating = ThinkingDatabase(
+            str(tmp_path / "sessions.db"), old_key, exclusive=True
+        )
+        with pytest.raises(DatabaseInUseError):
+            ThinkingDatabase(str(tmp_path / "sessions.db"), old_key)
+        rotating.shutdown()
+
+    def test_online_rotation_through_serving_instance(self, tmp_path):
+        manager = PrivacyManager(str(tmp_path))
+        server_db = manager.create_encrypted_database()
+        populate(server_db)
+        expected = read_all(server_db)
+
+        result = manager.rotate_encryption_key(batch_size=2, database=server_db)
+        assert result["rotation_successful"], result.get("error")
+        assert result["online"]
+
+        # The serving instance switched keys and keeps reading and writing
+        assert read_all(server_db) == expected
+        server_db.create_session("after", "Written after rotation")
+        server_db.shutdown()
+
+        reopened = manager.create_encrypted_database()
+        assert read_all(reopened) == expected
+        assert reopened.get_session("after")["topic"] == "Written after rotation"
+        reopened.shutdown()
+
+    def test_reopen_during_unfinished_rotation(self, tmp_path):
+        manager = PrivacyManager(str(tmp_path))
+        db = manager.create_encrypted_database()
+        populate(db)
+        expected = read_all(db)
+        db.shutdown()
+        old_key = (tmp_path / "sessions.db.key").read_bytes()
+        new_key = Fernet.generate_key()
+        (tmp_path / "sessions.db.key.next").write_bytes(new_key)
+
+        # Rows are still under the old key, new writes go under the next one
+        assert manager.load_encryption_keys() == (new_key, [old_key])
+        reopened = manager.create_encrypted_database()
+        assert read_all(reopened) == expected
+        reopened.create_session("during", "Written mid-rotation")
+        reopened.shutdown()
+
+        result = manager.rotate_encryption_key()
+        assert result["rotation_successful"], result.get("error")
+        assert result["resumed"]
+        finished = ThinkingDatabase(str(tmp_path / "sessions.db"), new_key)
+        assert read_all(finished) == expected
+        assert finished.get_session("during")["topic"] == "Written mid-rotation"
+        finished.shutdown()
+
+    def test_server_tool_rotates_serving_database(self, tmp_path, monkeypatch):
+        try:
+            from src.mcps.deep_thinking.server import DeepThinkingMCPServer
+        except ImportError as e:
+            pytest.skip(f"Compatible mcp SDK not installed: {e}")
+
+        monkeypatch.setenv("HOME", str(tmp_path))
+        monkeypatch.chdir(tmp_path)
+        data_dir = tmp_path / ".deep_thinking"
+        manager = PrivacyManager(str(data_dir))
+        manager.create_encrypted_database().shutdown()
+        old_key = (data_dir / "sessions.db.key").read_bytes()
+
+        server = DeepThinkingMCPServer(max_workers=1)
+        try:
+            db = server.session_manager.db
+            assert db.encryption.key == old_key
+            populate(db)
+            expected = read_all(db)
+
+            result = json.loads(
+                server._run_tool("rotate_encryption_key", {"batch_size": 2})
+            )
+            assert result["rotation_successful"], result.get("error")
+            assert result["online"]
+            assert read_all(db) == expected
+        finally:
+            server.session_manager.db.shutdown()
+            server.tool_executor.shutdown()
+
+        assert (data_dir / "sessions.db.key").read_bytes() != old_key
+        reopened = manager.create_encrypted_database()
+        assert read_all(reopened) == expected
+        reopened.shutdown()
+
+    def test_online_rotation_rejects_other_keys(self, tmp_path):
+        manager = PrivacyManager(str(tmp_path))
+        manager.create_encrypted_database().shutdown()
+        other = ThinkingDatabase(str(tmp_path / "sessions.db"), Fernet.generate_key())
+
+        result = manager.rotate_encryption_key(database=other)
+        assert not result["rotation_successful"]
+        assert not (tmp_path / "sessions.db.key.next").exists()
+        other.shutdown()
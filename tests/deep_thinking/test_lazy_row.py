@@ -0,0 +1,146 @@
+"""
+Tests for lazily decrypted rows and the decryption cache
+"""
+
+import copy
+import json
+import pickle
+
+import pytest
+from cryptography.fernet import Fernet
+
+from src.mcps.deep_thinking.data.database import ThinkingDatabase
+from src.mcps.deep_thinking.data.lazy_row import DecryptionCache, LazyRow
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = ThinkingDatabase(
+        str(tmp_path / "sessions.db"), encryption_key=Fernet.generate_key()
+    )
+    db.create_session("session", "Secret topic", configuration={"depth": "high"})
+    step_id = db.add_session_step(
+        "session",
+        "analyze",
+        1,
+        "analysis",
+        input_data={"prompt": "secret input"},
+        output_data={"answer": "secret output"},
+        quality_score=0.8,
+    )
+    db.add_step_result("session", step_id, "analysis", "secret result")
+
+    # Count real decryptions
+    db.decryptions = 0
+    decrypt = db.encryption.decrypt
+
+    def counting_decrypt(data):
+        db.decryptions += 1
+        return decrypt(data)
+
+    db.encryption.decrypt = counting_decrypt
+    return db
+
+
+class TestLazyDecryption:
+    """Test that encrypted columns are decrypted only when read"""
+
+    def test_plain_columns_do_not_decrypt(self, db):
+        steps = db.get_session_steps("session")
+        assert [(s["step_name"], s["quality_score"]) for s in steps] == [
+            ("analyze", 0.8)
+        ]
+        results = db.get_step_results("session")
+        assert results[0]["result_type"] == "analysis"
+        session = db.get_session("session")
+        assert session["status"] == "active"
+        assert db.decryptions == 0
+
+        assert steps[0]["input_data"] == {"prompt": "secret input"}
+        assert results[0]["content"] == "secret result"
+        assert session["topic"] == "Secret topic"
+        assert db.decryptions == 3
+
+    def test_cached_by_row_and_ciphertext(self, db):
+        assert db.get_session_steps("session")[0]["output_data"] == {
+            "answer": "secret output"
+        }
+        # Each read parses its own copy from the cached plaintext
+        step = db.get_session_steps("session")[0]
+        step["output_data"]["answer"] = "changed"
+        assert db.get_session_steps("session")[0]["output_data"] == {
+            "answer": "secret output"
+        }
+        assert db.decryptions == 1
+
+        # New ciphertext is a new cache key
+        db.update_session("session", context={"stage": "one"})
+        assert db.get_session("session")["context"] == {"stage": "one"}
+        db.update_session("session", context={"stage": "two"})
+        assert db.get_session("session")["context"] == {"stage": "two"}
+        assert db.decryptions == 3
+        assert db.decryption_cache.get_stats()["hits"] == 2
+
+    def test_context_entries_applied_on_read(self, db):
+        assert db.update_session_delta(
+            "session",
+            db.get_context_version("session"),
+            context_changes={"key": db.serialize_context_value("value")},
+            context_appends={"log": [db.serialize_context_value("first")]},
+        )
+        session = db.get_session("session")
+        assert db.decryptions == 0
+        assert session["context"] == {"key": "value", "log": ["first"]}
+        assert session["configuration"] == {"depth": "high"}
+
+
+class TestLazyRow:
+    """Test LazyRow dict behavior"""
+
+    def test_decoded_once_on_access(self):
+        calls = []
+        row = LazyRow({"id": 1, "data": "raw"})
+        row.defer("data", lambda: calls.append(1) or {"decoded": True})
+
+        assert "data" in row and len(row) == 2
+        assert not row.is_decoded("data")
+        assert row.copy().is_decoded("data") is False
+        assert calls == []
+
+        assert row["data"] == {"decoded": True}
+        assert row.get("data") is row["data"]
+        assert row.is_decoded("data")
+        assert calls == [1]
+
+    @pytest.mark.parametrize(
+        "convert",
+        [
+            dict,
+            lambda row: {**row},
+            lambda row: json.loads(json.dumps(row)),
+            lambda row: dict(row.items()),
+            lambda row: copy.deepcopy(row),
+            lambda row: pickle.loads(pickle.dumps(row)),
+            lambda row: row | {},
+        ],
+    )
+    def test_conversions_decode(self, convert):
+        row = LazyRow({"id": 1, "data": "raw"})
+        row.defer("data", lambda: {"decoded": True})
+
+        converted = convert(row)
+        assert converted == {"id": 1, "data": {"decoded": True}}
+        assert row == converted
+
+    def test_cache_bounds(self):
+        cache = DecryptionCache(max_entries=2, max_chars=10)
+        for i, text in enumerate(["aaaa", "bbbb", "cccc"]):
+            plain = cache.decrypt(f"row:{i}", f"cipher-{i}", lambda _, text=text: text)
+            assert plain == text
+        assert len(cache) == 2
+        assert cache.decrypt("row:9", "big", lambda _: "x" * 11) == "x" * 11
+        assert len(cache) == 2
+
+        stats = cache.get_stats()
+        assert stats["evictions"] == 1
+        assert stats["current_chars"] == 8
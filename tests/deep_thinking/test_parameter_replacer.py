@@ -9,6 +9,7 @@ from src.mcps.deep_thinking.templates.parameter_replacer import (
     ParameterConfig,
     ReplacementContext,
     ParameterValidationError,
+    compile_template,
 )
 
 
@@ -422,6 +423,46 @@ class TestParameterReplacer:
         assert "Value: First: {nested} and Second value" in result
         assert "Should not appear" not in result
 
+    def test_compiled_template_cached(self, replacer):
+        """Test that templates are compiled once and reused"""
+        template = "Topic: {topic|upper}, Focus: {focus}"
+        compiled = compile_template(template)
+
+        assert compile_template(template) is compiled
+        assert replacer.extract_parameters(template) == ["focus", "topic"]
+
+    def test_compiled_rendering_matches_passes(self, replacer):
+        """Test that compiled rendering gives the same output as the passes"""
+        templates = [
+            "Hello {{name}}, {place|upper||Wonderland}!",
+            'Output: {"name": "{name}", "items": [{items|join}]}',
+            "{a}{b}{{c}}{missing} and {name|nonexistent}",
+            "{prefix}suffix} with {open",
+        ]
+        params = {
+            "name": "Ada",
+            "items": ["x", "y"],
+            "a": "{",
+            "b": "name",
+            "c": "value",
+            "prefix": "{missing",
+            "open": "no",
+        }
+
+        for template in templates:
+            variables = replacer._merge_variables(params, ReplacementContext())
+            assert replacer.replace_parameters(
+                template, params
+            ) == replacer._replace_in_passes(template, variables)
+
+    def test_json_placeholders_left_intact(self, replacer):
+        """Test that quoted JSON keys are not treated as parameters"""
+        template = '{"topic": "{topic}"}'
+
+        result = replacer.replace_parameters(template, {"topic": "AI"})
+
+        assert result == '{"topic": "AI"}'
+
 
 if __name__ == "__main__":
     pytest.main([__file__])
@@ -0,0 +1,124 @@
+"""
+Unit tests for the shared hot-reload bus
+Tests event coalescing, trailing-edge debounce and event loop delivery
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from src.mcps.deep_thinking.config.reload_bus import ReloadBus
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+class TestReloadBus:
+    """Test suite for ReloadBus"""
+
+    @pytest.fixture
+    def bus(self):
+        bus = ReloadBus()
+        yield bus
+        bus.shutdown()
+
+    def test_changes_batched_per_subscriber(self, bus, tmp_path):
+        batches = []
+        bus.subscribe(
+            tmp_path,
+            lambda changes: batches.append((threading.current_thread(), changes)),
+            suffixes=(".tmpl",),
+            debounce=0.2,
+        )
+
+        for i in range(20):
+            (tmp_path / f"template_{i}.tmpl").write_text(f"Template {i}")
+        (tmp_path / "notes.txt").write_text("ignored")
+
+        assert wait_for(lambda: batches)
+        time.sleep(0.3)
+        assert len(batches) == 1
+        thread, changes = batches[0]
+        assert thread is not threading.current_thread()
+        assert {path.name for path in changes.modified} == {
+            f"template_{i}.tmpl" for i in range(20)
+        }
+        assert changes.deleted == frozenset()
+        assert bus.get_stats()["change_sets"] == 1
+
+    def test_trailing_edge_debounce(self, bus, tmp_path):
+        delivered = []
+        bus.subscribe(tmp_path, delivered.append, debounce=0.3)
+
+        target = tmp_path / "flows.yaml"
+        started = time.monotonic()
+        for i in range(6):
+            target.write_text(f"version: {i}")
+            time.sleep(0.1)
+
+        assert not delivered
+        assert wait_for(lambda: delivered)
+        assert time.monotonic() - started >= 0.8
+        assert delivered[0].modified == frozenset({target})
+        assert bus.get_stats()["coalesced_events"] > 0
+
+    def test_deleted_files_reported(self, bus, tmp_path):
+        existing = tmp_path / "old.yaml"
+        existing.write_text("a: 1")
+        delivered = []
+        bus.subscribe(tmp_path, delivered.append, debounce=0.1)
+
+        existing.unlink()
+
+        assert wait_for(lambda: delivered)
+        assert delivered[0].deleted == frozenset({existing})
+        assert delivered[0].modified == frozenset()
+
+    @pytest.mark.asyncio
+    async def test_coroutine_callbacks_run_on_subscribing_loop(self, bus, tmp_path):
+        loop_thread = threading.current_thread()
+        delivered = asyncio.Event()
+        threads = []
+
+        async def on_changes(changes):
+            threads.append(threading.current_thread())
+            delivered.set()
+
+        bus.subscribe(tmp_path, on_changes, debounce=0.1)
+        (tmp_path / "system.yaml").write_text("log_level: DEBUG")
+
+        await asyncio.wait_for(delivered.wait(), timeout=5.0)
+        assert threads == [loop_thread]
+
+    def test_coroutine_callback_requires_loop(self, bus, tmp_path):
+        async def on_changes(changes):
+            pass
+
+        with pytest.raises(ValueError):
+            bus.subscribe(tmp_path, on_changes)
+        assert bus.get_stats()["subscriptions"] == 0
+
+    def test_shared_watch_and_unsubscribe(self, bus, tmp_path):
+        first = bus.subscribe(tmp_path, lambda changes: None)
+        second = bus.subscribe(str(tmp_path), lambda changes: None)
+        assert bus.get_stats()["watches"] == 1
+
+        bus.unsubscribe(first)
+        assert bus.get_stats()["watches"] == 1
+        bus.unsubscribe(second)
+        assert bus.get_stats() == {
+            "events": 0,
+            "coalesced_events": 0,
+            "change_sets": 0,
+            "subscriptions": 0,
+            "watches": 0,
+            "pending_changes": 0,
+        }
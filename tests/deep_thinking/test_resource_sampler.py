@@ -0,0 +1,80 @@
+"""
+Tests for the shared resource sampler and its ring buffers
+"""
+
+import time
+
+from src.mcps.deep_thinking.performance.resource_sampler import (
+    ResourceSampler,
+    SampleRing,
+)
+from src.mcps.deep_thinking.performance.system_monitor import SystemResourceMonitor
+
+
+class TestSampleRing:
+    """Test the fixed-size sample ring"""
+
+    def test_wraps_and_windows(self):
+        ring = SampleRing(("cpu", "memory"), capacity=4)
+        for i in range(6):
+            ring.append(100.0 + i, {"cpu": float(i)})
+
+        assert len(ring) == 4
+        window = ring.window()
+        assert list(window["timestamp"]) == [102.0, 103.0, 104.0, 105.0]
+        assert list(window["cpu"]) == [2.0, 3.0, 4.0, 5.0]
+        assert list(window["memory"]) == [0.0] * 4
+        assert list(ring.window(since=103.5)["cpu"]) == [4.0, 5.0]
+        assert list(ring.window(since=103.0, last=1)["cpu"]) == [5.0]
+        assert ring.latest()["timestamp"] == 105.0
+
+        summary = ring.summarize(since=103.0)["cpu"]
+        assert summary == {
+            "min": 3.0,
+            "max": 5.0,
+            "mean": 4.0,
+            "last": 5.0,
+            "samples": 3,
+        }
+        assert ring.summarize(since=200.0) == {}
+
+
+class TestResourceSampler:
+    """Test non-blocking sampling on per-group intervals"""
+
+    def test_snapshot_does_not_block(self):
+        sampler = ResourceSampler(intervals={"disk": 3600.0})
+        start = time.perf_counter()
+        values = sampler.snapshot()
+        assert time.perf_counter() - start < 0.5
+        assert values["thread_count"] > 0
+        assert values["process_memory_mb"] > 0
+        assert 0 <= values["cpu_percent"] <= 100
+
+        # Groups are only read again once their interval has passed
+        sampler.intervals["cpu"] = 0.0
+        sampler.snapshot()
+        assert len(sampler.history["cpu"]) == 2
+        assert len(sampler.history["disk"]) == 1
+
+    def test_one_thread_for_all_subscribers(self):
+        sampler = ResourceSampler()
+        first = SystemResourceMonitor(monitoring_interval=0.02, sampler=sampler)
+        second = SystemResourceMonitor(monitoring_interval=0.05, sampler=sampler)
+        first.start_monitoring()
+        second.start_monitoring()
+        try:
+            time.sleep(0.2)
+            assert sampler.get_stats()["subscribers"] == 2
+            assert len(first.resource_history) > len(second.resource_history) > 0
+        finally:
+            first.stop_monitoring()
+            assert sampler.running
+            second.stop_monitoring()
+        assert not sampler.running
+
+        historical = first.get_historical_stats(minutes=1)
+        assert len(historical) == len(first.resource_history)
+        assert isinstance(historical[-1].thread_count, int)
+        summary = first.get_history_summary(minutes=1)
+        assert summary["process_memory_mb"]["min"] > 0
@@ -0,0 +1,120 @@
+"""
+Tests for session retention and compaction
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.mcps.deep_thinking.data.database import ThinkingDatabase
+from src.mcps.deep_thinking.data.retention import RetentionEngine, RetentionPolicy
+from src.mcps.deep_thinking.models.mcp_models import SessionState
+from src.mcps.deep_thinking.sessions.session_manager import SessionManager
+
+
+def add_session(db, session_id, status, age_days, content_size=100):
+    """Create a session with one step and result, aged by age_days"""
+    db.create_session(session_id, f"Topic {session_id}")
+    step_id = db.add_session_step(session_id, "analyze", 1, "analysis")
+    db.add_step_result(session_id, step_id, "analysis", "x" * content_size)
+
+    timestamp = (datetime.now() - timedelta(days=age_days)).isoformat()
+    with db.get_connection() as conn:
+        conn.execute(
+            """
+            UPDATE thinking_sessions
+            SET status = ?, updated_at = ?,
+                completed_at = CASE WHEN ? = 'completed' THEN ? END
+            WHERE id = ?
+        """,
+            (status, timestamp, status, timestamp, session_id),
+        )
+        conn.commit()
+
+
+@pytest.fixture
+def db(tmp_path):
+    return ThinkingDatabase(str(tmp_path / "sessions.db"))
+
+
+class TestRetention:
+    """Test chunked retention and storage reclamation"""
+
+    def test_cleanup_old_sessions_in_chunks(self, db, monkeypatch):
+        monkeypatch.setattr(ThinkingDatabase, "RETENTION_BATCH_SIZE", 2)
+        for i in range(5):
+            add_session(db, f"old-{i}", "completed", age_days=45)
+        add_session(db, "recent", "completed", age_days=5)
+        add_session(db, "active", "active", age_days=45)
+
+        assert db.cleanup_old_sessions(days_old=30) == 5
+        assert db.get_session("old-0") is None
+        assert db.get_session("recent") is not None
+        assert db.get_session("active") is not None
+
+    def test_run_once_reports_reclaimed_rows_and_bytes(self, db):
+        for i in range(6):
+            add_session(db, f"old-{i}", "completed", age_days=45, content_size=20000)
+        add_session(db, "idle", "active", age_days=3)
+        add_session(db, "busy", "active", age_days=0)
+
+        abandoned = []
+        engine = RetentionEngine(
+            db,
+            RetentionPolicy(batch_size=4, batch_pause=0),
+            on_abandoned=abandoned.extend,
+        )
+        report = engine.run_once()
+
+        assert report.errors == []
+        assert report.sessions_abandoned == 1
+        assert abandoned == ["idle"]
+        assert db.get_session("idle")["status"] == "abandoned"
+        assert db.get_session("busy")["status"] == "active"
+        assert report.sessions_deleted == 6
+        # Each session takes its step and result with it
+        assert report.rows_deleted == 18
+        assert db.get_storage_stats()["auto_vacuum"] == 2
+        assert report.pages_vacuumed > 0
+        assert report.bytes_reclaimed > 0
+        assert engine.get_stats()["last_report"]["sessions_deleted"] == 6
+
+    def test_session_manager_abandons_and_forgets(self, tmp_path):
+        manager = SessionManager(str(tmp_path / "sessions.db"))
+        manager.create_session(
+            SessionState(
+                session_id="idle",
+                topic="Idle topic",
+                current_step="decompose_problem",
+                flow_type="comprehensive_analysis",
+            )
+        )
+        with manager.db.get_connection() as conn:
+            conn.execute(
+                "UPDATE thinking_sessions SET updated_at = ? WHERE id = 'idle'",
+                ((datetime.now() - timedelta(hours=48)).isoformat(),),
+            )
+            conn.commit()
+
+        assert manager.cleanup_inactive_sessions(hours_inactive=24) == 1
+        assert "idle" not in manager._active_sessions
+        assert manager.db.get_session("idle")["status"] == "abandoned"
+        assert manager.retention.running is False
+
+    def test_scheduled_runs(self, db):
+        add_session(db, "old", "completed", age_days=45)
+        engine = RetentionEngine(db, RetentionPolicy(interval=0.01))
+
+        assert engine.start()
+        assert not engine.start()
+        try:
+            for _ in range(500):
+                if engine.runs:
+                    break
+                engine._stop_event.wait(0.01)
+        finally:
+            engine.stop()
+
+        assert not engine.running
+        assert engine.runs >= 1
+        assert db.get_session("old") is None
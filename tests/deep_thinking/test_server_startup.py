@@ -0,0 +1,103 @@
+"""
+Tests for MCP server startup cost
+Checks that importing the server leaves the heavy modules unloaded and that
+core components are only built on first use
+"""
+
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+# Modules the server must not import before the first tool call
+HEAVY_MODULES = (
+    "src.mcps.deep_thinking.config.config_manager",
+    "src.mcps.deep_thinking.data.database",
+    "src.mcps.deep_thinking.flows.flow_manager",
+    "src.mcps.deep_thinking.models.agent_models",
+    "src.mcps.deep_thinking.models.mcp_models",
+    "src.mcps.deep_thinking.sessions.session_manager",
+    "src.mcps.deep_thinking.templates.template_manager",
+    "src.mcps.deep_thinking.tools.mcp_tools",
+    "psutil",
+    "watchdog",
+    "yaml",
+)
+
+_SERVER_IMPORT_SCRIPT = """
+import json, sys
+try:
+    import mcp, mcp.server, mcp.server.stdio, mcp.types
+    from mcp import McpError
+except ImportError as e:
+    print(json.dumps({"skip": str(e)}))
+    raise SystemExit(0)
+import src.mcps.deep_thinking.server
+print(json.dumps({"loaded": sorted(sys.modules)}))
+"""
+
+
+def _run_python(script: str) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+class TestServerStartup:
+    """Test suite for server import time and deferred initialization"""
+
+    def test_models_package_imports_lazily(self):
+        report = _run_python(
+            "import json, sys\n"
+            "import src.mcps.deep_thinking.models.mcp_models\n"
+            "from src.mcps.deep_thinking.models import ThinkingSession\n"
+            "print(json.dumps({'loaded': sorted(sys.modules),"
+            " 'name': ThinkingSession.__name__}))"
+        )
+
+        assert report["name"] == "ThinkingSession"
+        assert "src.mcps.deep_thinking.models.thinking_models" in report["loaded"]
+        assert "src.mcps.deep_thinking.models.agent_models" not in report["loaded"]
+        assert "src.mcps.deep_thinking.models.evaluation_models" not in report["loaded"]
+
+    def test_models_exports_match_lazy_table(self):
+        from src.mcps.deep_thinking import models
+
+        assert sorted(models.__all__) == sorted(models._MODEL_MODULES)
+
+    def test_server_import_defers_heavy_modules(self):
+        report = _run_python(_SERVER_IMPORT_SCRIPT)
+        if "skip" in report:
+            pytest.skip(f"Compatible mcp SDK not installed: {report['skip']}")
+
+        assert "src.mcps.deep_thinking.server" in report["loaded"]
+        assert not set(HEAVY_MODULES) & set(report["loaded"])
+
+    def test_components_built_on_first_use(self, tmp_path, monkeypatch):
+        try:
+            from src.mcps.deep_thinking.server import DeepThinkingMCPServer
+        except ImportError as e:
+            pytest.skip(f"Compatible mcp SDK not installed: {e}")
+
+        monkeypatch.chdir(tmp_path)
+        server = DeepThinkingMCPServer(max_workers=1)
+        try:
+            assert not server.components_ready
+
+            template_manager = server.template_manager
+            assert server.components_ready
+            assert server.template_manager is template_manager
+            assert server.mcp_tools.template_manager is template_manager
+
+            assert not hasattr(server, "missing_component")
+        finally:
+            server.tool_executor.shutdown()
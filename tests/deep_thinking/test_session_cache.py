@@ -0,0 +1,255 @@
+"""
+Unit tests for Session Cache
+Tests LRU/TTL eviction, byte budget, statistics and write-back on eviction
+"""
+
+import threading
+import time
+
+import pytest
+
+from src.mcps.deep_thinking.models.mcp_models import SessionState
+from src.mcps.deep_thinking.sessions import session_cache
+from src.mcps.deep_thinking.sessions.session_cache import (
+    SessionCache,
+    SessionSizeEstimator,
+)
+from src.mcps.deep_thinking.sessions.session_manager import SessionManager
+
+
+def make_session(session_id: str, **context) -> SessionState:
+    return SessionState(
+        session_id=session_id,
+        topic=f"Topic {session_id}",
+        current_step="initialize",
+        flow_type="comprehensive_analysis",
+        context=context,
+    )
+
+
+class TestSessionCache:
+    """Test suite for SessionCache"""
+
+    def test_lru_eviction_by_count(self):
+        evicted = []
+        cache = SessionCache(max_sessions=2, on_evict=evicted.append)
+
+        cache["a"] = make_session("a")
+        cache["b"] = make_session("b")
+        cache.get("a")  # a becomes most recently used
+        cache["c"] = make_session("c")
+
+        assert set(cache) == {"a", "c"}
+        assert [s.session_id for s in evicted] == ["b"]
+        assert cache.get_stats()["evictions"] == 1
+
+    def test_byte_budget(self):
+        cache = SessionCache(max_bytes=250, size_estimator=lambda s: 100)
+
+        for session_id in "abc":
+            cache[session_id] = make_session(session_id)
+
+        stats = cache.get_stats()
+        assert len(cache) == 2
+        assert stats["current_bytes"] == 200
+
+    def test_storing_again_remeasures_size(self):
+        cache = SessionCache(size_estimator=lambda s: 10 * len(s.context))
+        session = make_session("a", topic="x")
+        cache["a"] = session
+        session.context["notes"] = "grown"
+        cache["a"] = session
+
+        assert cache.get_stats()["current_bytes"] == 20
+
+    def test_default_estimate_tracks_growth(self):
+        cache = SessionCache()
+        session = make_session("a", notes=["first"])
+        cache["a"] = session
+        initial = cache.get_stats()["current_bytes"]
+        assert initial > 0
+
+        session.context["notes"].append("second")
+        session.step_results["analyze"] = "x" * 1000
+        cache["a"] = session
+        assert cache.get_stats()["current_bytes"] >= initial + 1000
+
+        del session.step_results["analyze"]
+        cache["a"] = session
+        assert cache.get_stats()["current_bytes"] < initial + 100
+
+    def test_estimator_measures_only_changed_entries(self, monkeypatch):
+        estimator = SessionSizeEstimator()
+        session = make_session("a", **{f"key-{i}": f"value {i}" for i in range(50)})
+        first = estimator(session)
+
+        measured = []
+        measure = session_cache._measure
+        monkeypatch.setattr(
+            session_cache,
+            "_measure",
+            lambda value: measured.append(value) or measure(value),
+        )
+        session.context["key-0"] = "changed value 0"
+        assert estimator(session) == first + len("changed ")
+        assert "value 1" not in measured
+        assert "changed value 0" in measured
+
+        estimator.forget("a")
+        measured.clear()
+        estimator(session)
+        assert "value 1" in measured
+
+    def test_pinned_sessions_are_not_evicted(self):
+        evicted = []
+        cache = SessionCache(max_sessions=2, on_evict=evicted.append)
+
+        with cache.in_use("a"):
+            cache["a"] = make_session("a")
+            cache["b"] = make_session("b")
+            cache["c"] = make_session("c")
+            assert set(cache) == {"a", "c"}
+
+        assert [s.session_id for s in evicted] == ["b"]
+        assert cache.get_stats()["pinned"] == 0
+
+    def test_unpin_remeasures_and_enforces_budget(self):
+        evicted = []
+        cache = SessionCache(
+            max_bytes=25,
+            size_estimator=lambda s: 10 * len(s.context),
+            on_evict=evicted.append,
+        )
+        session = make_session("a", topic="x")
+        cache["b"] = make_session("b", topic="y")
+        cache["a"] = session
+
+        with cache.in_use("a"):
+            session.context["notes"] = "grown"
+            session.context["more"] = "grown"
+        # a now measures 30 bytes, so the older b no longer fits
+        assert [s.session_id for s in evicted] == ["b"]
+        assert cache.get_stats()["current_bytes"] == 30
+
+    def test_ttl_expiry(self):
+        evicted = []
+        cache = SessionCache(ttl_seconds=0.01, on_evict=evicted.append)
+        cache["a"] = make_session("a")
+
+        time.sleep(0.02)
+
+        assert cache.get("a") is None
+        assert [s.session_id for s in evicted] == ["a"]
+        assert cache.get_stats()["expirations"] == 1
+
+    def test_expire_sweeps_idle_sessions(self):
+        cache = SessionCache(ttl_seconds=0.01)
+        for session_id in "abc":
+            cache[session_id] = make_session(session_id)
+
+        time.sleep(0.02)
+
+        assert cache.expire() == 3
+        assert len(cache) == 0
+
+    def test_hit_miss_counters(self):
+        cache = SessionCache()
+        cache["a"] = make_session("a")
+
+        cache.get("a")
+        cache.get("missing")
+        cache.peek("a")
+
+        stats = cache.get_stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_rate"] == 0.5
+
+    def test_pop_does_not_notify(self):
+        evicted = []
+        cache = SessionCache(on_evict=evicted.append)
+        cache["a"] = make_session("a")
+
+        assert cache.pop("a").session_id == "a"
+        assert cache.pop("a", None) is None
+        assert evicted == []
+        assert cache.get_stats()["current_bytes"] == 0
+
+    def test_invalid_configuration(self):
+        with pytest.raises(ValueError):
+            SessionCache(max_sessions=0)
+
+
+class TestSessionManagerCache:
+    """Test SessionManager with a bounded cache"""
+
+    @pytest.fixture
+    def manager(self):
+        manager = SessionManager(":memory:", session_cache=SessionCache(max_sessions=2))
+        yield manager
+        manager.db.shutdown()
+
+    def test_memory_stays_bounded(self, manager):
+        for i in range(20):
+            manager.create_session(make_session(f"session-{i}"))
+
+        assert len(manager._active_sessions) == 2
+        assert len(manager._context_versions) <= 2
+        assert manager.get_statistics()["session_cache"]["evictions"] == 18
+
+    def test_evicted_session_reloads_with_state(self, manager):
+        session = make_session("first", complexity="complex")
+        manager.create_session(session)
+        session.context["focus"] = "depth"
+        session.iteration_count["collect_evidence"] = 2
+        session.total_iterations["collect_evidence"] = 3
+
+        manager.create_session(make_session("second"))
+        manager.create_session(make_session("third"))
+        assert "first" not in manager._active_sessions
+
+        reloaded = manager.get_session("first")
+        assert reloaded is not session
+        assert reloaded.context["focus"] == "depth"
+        assert reloaded.iteration_count == {"collect_evidence": 2}
+        assert reloaded.total_iterations == {"collect_evidence": 3}
+
+    def test_write_back_runs_outside_manager_lock(self, manager):
+        held = []
+
+        def probe():
+            acquired = manager.lock.acquire(timeout=0)
+            if acquired:
+                manager.lock.release()
+            held.append(not acquired)
+
+        def on_evict(session):
+            thread = threading.Thread(target=probe)
+            thread.start()
+            thread.join()
+
+        manager._active_sessions.on_evict = on_evict
+        for session_id in ("first", "second", "third"):
+            manager.create_session(make_session(session_id))
+        manager.get_session("first")  # Reloading evicts second
+
+        assert held == [False, False]
+
+    def test_session_in_use_survives_eviction(self, manager):
+        session = make_session("busy")
+        manager.create_session(session)
+
+        with manager.session_in_use("busy"):
+            manager.create_session(make_session("second"))
+            manager.create_session(make_session("third"))
+            session.context["focus"] = "depth"
+            assert manager.get_session("busy") is session
+
+        assert "busy" in manager._active_sessions
+
+    def test_single_cache_shared_with_tools(self, manager):
+        session = make_session("shared")
+        manager.create_session(session)
+
+        assert manager.get_session("shared") is session
+        assert manager.get_statistics()["session_cache"]["hits"] == 1
@@ -0,0 +1,79 @@
+"""
+Tests for parsed step results
+"""
+
+import json
+
+from src.mcps.deep_thinking.models.mcp_models import SessionState
+from src.mcps.deep_thinking.sessions.session_manager import SessionManager
+from src.mcps.deep_thinking.sessions.step_result import (
+    ParsedStepResult,
+    parse_step_result,
+)
+
+DECOMPOSITION = {
+    "main_question": "How should a small team adopt AI tools?",
+    "sub_questions": [
+        {"id": "SQ1", "question": "Which tasks benefit most?"},
+        {"id": "SQ2", "question": "What are the risks?"},
+    ],
+    "relationships": [],
+}
+
+
+class TestParsedStepResult:
+    """Test parsing and feature extraction of step results"""
+
+    def test_json_and_fenced_json(self):
+        raw = json.dumps(DECOMPOSITION)
+        fenced = f"```json\n{raw}\n```"
+
+        for text in (raw, fenced, f"  {fenced}\n"):
+            parsed = ParsedStepResult(text)
+            assert parsed.is_json
+            assert parsed.json_object == DECOMPOSITION
+            assert [sq["id"] for sq in parsed.sub_questions] == ["SQ1", "SQ2"]
+
+        prose = ParsedStepResult(f"Decomposition:\n{fenced}\nDone.")
+        assert not prose.is_json
+        assert prose.json_object is None
+        assert prose.sub_questions is None
+        assert prose.json_text == ""
+
+    def test_text_features(self):
+        parsed = ParsedStepResult(
+            "1. Market SQ1 analysis\n2. Risk SQ2 review\nSQ1 again, Source: report"
+        )
+
+        assert parsed.numbered_items == ["1", "2"]
+        assert parsed.sq_mentions == ["1", "2", "1"]
+        assert parsed.sq_ids == {"1", "2"}
+        assert "source" in parsed.lowered
+        assert parsed.contains_any(["Risk", "missing"])
+        assert not parsed.contains_any(["missing"])
+
+    def test_parsed_once_per_text(self):
+        result = {"sub_question": "SQ1", "evidence_synthesis": {}}
+        parsed = parse_step_result(json.dumps(result))
+
+        # Stages handed an equal copy of the text share the parse
+        assert parse_step_result(json.dumps(result)) is parsed
+        assert parse_step_result(parsed) is parsed
+        assert parse_step_result(None).raw == ""
+
+    def test_session_manager_uses_fenced_decomposition(self, tmp_path):
+        manager = SessionManager(str(tmp_path / "sessions.db"))
+        session = SessionState(
+            session_id="session",
+            topic="AI adoption",
+            current_step="decompose_problem",
+            flow_type="comprehensive_analysis",
+        )
+        result = f"```json\n{json.dumps(DECOMPOSITION)}\n```"
+
+        assert manager._contains_decomposition_data(result)
+        manager._handle_special_step_results(session, "decompose_problem", result)
+
+        assert session.decomposition_result == DECOMPOSITION
+        assert session.total_iterations["collect_evidence"] == 2
+        assert session.iteration_count["collect_evidence"] == 0
@@ -0,0 +1,92 @@
+"""
+Tests for precompiled template bundles
+"""
+
+import os
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from src.mcps.deep_thinking.templates.parameter_replacer import compile_template
+from src.mcps.deep_thinking.templates.template_bundle import (
+    BUNDLE_NAME,
+    TemplateBundleError,
+    build_template_bundle,
+    load_template_bundle,
+)
+from src.mcps.deep_thinking.templates.template_manager import TemplateManager
+
+
+class TestTemplateBundle:
+    """Test building and loading template bundles"""
+
+    @pytest.fixture
+    def templates_dir(self):
+        """Create a templates directory with a built bundle"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir)
+            (path / "greeting.tmpl").write_text(
+                "# 问候\nHello {{name}}, {place|upper|World}!", encoding="utf-8"
+            )
+            (path / "json_example.tmpl").write_text(
+                'Output: {"topic": "{topic}"}', encoding="utf-8"
+            )
+            build_template_bundle(temp_dir)
+            yield path
+
+    def test_round_trip(self, templates_dir):
+        """Test that bundled contents and compiled forms match the files"""
+        bundled = load_template_bundle(templates_dir / BUNDLE_NAME)
+
+        assert set(bundled) == {"greeting", "json_example"}
+        for name, template in bundled.items():
+            content = (templates_dir / f"{name}.tmpl").read_text(encoding="utf-8")
+            assert template.content == content
+            assert template.compiled == compile_template.__wrapped__(content)
+
+    def test_corrupt_bundle_rejected(self, templates_dir):
+        """Test that a bundle failing its checksum is not used"""
+        bundle_path = templates_dir / BUNDLE_NAME
+        data = bundle_path.read_bytes()
+        bundle_path.write_bytes(data[:-1] + b"!")
+
+        with pytest.raises(TemplateBundleError):
+            load_template_bundle(bundle_path)
+
+        manager = TemplateManager(
+            str(templates_dir), enable_performance_optimization=False
+        )
+        assert manager.get_template("greeting", {"name": "Ada"}).startswith("# 问候")
+
+    def test_manager_loads_from_bundle(self, templates_dir):
+        """Test that the manager takes unchanged templates from the bundle"""
+        manager = TemplateManager(
+            str(templates_dir), enable_performance_optimization=False
+        )
+
+        assert manager.versions["greeting"][-1].get("loaded_from_bundle")
+        assert manager.get_template("greeting", {"name": "Ada"}).endswith(
+            "Hello {Ada}, WORLD!"
+        )
+
+    def test_changed_file_falls_back(self, templates_dir):
+        """Test that edited templates are read from their files"""
+        template_path = templates_dir / "greeting.tmpl"
+        os.utime(template_path, ns=(1, 1))
+        (templates_dir / "json_example.tmpl").write_text(
+            "Changed {topic}", encoding="utf-8"
+        )
+
+        manager = TemplateManager(
+            str(templates_dir), enable_performance_optimization=False
+        )
+
+        # Touched but unchanged content is still taken from the bundle
+        assert manager.versions["greeting"][-1].get("loaded_from_bundle")
+        assert not manager.versions["json_example"][-1].get("loaded_from_bundle")
+        assert manager.get_template("json_example", {"topic": "x"}) == "Changed x"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
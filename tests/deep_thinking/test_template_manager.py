@@ -124,6 +124,92 @@ class TestTemplateManager:
 
         assert result is not None
 
+    def test_rendered_prompt_cache(self, temp_template_manager):
+        """Test that identical renders are served from the rendered cache"""
+        manager = temp_template_manager
+        params = {"topic": "cache test", "complexity": "moderate", "focus": ""}
+
+        first = manager.get_template("decomposition", params)
+        second = manager.get_template("decomposition", params)
+
+        metrics = manager.get_performance_metrics()["rendered_cache_metrics"]
+        assert first == second
+        assert metrics["cache_hits"] == 1
+        assert metrics["cache_misses"] == 1
+
+    def test_rendered_prompt_cache_invalidation(self, temp_template_manager):
+        """Test that template changes are visible through the rendered cache"""
+        manager = temp_template_manager
+        manager.add_template("greeting", "Hello {name}")
+        first_version = manager.get_template_versions("greeting")[0]["version_id"]
+        assert manager.get_template("greeting", {"name": "Ada"}) == "Hello Ada"
+
+        manager.add_template("greeting", "Goodbye {name}")
+        assert manager.get_template("greeting", {"name": "Ada"}) == "Goodbye Ada"
+
+        (manager.templates_dir / "greeting.tmpl").write_text("Hi {name}")
+        manager.reload_template("greeting")
+        assert manager.get_template("greeting", {"name": "Ada"}) == "Hi Ada"
+
+        manager.rollback_template("greeting", first_version)
+        assert manager.get_template("greeting", {"name": "Ada"}) == "Hello Ada"
+
+    def test_time_dependent_prompts_not_cached(self, temp_template_manager):
+        """Test that prompts using time variables are rendered every time"""
+        manager = temp_template_manager
+        manager.add_template("dated", "Report on {topic} at {current_datetime}")
+
+        manager.get_template("dated", {"topic": "x"})
+        manager.get_template("dated", {"topic": "x"})
+
+        metrics = manager.get_performance_metrics()["rendered_cache_metrics"]
+        assert metrics["cache_size"] == 0
+        assert metrics["bypasses"] == 2
+
+    def test_version_history_retention(self):
+        """Test that version history is bounded and shares content"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            manager = TemplateManager(temp_dir, max_versions_per_template=3)
+            for i in range(10):
+                manager.add_template("bounded", f"Version {i % 2}: {{name}}")
+
+            versions = manager.get_template_versions("bounded")
+            assert len(versions) == 3
+            assert versions[-1]["is_active"]
+            assert manager.get_template("bounded", {"name": "x"}) == "Version 1: x"
+
+            storage = manager.get_performance_metrics()["template_manager_stats"][
+                "template_storage"
+            ]
+            assert storage["references"] == sum(
+                len(v) for v in manager.versions.values()
+            )
+
+            manager.rollback_template("bounded", versions[1]["version_id"])
+            assert manager.get_template("bounded", {"name": "x"}) == "Version 0: x"
+            manager.shutdown()
+
+    def test_pruning_deletes_blob_files(self):
+        """Test that pruned versions leave no content files behind"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            manager = TemplateManager(
+                temp_dir,
+                enable_performance_optimization=False,
+                max_versions_per_template=2,
+            )
+            blobs_dir = manager.versions_dir / "blobs"
+            before = set(blobs_dir.iterdir())
+            for i in range(5):
+                manager.add_template("pruned", f"Version {i}: {{name}}")
+
+            retained = {
+                manager.blob_store.content_hash(f"Version {i}: {{name}}")
+                for i in (3, 4)
+            }
+            added = {path.stem for path in set(blobs_dir.iterdir()) - before}
+            assert added == retained
+            manager.shutdown()
+
 
 if __name__ == "__main__":
     pytest.main([__file__])
@@ -251,6 +251,35 @@ class TestEnhancedTemplateManager:
         manager.disable_hot_reload()
         assert manager.is_hot_reload_enabled() is False
 
+    def test_hot_reload_batches_changes(self, temp_template_manager):
+        """Test that templates changed together are reloaded in one wave"""
+        manager = temp_template_manager
+        waves = []
+        reload_wave = manager._on_template_files_changed
+
+        def record_wave(changes):
+            waves.append(sorted(path.stem for path in changes.modified))
+            reload_wave(changes)
+
+        manager._on_template_files_changed = record_wave
+        manager.enable_hot_reload()
+
+        names = [f"batch_template_{i}" for i in range(10)]
+        for name in names:
+            (Path(manager.templates_dir) / f"{name}.tmpl").write_text(
+                f"{name}: {{param}}"
+            )
+
+        deadline = time.time() + 5
+        while not waves and time.time() < deadline:
+            time.sleep(0.05)
+        time.sleep(0.7)
+
+        assert waves == [names]
+        assert manager.get_template(names[3], {"param": "x"}) == f"{names[3]}: x"
+
+        manager.disable_hot_reload()
+
     def test_template_version_error(self, temp_template_manager):
         """Test template version error handling"""
         manager = temp_template_manager
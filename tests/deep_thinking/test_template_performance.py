@@ -19,6 +19,8 @@ from src.mcps.deep_thinking.templates.performance_optimizer import (
     MemoryMonitor,
     TemplateUsageStats,
     CacheMetrics,
+    RenderedPromptCache,
+    params_cache_key,
 )
 
 
@@ -99,6 +101,53 @@ class TestLRUCache:
         assert cache.get("key1") is None
 
 
+class TestRenderedPromptCache:
+    """Test rendered prompt cache"""
+
+    def test_params_key_distinguishes_rendered_values(self):
+        """Test that values rendering differently get different keys"""
+        keys = [
+            params_cache_key({"p": value})
+            for value in (1, 1.0, True, "1", [1, 2], (1, 2), 0.0, -0.0)
+        ]
+        assert len(set(keys)) == len(keys)
+
+        assert params_cache_key({"a": "x", "b": ["y"]}) == params_cache_key(
+            {"a": "x", "b": ["y"]}
+        )
+        assert params_cache_key({"p": object()}) is None
+        volatile = frozenset({"current_date"})
+        assert params_cache_key({"p": "{current_date}"}, volatile) is None
+
+    def test_invalidate_template(self):
+        """Test dropping the rendered prompts of one template"""
+        cache = RenderedPromptCache(max_size=10)
+        cache.put(("t1", "v1", ()), "one")
+        cache.put(("t1", "v1", (("p", "x"),)), "two")
+        cache.put(("t2", "v1", ()), "three")
+
+        assert cache.invalidate("t1") == 2
+        assert cache.get(("t1", "v1", ())) is None
+        assert cache.get(("t2", "v1", ())) == "three"
+        assert cache.memory_size() == len("three")
+
+    def test_metrics(self):
+        """Test hit, miss and eviction counting"""
+        cache = RenderedPromptCache(max_size=2)
+        cache.put(("t", "v", (1,)), "a")
+        cache.get(("t", "v", (1,)))
+        cache.get(("t", "v", (2,)))
+        cache.put(("t", "v", (2,)), "b")
+        cache.put(("t", "v", (3,)), "c")
+
+        metrics = cache.get_metrics()
+        assert metrics["cache_hits"] == 1
+        assert metrics["cache_misses"] == 1
+        assert metrics["hit_rate"] == 0.5
+        assert metrics["evictions"] == 1
+        assert metrics["cache_size"] == 2
+
+
 class TestTemplatePreloader:
     """Test template preloading functionality"""
 
@@ -0,0 +1,69 @@
+"""
+Tests for content-addressed template storage
+"""
+
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from src.mcps.deep_thinking.templates.template_store import TemplateBlobStore
+
+
+class TestTemplateBlobStore:
+    """Test template blob store"""
+
+    def test_identical_content_stored_once(self):
+        """Test that equal contents share one stored copy"""
+        store = TemplateBlobStore()
+        first = "".join(["Hello ", "{name}"])
+        second = "".join(["Hello ", "{name}"])
+
+        digest1, stored1 = store.add(first)
+        digest2, stored2 = store.add(second)
+
+        assert digest1 == digest2
+        assert stored2 is stored1
+        assert store.intern("Hello {name}") is stored1
+        assert store.get_stats()["distinct_contents"] == 1
+        assert store.get_stats()["references"] == 2
+
+    def test_release_drops_unreferenced_blob(self):
+        """Test reference counting"""
+        store = TemplateBlobStore()
+        digest, _ = store.add("content")
+        store.add("content")
+
+        assert store.release(digest) is False
+        assert store.get(digest) == "content"
+        assert store.release(digest) is True
+        assert store.get(digest) is None
+
+    def test_persist_writes_once(self):
+        """Test that blobs are written to disk by hash"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = TemplateBlobStore(Path(temp_dir) / "blobs")
+            digest, _ = store.add("persisted")
+
+            path = store.persist(digest)
+
+            assert path.name == f"{digest}.tmpl"
+            assert path.read_text(encoding="utf-8") == "persisted"
+            assert TemplateBlobStore().persist(digest) is None
+
+    def test_release_deletes_blob_file(self):
+        """Test that the file goes with the last reference"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = TemplateBlobStore(Path(temp_dir) / "blobs")
+            digest, _ = store.add("persisted")
+            store.add("persisted")
+            path = store.persist(digest)
+
+            store.release(digest)
+            assert path.exists()
+            store.release(digest)
+            assert not path.exists()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
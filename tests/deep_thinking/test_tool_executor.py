@@ -0,0 +1,281 @@
+"""
+Unit tests for Tool Executor
+Tests worker-pool execution, per-session ordering and metrics
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from src.mcps.deep_thinking.flows.flow_manager import FlowManager
+from src.mcps.deep_thinking.models.mcp_models import SessionState
+from src.mcps.deep_thinking.sessions.session_manager import SessionManager
+from src.mcps.deep_thinking.tools.tool_executor import ToolExecutor
+
+
+class TestToolExecutor:
+    """Test suite for ToolExecutor"""
+
+    @pytest.fixture
+    def executor(self):
+        executor = ToolExecutor(max_workers=4)
+        yield executor
+        executor.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_runs_off_event_loop(self, executor):
+        loop_thread = threading.get_ident()
+
+        result = await executor.run("start_thinking", None, threading.get_ident)
+
+        assert result != loop_thread
+
+    @pytest.mark.asyncio
+    async def test_same_session_calls_do_not_interleave(self, executor):
+        events = []
+
+        def handler(tag):
+            events.append(("start", tag))
+            time.sleep(0.02)
+            events.append(("end", tag))
+            return tag
+
+        results = await asyncio.gather(
+            *[executor.run("next_step", "session-1", handler, i) for i in range(4)]
+        )
+
+        assert results == [0, 1, 2, 3]
+        assert events == [(kind, i) for i in range(4) for kind in ("start", "end")]
+
+    @pytest.mark.asyncio
+    async def test_different_sessions_run_concurrently(self, executor):
+        barrier = threading.Barrier(2, timeout=2)
+
+        def handler():
+            # Deadlocks (and times out) unless both calls run at once
+            barrier.wait()
+            return True
+
+        results = await asyncio.gather(
+            executor.run("next_step", "session-a", handler),
+            executor.run("next_step", "session-b", handler),
+        )
+
+        assert results == [True, True]
+
+    @pytest.mark.asyncio
+    async def test_worker_bound_is_respected(self):
+        executor = ToolExecutor(max_workers=2)
+        try:
+
+            def handler():
+                time.sleep(0.02)
+
+            await asyncio.gather(
+                *[executor.run("analyze_step", f"s{i}", handler) for i in range(6)]
+            )
+
+            stats = executor.get_stats()
+            assert stats["max_in_flight"] <= 2
+            assert stats["max_queue_depth"] >= 4
+            assert stats["queue_depth"] == 0
+        finally:
+            executor.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_exceptions_propagate_and_are_counted(self, executor):
+        def failing():
+            raise ValueError("boom")
+
+        with pytest.raises(ValueError):
+            await executor.run("complete_thinking", "session-1", failing)
+
+        stats = executor.get_stats()
+        assert stats["failed_calls"] == 1
+        assert stats["tools"][0]["error_count"] == 1
+        assert stats["active_sessions"] == 0
+
+    @pytest.mark.asyncio
+    async def test_latency_metrics(self, executor):
+        await executor.run("next_step", "session-1", time.sleep, 0.01)
+
+        stats = executor.get_stats()
+        tool = stats["tools"][0]
+        assert stats["total_calls"] == 1
+        assert stats["completed_calls"] == 1
+        assert tool["tool_name"] == "next_step"
+        assert tool["average_execution_time"] >= 0.01
+        assert tool["max_queue_wait"] >= 0.0
+
+    @pytest.mark.asyncio
+    async def test_inline_mode_runs_on_loop_thread(self):
+        executor = ToolExecutor(execution_mode="inline")
+
+        result = await executor.run("start_thinking", None, threading.get_ident)
+
+        assert result == threading.get_ident()
+        assert executor.get_stats()["completed_calls"] == 1
+
+    def test_invalid_configuration(self):
+        with pytest.raises(ValueError):
+            ToolExecutor(execution_mode="forked")
+        with pytest.raises(ValueError):
+            ToolExecutor(max_workers=0)
+
+    @pytest.mark.asyncio
+    async def test_run_after_shutdown_raises(self):
+        executor = ToolExecutor()
+        executor.shutdown()
+
+        with pytest.raises(RuntimeError):
+            await executor.run("next_step", "session-1", lambda: None)
+
+    @pytest.mark.asyncio
+    async def test_cancelled_call_keeps_session_serialized(self, executor):
+        events = []
+        release_first = threading.Event()
+
+        def handler(tag):
+            events.append(("start", tag))
+            if tag == 1:
+                release_first.wait(2)
+            events.append(("end", tag))
+            return tag
+
+        first = asyncio.ensure_future(
+            executor.run("next_step", "session-1", handler, 1)
+        )
+        await asyncio.sleep(0.05)
+        first.cancel()
+        second = asyncio.ensure_future(
+            executor.run("next_step", "session-1", handler, 2)
+        )
+        await asyncio.sleep(0.05)
+
+        # The cancelled call's handler is still running; the next one must wait
+        assert events == [("start", 1)]
+        release_first.set()
+
+        assert await second == 2
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        assert events == [("start", 1), ("end", 1), ("start", 2), ("end", 2)]
+        assert executor.get_stats()["active_sessions"] == 0
+
+    @pytest.mark.asyncio
+    async def test_cancelled_call_holds_worker_slot(self):
+        executor = ToolExecutor(max_workers=1)
+        try:
+            release_first = threading.Event()
+            first = asyncio.ensure_future(
+                executor.run("next_step", "session-a", release_first.wait, 2)
+            )
+            await asyncio.sleep(0.05)
+            first.cancel()
+            second = asyncio.ensure_future(
+                executor.run("next_step", "session-b", lambda: "done")
+            )
+            await asyncio.sleep(0.05)
+
+            assert not second.done()
+            assert executor.get_stats()["queue_depth"] == 1
+            release_first.set()
+            assert await second == "done"
+            assert executor.get_stats()["max_in_flight"] == 1
+        finally:
+            executor.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_inline_mode_counts_calls_without_queueing(self):
+        executor = ToolExecutor(execution_mode="inline")
+
+        await executor.run("next_step", "session-1", lambda: None)
+
+        stats = executor.get_stats()
+        assert stats["total_calls"] == 1
+        assert stats["max_queue_depth"] == 0
+
+    @pytest.mark.asyncio
+    async def test_shutdown_logs_summary(self, caplog):
+        executor = ToolExecutor(max_workers=1)
+        await executor.run("next_step", "session-1", time.sleep, 0.01)
+
+        with caplog.at_level("INFO"):
+            executor.shutdown()
+
+        assert "1 calls (1 completed, 0 failed)" in caplog.text
+        assert "slowest next_step" in caplog.text
+
+
+class TestConcurrentHandlers:
+    """Shared managers driven from several tool worker threads"""
+
+    @pytest.mark.asyncio
+    async def test_sessions_across_workers(self):
+        manager = SessionManager(":memory:")
+        executor = ToolExecutor(max_workers=4)
+
+        def start(i):
+            session = SessionState(
+                session_id=f"session-{i}",
+                topic=f"Topic {i}",
+                current_step="initialize",
+                flow_type="comprehensive_analysis",
+                context={"index": i},
+            )
+            return manager.create_session(session)
+
+        def step(session_id, step_name):
+            manager.get_session(session_id).context[step_name] = True
+            return manager.update_session_step(session_id, step_name, "result")
+
+        try:
+            # start_thinking-style calls carry no session_id
+            ids = await asyncio.gather(
+                *[executor.run("start_thinking", None, start, i) for i in range(8)]
+            )
+            await asyncio.gather(
+                *[
+                    executor.run("next_step", sid, step, sid, name)
+                    for name in ("decompose", "evaluate")
+                    for sid in ids
+                ]
+            )
+
+            for i, sid in enumerate(ids):
+                manager._forget_session(sid)
+                session = manager.get_session(sid)
+                assert session.context["index"] == i
+                assert session.context["decompose"] and session.context["evaluate"]
+                assert session.current_step == "evaluate"
+        finally:
+            executor.shutdown()
+            manager.db.shutdown()
+
+    def test_flow_listing_during_creation(self):
+        flow_manager = FlowManager()
+        errors = []
+
+        def create():
+            for i in range(200):
+                flow_manager.create_flow(f"session-{threading.get_ident()}-{i}")
+
+        def listing():
+            try:
+                for _ in range(200):
+                    flow_manager.list_active_flows()
+                    flow_manager.get_flow_statistics()
+            except RuntimeError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=create) for _ in range(2)]
+        threads.append(threading.Thread(target=listing))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert errors == []
+        assert flow_manager.get_flow_statistics()["total_flows"] == 400